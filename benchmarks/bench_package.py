@@ -0,0 +1,340 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Package benchmark, runs WMI based collectors of virtualization, updates, antivirus, product_key and server
+against a replayed WMI fixture and a registry backend, so every release gets a baseline on any OS
+
+Every collector runs cold (empty query cache) then warm, median times are printed, and written as JSON
+with --output so baselines of two releases can be compared. Replayed queries take --latency seconds
+plus --per-object-latency seconds per returned object, and connections --connect-latency seconds.
+
+Without --fixture, a synthetic host is used, its fixture being recorded from a fake WMI provider.
+Fixtures of real hosts are recorded on Windows with --record, registry being exported with reg export:
+
+    python benchmarks/bench_package.py --record host.json.gz
+    reg export HKLM\\SOFTWARE host.reg
+
+Usage: python benchmarks/bench_package.py [--fixture host.json.gz] [--registry host.reg] [--iterations 10]
+                                          [--latency 0.005] [--output baseline.json]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.package"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import argparse
+import importlib
+import json
+import statistics
+from time import perf_counter
+
+from windows_tools import registry, wmi_queries
+from windows_tools.wmi_queries.fixtures import recording, replaying
+from windows_tools.wmi_queries.wql import WqlQuery
+
+# (module, collector name, collector), collectors needing COM or a live system only are left out
+COLLECTORS = [
+    (
+        "virtualization",
+        "check_for_virtualization",
+        lambda module: module.check_for_virtualization(
+            module.get_relevant_platform_info()
+        ),
+    ),
+    (
+        "updates",
+        "get_windows_updates_wmi",
+        lambda module: module.get_windows_updates_wmi(),
+    ),
+    (
+        "updates",
+        "get_windows_updates_reg",
+        lambda module: module.get_windows_updates_reg(),
+    ),
+    (
+        "antivirus",
+        "get_installed_antivirus_software",
+        lambda module: module.get_installed_antivirus_software(),
+    ),
+    (
+        "product_key",
+        "get_windows_product_key_from_wmi",
+        lambda module: module.get_windows_product_key_from_wmi(),
+    ),
+    (
+        "product_key",
+        "get_windows_product_channel",
+        lambda module: module.get_windows_product_channel(),
+    ),
+    (
+        "product_key",
+        "get_windows_product_key_from_reg",
+        lambda module: module.get_windows_product_key_from_reg(),
+    ),
+    ("server", "is_windows_server", lambda module: module.is_windows_server()),
+    ("server", "is_rds_server", lambda module: module.is_rds_server()),
+]
+
+# Synthetic host, a Windows server with 300 hotfixes
+WMI_CLASSES = {
+    "Win32_ComputerSystem": [{"Manufacturer": "Dell Inc.", "Model": "PowerEdge R740"}],
+    "Win32_Baseboard": [{"Manufacturer": "Dell Inc.", "Product": "0WXD1Y"}],
+    "Win32_Bios": [
+        {"Manufacturer": "Dell Inc.", "SerialNumber": "5GH2K13", "Version": "DELL - 1"}
+    ],
+    "Win32_DiskDrive": [
+        {
+            "Caption": "PERC H740P Disk %d" % index,
+            "Model": "PERC H740P",
+            "SerialNumber": "00%d" % index,
+        }
+        for index in range(8)
+    ],
+    "Win32_QuickFixEngineering": [
+        {
+            "HotFixID": "KB50%05d" % index,
+            "InstalledOn": "%d/%d/2025" % (index % 12 + 1, index % 28 + 1),
+            "Description": "Security Update",
+            "Caption": "http://support.microsoft.com/?kbid=50%05d" % index,
+        }
+        for index in range(300)
+    ],
+    "Win32_OperatingSystem": [{"ProductType": 3, "OSProductSuite": 272}],
+    "Win32_ServerFeature": [{"ID": 18}],
+    "Win32_TerminalService": [{"Name": "TermService"}],
+    "SoftwareLicensingService": [{"OA3xOriginalProductKey": ""}],
+    "SoftwareLicensingProduct": [
+        {"Description": "Windows(R) Operating System, VOLUME_KMSCLIENT channel"}
+    ],
+    "AntivirusProduct": [
+        {"displayName": "Windows Defender", "productState": 397568},
+        {"displayName": "ESET Security", "productState": 266240},
+    ],
+}
+
+
+class FakeProperty:
+    def __init__(self, name: str, value):
+        self.Name = name
+        self.Value = value
+        self.CIMType = 3 if isinstance(value, int) else 8
+
+
+class FakePropertySet:
+    def __init__(self, values: dict):
+        self._values = values
+
+    def Item(self, name: str) -> FakeProperty:
+        return FakeProperty(name, self._values[name])
+
+    __call__ = Item
+
+    def __iter__(self):
+        return (self.Item(name) for name in self._values)
+
+
+class FakeWmiObject:
+    def __init__(self, values: dict):
+        self.properties = dict.fromkeys(values)
+        self.Properties_ = FakePropertySet(values)
+
+
+class FakeWmiConnection:
+    def query(self, query_str: str) -> list:
+        query = WqlQuery.parse(query_str)
+        try:
+            objects = WMI_CLASSES[query.class_name]
+        except KeyError:
+            raise OSError("Invalid class %s" % query.class_name)
+        return [
+            FakeWmiObject(
+                dict((column, values[column]) for column in query.columns or values)
+            )
+            for values in objects
+        ]
+
+
+def make_registry_backend() -> registry.MemoryBackend:
+    uninstall = {}
+    for index in range(400):
+        uninstall["{%08d-0000-0000-0000-000000000000}" % index] = {
+            "": [
+                {"name": "DisplayName", "value": "Product %d" % index},
+                {"name": "DisplayVersion", "value": "1.0.%d" % index},
+                {"name": "Publisher", "value": "Vendor %d" % (index % 40)},
+            ]
+        }
+    uninstall["ESET Security"] = {
+        "": [
+            {"name": "DisplayName", "value": "ESET Security"},
+            {"name": "DisplayVersion", "value": "17.0.15.0"},
+            {"name": "Publisher", "value": "ESET, spol. s r.o."},
+        ]
+    }
+    packages = {}
+    for index in range(3000):
+        packages[
+            "Package_%d_for_KB50%05d~31bf3856ad364e35~amd64~~1.0" % (index, index)
+        ] = {
+            "": [
+                {"name": "CurrentState", "value": (112, 128, 80)[index % 3]},
+                {
+                    "name": "InstallLocation",
+                    "value": r"C:\Windows\KB50%05d.cab" % index,
+                },
+            ]
+        }
+    return registry.MemoryBackend(
+        {
+            registry.HKEY_LOCAL_MACHINE: {
+                "SOFTWARE": {
+                    "Microsoft": {
+                        "Windows": {
+                            "CurrentVersion": {
+                                "Uninstall": uninstall,
+                                "Component Based Servicing": {"Packages": packages},
+                            }
+                        },
+                        "Windows NT": {
+                            "CurrentVersion": {
+                                "": [
+                                    {
+                                        "name": "DigitalProductID",
+                                        "value": bytes(range(164)),
+                                    }
+                                ]
+                            }
+                        },
+                    }
+                }
+            }
+        }
+    )
+
+
+def load_collectors() -> list:
+    collectors = []
+    for module_name, name, collector in COLLECTORS:
+        try:
+            module = importlib.import_module("windows_tools.%s" % module_name)
+        except ImportError as exc:
+            print("Skipping %s.%s: %s" % (module_name, name, exc))
+            continue
+        collectors.append(("%s.%s" % (module_name, name), module, collector))
+    return collectors
+
+
+def record(collectors: list, path: str = None, factory=None):
+    """
+    Run every collector once while recording WMI queries
+    """
+    with recording(factory=factory) as fixture:
+        for _, module, collector in collectors:
+            collector(module)
+    if path:
+        fixture.save(path)
+        print("Recorded %d queries to %s" % (len(fixture), path))
+    return fixture
+
+
+def bench(collectors: list, fixture, iterations: int, **latencies) -> dict:
+    results = {}
+    with replaying(fixture, **latencies) as replay:
+        cache = wmi_queries.get_cache(True)
+        for name, module, collector in collectors:
+            cold = []
+            warm = []
+            queries = 0
+            for _ in range(iterations):
+                cache.clear()
+                queries -= replay.stats["queries"]
+                start = perf_counter()
+                collector(module)
+                cold.append(perf_counter() - start)
+                queries += replay.stats["queries"]
+                start = perf_counter()
+                collector(module)
+                warm.append(perf_counter() - start)
+            results[name] = {
+                "cold_ms": statistics.median(cold) * 1000,
+                "warm_ms": statistics.median(warm) * 1000,
+                "queries": queries / iterations,
+            }
+            print(
+                "%-50s cold %8.2f ms, warm %8.2f ms, %.1f WMI queries per cold call"
+                % (
+                    name,
+                    results[name]["cold_ms"],
+                    results[name]["warm_ms"],
+                    results[name]["queries"],
+                )
+            )
+    for namespace, query_str in sorted(set(replay.missing)):
+        print("WARNING: query missing from fixture, %s: %s" % (namespace, query_str))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixture", help="WMI fixture to replay")
+    parser.add_argument("--registry", help=".reg export used as registry")
+    parser.add_argument("--record", help="Record a WMI fixture of this host and exit")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--per-object-latency", type=float, default=0.0001)
+    parser.add_argument("--connect-latency", type=float, default=0.02)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    collectors = load_collectors()
+    if args.record:
+        record(collectors, args.record)
+        return
+
+    if args.registry:
+        backend = registry.RegFileBackend(args.registry)
+    else:
+        backend = make_registry_backend()
+    with registry.use_backend(backend):
+        if args.fixture:
+            fixture = args.fixture
+        else:
+            fixture = record(
+                collectors,
+                factory=lambda computer, namespace, moniker: FakeWmiConnection(),
+            )
+        results = bench(
+            collectors,
+            fixture,
+            args.iterations,
+            latency=args.latency,
+            per_object_latency=args.per_object_latency,
+            connect_latency=args.connect_latency,
+        )
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(
+                {
+                    "wmi_queries": wmi_queries.__version__,
+                    "fixture": args.fixture or "synthetic",
+                    "latency": [
+                        args.latency,
+                        args.per_object_latency,
+                        args.connect_latency,
+                    ],
+                    "collectors": results,
+                },
+                file_handle,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    main()
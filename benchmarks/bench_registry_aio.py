@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Event loop latency benchmark while scanning a large registry tree,
+blocking get_keys() calls versus awaited windows_tools.registry.aio.get_keys() calls
+A ticker coroutine sleeps 1ms in a loop and records how late it wakes up
+
+winreg releases the GIL while the registry is read, which the latency backend emulates with a short
+sleep per opened key. The plain memory backend never releases it, so worker threads still compete
+with the event loop for the GIL there
+
+Usage: python benchmarks/bench_registry_aio.py [number of installed softwares]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.registry.aio"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import asyncio
+import sys
+from time import perf_counter, sleep
+
+from windows_tools import registry
+from windows_tools.registry import aio
+
+UNINSTALL_KEY = r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall"
+TICK = 0.001
+
+
+class LatencyBackend(registry.MemoryBackend):
+    """
+    Memory backend releasing the GIL for a moment on every key opening, like winreg system calls do
+    """
+
+    def open_key(self, handle, sub_key: str, access: int = registry.KEY_READ):
+        sleep(0.00005)
+        return super().open_key(handle, sub_key, access)
+
+
+def make_backend(
+    software_count: int, backend_class=registry.MemoryBackend
+) -> registry.MemoryBackend:
+    uninstall = {}
+    for index in range(software_count):
+        uninstall["Software%d" % index] = {
+            "": [
+                {"name": "DisplayName", "value": "Software number %d" % index},
+                {"name": "DisplayVersion", "value": "1.0.%d" % index},
+                {"name": "Publisher", "value": "Vendor %d" % (index % 50)},
+            ],
+            "Components": {"Main": {"": [{"name": "Path", "value": r"C:\App"}]}},
+        }
+    return backend_class(
+        {
+            registry.HKEY_LOCAL_MACHINE: {
+                "SOFTWARE": {
+                    "Microsoft": {
+                        "Windows": {"CurrentVersion": {"Uninstall": uninstall}}
+                    }
+                }
+            }
+        }
+    )
+
+
+async def ticker(delays: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = perf_counter()
+        await asyncio.sleep(TICK)
+        delays.append(perf_counter() - start - TICK)
+
+
+async def measure(scan, scans: int) -> tuple:
+    delays = []
+    stop = asyncio.Event()
+    tick_task = asyncio.ensure_future(ticker(delays, stop))
+    await asyncio.sleep(0)
+    start = perf_counter()
+    await scan(scans)
+    elapsed = perf_counter() - start
+    stop.set()
+    await tick_task
+    delays.sort()
+    return elapsed, len(delays), delays[int(len(delays) * 0.99)], delays[-1]
+
+
+def bench(software_count: int, scans: int = 4) -> None:
+    hive = registry.HKEY_LOCAL_MACHINE
+    loop = asyncio.new_event_loop()
+    try:
+        for backend_description, backend_class in (
+            ("memory backend", registry.MemoryBackend),
+            ("latency backend", LatencyBackend),
+        ):
+            backend = make_backend(software_count, backend_class)
+
+            async def blocking_scan(scans: int) -> None:
+                for _ in range(scans):
+                    registry.get_keys(
+                        hive, UNINSTALL_KEY, recursion_level=None, backend=backend
+                    )
+                    # Give the ticker a chance between scans, as an agent would between tasks
+                    await asyncio.sleep(0)
+
+            async def aio_scan(scans: int) -> None:
+                await asyncio.gather(
+                    *[
+                        aio.get_keys(
+                            hive, UNINSTALL_KEY, recursion_level=None, backend=backend
+                        )
+                        for _ in range(scans)
+                    ]
+                )
+
+            for description, scan in (
+                ("blocking get_keys()", blocking_scan),
+                ("aio.get_keys()", aio_scan),
+            ):
+                elapsed, ticks, p99, worst = loop.run_until_complete(
+                    measure(scan, scans)
+                )
+                print(
+                    "%s, %s, %d scans: %.3fs, %d ticks, event loop lag p99 %.1fms, max %.1fms"
+                    % (
+                        backend_description,
+                        description,
+                        scans,
+                        elapsed,
+                        ticks,
+                        p99 * 1000,
+                        worst * 1000,
+                    )
+                )
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Registry result memory benchmark, dict results versus compact records
+
+Usage: python benchmarks/bench_registry_compact.py [number of keys]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.registry.compact"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import sys
+import tracemalloc
+from time import perf_counter
+
+from windows_tools import registry
+
+NAMES = ["DisplayName", "DisplayVersion", "Publisher", "EstimatedSize"]
+
+
+def make_backend(key_count: int) -> registry.MemoryBackend:
+    uninstall = {}
+    for index in range(key_count):
+        uninstall["Software%d" % index] = {
+            "": [
+                {"name": "DisplayName", "value": "Software number %d" % index},
+                {"name": "DisplayVersion", "value": "1.0.%d" % index},
+                {"name": "Publisher", "value": "Vendor %d" % (index % 50)},
+                {"name": "EstimatedSize", "value": index},
+                {"name": "Flags", "value": b"\x00" * 16},
+            ]
+        }
+    return registry.MemoryBackend(
+        {registry.HKEY_LOCAL_MACHINE: {"SOFTWARE": {"Uninstall": uninstall}}}
+    )
+
+
+def measure(description: str, function) -> None:
+    tracemalloc.start()
+    start = perf_counter()
+    result = function()
+    elapsed = perf_counter() - start
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    statistics = snapshot.statistics("filename")
+    retained = sum(stat.size for stat in statistics)
+    blocks = sum(stat.count for stat in statistics)
+    print(
+        "%s: %.2fs, result holds %.1f MB in %d allocations"
+        % (description, elapsed, retained / 1024 / 1024, blocks)
+    )
+    return result
+
+
+def bench(key_count: int) -> None:
+    backend = make_backend(key_count)
+    for compact in (False, True):
+        measure(
+            "get_values(last_modified=True, compact=%s) %d keys" % (compact, key_count),
+            lambda: registry.get_values(
+                registry.HKEY_LOCAL_MACHINE,
+                r"SOFTWARE\Uninstall",
+                names=NAMES,
+                last_modified=True,
+                backend=backend,
+                compact=compact,
+            ),
+        )
+    for compact in (False, True):
+        measure(
+            "get_keys(last_modified=True, compact=%s) %d keys" % (compact, key_count),
+            lambda: registry.get_keys(
+                registry.HKEY_LOCAL_MACHINE,
+                r"SOFTWARE\Uninstall",
+                last_modified=True,
+                backend=backend,
+                compact=compact,
+            ),
+        )
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Registry subtree deletion benchmark, bottom-up delete_tree() versus the former recursive delete_sub_key()
+Counts OpenKey calls, key names they resolve and time to delete an installer like subtree
+
+Usage: python benchmarks/bench_registry_delete.py [number of product keys]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.registry.delete"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import sys
+from time import perf_counter
+
+from windows_tools import registry
+
+VENDOR_KEY = r"SOFTWARE\Vendor"
+
+
+class CountingBackend(registry.MemoryBackend):
+    """
+    Memory backend counting OpenKey calls and key path components they resolve
+    """
+
+    def __init__(self, trees: dict = None):
+        super().__init__(trees)
+        self.opens = 0
+        self.lookups = 0
+
+    def open_key(self, handle, sub_key: str, access: int = registry.KEY_READ):
+        self.opens += 1
+        self.lookups += len([part for part in sub_key.split("\\") if part])
+        return super().open_key(handle, sub_key, access)
+
+
+def make_backend(product_count: int) -> CountingBackend:
+    products = {}
+    for index in range(product_count):
+        products["Product%d" % index] = {
+            "": [{"name": "Version", "value": "1.0.%d" % index}],
+            "Features": dict(
+                ("Feature%d" % feature, {"Components": {"Files": {}}})
+                for feature in range(5)
+            ),
+        }
+    return CountingBackend(
+        {registry.HKEY_LOCAL_MACHINE: {"SOFTWARE": {"Vendor": products}}}
+    )
+
+
+def legacy_delete_sub_key(backend, root_key: int, current_key: str) -> None:
+    """
+    Former delete_sub_key() algorithm: try DeleteKey on every subkey, and reopen it by full path
+    from the hive on failure
+    """
+    open_key = backend.open_key(root_key, current_key, registry.KEY_ALL_ACCESS)
+    for _ in range(backend.query_info(open_key)[0]):
+        sub_key = backend.enum_key(open_key, 0)
+        try:
+            backend.delete_key(open_key, sub_key)
+        except OSError:
+            legacy_delete_sub_key(backend, root_key, current_key + "\\" + sub_key)
+    backend.delete_key(open_key, "")
+    backend.close_key(open_key)
+
+
+def bench(product_count: int) -> None:
+    hive = registry.HKEY_LOCAL_MACHINE
+    backend = make_backend(product_count)
+    start = perf_counter()
+    legacy_delete_sub_key(backend, hive, VENDOR_KEY)
+    elapsed = perf_counter() - start
+    print(
+        "recursive delete_sub_key(): %d OpenKey calls resolving %d key names, %.3fs"
+        % (backend.opens, backend.lookups, elapsed)
+    )
+
+    backend = make_backend(product_count)
+    start = perf_counter()
+    result = registry.delete_tree(hive, VENDOR_KEY, dry_run=True, backend=backend)
+    elapsed = perf_counter() - start
+    print(
+        "delete_tree(dry_run=True): %d keys listed, %d OpenKey calls, %.3fs"
+        % (result["deleted"], backend.opens, elapsed)
+    )
+
+    backend.opens = backend.lookups = 0
+    start = perf_counter()
+    result = registry.delete_tree(hive, VENDOR_KEY, backend=backend)
+    elapsed = perf_counter() - start
+    assert not result["errors"]
+    print(
+        "delete_tree(): %d keys deleted, %d OpenKey calls resolving %d key names, %.3fs"
+        % (result["deleted"], backend.opens, backend.lookups, elapsed)
+    )
+
+    backend = make_backend(product_count)
+    start = perf_counter()
+    result = registry.delete_tree(hive, VENDOR_KEY, native=True, backend=backend)
+    elapsed = perf_counter() - start
+    print(
+        "delete_tree(native=True): native=%s, %d OpenKey calls, %.3fs"
+        % (result["native"], backend.opens, elapsed)
+    )
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,111 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Registry export benchmark, .reg files versus the binary export format
+Exports a 100k keys installer like subtree both ways, then compares file sizes and load times
+
+Usage: python benchmarks/bench_registry_export.py [number of product keys, 100 subkeys each]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.registry.export"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+from windows_tools import registry
+from windows_tools.registry.export import (
+    export_binary,
+    export_reg,
+    iter_file,
+    load_tree,
+)
+
+VENDOR_KEY = r"SOFTWARE\Vendor"
+ROUNDS = 3
+
+
+def make_backend(product_count: int) -> registry.MemoryBackend:
+    products = {}
+    for index in range(product_count):
+        product = {
+            "": [
+                {"name": "DisplayName", "value": "Product %d" % index},
+                {"name": "Publisher", "value": "Vendor"},
+                {"name": "EstimatedSize", "value": index * 1024},
+            ]
+        }
+        for component in range(99):
+            product["Component%d" % component] = {
+                "": [
+                    {"name": "", "value": "Component %d" % component},
+                    {
+                        "name": "Path",
+                        "value": r"C:\Program Files\Vendor\Product%d\%d.dll"
+                        % (index, component),
+                    },
+                    {"name": "Version", "value": component},
+                    {"name": "Checksum", "value": os.urandom(8)},
+                ]
+            }
+        products["Product%d" % index] = product
+    return registry.MemoryBackend(
+        {registry.HKEY_LOCAL_MACHINE: {"SOFTWARE": {"Vendor": products}}}
+    )
+
+
+def best_time(function, *args) -> float:
+    best = None
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        function(*args)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench(product_count: int) -> None:
+    hive = registry.HKEY_LOCAL_MACHINE
+    backend = make_backend(product_count)
+    directory = tempfile.mkdtemp()
+    try:
+        load_times = {}
+        trees = {}
+        for name, export in (("reg", export_reg), ("binary", export_binary)):
+            path = os.path.join(directory, "vendor.%s" % name)
+            start = perf_counter()
+            keys = export(hive, VENDOR_KEY, path, backend=backend)
+            elapsed = perf_counter() - start
+            print(
+                "export_%s(): %d keys, %.1f MB, %.3fs"
+                % (name, keys, os.path.getsize(path) / 1024 / 1024, elapsed)
+            )
+            load_times[name] = best_time(load_tree, path)
+            trees[name] = load_tree(path)
+            print("load_tree(%s): %.3fs" % (name, load_times[name]))
+            print(
+                "iter_file(%s): %.3fs"
+                % (name, best_time(lambda: sum(1 for _ in iter_file(path))))
+            )
+        assert trees["reg"] == trees["binary"]
+        print(
+            "binary exports load %.1fx faster than .reg files"
+            % (load_times["reg"] / load_times["binary"])
+        )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
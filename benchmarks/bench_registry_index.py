@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Registry search index benchmark, index lookups versus scanning get_keys() results
+
+Usage: python benchmarks/bench_registry_index.py [number of keys]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.registry.index"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+from windows_tools import registry
+from windows_tools.registry.index import RegistryIndex
+
+
+def make_backend(key_count: int) -> registry.MemoryBackend:
+    tree = {}
+    for index in range(key_count):
+        vendor = tree.setdefault("Vendor%d" % (index // 1000), {})
+        vendor["{%08X-0000-0000-0000-%012X}" % (index, index)] = {
+            "": [
+                {"name": "DisplayName", "value": "Product number %d" % index},
+                {
+                    "name": "InstallLocation",
+                    "value": r"C:\Program Files\Vendor%d\Product%d"
+                    % (index // 1000, index),
+                },
+                {"name": "EstimatedSize", "value": index},
+            ]
+        }
+    return registry.MemoryBackend({registry.HKEY_LOCAL_MACHINE: {"SOFTWARE": tree}})
+
+
+def timed(description: str, function):
+    start = perf_counter()
+    result = function()
+    print("%s: %.4fs" % (description, perf_counter() - start))
+    return result
+
+
+def bench(key_count: int) -> None:
+    backend = make_backend(key_count)
+    guid = "{%08X-0000-0000-0000-%012X}" % (key_count // 2, key_count // 2)
+
+    def _scan():
+        found = []
+        for path, values, _ in registry.walk_keys(
+            registry.HKEY_LOCAL_MACHINE, "SOFTWARE", backend=backend
+        ):
+            if path.lower().endswith(guid.lower()) or any(
+                isinstance(value["value"], str) and "product5" in value["value"].lower()
+                for value in values
+            ):
+                found.append(path)
+        return found
+
+    timed("walk_keys() scan for a substring, %d keys" % key_count, _scan)
+    index = timed(
+        "RegistryIndex.build() %d keys" % key_count,
+        lambda: RegistryIndex.build(
+            registry.HKEY_LOCAL_MACHINE, "SOFTWARE", backend=backend
+        ),
+    )
+    timed("exact lookup", lambda: index.find(guid))
+    timed("prefix lookup", lambda: index.find(r"c:\program files\vendor5", "prefix"))
+    found = timed("substring lookup", lambda: index.find("product5", "substring"))
+    print("%d keys found by substring" % len(found))
+
+    index_file = os.path.join(tempfile.mkdtemp(), "index.json.gz")
+    timed("save()", lambda: index.save(index_file))
+    print("Index file size: %.1f MB" % (os.path.getsize(index_file) / 1024 / 1024))
+    timed("load()", lambda: RegistryIndex.load(index_file))
+    os.remove(index_file)
+
+    software = backend.open_key(registry.HKEY_LOCAL_MACHINE, "SOFTWARE")
+    for index_number in range(0, key_count, 1000):
+        key = software.get_subkey("Vendor%d" % (index_number // 1000)).get_subkey(
+            "{%08X-0000-0000-0000-%012X}" % (index_number, index_number)
+        )
+        key.set_value("DisplayName", "Renamed product %d" % index_number)
+        key.last_write += 1
+    timed(
+        "refresh() with %d changed keys" % (key_count // 1000),
+        lambda: index.refresh(backend=backend),
+    )
+    timed("exact lookup after refresh", lambda: index.find("renamed product 0"))
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,252 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Batched registry queries benchmark, query_many() versus one get_value() call per value
+Counts OpenKey calls, key names they resolve and time for firewall and installed software like lookups,
+then for the query_many() based callers, windows_firewall.is_firewall_active() and office.get_office_version(),
+office being compared with its previous get_value() / get_keys() lookups
+
+Usage: python benchmarks/bench_registry_query_many.py [number of installed softwares]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.registry.query_many"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import sys
+from time import perf_counter
+
+from windows_tools import office, registry, windows_firewall
+
+FIREWALL_POLICY_KEY = (
+    r"SYSTEM\CurrentControlSet\Services\SharedAccess\Parameters\FirewallPolicy"
+)
+FIREWALL_PROFILES = ["StandardProfile", "DomainProfile", "PublicProfile"]
+OFFICE_KEY = r"SOFTWARE\Microsoft\Office"
+OFFICE_VERSIONS = ["14.0", "15.0", "16.0"]
+OFFICE_APPLICATIONS = [
+    "Access",
+    "Common",
+    "Excel",
+    "Groove",
+    "InfoPath",
+    "Lync",
+    "OneNote",
+    "Outlook",
+    "PowerPoint",
+    "Publisher",
+    "Registration",
+    "User Settings",
+    "Visio",
+    "Word",
+]
+OFFICE_SETTINGS_KEYS = ["Addins", "Options", "Resiliency", "Security", "InstallRoot"]
+UNINSTALL_KEY = r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall"
+UNINSTALL_VALUES = ["DisplayName", "DisplayVersion", "Publisher"]
+
+
+class CountingBackend(registry.MemoryBackend):
+    """
+    Memory backend counting OpenKey calls and key path components they resolve
+    """
+
+    def __init__(self, trees: dict = None):
+        super().__init__(trees)
+        self.opens = 0
+        self.lookups = 0
+
+    def open_key(self, handle, sub_key: str, access: int = registry.KEY_READ):
+        self.opens += 1
+        self.lookups += len([part for part in sub_key.split("\\") if part])
+        return super().open_key(handle, sub_key, access)
+
+
+def make_backend(software_count: int) -> CountingBackend:
+    uninstall = {}
+    for index in range(software_count):
+        uninstall["Software%d" % index] = {
+            "": [
+                {"name": "DisplayName", "value": "Software number %d" % index},
+                {"name": "DisplayVersion", "value": "1.0.%d" % index},
+                {"name": "Publisher", "value": "Vendor %d" % (index % 50)},
+            ]
+        }
+    # Office 2019 click and run, older versions left behind, every application having a few settings keys
+    office_tree = {
+        "ClickToRun": {
+            "Configuration": {
+                "": [{"name": "ProductReleaseIds", "value": "ProPlus2019Volume"}]
+            }
+        }
+    }
+    for version in OFFICE_VERSIONS:
+        office_tree[version] = dict(
+            (
+                application,
+                dict(
+                    (
+                        settings,
+                        {
+                            "": [
+                                {"name": "Setting%d" % index, "value": index}
+                                for index in range(3)
+                            ]
+                        },
+                    )
+                    for settings in OFFICE_SETTINGS_KEYS
+                ),
+            )
+            for application in OFFICE_APPLICATIONS
+        )
+    office_tree["16.0"]["ClickToRunStore"] = {"Packages": {}}
+    return CountingBackend(
+        {
+            registry.HKEY_LOCAL_MACHINE: {
+                "SYSTEM": {
+                    "CurrentControlSet": {
+                        "Services": {
+                            "SharedAccess": {
+                                "Parameters": {
+                                    "FirewallPolicy": dict(
+                                        (
+                                            profile,
+                                            {
+                                                "": [
+                                                    {
+                                                        "name": "EnableFirewall",
+                                                        "value": 1,
+                                                    }
+                                                ]
+                                            },
+                                        )
+                                        for profile in FIREWALL_PROFILES
+                                    )
+                                }
+                            }
+                        }
+                    }
+                },
+                "SOFTWARE": {
+                    "Microsoft": {
+                        "Office": office_tree,
+                        "Windows": {"CurrentVersion": {"Uninstall": uninstall}},
+                    }
+                },
+            },
+            registry.HKEY_CLASSES_ROOT: {
+                "Word.Application": {
+                    "CurVer": {"": [{"name": "", "value": "Word.Application.16"}]}
+                }
+            },
+        }
+    )
+
+
+def make_queries(software_count: int) -> dict:
+    hive = registry.HKEY_LOCAL_MACHINE
+    return {
+        "firewall": [
+            (hive, FIREWALL_POLICY_KEY + "\\" + profile, ["EnableFirewall"])
+            for profile in FIREWALL_PROFILES
+        ],
+        "installed software": [
+            (hive, UNINSTALL_KEY + "\\Software%d" % index, UNINSTALL_VALUES)
+            for index in range(software_count)
+        ],
+    }
+
+
+def bench(software_count: int) -> None:
+    backend = make_backend(software_count)
+    for description, queries in make_queries(software_count).items():
+        backend.opens = backend.lookups = 0
+        start = perf_counter()
+        for hive, key, names in queries:
+            for name in names:
+                registry.get_value(hive, key, name, backend=backend)
+        elapsed = perf_counter() - start
+        print(
+            "%s, get_value(): %d OpenKey calls resolving %d key names, %.3fs"
+            % (description, backend.opens, backend.lookups, elapsed)
+        )
+
+        backend.opens = backend.lookups = 0
+        start = perf_counter()
+        results = registry.query_many(queries, backend=backend)
+        elapsed = perf_counter() - start
+        assert not any(result["error"] for result in results)
+        print(
+            "%s, query_many(): %d OpenKey calls resolving %d key names, %.3fs"
+            % (description, backend.opens, backend.lookups, elapsed)
+        )
+
+
+def previous_office_lookups(backend: CountingBackend) -> None:
+    """
+    Registry reads office.get_office_version() did before using query_many()
+    """
+    both_views = registry.KEY_WOW64_64KEY | registry.KEY_WOW64_32KEY
+    for hive, key, name, arch in (
+        (
+            registry.HKEY_CLASSES_ROOT,
+            r"Word.Application\CurVer",
+            None,
+            0,
+        ),
+        (
+            registry.HKEY_LOCAL_MACHINE,
+            r"Software\Microsoft\Office\ClickToRun\Configuration",
+            "ProductReleaseIds",
+            both_views,
+        ),
+    ):
+        try:
+            registry.get_value(hive, key, name, arch=arch, backend=backend)
+        except FileNotFoundError:
+            pass
+    for version in office.KNOWN_VERSIONS:
+        try:
+            keys = registry.get_keys(
+                registry.HKEY_LOCAL_MACHINE,
+                OFFICE_KEY + "\\" + version,
+                recursion_level=2,
+                arch=both_views,
+                combine=True,
+                backend=backend,
+            )
+        except FileNotFoundError:
+            continue
+        if "Word" in keys:
+            return
+
+
+def bench_callers(software_count: int) -> None:
+    backend = make_backend(software_count)
+    callers = [
+        ("office, previous lookups", lambda: previous_office_lookups(backend)),
+        ("office.get_office_version()", office.get_office_version),
+        ("windows_firewall.is_firewall_active()", windows_firewall.is_firewall_active),
+    ]
+    with registry.use_backend(backend):
+        for description, caller in callers:
+            backend.opens = backend.lookups = 0
+            start = perf_counter()
+            caller()
+            elapsed = perf_counter() - start
+            print(
+                "%s: %d OpenKey calls resolving %d key names, %.3fs"
+                % (description, backend.opens, backend.lookups, elapsed)
+            )
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    software_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    bench(software_count)
+    bench_callers(software_count)
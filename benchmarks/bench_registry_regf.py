@@ -0,0 +1,129 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Offline hive reader benchmark
+
+Builds a synthetic SOFTWARE like hive, then walks it entirely through the registry API
+Usage: python benchmarks/bench_registry_regf.py [number of keys]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.registry.regf"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+from windows_tools import registry
+from windows_tools.registry.regf import HiveFileBackend, build_hive
+
+
+def make_tree(key_count: int, values_per_key: int = 6) -> dict:
+    """
+    Three level deep tree, vendor / product / version, with a handful of values per key
+    """
+    tree = {}
+    products_per_vendor = 100
+    versions_per_product = 10
+    index = 0
+    while index < key_count:
+        vendor = tree.setdefault(
+            "Vendor%d" % (index // (products_per_vendor * versions_per_product)), {}
+        )
+        product = vendor.setdefault("Product%d" % (index // versions_per_product), {})
+        product["Version%d" % index] = {
+            "": [
+                {"name": "DisplayName", "value": "Product number %d" % index},
+                {
+                    "name": "InstallLocation",
+                    "value": r"C:\Program Files\Vendor\%d" % index,
+                },
+                {"name": "EstimatedSize", "value": index},
+                {"name": "InstallDate", "value": 2**40 + index},
+                {"name": "Tags", "value": ["tag1", "tag2", "tag%d" % index]},
+                {"name": "Blob", "value": os.urandom(64)},
+            ][:values_per_key]
+        }
+        index += 1
+    return tree
+
+
+def walk(backend, key: str = "") -> int:
+    """
+    Walk the whole tree with backend primitives, returns number of values read
+    """
+    value_count = 0
+    stack = [backend.open_key(registry.HKEY_LOCAL_MACHINE, key)]
+    while stack:
+        handle = stack.pop()
+        subkey_count, key_value_count, _ = backend.query_info(handle)
+        for index in range(key_value_count):
+            backend.enum_value(handle, index)
+            value_count += 1
+        for index in range(subkey_count):
+            stack.append(backend.open_key(handle, backend.enum_key(handle, index)))
+    return value_count
+
+
+def bench(key_count: int) -> None:
+    tree = make_tree(key_count)
+    start = perf_counter()
+    hive = build_hive(tree)
+    print(
+        "Built %d keys hive of %.1f MB in %.2fs"
+        % (key_count, len(hive) / 1024 / 1024, perf_counter() - start)
+    )
+
+    with tempfile.NamedTemporaryFile(delete=False) as file_handle:
+        file_handle.write(hive)
+    del hive
+    try:
+        with HiveFileBackend(
+            {(registry.HKEY_LOCAL_MACHINE, "SOFTWARE"): file_handle.name}
+        ) as backend:
+            start = perf_counter()
+            backend.open_key(registry.HKEY_LOCAL_MACHINE, "SOFTWARE")
+            print("Opened hive in %.4fs" % (perf_counter() - start))
+
+            start = perf_counter()
+            value_count = walk(backend, "SOFTWARE")
+            elapsed = perf_counter() - start
+            print(
+                "Walked %d keys / %d values in %.2fs (%d keys/s)"
+                % (key_count, value_count, elapsed, key_count / elapsed)
+            )
+
+            start = perf_counter()
+            registry.get_keys(
+                registry.HKEY_LOCAL_MACHINE,
+                "SOFTWARE",
+                recursion_level=3,
+                backend=backend,
+            )
+            print("get_keys() over whole hive in %.2fs" % (perf_counter() - start))
+
+            start = perf_counter()
+            for index in range(0, key_count, max(1, key_count // 1000)):
+                registry.get_value(
+                    registry.HKEY_LOCAL_MACHINE,
+                    r"SOFTWARE\Vendor%d\Product%d\Version%d"
+                    % (index // 1000, index // 10, index),
+                    "DisplayName",
+                    backend=backend,
+                )
+            print("1000 random get_value() in %.4fs" % (perf_counter() - start))
+    finally:
+        os.remove(file_handle.name)
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
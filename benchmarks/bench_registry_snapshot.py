@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Registry snapshot benchmark, full snapshot versus incremental refresh with 1% of changed keys
+
+Usage: python benchmarks/bench_registry_snapshot.py [number of keys]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.registry.snapshot"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import sys
+from time import perf_counter
+
+from windows_tools import registry
+from windows_tools.registry.snapshot import take_snapshot, refresh_snapshot
+
+
+def make_backend(key_count: int) -> registry.MemoryBackend:
+    tree = {}
+    for index in range(key_count):
+        vendor = tree.setdefault("Vendor%d" % (index // 1000), {})
+        vendor["Product%d" % index] = {
+            "": [
+                {"name": "DisplayName", "value": "Product number %d" % index},
+                {"name": "DisplayVersion", "value": "1.0.%d" % index},
+                {"name": "EstimatedSize", "value": index},
+            ]
+        }
+    return registry.MemoryBackend({registry.HKEY_LOCAL_MACHINE: {"SOFTWARE": tree}})
+
+
+def bench(key_count: int) -> None:
+    backend = make_backend(key_count)
+
+    start = perf_counter()
+    snapshot = take_snapshot(registry.HKEY_LOCAL_MACHINE, "SOFTWARE", backend=backend)
+    print("take_snapshot() %d keys: %.2fs" % (len(snapshot), perf_counter() - start))
+
+    software = backend.open_key(registry.HKEY_LOCAL_MACHINE, "SOFTWARE")
+    for index in range(0, key_count, 100):
+        product = software.get_subkey("Vendor%d" % (index // 1000)).get_subkey(
+            "Product%d" % index
+        )
+        product.set_value("DisplayVersion", "2.0.%d" % index)
+        product.last_write += 1
+
+    start = perf_counter()
+    snapshot, changes = refresh_snapshot(snapshot, backend=backend)
+    print(
+        "refresh_snapshot() %d keys: %.2fs, %d keys enumerated, %d changed"
+        % (
+            len(snapshot),
+            perf_counter() - start,
+            snapshot.stats["enumerated"],
+            len(changes["changed_keys"]),
+        )
+    )
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Dual view registry read benchmark, sequential 64 then 32 bit view reads versus concurrent ones
+Registry calls are given a fixed latency, as real registry calls release the GIL
+
+Usage: python benchmarks/bench_registry_views.py [number of softwares per view]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.registry.views"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import sys
+from time import perf_counter, sleep
+
+from windows_tools import registry
+
+UNINSTALL_KEY = r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall"
+NAMES = ["DisplayName", "Publisher", "DisplayVersion"]
+LATENCY = 0.0001
+
+
+class LatencyBackend(registry.MemoryBackend):
+    """
+    Memory backend where opening a key or reading a value takes some time
+    """
+
+    def open_key(self, handle, sub_key: str, access: int = registry.KEY_READ):
+        sleep(LATENCY)
+        return super().open_key(handle, sub_key, access)
+
+    def query_value(self, handle, name):
+        sleep(LATENCY)
+        return super().query_value(handle, name)
+
+
+def make_uninstall(software_count: int, bitness: int) -> dict:
+    return dict(
+        (
+            "Software%d_%d" % (bitness, index),
+            {
+                "": [
+                    {"name": "DisplayName", "value": "Software %d" % index},
+                    {"name": "Publisher", "value": "Vendor"},
+                    {"name": "DisplayVersion", "value": "1.0"},
+                ]
+            },
+        )
+        for index in range(software_count)
+    )
+
+
+def bench(software_count: int) -> None:
+    backend = LatencyBackend()
+    backend.load_tree(
+        registry.HKEY_LOCAL_MACHINE, make_uninstall(software_count, 64), UNINSTALL_KEY
+    )
+    backend.load_tree(
+        registry.HKEY_LOCAL_MACHINE,
+        make_uninstall(software_count, 32),
+        r"SOFTWARE\WOW6432Node\Microsoft\Windows\CurrentVersion\Uninstall",
+    )
+
+    start = perf_counter()
+    sequential = []
+    for view in (registry.KEY_WOW64_64KEY, registry.KEY_WOW64_32KEY):
+        sequential += registry.get_values(
+            registry.HKEY_LOCAL_MACHINE, UNINSTALL_KEY, NAMES, view, backend=backend
+        )
+    print(
+        "Sequential views: %d entries, %.2fs"
+        % (len(sequential), perf_counter() - start)
+    )
+
+    start = perf_counter()
+    concurrent = registry.get_values(
+        registry.HKEY_LOCAL_MACHINE,
+        UNINSTALL_KEY,
+        NAMES,
+        registry.KEY_WOW64_64KEY | registry.KEY_WOW64_32KEY,
+        combine=True,
+        backend=backend,
+    )
+    print(
+        "Concurrent views: %d entries, %.2fs"
+        % (len(concurrent), perf_counter() - start)
+    )
+
+    start = perf_counter()
+    registry.get_values(
+        registry.HKEY_LOCAL_MACHINE,
+        UNINSTALL_KEY,
+        NAMES,
+        registry.KEY_WOW64_64KEY,
+        backend=backend,
+    )
+    print("Single 64 bit view: %.2fs" % (perf_counter() - start))
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
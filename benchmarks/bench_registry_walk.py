@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Registry tree walking benchmark, streaming walk_keys() versus materialized get_keys()
+
+Usage: python benchmarks/bench_registry_walk.py [number of keys]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.registry.walk"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import sys
+import tracemalloc
+from time import perf_counter
+
+from windows_tools import registry
+
+
+def make_backend(key_count: int) -> registry.MemoryBackend:
+    tree = {}
+    for index in range(key_count):
+        vendor = tree.setdefault("Vendor%d" % (index // 1000), {})
+        product = vendor.setdefault("Product%d" % (index // 10), {})
+        product["Version%d" % index] = {
+            "": [
+                {"name": "DisplayName", "value": "Product number %d" % index},
+                {"name": "EstimatedSize", "value": index},
+            ]
+        }
+    return registry.MemoryBackend({registry.HKEY_LOCAL_MACHINE: {"SOFTWARE": tree}})
+
+
+def measure(description: str, function) -> None:
+    tracemalloc.start()
+    start = perf_counter()
+    function()
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%s: %.2fs, peak memory %.1f MB" % (description, elapsed, peak / 1024 / 1024))
+
+
+def bench(key_count: int) -> None:
+    backend = make_backend(key_count)
+
+    def _get_keys():
+        registry.get_keys(
+            registry.HKEY_LOCAL_MACHINE, "SOFTWARE", recursion_level=10, backend=backend
+        )
+
+    def _walk_keys():
+        value_count = 0
+        for _, values, _ in registry.walk_keys(
+            registry.HKEY_LOCAL_MACHINE, "SOFTWARE", backend=backend
+        ):
+            value_count += len(values)
+
+    def _walk_keys_early_stop():
+        for path, _, _ in registry.walk_keys(
+            registry.HKEY_LOCAL_MACHINE, "SOFTWARE", backend=backend
+        ):
+            if path.endswith("Version%d" % (key_count // 10)):
+                break
+
+    measure("get_keys() %d keys" % key_count, _get_keys)
+    measure("walk_keys() %d keys" % key_count, _walk_keys)
+    measure("walk_keys() stopped after 10% of keys", _walk_keys_early_stop)
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,110 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+CIM timestamp parsing benchmark, the former re.split() + strptime() parser versus the slicing parser and batch APIs
+
+Usage: python benchmarks/bench_wmi_datetimes.py [number of timestamps]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.wmi_queries.datetimes"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import random
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from windows_tools.wmi_queries import (
+    cim_timestamp_to_datetime,
+    cim_timestamps_to_datetimes,
+    cim_timestamps_to_epochs,
+)
+
+
+def legacy_cim_timestamp_to_datetime(cim_timestamp: str, utc: bool = True) -> datetime:
+    """
+    cim_timestamp_to_datetime() up to windows_tools.wmi_queries 1.6.0
+    """
+    cim_time, cim_offset = re.split("[+-]", cim_timestamp)
+    timestamp = datetime.strptime(cim_time, "%Y%m%d%H%M%S.%f")
+
+    if "+" in cim_timestamp:
+        offset = int(cim_offset)
+    elif "-" in cim_timestamp:
+        offset = -int(cim_offset)
+    else:
+        offset = 0
+
+    if utc:
+        timestamp = timestamp.replace(tzinfo=timezone(timedelta(minutes=offset)))
+    else:
+        timestamp += timedelta(minutes=offset)
+    return timestamp
+
+
+def make_timestamps(count: int) -> list:
+    """
+    Event log like timestamps, over two years, with a few time zones
+    """
+    randint = random.Random(42).randint
+    start = datetime(2024, 1, 1)
+    return [
+        "%s.%06d%s"
+        % (
+            (start + timedelta(seconds=randint(0, 63072000))).strftime("%Y%m%d%H%M%S"),
+            randint(0, 999999),
+            ("+000", "+060", "+120", "-300")[index % 4],
+        )
+        for index in range(count)
+    ]
+
+
+def timed(label: str, function, *args):
+    start = perf_counter()
+    result = function(*args)
+    elapsed = perf_counter() - start
+    print("  %s: %.3fs" % (label, elapsed))
+    return result, elapsed
+
+
+def bench(count: int) -> None:
+    cim_timestamps = make_timestamps(count)
+    print("%d CIM timestamps" % count)
+    legacy, legacy_elapsed = timed(
+        "legacy parser",
+        lambda: [legacy_cim_timestamp_to_datetime(value) for value in cim_timestamps],
+    )
+    single, single_elapsed = timed(
+        "cim_timestamp_to_datetime()",
+        lambda: [cim_timestamp_to_datetime(value) for value in cim_timestamps],
+    )
+    batch, batch_elapsed = timed(
+        "cim_timestamps_to_datetimes()", cim_timestamps_to_datetimes, cim_timestamps
+    )
+    epochs, epochs_elapsed = timed(
+        "cim_timestamps_to_epochs()", cim_timestamps_to_epochs, cim_timestamps
+    )
+    assert legacy == single == batch
+    assert list(epochs) == [int(value.timestamp()) for value in legacy]
+    print(
+        "  %.1fx, %.1fx and %.1fx faster than the legacy parser, epochs array takes %.1f MB"
+        % (
+            legacy_elapsed / single_elapsed,
+            legacy_elapsed / batch_elapsed,
+            legacy_elapsed / epochs_elapsed,
+            epochs.itemsize * len(epochs) / 1024 / 1024,
+        )
+    )
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,190 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+WMI result flattening benchmark, wmi_object_2_list_of_dict() versus wmi_objects_to_rows()
+Uses fake COM objects counting round trips, every COM call costing ROUND_TRIP_COST seconds of busy wait
+
+Usage: python benchmarks/bench_wmi_flatten.py [number of rows]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.wmi_queries.flatten"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import sys
+from time import perf_counter
+
+from windows_tools.wmi_queries import (
+    _exec_query,
+    get_select_columns,
+    wmi_object_2_list_of_dict,
+    wmi_objects_to_rows,
+)
+
+# Rough cost of an in-process COM call
+ROUND_TRIP_COST = 0.00002
+
+QFE_PROPERTIES = (
+    "Caption",
+    "CSName",
+    "Description",
+    "FixComments",
+    "HotFixID",
+    "InstallDate",
+    "InstalledBy",
+    "InstalledOn",
+    "Name",
+    "ServicePackInEffect",
+    "Status",
+)
+
+
+class RoundTrips:
+    count = 0
+
+    @classmethod
+    def call(cls) -> None:
+        cls.count += 1
+        deadline = perf_counter() + ROUND_TRIP_COST
+        while perf_counter() < deadline:
+            pass
+
+
+class FakeSWbemProperty:
+    def __init__(self, name: str, value):
+        self._name = name
+        self._value = value
+
+    @property
+    def Name(self) -> str:
+        RoundTrips.call()
+        return self._name
+
+    @property
+    def Value(self):
+        RoundTrips.call()
+        return self._value
+
+
+class FakeSWbemPropertySet:
+    def __init__(self, values: dict):
+        self._values = values
+
+    def Item(self, name: str) -> FakeSWbemProperty:
+        RoundTrips.call()
+        return FakeSWbemProperty(name, self._values[name])
+
+    __call__ = Item
+
+    def __iter__(self):
+        # Enumerator creation, then one Next() call per property
+        RoundTrips.call()
+        for name, value in self._values.items():
+            RoundTrips.call()
+            yield FakeSWbemProperty(name, value)
+
+
+class FakeSWbemObject:
+    def __init__(self, values: dict):
+        self._values = values
+
+    @property
+    def Properties_(self) -> FakeSWbemPropertySet:
+        RoundTrips.call()
+        return FakeSWbemPropertySet(self._values)
+
+
+class FakeWmiObject:
+    """
+    Stands for wmi._wmi_object, which reads every property name when created
+    """
+
+    def __init__(self, ole_object: FakeSWbemObject):
+        self.ole_object = ole_object
+        self.properties = dict.fromkeys(prop.Name for prop in ole_object.Properties_)
+
+    def __getattr__(self, attribute: str):
+        return getattr(self.ole_object, attribute)
+
+
+class FakeSWbemServices:
+    def __init__(self, objects: list):
+        self._objects = objects
+
+    def ExecQuery(self, query_str: str, language: str = "WQL", flags: int = 0) -> list:
+        """
+        Like WMI, objects only carry the selected properties
+        """
+        RoundTrips.call()
+        columns = get_select_columns(query_str)
+        if not columns:
+            return list(self._objects)
+        return [
+            FakeSWbemObject(dict((name, values[name]) for name in columns))
+            for values in (ole_object._values for ole_object in self._objects)
+        ]
+
+
+class FakeWmiConnection:
+    def __init__(self, row_count: int):
+        self._namespace = FakeSWbemServices(
+            [
+                FakeSWbemObject(
+                    dict((name, "%s %d" % (name, index)) for name in QFE_PROPERTIES)
+                )
+                for index in range(row_count)
+            ]
+        )
+
+    def query(self, query_str: str) -> list:
+        return [
+            FakeWmiObject(ole_object)
+            for ole_object in self._namespace.ExecQuery(query_str)
+        ]
+
+
+def bench(row_count: int) -> None:
+    connection = FakeWmiConnection(row_count)
+    for query_str in (
+        "SELECT * FROM Win32_QuickFixEngineering",
+        "SELECT HotFixID, InstalledOn FROM Win32_QuickFixEngineering",
+    ):
+        print(query_str)
+        RoundTrips.count = 0
+        start = perf_counter()
+        result = wmi_object_2_list_of_dict(connection.query(query_str))
+        elapsed = perf_counter() - start
+        print(
+            "  wmi_object_2_list_of_dict(): %d rows, %d round trips, %.3fs"
+            % (len(result), RoundTrips.count, elapsed)
+        )
+        legacy_round_trips, legacy_elapsed = RoundTrips.count, elapsed
+
+        RoundTrips.count = 0
+        start = perf_counter()
+        rows = wmi_objects_to_rows(
+            _exec_query(connection, query_str), get_select_columns(query_str)
+        )
+        elapsed = perf_counter() - start
+        print(
+            "  wmi_objects_to_rows(): %d rows, %d columns, %d round trips, %.3fs"
+            % (len(rows), len(rows.columns), RoundTrips.count, elapsed)
+        )
+        assert [
+            dict((key, row[key]) for key in rows.columns) for row in result
+        ] == rows.as_dicts()
+        print(
+            "  %.1fx fewer round trips, %.1fx faster"
+            % (legacy_round_trips / RoundTrips.count, legacy_elapsed / elapsed)
+        )
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+Concurrent WMI queries benchmark, serial query_wmi() calls versus query_wmi_many()
+Uses a fake WMI provider where every query takes LATENCY seconds, like a busy or remote provider
+
+Usage: python benchmarks/bench_wmi_many.py [latency in seconds]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.wmi_queries.many"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import sys
+import time
+from time import perf_counter
+
+from windows_tools.wmi_queries import (
+    WmiConnectionPool,
+    query_wmi,
+    query_wmi_many,
+)
+
+# Inventory queries, virtualization identification then RDS fallbacks
+QUERIES = {
+    "computersystem": "SELECT Manufacturer, Model FROM Win32_ComputerSystem",
+    "baseboard": "SELECT Manufacturer, Product FROM Win32_Baseboard",
+    "bios": "SELECT Manufacturer, SerialNumber, Version FROM Win32_Bios",
+    "diskdrive": "SELECT Caption, Model, SerialNumber FROM Win32_DiskDrive",
+    "os_product_suite": "SELECT OSProductSuite FROM Win32_OperatingSystem",
+    "server_feature": "SELECT ID FROM Win32_ServerFeature WHERE ID = 18",
+    "terminal_service": "SELECT Name FROM Win32_TerminalService WHERE State = 'Running'",
+}
+
+
+class FakeProperty:
+    def __init__(self, value):
+        self.Value = value
+
+
+class FakeWmiObject:
+    def __init__(self, query_str: str):
+        self.properties = {"Query": None}
+        self._values = {"Query": query_str}
+
+    def Properties_(self, name: str) -> FakeProperty:
+        return FakeProperty(self._values[name])
+
+
+class FakeWmiConnection:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def query(self, query_str: str) -> list:
+        time.sleep(self.latency)
+        return [FakeWmiObject(query_str)]
+
+
+def bench(latency: float) -> None:
+    pool = WmiConnectionPool(
+        factory=lambda computer, namespace, moniker: FakeWmiConnection(latency)
+    )
+    # Open connections of every worker thread first, so that only queries are timed
+    query_wmi_many(QUERIES, pool=pool)
+
+    start = perf_counter()
+    serial = dict(
+        (name, query_wmi(query_str, name=name, pool=pool))
+        for name, query_str in QUERIES.items()
+    )
+    serial_elapsed = perf_counter() - start
+    print(
+        "query_wmi(): %d queries, %.3fs, %d connections"
+        % (len(serial), serial_elapsed, pool.stats["created"])
+    )
+
+    start = perf_counter()
+    results, errors = query_wmi_many(QUERIES, pool=pool)
+    elapsed = perf_counter() - start
+    print(
+        "query_wmi_many(): %d queries, %d errors, %.3fs, %d connections"
+        % (len(results), len(errors), elapsed, pool.stats["created"])
+    )
+    assert results == serial
+    print("%.1fx faster" % (serial_elapsed / elapsed))
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(float(sys.argv[1]) if len(sys.argv) > 1 else 0.05)
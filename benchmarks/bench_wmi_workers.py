@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+WMI worker pool benchmark, one process per query (the query_wmi(mp_queue=...) pattern) versus warm workers
+Uses a fake WMI provider whose connections take CONNECT_COST seconds to open
+
+Usage: python benchmarks/bench_wmi_workers.py [number of queries]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.wmi_queries.workers"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import multiprocessing
+import sys
+import time
+from time import perf_counter
+
+from windows_tools.wmi_queries import WmiConnectionPool, query_wmi
+from windows_tools.wmi_queries.workers import WmiWorkerPool
+
+# Rough cost of COM initialization and a WMI connection
+CONNECT_COST = 0.05
+QUERY_STR = "SELECT Name FROM Win32_Service"
+
+
+class FakeProperty:
+    def __init__(self, value):
+        self.Value = value
+
+
+class FakeWmiObject:
+    def __init__(self, index: int):
+        self.properties = {"Name": None}
+        self._values = {"Name": "Service%d" % index}
+
+    def Properties_(self, name: str) -> FakeProperty:
+        return FakeProperty(self._values[name])
+
+
+class FakeWmiConnection:
+    def query(self, query_str: str) -> list:
+        return [FakeWmiObject(index) for index in range(200)]
+
+
+def fake_factory(computer: str, namespace: str, moniker: str) -> FakeWmiConnection:
+    time.sleep(CONNECT_COST)
+    return FakeWmiConnection()
+
+
+def _child_query(result_queue) -> None:
+    pool = WmiConnectionPool(factory=fake_factory)
+    result_queue.put(query_wmi(QUERY_STR, pool=pool))
+
+
+def process_per_query() -> list:
+    result_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_child_query, args=(result_queue,))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def bench(query_count: int) -> None:
+    start = perf_counter()
+    results = [process_per_query() for _ in range(query_count)]
+    elapsed = perf_counter() - start
+    print("process per query: %d queries, %.3fs" % (len(results), elapsed))
+
+    start = perf_counter()
+    with WmiWorkerPool(workers=2, factory=fake_factory) as pool:
+        startup = perf_counter() - start
+        warm_results = [
+            pool.query(QUERY_STR, rows=False, timeout=60) for _ in range(query_count)
+        ]
+    warm_elapsed = perf_counter() - start
+    print(
+        "WmiWorkerPool: %d queries, %.3fs including %.3fs startup"
+        % (len(warm_results), warm_elapsed, startup)
+    )
+    assert warm_results == results
+    print("%.1fx faster" % (elapsed / warm_elapsed))
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of windows_tools module
+
+"""
+WQL column pruning benchmark, SELECT * versus queries selecting the consumed fields only
+Uses a fake WMI provider counting marshalled properties and bytes, like WMI does for every returned object
+
+Usage: python benchmarks/bench_wmi_wql.py [number of objects]
+
+"""
+
+__intname__ = "benchmarks.windows_tools.wmi_queries.wql"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 Orsiris de Jong"
+__licence__ = "BSD 3 Clause"
+__build__ = "2026101701"
+
+import sys
+from time import perf_counter
+
+from windows_tools.wmi_queries import WmiConnectionPool, query_wmi
+from windows_tools.wmi_queries.wql import WqlQuery, prune_query
+
+# Class properties, then the fields callers actually read, as in updates and antivirus modules
+CLASSES = {
+    "Win32_QuickFixEngineering": (
+        (
+            "Caption",
+            "CSName",
+            "Description",
+            "FixComments",
+            "HotFixID",
+            "InstallDate",
+            "InstalledBy",
+            "InstalledOn",
+            "Name",
+            "ServicePackInEffect",
+            "Status",
+        ),
+        ("HotFixID", "InstalledOn", "Description", "Caption"),
+    ),
+    "AntivirusProduct": (
+        (
+            "displayName",
+            "instanceGuid",
+            "pathToSignedProductExe",
+            "pathToSignedReportingExe",
+            "productState",
+            "timestamp",
+        ),
+        ("displayName", "productState"),
+    ),
+}
+
+
+class Payload:
+    properties = 0
+    size = 0
+
+
+class FakeProperty:
+    def __init__(self, value):
+        self.Value = value
+
+
+class FakeWmiObject:
+    def __init__(self, values: dict):
+        self.properties = dict.fromkeys(values)
+        self._values = values
+        # Every selected property is marshalled with the object
+        Payload.properties += len(values)
+        Payload.size += sum(len(str(value)) for value in values.values())
+
+    def Properties_(self, name: str) -> FakeProperty:
+        return FakeProperty(self._values[name])
+
+
+class FakeWmiConnection:
+    def __init__(self, object_count: int):
+        self.object_count = object_count
+
+    def query(self, query_str: str) -> list:
+        query = WqlQuery.parse(query_str)
+        columns = query.columns or CLASSES[query.class_name][0]
+        return [
+            FakeWmiObject(
+                dict(
+                    (
+                        column,
+                        "%s value of object %d, %s" % (column, index, "x" * 40),
+                    )
+                    for column in columns
+                )
+            )
+            for index in range(self.object_count)
+        ]
+
+
+def bench(object_count: int) -> None:
+    pool = WmiConnectionPool(
+        factory=lambda computer, namespace, moniker: FakeWmiConnection(object_count)
+    )
+    for class_name, (_, fields) in CLASSES.items():
+        for query_str in (
+            "SELECT * FROM %s" % class_name,
+            prune_query("SELECT * FROM %s" % class_name, fields),
+        ):
+            Payload.properties = Payload.size = 0
+            start = perf_counter()
+            result = query_wmi(query_str, pool=pool)
+            elapsed = perf_counter() - start
+            print(
+                "%s: %d objects, %d properties, %.1f KB, %.3fs"
+                % (
+                    query_str,
+                    len(result),
+                    Payload.properties,
+                    Payload.size / 1024,
+                    elapsed,
+                )
+            )
+            if query_str.startswith("SELECT *"):
+                full_size = Payload.size
+        print("  %.1fx smaller payload" % (full_size / Payload.size))
+
+
+if __name__ == "__main__":
+    print("Benchmark for %s, %s" % (__intname__, __build__))
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -25,7 +25,9 @@ from windows_tools.antivirus import (
     securitycenter_get_product_exec_state,
     get_installed_antivirus_software,
 )
-
+from windows_tools.registry import MemoryBackend, use_backend
+from windows_tools.wmi_queries import WmiConnectionPool, use_connection_pool
+from windows_tools.wmi_queries import fixtures
 
 # Those states are obtained via WMI securitycenter2/antivirusproduct & securitycenter2/firewallproduct
 AV_DISABLED_AND_UP_TO_DATE = 262144
@@ -96,9 +98,70 @@ def test_get_installed_antivirus_software():
         )
 
 
+def test_get_installed_antivirus_software_securitycenter_versions():
+    # SecurityCenter v1 AntiVirusProduct has no productState, so each namespace gets its own projection
+    fixture = fixtures.WmiFixture()
+    fixture.add(
+        fixtures.FixtureEntry(
+            "SecurityCenter2",
+            "SELECT displayName, productState FROM AntivirusProduct",
+            ("displayName", "productState"),
+            (8, 19),
+            [("ESET Security", AV_ENABLED_AND_UP_TO_DATE)],
+        )
+    )
+    fixture.add(
+        fixtures.FixtureEntry(
+            "SecurityCenter",
+            "SELECT displayName, companyName, versionNumber, onAccessScanningEnabled, productUptoDate "
+            "FROM AntiVirusProduct",
+            (
+                "displayName",
+                "companyName",
+                "versionNumber",
+                "onAccessScanningEnabled",
+                "productUptoDate",
+            ),
+            (8, 8, 8, 11, 11),
+            [("AVG Anti-Virus", "AVG Technologies", "8.5", True, False)],
+        )
+    )
+    with use_backend(MemoryBackend()), fixtures.replaying(fixture) as replay:
+        assert get_installed_antivirus_software() == [
+            {
+                "name": "ESET Security",
+                "version": None,
+                "publisher": None,
+                "enabled": True,
+                "is_up_to_date": True,
+                "type": "Antivirus",
+            }
+        ]
+
+        # Windows XP has no SecurityCenter2 namespace
+        def factory(computer, namespace, moniker):
+            if namespace == "SecurityCenter2":
+                raise OSError("Invalid namespace")
+            return replay(computer, namespace, moniker)
+
+        with use_connection_pool(WmiConnectionPool(factory=factory)):
+            assert get_installed_antivirus_software() == [
+                {
+                    "name": "AVG Anti-Virus",
+                    "version": "8.5",
+                    "publisher": "AVG Technologies",
+                    "enabled": True,
+                    "is_up_to_date": False,
+                    "type": "Antivirus",
+                }
+            ]
+    assert not replay.missing
+
+
 if __name__ == "__main__":
     print("Example code for %s, %s" % (__intname__, __build__))
     test_securitycenter_get_product_type()
     test_securitycenter_get_product_exec_state()
     test_securitycenter_get_product_update_state()
     test_get_installed_antivirus_software()
+    test_get_installed_antivirus_software_securitycenter_versions()
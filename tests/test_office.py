@@ -20,6 +20,12 @@ __licence__ = "BSD 3 Clause"
 __build__ = "2021021601"
 
 from windows_tools.office import *
+from windows_tools.registry import (
+    HKEY_CLASSES_ROOT,
+    HKEY_LOCAL_MACHINE,
+    MemoryBackend,
+    use_backend,
+)
 
 
 def test_get_office_version():
@@ -38,6 +44,48 @@ def test_get_office_version():
     ], "Bogus office version detected"
 
 
+def test_get_office_version_from_registry():
+    office_keys = {
+        "16.0": {"Word": {}, "Excel": {}, "ClickToRunStore": {}},
+        "15.0": {"Word": {}},
+        "ClickToRun": {
+            "Configuration": {
+                "": [{"name": "ProductReleaseIds", "value": "ProPlus2019Volume"}]
+            }
+        },
+    }
+    backend = MemoryBackend(
+        {
+            HKEY_LOCAL_MACHINE: {"SOFTWARE": {"Microsoft": {"Office": office_keys}}},
+            HKEY_CLASSES_ROOT: {
+                "Word.Application": {
+                    "CurVer": {"": [{"name": "", "value": "Word.Application.16"}]}
+                }
+            },
+        }
+    )
+    with use_backend(backend):
+        assert get_office_version() == ("2019", "ClickAndRun")
+
+    # Highest version holding a Word key, without click and run
+    backend = MemoryBackend(
+        {
+            HKEY_LOCAL_MACHINE: {
+                "SOFTWARE": {
+                    "Microsoft": {
+                        "Office": {"15.0": {"Excel": {}}, "14.0": {"Word": {}}}
+                    }
+                }
+            }
+        }
+    )
+    with use_backend(backend):
+        assert get_office_version() == ("2010", "")
+    with use_backend(MemoryBackend()):
+        assert get_office_version() == (None, "")
+
+
 if __name__ == "__main__":
     print("Example code for %s, %s" % (__intname__, __build__))
     test_get_office_version()
+    test_get_office_version_from_registry()
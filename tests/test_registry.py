@@ -15,15 +15,85 @@ Versioning semantics:
 
 __intname__ = "tests.windows_tools.registry"
 __author__ = "Orsiris de Jong"
-__copyright__ = "Copyright (C) 2020-2024 Orsiris de Jong"
+__copyright__ = "Copyright (C) 2020-2026 Orsiris de Jong"
 __licence__ = "BSD 3 Clause"
-__build__ = "2023050601"
+__build__ = "2026101715"
 
+import asyncio
+import os
 import re
+import tempfile
+import threading
+import time
 from windows_tools.registry import *
+from windows_tools.registry import aio
+from windows_tools.registry.regf import HiveFileBackend, build_hive
+from windows_tools.registry.fleet import MultiHostBackend, RegistryFleet
+from windows_tools.registry.index import RegistryIndex
+from windows_tools.registry.watch import RegistryWatcher
+from windows_tools.registry.snapshot import (
+    RegistrySnapshot,
+    take_snapshot,
+    refresh_snapshot,
+    diff_snapshots,
+)
 
 DATE_REGEX = "[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}"
 
+UNINSTALL_KEY = r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall"
+
+
+def make_memory_backend(backend_class=MemoryBackend):
+    """
+    Simulated registry with 64 and 32 bit Uninstall keys
+    """
+    return backend_class(
+        {
+            HKEY_LOCAL_MACHINE: {
+                "SOFTWARE": {
+                    "Microsoft": {
+                        "Windows": {
+                            "CurrentVersion": {
+                                "Uninstall": {
+                                    "App64": {
+                                        "": [
+                                            {"name": "DisplayName", "value": "App 64"},
+                                            {"name": "Version", "value": 1},
+                                        ]
+                                    },
+                                    "Empty": {},
+                                }
+                            }
+                        },
+                        "Windows NT": {
+                            "CurrentVersion": {
+                                "": [{"name": "ProductName", "value": "Windows 10"}]
+                            }
+                        },
+                    },
+                    "WOW6432Node": {
+                        "Microsoft": {
+                            "Windows": {
+                                "CurrentVersion": {
+                                    "Uninstall": {
+                                        "App32": {
+                                            "": [
+                                                {
+                                                    "name": "DisplayName",
+                                                    "value": "App 32",
+                                                }
+                                            ]
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    },
+                }
+            }
+        }
+    )
+
 
 def test_get_value():
     product_name = get_value(
@@ -98,8 +168,1424 @@ def test_get_keys():
     ), "get_keys() should return at least one software to that could be uninstalled"
 
 
+class CountingBackend(MemoryBackend):
+    """
+    Memory backend that keeps track of opened handles
+    """
+
+    def __init__(self, trees: dict = None):
+        super().__init__(trees)
+        self.opens = 0
+        self.open_handles = 0
+        self.opened_paths = []
+
+    def open_key(self, handle, sub_key: str, access: int = KEY_READ):
+        result = super().open_key(handle, sub_key, access)
+        self.opens += 1
+        self.opened_paths.append(sub_key)
+        self.open_handles += 1
+        return result
+
+    def create_key(self, handle, sub_key: str, access: int = KEY_ALL_ACCESS):
+        result = super().create_key(handle, sub_key, access)
+        self.open_handles += 1
+        return result
+
+    def close_key(self, handle) -> None:
+        if isinstance(handle, MemoryKey) and handle.parent is not None:
+            self.open_handles -= 1
+
+
+def test_memory_backend():
+    backend = make_memory_backend()
+    product_name = get_value(
+        hive=HKEY_LOCAL_MACHINE,
+        key=r"SOFTWARE\Microsoft\Windows NT\CurrentVersion",
+        value="productname",
+        backend=backend,
+    )
+    assert product_name == "Windows 10", "Registry should be case insensitive"
+
+    uninstall = get_values(
+        hive=HKEY_LOCAL_MACHINE,
+        key=UNINSTALL_KEY,
+        names=["DisplayName", "Version"],
+        arch=KEY_WOW64_32KEY | KEY_WOW64_64KEY,
+        combine=True,
+        backend=backend,
+    )
+    assert uninstall == [
+        {"DisplayName": "App 64", "Version": 1},
+        {"DisplayName": "App 32"},
+    ], "WOW64 redirection should be emulated"
+
+    keys = get_keys(
+        hive=HKEY_LOCAL_MACHINE,
+        key=UNINSTALL_KEY,
+        recursion_level=2,
+        backend=backend,
+    )
+    assert keys["App64"][""][1] == {"name": "Version", "value": 1, "type": REG_DWORD}
+    assert keys["Empty"] == {}
+
+    delete_sub_key(HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft", backend=backend)
+    try:
+        get_value(
+            HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", "Version", backend=backend
+        )
+    except FileNotFoundError:
+        pass
+    else:
+        assert False, "Deleted key should not be found"
+
+
+def test_reg_file_backend():
+    reg_content = "\r\n".join(
+        [
+            "Windows Registry Editor Version 5.00",
+            "",
+            r"[HKEY_LOCAL_MACHINE\SOFTWARE\windows_tools]",
+            '@="default"',
+            r'"Path"="C:\\Program Files\\\"quoted\""',
+            '"Count"=dword:0000002a',
+            '"Blob"=hex:01,02,\\',
+            "  03",
+            '"Multi"=hex(7):61,00,00,00,62,00,00,00,00,00',
+            '"Big"=hex(b):00,00,00,00,01,00,00,00',
+            "",
+            r"[HKEY_LOCAL_MACHINE\SOFTWARE\windows_tools\Sub]",
+            "",
+        ]
+    )
+    with tempfile.NamedTemporaryFile("wb", suffix=".reg", delete=False) as fh:
+        fh.write(b"\xff\xfe" + reg_content.encode("utf-16-le"))
+    try:
+        backend = RegFileBackend(fh.name)
+        keys = get_keys(HKEY_LOCAL_MACHINE, r"SOFTWARE\windows_tools", backend=backend)
+        values = {value["name"]: value["value"] for value in keys[""]}
+        assert values == {
+            "": "default",
+            "Path": r'C:\Program Files\"quoted"',
+            "Count": 42,
+            "Blob": b"\x01\x02\x03",
+            "Multi": ["a", "b"],
+            "Big": 2**32,
+        }
+        assert keys["Sub"] == {}
+        try:
+            delete_sub_key(
+                HKEY_LOCAL_MACHINE, r"SOFTWARE\windows_tools", backend=backend
+            )
+        except PermissionError:
+            pass
+        else:
+            assert False, "Reg file backend should be read only"
+    finally:
+        os.remove(fh.name)
+
+
+def test_hive_file_backend():
+    software = {
+        "Microsoft": {
+            "Windows": {
+                "CurrentVersion": {
+                    "Uninstall": {
+                        "App%04d"
+                        % index: {
+                            "": [
+                                {"name": "DisplayName", "value": "App %d" % index},
+                                {"name": "EstimatedSize", "value": index},
+                            ]
+                        }
+                        # More than 512 subkeys so the subkey list is split into an ri list
+                        for index in range(1500)
+                    }
+                }
+            }
+        },
+        "Vendor": {
+            "Ünicode": {
+                "": [
+                    {"name": "Blob", "value": b"\x01" * 40000},
+                    {"name": "Multi", "value": ["a", "b"]},
+                    {"name": "Big", "value": 2**40, "type": REG_QWORD},
+                    {"name": "", "value": "default"},
+                ]
+            }
+        },
+    }
+    system = {
+        "Select": {"": [{"name": "Current", "value": 2}]},
+        "ControlSet002": {
+            "Control": {"": [{"name": "SystemBootDevice", "value": "x"}]}
+        },
+    }
+    paths = []
+    for tree in (software, system):
+        with tempfile.NamedTemporaryFile(delete=False) as fh:
+            fh.write(build_hive(tree, last_write=unix_seconds_to_windows_ticks(0)))
+        paths.append(fh.name)
+
+    try:
+        with HiveFileBackend(
+            {
+                (HKEY_LOCAL_MACHINE, "SOFTWARE"): paths[0],
+                (HKEY_LOCAL_MACHINE, "SYSTEM"): paths[1],
+            }
+        ) as backend:
+            with use_backend(backend):
+                uninstall = get_values(
+                    HKEY_LOCAL_MACHINE,
+                    UNINSTALL_KEY,
+                    names=["DisplayName", "EstimatedSize"],
+                    arch=KEY_WOW64_32KEY | KEY_WOW64_64KEY,
+                )
+                assert len(uninstall) == 1500
+                assert uninstall[1234] == {
+                    "DisplayName": "App 1234",
+                    "EstimatedSize": 1234,
+                }
+
+                assert (
+                    get_value(
+                        HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\app0042", "displayname"
+                    )
+                    == "App 42"
+                )
+
+                keys = get_keys(HKEY_LOCAL_MACHINE, r"SOFTWARE\VENDOR\ünicode")
+                values = {value["name"]: value["value"] for value in keys[""]}
+                assert values == {
+                    "Blob": b"\x01" * 40000,
+                    "Multi": ["a", "b"],
+                    "Big": 2**40,
+                    "": "default",
+                }
+
+                assert (
+                    get_value(
+                        HKEY_LOCAL_MACHINE,
+                        r"SYSTEM\CurrentControlSet\Control",
+                        "SystemBootDevice",
+                    )
+                    == "x"
+                ), "CurrentControlSet should be resolved from Select key"
+                assert re.match(
+                    DATE_REGEX,
+                    get_value(
+                        HKEY_LOCAL_MACHINE,
+                        r"SYSTEM\Select",
+                        "Current",
+                        last_modified=True,
+                    )["last_modified"],
+                )
+    finally:
+        for path in paths:
+            os.remove(path)
+
+
+def test_registry_session():
+    backend = make_memory_backend(CountingBackend)
+    get_values(HKEY_LOCAL_MACHINE, UNINSTALL_KEY, ["DisplayName"], backend=backend)
+    assert backend.open_handles == 0, "get_values() should not leak handles"
+    backend.opens = 0
+
+    with RegistrySession(backend) as session:
+        for _ in range(10):
+            get_values(
+                HKEY_LOCAL_MACHINE,
+                UNINSTALL_KEY,
+                names=["DisplayName"],
+                arch=KEY_WOW64_32KEY | KEY_WOW64_64KEY,
+                combine=True,
+                backend=session,
+            )
+        assert session.stats["connects"] == 1, "Hive connection should be pooled"
+        # 64 bit view: Uninstall + 2 subkeys, 32 bit view: Uninstall + 1 subkey
+        assert backend.opens == 5, "Cached handles should be reused"
+        assert session.stats["hits"] == 45
+
+        # Opening a subkey of a cached key should only open the remaining path
+        handle = session.open_key(
+            HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", KEY_READ | KEY_WOW64_64KEY
+        )
+        assert backend.opens == 5
+        session.close_key(handle)
+    assert backend.open_handles == 0, "Session should close every handle on exit"
+
+    backend = make_memory_backend(CountingBackend)
+    with RegistrySession(backend, max_handles=2) as session:
+        pinned = session.open_key(HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft")
+        get_keys(HKEY_LOCAL_MACHINE, UNINSTALL_KEY, recursion_level=2, backend=session)
+        assert (
+            r"Windows\CurrentVersion\Uninstall" in backend.opened_paths
+        ), "Keys should be opened relative to their nearest opened parent"
+        assert session.stats["evictions"] > 0
+        assert backend.open_handles <= 3, "Unpinned handles should be evicted"
+        assert session.query_info(pinned)[0] == 2, "Pinned handle should stay usable"
+        session.close_key(pinned)
+    assert backend.open_handles == 0
+
+    # A new handle isn't evicted right away when every other handle is pinned
+    backend = make_memory_backend(CountingBackend)
+    with RegistrySession(backend, max_handles=1) as session:
+        pinned = session.open_key(HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft")
+        handle = session.open_key(HKEY_LOCAL_MACHINE, UNINSTALL_KEY)
+        assert session.stats["evictions"] == 0 and backend.open_handles == 2
+        assert session.query_info(handle)[0] == 2, "New handle should be usable"
+        session.close_key(handle)
+        assert session.stats["evictions"] == 1 and backend.open_handles == 1
+
+        # Memory backend gives the same node for both access masks, pins stay per handle
+        other_view = session.open_key(
+            HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft", KEY_READ | KEY_WOW64_64KEY
+        )
+        assert session.backend_handle(other_view) is session.backend_handle(pinned)
+        session.close_key(pinned)
+        assert session.stats["evictions"] == 2, "Unpinned handle should be evicted"
+        assert session.query_info(other_view)[0] == 2
+        session.close_key(other_view)
+    assert backend.open_handles == 0
+
+    # Memory backend gives the same hive connection for every local computer name,
+    # roots stay distinct so handles are located under the computer they were opened for
+    backend = make_memory_backend(CountingBackend)
+    with RegistrySession(backend) as session:
+        local = session.connect(None, HKEY_LOCAL_MACHINE)
+        localhost = session.connect("localhost", HKEY_LOCAL_MACHINE)
+        assert session.backend_handle(local) is session.backend_handle(localhost)
+        assert session.stats["connects"] == 2
+        for connection, computer in ((local, None), (localhost, "localhost")):
+            handle = session.open_key(connection, UNINSTALL_KEY)
+            assert handle.root == (computer, HKEY_LOCAL_MACHINE)
+            assert session.query_info(handle)[0] == 2
+            session.close_key(handle)
+            session.close_key(connection)
+        assert session.connect(None, HKEY_LOCAL_MACHINE) is local
+        assert session.stats["opens"] == 2
+    assert backend.open_handles == 0
+
+
+def test_walk_keys():
+    backend = make_memory_backend(CountingBackend)
+    walked = list(walk_keys(HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft", backend=backend))
+    paths = [path for path, _, _ in walked]
+    assert paths[0] == r"SOFTWARE\Microsoft"
+    assert UNINSTALL_KEY + r"\App64" in paths
+    assert paths.index(UNINSTALL_KEY) < paths.index(UNINSTALL_KEY + r"\App64")
+    assert backend.open_handles == 0, "walk_keys() should close its handles"
+    # Subkeys should be opened relative to their parent
+    assert "App64" in backend.opened_paths
+
+    values = dict((path, values) for path, values, _ in walked)
+    assert values[r"SOFTWARE\Microsoft\Windows NT\CurrentVersion"] == [
+        {"name": "ProductName", "value": "Windows 10", "type": REG_SZ}
+    ]
+
+    depth_limited = [
+        path
+        for path, _, _ in walk_keys(
+            HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft", max_depth=1, backend=backend
+        )
+    ]
+    assert depth_limited == [
+        r"SOFTWARE\Microsoft",
+        r"SOFTWARE\Microsoft\Windows",
+        r"SOFTWARE\Microsoft\Windows NT",
+    ]
+
+    # Early termination
+    walker = walk_keys(HKEY_LOCAL_MACHINE, "SOFTWARE", backend=backend)
+    for path, _, _ in walker:
+        if path.endswith("CurrentVersion"):
+            break
+    walker.close()
+    assert backend.open_handles == 0, "Stopped walk should close its handles"
+
+    both_views = [
+        path
+        for path, _, _ in walk_keys(
+            HKEY_LOCAL_MACHINE,
+            UNINSTALL_KEY,
+            arch=KEY_WOW64_64KEY | KEY_WOW64_32KEY,
+            backend=backend,
+        )
+    ]
+    assert UNINSTALL_KEY + r"\App64" in both_views
+    assert UNINSTALL_KEY + r"\App32" in both_views
+
+    try:
+        list(walk_keys(HKEY_LOCAL_MACHINE, r"SOFTWARE\Nope", backend=backend))
+    except FileNotFoundError:
+        pass
+    else:
+        assert False, "Walking a non existing key should fail"
+
+    assert get_keys(
+        HKEY_LOCAL_MACHINE, "SOFTWARE", recursion_level=1, backend=backend
+    ) == {"Microsoft": {}, "WOW6432Node": {}}
+
+
+def test_query_many():
+    backend = make_memory_backend(CountingBackend)
+    nt_key = r"SOFTWARE\Microsoft\Windows NT\CurrentVersion"
+    results = query_many(
+        [
+            (HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", ["DisplayName", "Nope"]),
+            (HKEY_LOCAL_MACHINE, nt_key, "ProductName"),
+            (HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", None),
+            (HKEY_LOCAL_MACHINE, r"SOFTWARE\Nope", ["Value"]),
+            (
+                HKEY_LOCAL_MACHINE,
+                UNINSTALL_KEY + r"\App32",
+                ["DisplayName"],
+                KEY_WOW64_64KEY | KEY_WOW64_32KEY,
+            ),
+        ],
+        last_modified=True,
+        backend=backend,
+    )
+    assert [result["key"] for result in results][1] == nt_key, "Order should be kept"
+    assert results[0]["values"] == {"DisplayName": "App 64"}
+    assert results[0]["missing"] == ["Nope"]
+    assert re.match(DATE_REGEX, results[0]["last_modified"])
+    assert results[1]["values"] == {"ProductName": "Windows 10"}
+    assert results[2]["values"] == {"DisplayName": "App 64", "Version": 1}
+    assert results[3]["error"] is not None and results[3]["values"] == {}
+    assert results[4]["values"] == {"DisplayName": "App 32"}
+    assert results[4]["error"] is None
+    assert backend.open_handles == 0, "query_many() should close its handles"
+
+    # Shared parent SOFTWARE\Microsoft is opened once, keys below it relative to it
+    backend.opens = 0
+    backend.opened_paths = []
+    query_many(
+        [
+            (HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", ["DisplayName"]),
+            (HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\Empty", ["DisplayName"]),
+            (HKEY_LOCAL_MACHINE, nt_key, ["ProductName"]),
+        ],
+        backend=backend,
+    )
+    assert backend.opened_paths == [
+        r"SOFTWARE\Microsoft",
+        r"Windows\CurrentVersion\Uninstall",
+        "App64",
+        "Empty",
+        r"Windows NT\CurrentVersion",
+    ]
+
+
+def test_registry_snapshot():
+    backend = make_memory_backend(CountingBackend)
+    snapshot = take_snapshot(HKEY_LOCAL_MACHINE, UNINSTALL_KEY, backend=backend)
+    assert len(snapshot) == 3
+    assert snapshot.get_values("App64") == {"DisplayName": "App 64", "Version": 1}
+    assert backend.open_handles == 0, "take_snapshot() should close its handles"
+
+    # Nothing changed, nothing is enumerated again
+    unchanged, changes = refresh_snapshot(snapshot, backend=backend)
+    assert unchanged.stats == {"enumerated": 0, "unchanged": 3}
+    assert changes == {"added_keys": [], "removed_keys": [], "changed_keys": {}}
+
+    uninstall = backend.open_key(HKEY_LOCAL_MACHINE, UNINSTALL_KEY)
+    app64 = uninstall.get_subkey("App64")
+    app64.set_value("Version", 2)
+    app64.set_value("Publisher", "Vendor", REG_SZ)
+    app64.last_write += 1
+    uninstall.remove_subkey("Empty")
+    uninstall.add_subkey("New").set_value("Data", b"\x00\x01", REG_BINARY)
+    uninstall.last_write += 1
+    backend.close_key(uninstall)
+
+    refreshed, changes = refresh_snapshot(snapshot, backend=backend)
+    assert refreshed.stats == {"enumerated": 3, "unchanged": 0}
+    assert changes["added_keys"] == ["New"]
+    assert changes["removed_keys"] == ["Empty"]
+    assert changes["changed_keys"] == {
+        "App64": {
+            "added": {"Publisher": "Vendor"},
+            "removed": {},
+            "changed": {"Version": {"old": 1, "new": 2}},
+        }
+    }
+    assert diff_snapshots(snapshot, refreshed) == changes
+    assert backend.open_handles == 0, "refresh_snapshot() should close its handles"
+
+    snapshot_file = os.path.join(tempfile.mkdtemp(), "uninstall.json.gz")
+    refreshed.save(snapshot_file)
+    loaded = RegistrySnapshot.load(snapshot_file)
+    assert loaded.get_values("New") == {"Data": b"\x00\x01"}
+    assert diff_snapshots(refreshed, loaded) == {
+        "added_keys": [],
+        "removed_keys": [],
+        "changed_keys": {},
+    }
+    os.remove(snapshot_file)
+
+    try:
+        take_snapshot(HKEY_LOCAL_MACHINE, r"SOFTWARE\Nope", backend=backend)
+    except FileNotFoundError:
+        pass
+    else:
+        assert False, "Snapshot of a non existing key should fail"
+
+
+def test_compact_results():
+    backend = make_memory_backend()
+    names = ["DisplayName", "Version"]
+    records = get_values(
+        HKEY_LOCAL_MACHINE,
+        UNINSTALL_KEY,
+        names=names,
+        last_modified=True,
+        backend=backend,
+        compact=True,
+    )
+    assert len(records) == 1
+    record = records[0]
+    assert record.key == "App64"
+    assert record["DisplayName"] == "App 64" and record.get("Nope") is None
+    assert "Version" in record and "Nope" not in record
+    assert record == {"DisplayName": "App 64", "Version": 1}
+    assert re.match(DATE_REGEX, record.last_modified)
+    assert get_values(
+        HKEY_LOCAL_MACHINE, UNINSTALL_KEY, names=names, backend=backend
+    ) == [record.to_dict()]
+
+    dict_keys = get_keys(
+        HKEY_LOCAL_MACHINE, UNINSTALL_KEY, recursion_level=2, backend=backend
+    )
+    compact_keys = get_keys(
+        HKEY_LOCAL_MACHINE,
+        UNINSTALL_KEY,
+        recursion_level=2,
+        backend=backend,
+        compact=True,
+    )
+    assert compact_keys.keys() == dict_keys.keys()
+    assert list(compact_keys["App64"][""]) == dict_keys["App64"][""]
+    value = compact_keys["App64"][""][0]
+    assert value.name == value["name"] == "DisplayName"
+    assert re.match(DATE_REGEX, value["last_modified"])
+
+    assert decode_value_data(
+        b"a\x00b\x00\x00\x00c\x00\x00\x00\x00\x00", REG_MULTI_SZ
+    ) == [
+        "ab",
+        "c",
+    ]
+    assert decode_value_data(b"", REG_MULTI_SZ) == []
+    assert decode_value_data((2**40).to_bytes(8, "little"), REG_QWORD) == 2**40
+    assert decode_value_data(memoryview(b"\x01\x00\x00\x00"), REG_DWORD) == 1
+    assert decode_value_data(memoryview(b"\x01\x02"), REG_BINARY) == b"\x01\x02"
+    assert decode_value_data(b"", REG_BINARY) is None
+
+
+def test_registry_views():
+    backend = make_memory_backend()
+    both_views = KEY_WOW64_64KEY | KEY_WOW64_32KEY
+    backend.load_tree(
+        HKEY_CURRENT_USER,
+        {"App": {"": [{"name": "DisplayName", "value": "User app"}]}},
+        UNINSTALL_KEY,
+    )
+    backend.load_tree(
+        HKEY_LOCAL_MACHINE,
+        {
+            "Shared": {
+                "": [
+                    {"name": "DisplayName", "value": "Shared 64"},
+                    {"name": "Only64", "value": 1},
+                ],
+                "Sub64": {},
+            }
+        },
+        UNINSTALL_KEY,
+    )
+    backend.load_tree(
+        HKEY_LOCAL_MACHINE,
+        {
+            "Shared": {
+                "": [
+                    {"name": "DisplayName", "value": "Shared 32"},
+                    {"name": "Only32", "value": 2},
+                ],
+                "Sub32": {},
+            }
+        },
+        r"SOFTWARE\WOW6432Node\Microsoft\Windows\CurrentVersion\Uninstall",
+    )
+
+    # HKCU\Software isn't redirected, both views see the same key which is returned once
+    assert get_values(
+        HKEY_CURRENT_USER,
+        UNINSTALL_KEY,
+        names=["DisplayName"],
+        arch=both_views,
+        combine=True,
+        backend=backend,
+    ) == [{"DisplayName": "User app"}]
+
+    records = get_values(
+        HKEY_LOCAL_MACHINE,
+        UNINSTALL_KEY,
+        names=["DisplayName"],
+        arch=both_views,
+        combine=True,
+        backend=backend,
+        compact=True,
+    )
+    provenance = dict((record["DisplayName"], record.view) for record in records)
+    assert provenance == {
+        "App 64": KEY_WOW64_64KEY,
+        "Shared 64": KEY_WOW64_64KEY,
+        "App 32": KEY_WOW64_32KEY,
+        "Shared 32": KEY_WOW64_32KEY,
+    }
+
+    # 64 bit entries are not overwritten by 32 bit ones anymore
+    keys = get_keys(
+        HKEY_LOCAL_MACHINE,
+        UNINSTALL_KEY,
+        recursion_level=2,
+        arch=both_views,
+        combine=True,
+        backend=backend,
+    )
+    assert sorted(keys) == ["App32", "App64", "Empty", "Shared"]
+    assert sorted(keys["Shared"]) == ["", "Sub32", "Sub64"]
+    assert [value["value"] for value in keys["Shared"][""]] == ["Shared 64", 1, 2]
+
+    # First match only reads the 32 bit view when the 64 bit one doesn't have the key
+    assert read_views(lambda view: view, both_views, first_match=True) == [
+        (KEY_WOW64_64KEY, KEY_WOW64_64KEY)
+    ]
+
+    def _reader(view):
+        if view == KEY_WOW64_64KEY:
+            raise FileNotFoundError
+        return "32 bit"
+
+    assert read_views(_reader, both_views) == [(KEY_WOW64_32KEY, "32 bit")]
+    assert (
+        get_keys(HKEY_LOCAL_MACHINE, r"SOFTWARE\Nope", arch=both_views, backend=backend)
+        == {}
+    )
+
+
+class SlowBackend(MemoryBackend):
+    """
+    Memory backend standing in for an unresponsive remote computer
+    """
+
+    def connect(self, computer, hive: int):
+        time.sleep(1)
+        return super().connect(computer, hive)
+
+
+def test_registry_fleet():
+    nt_key = r"SOFTWARE\Microsoft\Windows NT\CurrentVersion"
+    host2 = make_memory_backend()
+    host2.get_hive(HKEY_LOCAL_MACHINE).get_subkey("SOFTWARE").get_subkey(
+        "Microsoft"
+    ).get_subkey("Windows NT").get_subkey("CurrentVersion").set_value(
+        "ProductName", "Windows Server 2022"
+    )
+    backend = MultiHostBackend(
+        {
+            "host1": make_memory_backend(),
+            "host2": host2,
+            "slow": make_memory_backend(SlowBackend),
+        }
+    )
+    # Remote mode of public functions
+    assert (
+        get_value(
+            HKEY_LOCAL_MACHINE, nt_key, "ProductName", backend=backend, computer="host2"
+        )
+        == "Windows Server 2022"
+    )
+    try:
+        get_value(
+            HKEY_LOCAL_MACHINE, nt_key, "ProductName", backend=backend, computer="ghost"
+        )
+    except FileNotFoundError:
+        pass
+    else:
+        assert False, "Unreachable computers should fail"
+
+    def _collector(session):
+        return get_value(HKEY_LOCAL_MACHINE, nt_key, "ProductName", backend=session)
+
+    with RegistryFleet(
+        ["host1", "slow", "host2", "ghost"], backend=backend, max_workers=2, timeout=0.3
+    ) as fleet:
+        start = time.monotonic()
+        results = fleet.collect(_collector)
+        assert time.monotonic() - start < 0.9, "Slow host should not hold collection"
+        assert [result["computer"] for result in results] == [
+            "host1",
+            "slow",
+            "host2",
+            "ghost",
+        ]
+        assert results[0]["result"] == "Windows 10" and results[0]["error"] is None
+        assert results[1]["timed_out"] and results[1]["error_type"] == "TimeoutError"
+        assert results[2]["result"] == "Windows Server 2022"
+        assert results[3]["error_type"] == "FileNotFoundError"
+
+        # Connections are reused between collections, slow host is still busy
+        results = fleet.collect(_collector)
+        assert results[0]["result"] == "Windows 10"
+        assert results[1]["error_type"] == "BusyError"
+        assert fleet._sessions["host1"].stats["connects"] == 1
+
+
+def test_registry_index():
+    backend = make_memory_backend()
+    index = RegistryIndex.build(HKEY_LOCAL_MACHINE, "SOFTWARE", backend=backend)
+    app64 = "SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\App64"
+    app32 = (
+        "SOFTWARE\\WOW6432Node\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\App32"
+    )
+    nt_key = r"SOFTWARE\Microsoft\Windows NT\CurrentVersion"
+
+    assert index.find("App 64") == [app64]
+    assert index.find("app") == []
+    assert index.find("APP", mode="prefix") == [app64, app32]
+    assert index.find("indows 1", mode="substring") == [nt_key]
+    assert index.find("displayname") == [app64, app32]
+    assert index.find("uninstall") == [UNINSTALL_KEY, app32[: -len("\\App32")]]
+    assert index.find("a", mode="substring", limit=1) == [UNINSTALL_KEY]
+    try:
+        index.find("app", mode="regex")
+    except ValueError:
+        pass
+    else:
+        assert False, "Unknown search modes should fail"
+
+    uninstall = backend.open_key(HKEY_LOCAL_MACHINE, UNINSTALL_KEY)
+    uninstall.get_subkey("App64").set_value("InstallLocation", r"C:\Program Files\App")
+    uninstall.get_subkey("App64").last_write += 1
+    uninstall.remove_subkey("Empty")
+    uninstall.add_subkey("Tool").set_value("DisplayName", ["Multi", "Tool"])
+    uninstall.last_write += 1
+    changes = index.refresh(backend=backend)
+    assert changes["added_keys"] == [r"Microsoft\Windows\CurrentVersion\Uninstall\Tool"]
+    assert index.find(r"c:\program files", mode="prefix") == [app64]
+    assert index.find("tool") == [UNINSTALL_KEY + r"\Tool"]
+    assert index.find("empty") == []
+    assert index.find("App 64") == [app64], "Unchanged terms of changed keys stay"
+
+    index_file = os.path.join(tempfile.mkdtemp(), "software.index.json.gz")
+    index.save(index_file)
+    loaded = RegistryIndex.load(index_file)
+    os.remove(index_file)
+    for term, mode in (("tool", "exact"), ("app", "prefix"), ("files", "substring")):
+        assert loaded.find(term, mode) == index.find(term, mode)
+
+
+def test_delete_tree():
+    tree = {"Deep": {"Level1": {"Level2": {"": [{"name": "x", "value": 1}]}}}}
+    for index in range(3):
+        tree["Child%d" % index] = {"Leaf": {}}
+    backend = CountingBackend({HKEY_LOCAL_MACHINE: {"SOFTWARE": {"Vendor": tree}}})
+
+    listed = []
+    result = delete_tree(
+        HKEY_LOCAL_MACHINE,
+        r"SOFTWARE\Vendor",
+        dry_run=True,
+        progress=lambda count, path: listed.append((count, path)),
+        backend=backend,
+    )
+    print("Dry run: %s" % result)
+    assert result["deleted"] == 10 and not result["errors"]
+    # Bottom-up order, every key is listed after all of its subkeys
+    for position, path in enumerate(result["keys"]):
+        assert not any(
+            other.startswith(path + "\\") for other in result["keys"][position:]
+        )
+    assert result["keys"][-1] == r"SOFTWARE\Vendor"
+    assert listed == list(enumerate(result["keys"], 1))
+    assert (
+        get_value(
+            HKEY_LOCAL_MACHINE,
+            r"SOFTWARE\Vendor\Deep\Level1\Level2",
+            "x",
+            backend=backend,
+        )
+        == 1
+    )
+    assert backend.open_handles == 0
+
+    # Keys holding subkeys are opened once relative to their parent, leaf keys aren't opened
+    backend.opened_paths = []
+    result = delete_tree(HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor", backend=backend)
+    assert result["deleted"] == 10 and not result["native"]
+    assert backend.opened_paths == [
+        "SOFTWARE",
+        "Vendor",
+        "Child2",
+        "Child1",
+        "Child0",
+        "Deep",
+        "Level1",
+    ]
+    assert backend.open_handles == 0
+    assert get_keys(HKEY_LOCAL_MACHINE, "SOFTWARE", backend=backend) == {}
+
+    try:
+        delete_tree(HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor", backend=backend)
+        assert False, "Deleted key should not be found"
+    except FileNotFoundError:
+        pass
+
+    # Native tree deletion and both views
+    backend = make_memory_backend(CountingBackend)
+    result = delete_tree(
+        HKEY_LOCAL_MACHINE, UNINSTALL_KEY, arch=768, native=True, backend=backend
+    )
+    assert result["native"] and result["deleted"] == 2
+    assert backend.open_handles == 0
+    for arch in (KEY_WOW64_64KEY, KEY_WOW64_32KEY):
+        assert (
+            get_keys(
+                HKEY_LOCAL_MACHINE,
+                r"SOFTWARE\Microsoft\Windows\CurrentVersion",
+                arch=arch,
+                backend=backend,
+            )
+            == {}
+        )
+
+    # The parent key is only read, so trees the caller controls under a read only parent are deleted
+    class ReadOnlyParentBackend(CountingBackend):
+        def open_key(self, handle, sub_key: str, access: int = KEY_READ):
+            if sub_key.endswith("CurrentVersion") and access & KEY_WRITE & ~KEY_READ:
+                raise PermissionError("Access is denied")
+            return super().open_key(handle, sub_key, access)
+
+    for native in (False, True):
+        backend = make_memory_backend(ReadOnlyParentBackend)
+        result = delete_tree(
+            HKEY_LOCAL_MACHINE, UNINSTALL_KEY, native=native, backend=backend
+        )
+        assert result["native"] is native and not result["errors"]
+        assert backend.open_handles == 0
+        assert "Uninstall" not in get_keys(
+            HKEY_LOCAL_MACHINE,
+            r"SOFTWARE\Microsoft\Windows\CurrentVersion",
+            backend=backend,
+        )
+
+    # Errors are reported, deletion goes on with the other keys
+    class ProtectedBackend(CountingBackend):
+        def delete_key(self, handle, sub_key: str) -> None:
+            if sub_key == "App64":
+                raise PermissionError("Access is denied")
+            super().delete_key(handle, sub_key)
+
+        def delete_tree(self, handle, sub_key: str) -> None:
+            raise PermissionError("Access is denied")
+
+    backend = make_memory_backend(ProtectedBackend)
+    result = delete_tree(
+        HKEY_LOCAL_MACHINE, UNINSTALL_KEY, native=True, backend=backend
+    )
+    assert not result["native"]
+    assert result["keys"] == [UNINSTALL_KEY + "\\Empty"]
+    assert [error["key"] for error in result["errors"]] == [
+        UNINSTALL_KEY + "\\App64",
+        UNINSTALL_KEY,
+    ]
+    assert backend.open_handles == 0
+    assert list(get_keys(HKEY_LOCAL_MACHINE, UNINSTALL_KEY, backend=backend)) == [
+        "App64"
+    ]
+    try:
+        delete_sub_key(HKEY_LOCAL_MACHINE, UNINSTALL_KEY, backend=backend)
+        assert False, "Protected key should not be deleted"
+    except OSError as exc:
+        assert "App64" in str(exc)
+
+
+def test_registry_batch():
+    backend = make_memory_backend(CountingBackend)
+    vendor_key = r"SOFTWARE\Vendor\App"
+    set_value(HKEY_LOCAL_MACHINE, vendor_key, "Version", "1.0", backend=backend)
+    stats = set_values(
+        HKEY_LOCAL_MACHINE,
+        vendor_key,
+        [
+            {"name": "Path", "value": r"%ProgramFiles%\App", "type": REG_EXPAND_SZ},
+            {"name": "Flags", "value": b"\x01"},
+        ],
+        backend=backend,
+    )
+    assert stats == {"keys": 1, "created_keys": 0, "writes": 2, "rolled_back": 0}
+    stats = create_keys(
+        HKEY_LOCAL_MACHINE, [vendor_key + r"\Plugins\One", vendor_key], backend=backend
+    )
+    assert stats["created_keys"] == 2
+    assert get_keys(HKEY_LOCAL_MACHINE, vendor_key, backend=backend) == {
+        "": [
+            {"name": "Version", "value": "1.0", "type": REG_SZ},
+            {"name": "Path", "value": r"%ProgramFiles%\App", "type": REG_EXPAND_SZ},
+            {"name": "Flags", "value": b"\x01", "type": REG_BINARY},
+        ],
+        "Plugins": {},
+    }
+    assert backend.open_handles == 0
+
+    # Writes are grouped per key, every key is opened once
+    backend.opened_paths = []
+    with RegistryBatch(backend=backend) as batch:
+        batch.set_value(HKEY_LOCAL_MACHINE, vendor_key, "Version", "2.0")
+        batch.set_values(HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", {"Version": 2})
+        batch.delete_value(HKEY_LOCAL_MACHINE, vendor_key, "Flags")
+        batch.delete_value(HKEY_LOCAL_MACHINE, vendor_key, "Missing")
+        assert len(batch) == 4
+    assert batch.stats == {"keys": 2, "created_keys": 0, "writes": 3, "rolled_back": 0}
+    assert backend.opened_paths == [vendor_key, UNINSTALL_KEY + r"\App64"]
+    assert (
+        get_value(HKEY_LOCAL_MACHINE, vendor_key, "Version", backend=backend) == "2.0"
+    )
+    assert (
+        get_value(
+            HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", "Version", backend=backend
+        )
+        == 2
+    )
+    try:
+        get_value(HKEY_LOCAL_MACHINE, vendor_key, "Flags", backend=backend)
+        assert False, "Deleted value should not be found"
+    except FileNotFoundError:
+        pass
+
+    # Both views
+    set_value(
+        HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\Both", "x", 1, arch=768, backend=backend
+    )
+    for arch in (KEY_WOW64_64KEY, KEY_WOW64_32KEY):
+        assert (
+            get_value(
+                HKEY_LOCAL_MACHINE,
+                UNINSTALL_KEY + r"\Both",
+                "x",
+                arch=arch,
+                backend=backend,
+            )
+            == 1
+        )
+
+    # A failing write undoes every change of the batch
+    class FailingBackend(CountingBackend):
+        def set_value(self, handle, name, value, value_type) -> None:
+            if name == "Fail":
+                raise PermissionError("Access is denied")
+            super().set_value(handle, name, value, value_type)
+
+    backend = make_memory_backend(FailingBackend)
+    before = get_keys(
+        HKEY_LOCAL_MACHINE, "SOFTWARE", recursion_level=None, backend=backend
+    )
+    batch = RegistryBatch(backend=backend)
+    batch.set_value(
+        HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", "DisplayName", "Renamed"
+    )
+    batch.set_value(HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", "New", 1)
+    batch.delete_value(HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", "Version")
+    batch.set_value(HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor\App", "Version", "1.0")
+    batch.set_value(HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor\App", "Fail", "1.0")
+    try:
+        batch.apply()
+        assert False, "Failing write should raise"
+    except PermissionError:
+        pass
+    assert batch.stats["rolled_back"] == 6 and not batch.rollback_errors
+    assert (
+        get_keys(HKEY_LOCAL_MACHINE, "SOFTWARE", recursion_level=None, backend=backend)
+        == before
+    )
+    assert backend.open_handles == 0
+
+    # Invalid data is rolled back too, winreg raising ValueError for a str as REG_DWORD
+    class InvalidDataBackend(CountingBackend):
+        def set_value(self, handle, name, value, value_type) -> None:
+            if value_type == REG_DWORD and not isinstance(value, int):
+                raise ValueError("Could not convert the data to the specified type.")
+            super().set_value(handle, name, value, value_type)
+
+    backend = make_memory_backend(InvalidDataBackend)
+    before = get_keys(
+        HKEY_LOCAL_MACHINE, "SOFTWARE", recursion_level=None, backend=backend
+    )
+    batch = RegistryBatch(backend=backend)
+    batch.set_value(
+        HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", "DisplayName", "Renamed"
+    )
+    batch.set_value(HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor\App", "Version", "1.0")
+    batch.set_value(
+        HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor\App", "Level", "high", REG_DWORD
+    )
+    try:
+        batch.apply()
+        assert False, "Invalid data should raise"
+    except ValueError:
+        pass
+    assert batch.stats["rolled_back"] > 0 and not batch.rollback_errors
+    assert (
+        get_keys(HKEY_LOCAL_MACHINE, "SOFTWARE", recursion_level=None, backend=backend)
+        == before
+    )
+    assert backend.open_handles == 0
+
+    # rollback() restores replaced values, and needs the undo log kept with rollback=True
+    backend = make_memory_backend(CountingBackend)
+    set_value(HKEY_LOCAL_MACHINE, vendor_key, "Version", "1.0", backend=backend)
+    batch = RegistryBatch(backend=backend)
+    batch.set_value(HKEY_LOCAL_MACHINE, vendor_key, "Version", "2.0")
+    batch.set_value(HKEY_LOCAL_MACHINE, vendor_key, "New", 1)
+    batch.apply()
+    assert batch.rollback() == 2
+    assert (
+        get_value(HKEY_LOCAL_MACHINE, vendor_key, "Version", backend=backend) == "1.0"
+    )
+    assert get_keys(HKEY_LOCAL_MACHINE, vendor_key, backend=backend) == {
+        "": [{"name": "Version", "value": "1.0", "type": REG_SZ}]
+    }
+    batch = RegistryBatch(backend=backend, rollback=False)
+    batch.set_value(HKEY_LOCAL_MACHINE, vendor_key, "Version", "2.0")
+    batch.apply()
+    try:
+        batch.rollback()
+        assert False, "Batch without undo log should not be rolled back"
+    except RuntimeError:
+        pass
+    assert (
+        get_value(HKEY_LOCAL_MACHINE, vendor_key, "Version", backend=backend) == "2.0"
+    )
+    assert backend.open_handles == 0
+
+    # Keys opened before a level fails to be created are closed, so sessions don't keep them pinned
+    class DeniedBackend(CountingBackend):
+        def create_key(self, handle, sub_key, access=KEY_ALL_ACCESS):
+            if sub_key.endswith("Denied"):
+                raise PermissionError("Access is denied")
+            return super().create_key(handle, sub_key, access)
+
+    backend = make_memory_backend(DeniedBackend)
+    with RegistrySession(backend, max_handles=1) as session:
+        batch = RegistryBatch(backend=session)
+        batch.set_value(HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor\Denied", "x", 1)
+        try:
+            batch.apply()
+            assert False, "Denied key creation should raise"
+        except PermissionError:
+            pass
+        handle = session.open_key(HKEY_LOCAL_MACHINE, UNINSTALL_KEY)
+        session.close_key(handle)
+        assert backend.open_handles == 1, "Only the last handle should stay cached"
+    assert backend.open_handles == 0
+
+    backend = MemoryBackend()
+    backend.read_only = True
+    try:
+        set_value(HKEY_LOCAL_MACHINE, "SOFTWARE", "x", 1, backend=backend)
+        assert False, "Read only backend should not be written"
+    except PermissionError:
+        pass
+
+
+def test_registry_watcher():
+    backend = make_memory_backend()
+    uninstall_path = "HKEY_LOCAL_MACHINE\\" + UNINSTALL_KEY
+    product_key = r"SOFTWARE\Microsoft\Windows NT\CurrentVersion"
+    deliveries = []
+    with RegistryWatcher(backend, debounce=0.2) as watcher:
+        assert watcher.watch(HKEY_LOCAL_MACHINE, UNINSTALL_KEY) == uninstall_path
+        watcher.watch(HKEY_LOCAL_MACHINE, product_key, subtree=False)
+        watcher.add_callback(deliveries.append)
+        try:
+            watcher.watch(HKEY_LOCAL_MACHINE, r"SOFTWARE\Missing")
+            assert False, "Missing key should not be watched"
+        except FileNotFoundError:
+            pass
+
+        # A burst of changes on both keys is delivered once
+        for index in range(20):
+            set_value(
+                HKEY_LOCAL_MACHINE,
+                UNINSTALL_KEY + r"\App%d" % index,
+                "x",
+                index,
+                backend=backend,
+            )
+        set_value(
+            HKEY_LOCAL_MACHINE, product_key, "CurrentBuild", "19045", backend=backend
+        )
+        # Subkeys of a key watched without subtree are ignored
+        create_keys(HKEY_LOCAL_MACHINE, product_key + r"\Sub\Deeper", backend=backend)
+        deadline = time.time() + 5
+        while not deliveries and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.4)
+        print("Deliveries: %s, stats: %s" % (deliveries, watcher.stats))
+        assert deliveries == [[uninstall_path, "HKEY_LOCAL_MACHINE\\" + product_key]]
+
+        watcher.unwatch(HKEY_LOCAL_MACHINE, product_key)
+        assert watcher.watched == [uninstall_path]
+        delete_tree(HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App3", backend=backend)
+        set_value(
+            HKEY_LOCAL_MACHINE, product_key, "CurrentBuild", "22631", backend=backend
+        )
+        time.sleep(0.5)
+        assert deliveries[1:] == [[uninstall_path]]
+    assert not backend.listeners
+
+    # Once the watcher thread failed, watch() and unwatch() raise instead of waiting for it
+    def _failing_wait(timeout):
+        raise OSError("The handle is invalid")
+
+    with RegistryWatcher(backend) as watcher:
+        watcher._notifier.wait = _failing_wait
+        watcher._notifier.wake()
+        watcher._thread.join(5)
+        start = time.monotonic()
+        for call in (watcher.watch, watcher.unwatch):
+            try:
+                call(HKEY_LOCAL_MACHINE, UNINSTALL_KEY)
+                assert False, "Failed watcher should raise"
+            except OSError as exc:
+                assert "handle is invalid" in str(exc)
+        assert time.monotonic() - start < 1
+    assert not backend.listeners
+
+    # Asyncio stream
+    async def _changes():
+        with RegistryWatcher(backend, debounce=0.05) as watcher:
+            watcher.watch(HKEY_LOCAL_MACHINE, UNINSTALL_KEY)
+            stream = watcher.stream()
+            threading.Timer(
+                0.1,
+                set_value,
+                [HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App1", "y", 1],
+                {"backend": backend},
+            ).start()
+            async for paths in stream:
+                return paths
+
+    loop = asyncio.new_event_loop()
+    try:
+        paths = loop.run_until_complete(asyncio.wait_for(_changes(), 5))
+    finally:
+        loop.close()
+    assert paths == [uninstall_path]
+
+
+def test_registry_aio():
+    backend = make_memory_backend(CountingBackend)
+
+    async def _queries():
+        return await asyncio.gather(
+            aio.get_value(
+                HKEY_LOCAL_MACHINE,
+                r"SOFTWARE\Microsoft\Windows NT\CurrentVersion",
+                "ProductName",
+                backend=backend,
+            ),
+            aio.get_values(
+                HKEY_LOCAL_MACHINE,
+                UNINSTALL_KEY,
+                names=["DisplayName"],
+                arch=768,
+                combine=True,
+                backend=backend,
+            ),
+            aio.get_keys(
+                HKEY_LOCAL_MACHINE, "SOFTWARE", recursion_level=None, backend=backend
+            ),
+        )
+
+    async def _walk(stop_after=None):
+        paths = []
+        async with aio.walk_keys(
+            HKEY_LOCAL_MACHINE, "SOFTWARE", backend=backend, batch_size=2
+        ) as walker:
+            async for path, values, last_write in walker:
+                paths.append(path)
+                if len(paths) == stop_after:
+                    break
+        return paths
+
+    loop = asyncio.new_event_loop()
+    try:
+        product_name, uninstall, keys = loop.run_until_complete(_queries())
+        assert product_name == "Windows 10"
+        assert uninstall == get_values(
+            HKEY_LOCAL_MACHINE,
+            UNINSTALL_KEY,
+            names=["DisplayName"],
+            arch=768,
+            combine=True,
+            backend=backend,
+        )
+        assert keys == get_keys(
+            HKEY_LOCAL_MACHINE, "SOFTWARE", recursion_level=None, backend=backend
+        )
+        assert loop.run_until_complete(_walk()) == [
+            path
+            for path, _, _ in walk_keys(HKEY_LOCAL_MACHINE, "SOFTWARE", backend=backend)
+        ]
+        assert len(loop.run_until_complete(_walk(stop_after=3))) == 3
+        assert backend.open_handles == 0
+
+        # Caller sessions are reused, not wrapped into a throwaway one
+        queries = [
+            (HKEY_LOCAL_MACHINE, UNINSTALL_KEY + r"\App64", ["DisplayName"]),
+            (HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft\Windows NT\CurrentVersion", None),
+        ]
+        backends = []
+        registry_query_many = aio.registry.query_many
+
+        def _recording_query_many(*args, **kwargs):
+            backends.append(kwargs["backend"])
+            return registry_query_many(*args, **kwargs)
+
+        with RegistrySession(backend) as session:
+            aio.registry.query_many = _recording_query_many
+            try:
+                first = loop.run_until_complete(
+                    aio.query_many(queries, backend=session)
+                )
+            finally:
+                aio.registry.query_many = registry_query_many
+            assert isinstance(backends[0], RegistrySession)
+            opens = backend.opens
+            assert session.stats["opens"] > 0 and backend.open_handles > 0
+            second = loop.run_until_complete(aio.query_many(queries, backend=session))
+            assert backend.opens == opens, "Cached handles should be reused"
+            assert second == first == query_many(queries, backend=backend)
+            assert session.stats["hits"] >= len(queries)
+        assert backend.open_handles == 0
+
+        # Cancelling the awaiting task stops the scan before its next key
+        class SlowOpenBackend(CountingBackend):
+            def open_key(self, handle, sub_key: str, access: int = KEY_READ):
+                time.sleep(0.01)
+                return super().open_key(handle, sub_key, access)
+
+        tree = dict(("Key%d" % index, {"Sub": {}}) for index in range(200))
+        backend = SlowOpenBackend({HKEY_LOCAL_MACHINE: {"SOFTWARE": tree}})
+
+        async def _cancel():
+            task = asyncio.ensure_future(
+                aio.get_keys(
+                    HKEY_LOCAL_MACHINE,
+                    "SOFTWARE",
+                    recursion_level=None,
+                    backend=backend,
+                )
+            )
+            await asyncio.sleep(0.1)
+            task.cancel()
+            try:
+                await task
+                assert False, "Cancelled scan should not complete"
+            except asyncio.CancelledError:
+                pass
+            await asyncio.sleep(0.1)
+
+        loop.run_until_complete(_cancel())
+        opens = backend.opens
+        time.sleep(0.1)
+        print("Keys opened before cancellation: %s" % opens)
+        assert backend.opens == opens < 100
+        assert backend.open_handles == 0
+    finally:
+        loop.close()
+
+
+def test_registry_export():
+    from windows_tools.registry import export
+
+    vendor = {
+        "": [
+            {"name": "", "value": "default"},
+            {"name": "Path", "value": r"%ProgramFiles%\Vendor", "type": REG_EXPAND_SZ},
+            {"name": "Quoted", "value": 'C:\\"quoted"\\'},
+            {"name": "Count", "value": 42},
+            {"name": "Big", "value": 2**40},
+            {"name": "Blob", "value": bytes(range(64))},
+            {"name": "Empty", "value": None, "type": REG_BINARY},
+            {"name": "Multi", "value": ["a", "", "b"]},
+            {"name": "Unicode ☃", "value": "été"},
+        ],
+        "Plugins": {"One": {"": [{"name": "Enabled", "value": 1}]}, "Two": {}},
+        "Empty": {},
+    }
+    backend = MemoryBackend({HKEY_LOCAL_MACHINE: {"SOFTWARE": {"Vendor": vendor}}})
+    expected = get_keys(
+        HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor", recursion_level=10, backend=backend
+    )
+    last_writes = {
+        path: last_write
+        for path, _, last_write in walk_keys(
+            HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor", backend=backend
+        )
+    }
+    directory = tempfile.mkdtemp()
+    block_keys = export.BINARY_BLOCK_KEYS
+    # Small blocks, so keys reference parents from previous blocks
+    export.BINARY_BLOCK_KEYS = 2
+    try:
+        reg_path = os.path.join(directory, "vendor.reg")
+        binary_path = os.path.join(directory, "vendor.wtrb")
+        assert (
+            export.export_reg(
+                HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor", reg_path, backend=backend
+            )
+            == 5
+        )
+        assert (
+            export.export_binary(
+                HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor", binary_path, backend=backend
+            )
+            == 5
+        )
+        with open(reg_path, "rb") as file_handle:
+            content = file_handle.read()
+        assert content.startswith(b"\xff\xfe")
+        text = content.decode("utf-16")
+        assert text.startswith(export.REG_HEADER + "\r\n")
+        assert '"Count"=dword:0000002a' in text
+        assert '@="default"' in text
+
+        for path in (reg_path, binary_path):
+            tree = export.load_tree(path)[HKEY_LOCAL_MACHINE]
+            assert tree["SOFTWARE"]["Vendor"] == expected
+            # Loaded trees are accepted by MemoryBackend as is
+            assert (
+                get_keys(
+                    HKEY_LOCAL_MACHINE,
+                    r"SOFTWARE\Vendor",
+                    recursion_level=10,
+                    backend=MemoryBackend({HKEY_LOCAL_MACHINE: tree}),
+                )
+                == expected
+            )
+        # Binary exports keep last write times
+        records = list(export.iter_file(binary_path))
+        assert {path: last_write for _, path, last_write, _ in records} == last_writes
+        assert all(record[2] is None for record in export.iter_file(reg_path))
+        assert (
+            RegFileBackend(reg_path)
+            .hives[HKEY_LOCAL_MACHINE]
+            .get_subkey("SOFTWARE")
+            .get_subkey("Vendor")
+            .get_subkey("Plugins")
+            .get_subkey("One")
+        )
+
+        # Keys written again, or before their parent, are merged by path
+        export.write_binary(
+            [
+                (
+                    HKEY_LOCAL_MACHINE,
+                    r"SOFTWARE\Vendor\App\Sub",
+                    0,
+                    [("A", 1, REG_DWORD)],
+                ),
+                (HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor\App", 0, [("B", "b", REG_SZ)]),
+                (
+                    HKEY_LOCAL_MACHINE,
+                    r"SOFTWARE\Vendor\App\Sub",
+                    0,
+                    [("A", 2, REG_DWORD)],
+                ),
+                (HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor\App\Sub\Leaf", 0, []),
+            ],
+            binary_path,
+        )
+        assert export.load_tree(binary_path)[HKEY_LOCAL_MACHINE]["SOFTWARE"] == {
+            "Vendor": {
+                "App": {
+                    "": [{"name": "B", "value": "b", "type": REG_SZ}],
+                    "Sub": {
+                        "": [{"name": "A", "value": 2, "type": REG_DWORD}],
+                        "Leaf": {},
+                    },
+                }
+            }
+        }
+
+        # Imports create keys, write values and apply deletions
+        target = make_memory_backend()
+        stats = export.import_file(reg_path, backend=target)
+        assert stats == {"keys": 5, "created_keys": 5, "writes": 10, "deleted_keys": 0}
+        assert (
+            get_keys(
+                HKEY_LOCAL_MACHINE,
+                r"SOFTWARE\Vendor",
+                recursion_level=10,
+                backend=target,
+            )
+            == expected
+        )
+        with open(reg_path, "wb") as file_handle:
+            file_handle.write(
+                "\r\n".join(
+                    [
+                        "\ufeff" + export.REG_HEADER,
+                        "",
+                        r"[-HKEY_LOCAL_MACHINE\SOFTWARE\Vendor\Plugins]",
+                        "",
+                        r"[HKEY_LOCAL_MACHINE\SOFTWARE\Vendor]",
+                        '"Count"=-',
+                        '"Added"="yes"',
+                        "",
+                    ]
+                ).encode("utf-16-le")
+            )
+        assert export.import_file(reg_path, backend=target) == {
+            "keys": 1,
+            "created_keys": 0,
+            "writes": 2,
+            "deleted_keys": 1,
+        }
+        result = get_keys(
+            HKEY_LOCAL_MACHINE, r"SOFTWARE\Vendor", recursion_level=10, backend=target
+        )
+        assert sorted(result) == ["", "Empty"]
+        names = [value["name"] for value in result[""]]
+        assert "Count" not in names and "Added" in names
+    finally:
+        export.BINARY_BLOCK_KEYS = block_keys
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
 if __name__ == "__main__":
     print("Example code for %s, %s" % (__intname__, __build__))
     test_get_value()
     test_get_values()
     test_get_keys()
+    test_memory_backend()
+    test_reg_file_backend()
+    test_hive_file_backend()
+    test_registry_session()
+    test_walk_keys()
+    test_query_many()
+    test_registry_snapshot()
+    test_compact_results()
+    test_registry_views()
+    test_registry_fleet()
+    test_registry_index()
+    test_delete_tree()
+    test_registry_batch()
+    test_registry_watcher()
+    test_registry_aio()
+    test_registry_export()
@@ -20,10 +20,32 @@ __intname__ = "tests.windows_tools.wmi_queries"
 __author__ = "Orsiris de Jong"
 __copyright__ = "Copyright (C) 2020-2024 Orsiris de Jong"
 __licence__ = "BSD 3 Clause"
-__build__ = "2023050601"
+__build__ = "2026101725"
 
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 
 from windows_tools.wmi_queries import *
+from windows_tools.wmi_queries import fixtures
+from windows_tools.wmi_queries.events import (
+    FakeEventProvider,
+    WmiEventWatcher,
+    instance_event_query,
+)
+from windows_tools.wmi_queries.workers import WmiWorkerPool
+from windows_tools.wmi_queries.wql import (
+    WqlError,
+    WqlQuery,
+    prune_query,
+    select,
+    validate_where,
+)
 
 CIM_TIMESTAMP_REGEX = (
     r"[0-9]{4}[0-1][0-9][0-3][0-9][0-1][0-9]([0-5][0-9]){2}\.[0-9]{5,6}(\+|-)[0-9]{1,3}"
@@ -156,6 +178,834 @@ def test_create_cim_timestamp_from_now():
     # assert dt.second == curr_dt.second, 'cim timestamp creation failed failed'
 
 
+class FakeProperty:
+    def __init__(self, name, value, cim_type=8):
+        self.Name = name
+        self.Value = value
+        self.CIMType = cim_type
+
+
+class FakePropertySet:
+    def __init__(self, values, cim_types=None):
+        self._values = values
+        self._cim_types = cim_types or {}
+
+    def Item(self, name):
+        return FakeProperty(name, self._values[name], self._cim_types.get(name, 8))
+
+    __call__ = Item
+
+    def __iter__(self):
+        return (self.Item(name) for name in self._values)
+
+
+class FakeWmiObject:
+    """
+    Stands for a wmi._wmi_object, properties being read through Properties_ like COM does
+    """
+
+    def __init__(self, cim_types=None, **properties):
+        self.properties = dict.fromkeys(properties)
+        self.Properties_ = FakePropertySet(properties, cim_types)
+
+
+class FakeWmiConnection:
+    def __init__(self, computer, namespace, moniker):
+        self.computer = computer
+        self.namespace = namespace
+        self.moniker = moniker
+        self.healthy = True
+        self.queries = []
+        # Seconds every query takes, like a remote or busy WMI provider
+        self.latency = 0
+
+    def query(self, query_str):
+        self.queries.append(query_str)
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.healthy:
+            raise OSError("Connection lost")
+        if query_str.startswith("SELECT HotFixID"):
+            return [
+                FakeWmiObject(HotFixID="KB%d" % index, InstalledOn="1/1/2026")
+                for index in range(3)
+            ]
+        if query_str.startswith("SELECT Bias"):
+            return [FakeWmiObject(Bias=120)]
+        return [FakeWmiObject(Name=self.namespace, Computer=self.computer)]
+
+
+def test_wmi_connection_pool():
+    print("Testing WMI connection pool")
+    now = [0.0]
+    created = []
+
+    def factory(computer, namespace, moniker):
+        connection = FakeWmiConnection(computer, namespace, moniker)
+        created.append(connection)
+        return connection
+
+    pool = WmiConnectionPool(
+        factory=factory,
+        idle_timeout=60,
+        health_check=lambda connection: connection.healthy,
+        health_check_interval=10,
+        clock=lambda: now[0],
+    )
+    with use_connection_pool(pool):
+        for _ in range(4):
+            result = query_wmi("SELECT Name FROM Win32_ComputerSystem", name="test")
+            assert result == [{"Name": "cimv2", "Computer": "localhost"}]
+        assert len(created) == 1, "Connection should be reused"
+        assert created[0].moniker == get_moniker("localhost", "cimv2")
+        query_wmi("SELECT * FROM MSAcpi_ThermalZoneTemperature", "wmi")
+        query_wmi("SELECT * FROM Win32_ComputerSystem", computer="remote")
+        assert [(c.computer, c.namespace) for c in created] == [
+            ("localhost", "cimv2"),
+            ("localhost", "wmi"),
+            ("remote", "cimv2"),
+        ]
+        assert len(pool) == 3
+
+        # Connections are only health checked after health_check_interval seconds
+        created[0].healthy = False
+        now[0] = 5
+        pool.get("localhost", "cimv2", get_moniker("localhost", "cimv2"))
+        now[0] = 20
+        assert query_wmi("SELECT * FROM Win32_ComputerSystem")[0]["Name"] == "cimv2"
+        assert len(created) == 4 and pool.stats["unhealthy"] == 1
+
+        # Idle connections expire, connections failing a query are discarded
+        now[0] = 100
+        assert query_wmi("SELECT * FROM Win32_ComputerSystem") is not None
+        assert pool.stats["expired"] == 3
+        assert len(pool) == 1
+        created[-1].healthy = False
+        assert (
+            query_wmi("SELECT * FROM Win32_ComputerSystem", can_be_skipped=True) is None
+        )
+        assert pool.stats["discarded"] == 1 and len(pool) == 0
+
+        # Every thread gets its own connections
+        threads = [
+            threading.Thread(
+                target=query_wmi, args=("SELECT * FROM Win32_ComputerSystem",)
+            )
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(pool) == 0
+        assert pool.stats["created"] == len(created) == 7
+    assert get_connection_pool() is not pool
+
+
+def test_wmi_objects_to_rows():
+    print("Testing WMI objects to rows conversion")
+    assert get_select_columns("SELECT * FROM Win32_QuickFixEngineering") is None
+    assert get_select_columns(
+        "select HotFixID,  InstalledOn from Win32_QuickFixEngineering"
+    ) == ("HotFixID", "InstalledOn")
+    objects = [
+        FakeWmiObject(Caption="one", HotFixID="KB1", InstalledOn=None),
+        FakeWmiObject(Caption="two", HotFixID="KB2", InstalledOn="1/1/2026"),
+    ]
+    rows = wmi_objects_to_rows(objects)
+    assert rows.columns == ("Caption", "HotFixID", "InstalledOn")
+    assert rows.rows == [("one", "KB1", None), ("two", "KB2", "1/1/2026")]
+    assert rows.as_dicts() == wmi_object_2_list_of_dict(objects)
+    assert rows.column("hotfixid") == ["KB1", "KB2"]
+    rows = wmi_objects_to_rows(objects, ("HotFixID", "Missing"))
+    assert list(rows) == [("KB1", None), ("KB2", None)]
+    assert len(wmi_objects_to_rows([])) == 0
+
+    pool = WmiConnectionPool(factory=FakeWmiConnection)
+    rows = query_wmi(
+        "SELECT HotFixID, InstalledOn FROM Win32_QuickFixEngineering",
+        pool=pool,
+        rows=True,
+    )
+    assert rows.columns == ("HotFixID", "InstalledOn")
+    assert rows[2] == ("KB2", "1/1/2026")
+
+
+class FakeEnumeratingServices:
+    """
+    Stands for SWbemServices, ExecQuery() returning a lazy enumerator
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.enumerated = 0
+        self.flags = None
+
+    def ExecQuery(self, query_str, language, flags):
+        self.flags = flags
+        for index in range(self.count):
+            self.enumerated += 1
+            yield FakeWmiObject(
+                EventCode=index, Message="Event %d %s" % (index, "x" * 100)
+            )
+
+
+def test_iter_wmi():
+    print("Testing WMI streaming")
+    services = FakeEnumeratingServices(50000)
+
+    def factory(computer, namespace, moniker):
+        connection = FakeWmiConnection(computer, namespace, moniker)
+        connection._namespace = services
+        return connection
+
+    pool = WmiConnectionPool(factory=factory)
+    query_str = "SELECT EventCode, Message FROM Win32_NTLogEvent"
+    events = iter_wmi(query_str, batch_size=4, pool=pool)
+    assert [next(events)["EventCode"] for _ in range(10)] == list(range(10))
+    events.close()
+    assert services.flags == WBEM_FLAG_RETURN_IMMEDIATELY | WBEM_FLAG_FORWARD_ONLY
+    assert services.enumerated == 12, "Only whole batches should be enumerated"
+
+    # Memory doesn't grow with result size
+    tracemalloc.start()
+    try:
+        count = 0
+        for batch in iter_wmi(query_str, batch_size=100, pool=pool, rows=True):
+            assert batch.columns == ("EventCode", "Message")
+            count += len(batch)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert count == 50000
+    print("Peak memory while streaming 50000 objects: %d bytes" % peak)
+    assert peak < 1024 * 1024
+
+    services.count = 3
+    assert list(iter_wmi("SELECT * FROM Win32_NTLogEvent", pool=pool)) == [
+        {"EventCode": index, "Message": "Event %d %s" % (index, "x" * 100)}
+        for index in range(3)
+    ]
+
+
+def test_wmi_cache():
+    print("Testing WMI query cache")
+    now = [0.0]
+    connections = []
+
+    def factory(computer, namespace, moniker):
+        connections.append(FakeWmiConnection(computer, namespace, moniker))
+        return connections[-1]
+
+    def query_count():
+        return sum(len(connection.queries) for connection in connections)
+
+    assert normalize_query(
+        "select  Name\nFROM Win32_Service WHERE Name = 'Spooler  X'"
+    ) == normalize_query("SELECT Name FROM win32_service where name = 'Spooler  X'")
+    assert normalize_query("SELECT * FROM A WHERE B='x'") != normalize_query(
+        "SELECT * FROM A WHERE B='X'"
+    )
+    assert get_query_class("SELECT Bias FROM Win32_TimeZone") == "win32_timezone"
+
+    cache = WmiCache(max_entries=4, ttls={"Win32_Service": 5}, clock=lambda: now[0])
+    pool = WmiConnectionPool(factory=factory)
+    with use_connection_pool(pool), use_cache(cache):
+        # Timestamp creation in a loop only queries the time zone bias once
+        for _ in range(1000):
+            cim_timestamp = create_cim_timestamp_from_now()
+        assert cim_timestamp.endswith("+120")
+        assert query_count() == 1
+        assert cache.stats["hits"] == 999 and cache.stats["misses"] == 1
+
+        # Uncached queries always reach WMI, cached results are copies
+        query_wmi("SELECT Name FROM Win32_ComputerSystem")
+        assert query_count() == 2
+        result = query_wmi("SELECT Name FROM Win32_Service", cache=True)
+        result[0]["Name"] = "altered"
+        assert query_wmi("select name from win32_service", cache=True) == [
+            {"Name": "cimv2", "Computer": "localhost"}
+        ]
+        assert query_count() == 3
+        query_wmi("SELECT Name FROM Win32_Service", cache=True, computer="remote")
+        result = query_wmi("SELECT Name FROM Win32_Service", cache=True, rows=True)
+        result.rows.append(("altered",))
+        assert query_wmi(
+            "SELECT Name FROM Win32_Service", cache=True, rows=True
+        ).rows == [("cimv2",)]
+        assert query_count() == 5 and len(cache) == 4
+
+        # Per class TTLs, then least recently used entries are evicted
+        now[0] = 10
+        query_wmi("SELECT Name FROM Win32_Service", cache=True)
+        assert query_count() == 6 and cache.stats["expirations"] == 1
+        assert get_wmi_timezone_bias() == "120" and query_count() == 6
+        query_wmi("SELECT Caption FROM Win32_Bios", cache=True)
+        assert cache.stats["evictions"] == 1 and len(cache) == 4
+        query_wmi("SELECT Name FROM Win32_Service", cache=True, computer="remote")
+        assert query_count() == 8
+
+        # Failed queries aren't cached, invalidation drops matching entries
+        connections[0].healthy = False
+        assert query_wmi("SELECT Caption FROM Win32_Baseboard", cache=True) is None
+        assert len(cache) == 4
+        assert cache.invalidate("Win32_TimeZone") == 1
+        get_wmi_timezone_bias()
+        assert query_count() == 10
+        assert cache.invalidate(computer="REMOTE") == 1 and len(cache) == 3
+        cache.clear()
+        assert len(cache) == 0 and cache.stats["invalidations"] == 5
+    assert get_cache(True) is not cache and get_cache(False) is None
+
+
+def test_query_wmi_many():
+    print("Testing concurrent WMI queries")
+
+    def factory(computer, namespace, moniker):
+        connection = FakeWmiConnection(computer, namespace, moniker)
+        connection.latency = 1 if computer == "slow" else 0.2
+        return connection
+
+    pool = WmiConnectionPool(factory=factory)
+    executor = ThreadPoolExecutor(max_workers=4)
+    queries = dict(
+        ("query_%d" % index, "SELECT Name FROM Win32_Class%d" % index)
+        for index in range(4)
+    )
+    start = time.monotonic()
+    results, errors = query_wmi_many(queries, pool=pool, executor=executor)
+    elapsed = time.monotonic() - start
+    assert errors == {}
+    assert results["query_3"] == [{"Name": "cimv2", "Computer": "localhost"}]
+    # Serial queries would take 0.8 seconds
+    assert elapsed < 0.6, "Queries should run concurrently, took %.2fs" % elapsed
+    assert pool.stats["created"] == 4
+
+    cache = WmiCache()
+    cache.set(
+        cache.make_key(
+            "localhost", "cimv2", "SELECT Bias FROM Win32_TimeZone", 1, False
+        ),
+        [{"Bias": 60}],
+    )
+    results, errors = query_wmi_many(
+        [
+            {
+                "name": "bias",
+                "query_str": "SELECT Bias FROM Win32_TimeZone",
+                "cache": cache,
+            },
+            {"name": "bogus", "query_str": "SELECT * FROM A", "namespace": "bogus"},
+            {
+                "name": "slow",
+                "query_str": "SELECT * FROM Win32_ComputerSystem",
+                "computer": "slow",
+                "timeout": 0.3,
+            },
+            {
+                "name": "rows",
+                "query_str": "SELECT Name FROM Win32_Service",
+                "rows": True,
+            },
+        ],
+        pool=pool,
+        executor=executor,
+    )
+    assert results["bias"] == [{"Bias": 60}] and cache.stats["hits"] == 1
+    assert results["rows"].column("Name") == ["cimv2"]
+    assert results["bogus"] is None and results["slow"] is None
+    assert sorted(errors) == ["bogus", "slow"]
+    assert errors["bogus"].reason == "error"
+    assert isinstance(errors["bogus"].exception, ValueError)
+    assert errors["slow"].reason == "timeout" and errors["slow"].exception is None
+    assert "slow" in str(errors["slow"])
+    executor.shutdown()
+
+
+def test_wql():
+    print("Testing WQL builder and parser")
+    assert (
+        select("Win32_QuickFixEngineering", ["HotFixID", "InstalledOn"])
+        == "SELECT HotFixID, InstalledOn FROM Win32_QuickFixEngineering"
+    )
+    assert (
+        prune_query(
+            "select *  from Win32_Service where State = 'Running' and StartMode like 'A%'",
+            ["Name", "State"],
+        )
+        == "SELECT Name, State FROM Win32_Service WHERE State = 'Running' and StartMode like 'A%'"
+    )
+    query = WqlQuery.parse(
+        "SELECT * FROM __InstanceCreationEvent WITHIN 5 WHERE TargetInstance ISA 'Win32_Process'"
+    )
+    assert query.class_name == "__InstanceCreationEvent" and query.within == 5
+    assert query.columns is None and WqlQuery.parse(str(query)) == query
+    assert get_select_columns(str(query.project(["TargetInstance"]))) == (
+        "TargetInstance",
+    )
+
+    # Explicit projections can only be narrowed
+    query = WqlQuery.parse("SELECT Name, State FROM Win32_Service")
+    assert query.project(["state"]).columns == ("State",)
+    for invalid in (
+        lambda: query.project(["StartMode"]),
+        lambda: WqlQuery.parse("SELECT Name FROM"),
+        lambda: WqlQuery.parse("SELECT Name; FROM Win32_Service"),
+        lambda: select("Win32_Service", []),
+        lambda: select("Win32_Service", where="Name = 'a' AND"),
+        lambda: select("Win32_Service", where="Name == 'a'"),
+        lambda: select("Win32_Service", where="(Name = 'a'"),
+        lambda: select("Win32_Service", where="Name LIKE 3"),
+        lambda: select("Win32_Service", where="Name = 'a"),
+    ):
+        try:
+            invalid()
+        except WqlError:
+            pass
+        else:
+            assert False, "Invalid query should raise WqlError"
+    assert validate_where(
+        'NOT (Name IS NULL OR Name IS NOT NULL) AND Size >= -1.5 AND Enabled <> TRUE AND Caption NOT LIKE "%a%"'
+    )
+
+
+def fake_worker_factory(computer, namespace, moniker):
+    """
+    Module level, hence picklable, fake connection factory for worker processes
+    """
+    connection = FakeWmiConnection(computer, namespace, moniker)
+    if computer == "crash":
+        connection.query = lambda query_str: os._exit(1)
+    elif computer == "broken":
+        connection.healthy = False
+    elif computer == "unpicklable":
+        connection.query = lambda query_str: [FakeWmiObject(Name=threading.Lock())]
+    return connection
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_wmi_worker_pool():
+    print("Testing WMI worker pool")
+    handler = RecordingHandler()
+    workers_logger = logging.getLogger("windows_tools.wmi_queries.workers")
+    workers_logger.addHandler(handler)
+    package_logger = logging.getLogger("windows_tools")
+    previous_level = package_logger.level
+    package_logger.setLevel(logging.DEBUG)
+    root_handlers = list(logging.getLogger().handlers)
+    try:
+        with WmiWorkerPool(workers=2, factory=fake_worker_factory) as pool:
+            futures = [
+                pool.submit(
+                    "SELECT Name FROM Win32_Class%d" % index, name="q%d" % index
+                )
+                for index in range(6)
+            ]
+            assert [future.result(timeout=30) for future in futures] == [
+                WmiRows(("Name",), [("cimv2",)])
+            ] * 6
+            assert pool.query(
+                "SELECT HotFixID, InstalledOn FROM Win32_QuickFixEngineering",
+                rows=False,
+                timeout=30,
+            )[2] == {"HotFixID": "KB2", "InstalledOn": "1/1/2026"}
+
+            try:
+                pool.query("SELECT * FROM A", computer="broken", timeout=30)
+            except WmiQueryError as exc:
+                assert exc.reason == "error" and isinstance(exc.exception, OSError)
+            else:
+                assert False, "Failed queries should raise WmiQueryError"
+
+            # Dead workers fail their query and are replaced
+            try:
+                pool.query(
+                    "SELECT * FROM A", computer="crash", name="crash", timeout=30
+                )
+            except WmiQueryError as exc:
+                assert exc.reason == "crash" and exc.name == "crash"
+            else:
+                assert False, "Crashed queries should raise WmiQueryError"
+            assert pool.query("SELECT Name FROM B", timeout=30).rows == [("cimv2",)]
+
+            # Results that cannot be sent to the parent process fail their query only
+            for rows in (True, False):
+                try:
+                    pool.query(
+                        "SELECT Name FROM A",
+                        computer="unpicklable",
+                        rows=rows,
+                        timeout=30,
+                    )
+                except WmiQueryError as exc:
+                    assert exc.reason == "error"
+                else:
+                    assert False, "Unpicklable results should raise WmiQueryError"
+            assert pool.query("SELECT Name FROM B", timeout=30).rows == [("cimv2",)]
+
+        # Worker logs are handled by the parent process loggers, root handlers are left alone
+        assert any(
+            record.processName.startswith("WmiWorker")
+            and "running WMI query [q3]" in record.getMessage()
+            for record in handler.records
+        )
+        assert logging.getLogger().handlers == root_handlers
+        try:
+            pool.submit("SELECT Name FROM B")
+        except RuntimeError:
+            pass
+        else:
+            assert False, "Closed pools should refuse queries"
+    finally:
+        workers_logger.removeHandler(handler)
+        package_logger.setLevel(previous_level)
+
+    # Workers dying while the pool closes still fail their query, queued queries still run
+    pool = WmiWorkerPool(workers=1, factory=fake_worker_factory)
+    crashed = pool.submit("SELECT * FROM A", computer="crash", name="crash")
+    queued = pool.submit("SELECT Name FROM B")
+    closer = threading.Thread(target=pool.close, daemon=True)
+    closer.start()
+    closer.join(30)
+    assert not closer.is_alive(), "close() should not wait for dead workers"
+    assert crashed.exception(timeout=0).reason == "crash"
+    assert queued.result(timeout=0).rows == [("cimv2",)]
+
+    # COM initialized threads, warm connections being opened when workers start
+    created = []
+
+    def factory(computer, namespace, moniker):
+        created.append(namespace)
+        return FakeWmiConnection(computer, namespace, moniker)
+
+    with WmiWorkerPool(
+        workers=3, processes=False, factory=factory, warm_namespaces=("cimv2", "wmi")
+    ) as pool:
+        assert pool.query("SELECT Name FROM A", namespace="wmi", timeout=30)[0] == (
+            "wmi",
+        )
+    assert sorted(created) == ["cimv2"] * 3 + ["wmi"] * 3
+
+
+def test_cim_timestamps_batch_conversion():
+    print("Testing CIM timestamps batch conversion")
+    cim_timestamps = [
+        "20201103225935.123456+0",
+        "20201103225935.123456+240",
+        "20240229235959.999999-060",
+        "19700101000000.000000+000",
+        "20201103225935.123+060",
+        None,
+    ]
+    datetimes = cim_timestamps_to_datetimes(cim_timestamps)
+    assert datetimes[-1] is None
+    assert [dt.timestamp() for dt in datetimes[:-1]] == [
+        1604444375.123456,
+        1604429975.123456,
+        1709254799.999999,
+        0,
+        1604440775.123,
+    ]
+    assert datetimes[0].tzinfo is datetimes[3].tzinfo
+    assert cim_timestamp_to_datetime(cim_timestamps[1], utc=False) == datetime(
+        2020, 11, 4, 2, 59, 35, 123456
+    )
+    epochs = cim_timestamps_to_epochs(cim_timestamps, missing=-1)
+    assert epochs.typecode == "q"
+    assert list(epochs) == [1604444375, 1604429975, 1709254799, 0, 1604440775, -1]
+    assert cim_timestamps_to_epochs(cim_timestamps[2:3], microseconds=True)[0] == (
+        1709254799999999
+    )
+    assert (
+        utc_datetime_to_cim_timestamp(datetime(2021, 2, 7, 1, 5, 3, 8), localize=False)
+        == "20210207010503.000008+0"
+    )
+
+    # Datetime properties are found from their CIM type when flattening
+    objects = [
+        FakeWmiObject(
+            cim_types={"InstallDate": CIM_TYPE_DATETIME},
+            Name="app%d" % index,
+            InstallDate=cim_timestamps[index],
+            Version="20201103225935.123456+0",
+        )
+        for index in range(6)
+    ]
+    rows = wmi_objects_to_rows(objects, parse_datetimes=True)
+    assert rows.column("InstallDate") == datetimes
+    assert rows.column("Version")[0] == "20201103225935.123456+0"
+    assert wmi_objects_to_rows(objects).column("InstallDate") == cim_timestamps
+
+
+def test_wmi_event_watcher():
+    print("Testing WMI event watcher")
+    query_str = instance_event_query("creation", "Win32_Process", within=1)
+    assert query_str == (
+        "SELECT * FROM __InstanceCreationEvent WITHIN 1 "
+        "WHERE TargetInstance ISA 'Win32_Process'"
+    )
+    extrinsic_query = "SELECT * FROM Win32_VolumeChangeEvent"
+    provider = FakeEventProvider()
+    for index in range(250):
+        provider.emit(query_str, {"TargetInstance": {"ProcessId": index}})
+    provider.emit(extrinsic_query, {"EventType": 2, "DriveName": "E:"})
+
+    # Events are batched by batch_size, and delivered in order
+    batches = []
+    with WmiEventWatcher(
+        source_factory=provider, batch_size=100, max_delay=0.5
+    ) as watcher:
+        watcher.add_callback(batches.append)
+        assert watcher.subscribe(query_str, name="processes") == "processes"
+        watcher.subscribe(extrinsic_query, namespace="cimv2")
+        deadline = time.monotonic() + 10
+        while sum(len(events) for events in batches) < 251:
+            assert time.monotonic() < deadline, "Events were not delivered"
+            time.sleep(0.05)
+    assert max(len(events) for events in batches) == 100
+    events = [event for events in batches for event in events]
+    assert [
+        event.data["TargetInstance"]["ProcessId"]
+        for event in events
+        if event.subscription == "processes"
+    ] == list(range(250))
+    assert [event.data for event in events if event.subscription != "processes"] == [
+        {"EventType": 2, "DriveName": "E:"}
+    ]
+    assert watcher.stats["received"] == 251 and watcher.stats["dropped"] == 0
+    assert ("SELECT * FROM Win32_VolumeChangeEvent", "cimv2", "localhost") in (
+        provider.opened
+    )
+    try:
+        watcher.subscribe("SELECT * FROM")
+    except WqlError:
+        pass
+    else:
+        assert False, "Invalid event queries should not be subscribed"
+
+    # A lone event is delivered after max_delay
+    batches = []
+    with WmiEventWatcher(source_factory=provider, max_delay=0.1) as watcher:
+        watcher.add_callback(batches.append)
+        watcher.subscribe(extrinsic_query)
+        start = time.monotonic()
+        provider.emit(extrinsic_query, {"EventType": 3})
+        while not batches:
+            assert time.monotonic() - start < 5, "Event was not delivered"
+            time.sleep(0.01)
+    assert len(batches[0]) == 1
+
+    # A slow consumer blocks readers once max_pending events wait, events stay queued by the source
+    release = threading.Event()
+    batches = []
+
+    def slow_callback(events):
+        release.wait()
+        batches.append(events)
+
+    with WmiEventWatcher(
+        source_factory=provider, batch_size=5, max_delay=0, max_pending=10
+    ) as watcher:
+        watcher.add_callback(slow_callback)
+        watcher.subscribe(query_str)
+        for index in range(100):
+            provider.emit(query_str, {"Index": index})
+        time.sleep(0.5)
+        try:
+            # At most one batch being delivered, max_pending events waiting, one event held by the reader
+            assert watcher._events.full()
+            assert watcher.stats["received"] <= 5 + 10 + 1
+            assert provider.pending(query_str) == 100 - watcher.stats["received"]
+        finally:
+            release.set()
+        while provider.pending(query_str) or watcher._events.qsize():
+            time.sleep(0.05)
+    assert [event.data["Index"] for events in batches for event in events] == list(
+        range(100)
+    )
+    assert watcher.stats["dropped"] == 0
+
+    # drop_oldest keeps reading events, dropping the oldest waiting ones
+    release.clear()
+    batches = []
+    with WmiEventWatcher(
+        source_factory=provider,
+        batch_size=5,
+        max_delay=0,
+        max_pending=10,
+        overflow="drop_oldest",
+    ) as watcher:
+        watcher.add_callback(slow_callback)
+        watcher.subscribe(query_str)
+        for index in range(100):
+            provider.emit(query_str, {"Index": index})
+        while provider.pending(query_str):
+            time.sleep(0.05)
+        time.sleep(0.2)
+        release.set()
+        assert watcher.stats["received"] == 100
+    indexes = [event.data["Index"] for events in batches for event in events]
+    assert indexes[-10:] == list(range(90, 100))
+    assert len(indexes) + watcher.stats["dropped"] == 100
+
+    # Async streams get every batch, a stream holding max_batches batches holds the dispatcher
+    async def consume(watcher):
+        stream = watcher.stream(max_batches=1)
+        for index in range(30):
+            provider.emit(extrinsic_query, {"Index": index})
+        received = []
+        async for events in stream:
+            await asyncio.sleep(0.01)
+            received.extend(event.data["Index"] for event in events)
+            if len(received) == 30:
+                stream.close()
+        return received
+
+    loop = asyncio.new_event_loop()
+    watcher = WmiEventWatcher(source_factory=provider, batch_size=4, max_delay=0.05)
+    watcher.subscribe(extrinsic_query)
+    watcher.start()
+    try:
+        assert loop.run_until_complete(consume(watcher)) == list(range(30))
+    finally:
+        watcher.stop()
+
+    async def consume_until_stopped(watcher):
+        stream = watcher.stream()
+        provider.emit(extrinsic_query, {"Index": 0})
+        threading.Timer(0.5, watcher.stop).start()
+        return [events async for events in stream]
+
+    watcher = WmiEventWatcher(source_factory=provider, max_delay=0.05)
+    watcher.subscribe(extrinsic_query)
+    watcher.start()
+    try:
+        assert len(loop.run_until_complete(consume_until_stopped(watcher))) == 1
+    finally:
+        watcher.stop()
+
+    # Leaving the watcher from the loop thread while a full stream holds a batch
+    async def stop_from_loop():
+        with WmiEventWatcher(
+            source_factory=provider, batch_size=1, max_delay=0
+        ) as watcher:
+            stream = watcher.stream(max_batches=1)
+            watcher.subscribe(extrinsic_query)
+            for index in range(5):
+                provider.emit(extrinsic_query, {"Index": index})
+            async for events in stream:
+                break
+        return watcher, events
+
+    stopper = threading.Thread(
+        target=lambda: results.append(loop.run_until_complete(stop_from_loop()))
+    )
+    results = []
+    stopper.start()
+    stopper.join(10)
+    assert not stopper.is_alive(), "stop() should not deadlock from the loop thread"
+    watcher, events = results[0]
+    assert events[0].data == {"Index": 0} and watcher._dispatcher is None
+    loop.close()
+
+
+def test_wmi_fixtures():
+    print("Testing WMI fixtures record and replay")
+    updates_query = "SELECT HotFixID, InstalledOn FROM Win32_QuickFixEngineering"
+    many_queries = [
+        {"name": "computer", "query_str": "SELECT Name FROM Win32_ComputerSystem"},
+        {"name": "thermal", "query_str": "SELECT * FROM A", "namespace": "wmi"},
+    ]
+
+    def factory(computer, namespace, moniker):
+        connection = FakeWmiConnection(computer, namespace, moniker)
+        connection.healthy = namespace != "wmi"
+        return connection
+
+    # Cached queries are recorded too, failures are recorded as errors
+    with fixtures.recording(factory=factory) as fixture:
+        updates = query_wmi(updates_query, cache=True)
+        bias = get_wmi_timezone_bias()
+        results, errors = query_wmi_many(many_queries)
+    assert len(updates) == 3 and list(errors) == ["thermal"]
+    assert len(fixture) == 4
+    entry = fixture.get("cimv2", updates_query.lower())
+    assert entry.columns == ("HotFixID", "InstalledOn") and entry.cim_types == (8, 8)
+    assert fixture.get("wmi", "SELECT * FROM A").error == "OSError('Connection lost')"
+    fixture.add(
+        fixtures.FixtureEntry(
+            "cimv2",
+            "SELECT Name, InstallDate, Codes FROM Win32_Product",
+            ("Name", "InstallDate", "Codes"),
+            (8, CIM_TYPE_DATETIME, 8195),
+            [("app", "20201103225935.123456+0", (1, 2))],
+        )
+    )
+
+    directory = tempfile.mkdtemp()
+    file_names = ["host.json", "host.json.gz"]
+    if fixtures.msgpack is not None:
+        file_names.append("host.msgpack")
+    for file_name in file_names:
+        path = os.path.join(directory, file_name)
+        fixture.save(path)
+        with fixtures.replaying(path) as replay:
+            assert query_wmi(updates_query) == updates
+            assert query_wmi(updates_query, rows=True).as_dicts() == updates
+            assert get_wmi_timezone_bias() == bias
+            replayed_results, replayed_errors = query_wmi_many(many_queries)
+            assert replayed_results == results
+            assert replayed_errors["thermal"].reason == "error"
+            products = query_wmi(
+                "SELECT Name, InstallDate, Codes FROM Win32_Product",
+                rows=True,
+                parse_datetimes=True,
+            )
+            assert products.rows == [
+                ("app", cim_timestamp_to_datetime("20201103225935.123456+0"), (1, 2))
+            ]
+            # parse_datetimes is honored, and cached apart, by query_wmi_many() too
+            for parse_datetimes in (True, False):
+                many_products, _ = query_wmi_many(
+                    [
+                        {
+                            "name": "products",
+                            "query_str": "SELECT Name, InstallDate, Codes FROM Win32_Product",
+                            "rows": True,
+                            "parse_datetimes": parse_datetimes,
+                            "cache": True,
+                        }
+                    ]
+                )
+                assert many_products["products"].rows == (
+                    products.rows
+                    if parse_datetimes
+                    else [("app", "20201103225935.123456+0", (1, 2))]
+                )
+            assert query_wmi("SELECT * FROM Win32_Missing") is None
+            assert replay.missing == [("cimv2", "SELECT * FROM Win32_Missing")]
+    assert os.path.getsize(os.path.join(directory, "host.json.gz")) < os.path.getsize(
+        os.path.join(directory, "host.json")
+    )
+
+    # Latency is paid once per connection, and per query and returned object
+    with fixtures.replaying(
+        fixture, latency=0.05, per_object_latency=0.01, connect_latency=0.1
+    ) as replay:
+        start = time.monotonic()
+        assert query_wmi(updates_query) == updates
+        assert time.monotonic() - start >= 0.1 + 0.05 + 3 * 0.01
+    assert replay.stats == {"connections": 1, "queries": 1, "objects": 3, "missing": 0}
+
+
 if __name__ == "__main__":
     print("Example code for %s, %s" % (__intname__, __build__))
     test_wmi_object_2_list_of_dict()
@@ -164,3 +1014,13 @@ if __name__ == "__main__":
     test_cim_timestamp_to_datetime()
     test_utc_datetime_to_cim_timestamp()
     test_create_cim_timestamp_from_now()
+    test_wmi_connection_pool()
+    test_wmi_objects_to_rows()
+    test_iter_wmi()
+    test_wmi_cache()
+    test_query_wmi_many()
+    test_wql()
+    test_wmi_worker_pool()
+    test_cim_timestamps_batch_conversion()
+    test_wmi_event_watcher()
+    test_wmi_fixtures()
@@ -28,14 +28,15 @@ __author__ = "Orsiris de Jong"
 __copyright__ = "Copyright (C) 2018-2024 Orsiris de Jong"
 __description__ = "antivirus state and installed products retrieval"
 __licence__ = "BSD 3 Clause"
-__version__ = "0.7.4"
-__build__ = "2024011001"
+__version__ = "0.8.0"
+__build__ = "2026101721"
 
 import re
 from typing import List, Union
 
 import windows_tools.installed_software
 import windows_tools.wmi_queries
+from windows_tools.wmi_queries.wql import select
 
 # Feel free to expand the antivirus vendor list
 KNOWN_ANTIVIRUS_PRODUCTS_REGEX = [
@@ -147,11 +148,28 @@ def get_installed_antivirus_software() -> List[dict]:
     potential_seccenter_av_engines = []
     potential_av_engines = []
 
+    # SecurityCenter2 (Vista and later) packs product state into productState
     result = windows_tools.wmi_queries.query_wmi(
-        "SELECT * FROM AntivirusProduct",
-        namespace="SecurityCenter",
+        select("AntivirusProduct", ["displayName", "productState"]),
+        namespace="SecurityCenter2",
         name="windows_tools.antivirus.get_installed_antivirus_software",
     )
+    if result is None:
+        # SecurityCenter v1 (XP) has no productState but separate state properties
+        result = windows_tools.wmi_queries.query_wmi(
+            select(
+                "AntiVirusProduct",
+                [
+                    "displayName",
+                    "companyName",
+                    "versionNumber",
+                    "onAccessScanningEnabled",
+                    "productUptoDate",
+                ],
+            ),
+            namespace="SecurityCenter",
+            name="windows_tools.antivirus.get_installed_antivirus_software",
+        )
     try:
         for product in result:
             av_engine = {
@@ -175,6 +193,14 @@ def get_installed_antivirus_software() -> List[dict]:
                 av_engine["type"] = securitycenter_get_product_type(state)
             except KeyError:
                 pass
+            try:
+                av_engine["version"] = product["versionNumber"]
+                av_engine["publisher"] = product["companyName"]
+                av_engine["enabled"] = product["onAccessScanningEnabled"]
+                av_engine["is_up_to_date"] = product["productUptoDate"]
+                av_engine["type"] = "Antivirus"
+            except KeyError:
+                pass
             potential_seccenter_av_engines.append(av_engine)
     # TypeError may happen when securityCenter namespace does not exist
     except (KeyError, TypeError):
@@ -18,8 +18,8 @@ __author__ = "Orsiris de Jong"
 __copyright__ = "Copyright (C) 2020 Orsiris de Jong"
 __description__ = "MS Office identification, works for click and run, o365 and others"
 __licence__ = "BSD 3 Clause"
-__version__ = "0.1.4"
-__build__ = "2021101002"
+__version__ = "0.2.0"
+__build__ = "2026101705"
 
 from typing import Tuple, Optional
 
@@ -39,73 +39,63 @@ KNOWN_VERSIONS = {
 }
 
 
-def _get_office_click_and_run_ident():
-    # type: () -> Optional[str]
-    """
-    Get ClickAndRun Product Id for Office 2016/2019/O365 detection
-    Example of result "ProPlus2019Volume,VisioPro2019Volume"
-    """
-    try:
-        click_and_run_ident = registry.get_value(
-            registry.HKEY_LOCAL_MACHINE,
-            r"Software\Microsoft\Office\ClickToRun\Configuration",
-            "ProductReleaseIds",
-            arch=registry.KEY_WOW64_64KEY | registry.KEY_WOW64_32KEY,
-        )
-    except FileNotFoundError:
-        click_and_run_ident = None
-    return click_and_run_ident
-
-
-def _get_used_word_version():
-    # type: () -> Optional[int]
+OFFICE_KEY = r"SOFTWARE\Microsoft\Office"
+# Both registry views, first view where the key exists is used
+BOTH_VIEWS = registry.KEY_WOW64_64KEY | registry.KEY_WOW64_32KEY
+
+
+def _get_office_click_and_run_ident_and_word_version():
+    # type: () -> Tuple[Optional[str], Optional[int]]
     """
-    Try do determine which version of Word is used (in case multiple versions are installed)
+    Get ClickAndRun Product Id for Office 2016/2019/O365 detection, and try do determine which version of Word
+    is used (in case multiple versions are installed), in a single registry pass
+    Example of ClickAndRun Product Id "ProPlus2019Volume,VisioPro2019Volume"
     """
-    try:
-        word_ver = registry.get_value(
-            registry.HKEY_CLASSES_ROOT, r"Word.Application\CurVer", None
-        )
-    except FileNotFoundError:
-        word_ver = None
+    click_and_run, word = registry.query_many(
+        [
+            (
+                registry.HKEY_LOCAL_MACHINE,
+                r"Software\Microsoft\Office\ClickToRun\Configuration",
+                ["ProductReleaseIds"],
+                BOTH_VIEWS,
+            ),
+            (registry.HKEY_CLASSES_ROOT, r"Word.Application\CurVer", [None]),
+        ]
+    )
+    click_and_run_ident = click_and_run["values"].get("ProductReleaseIds")
+    word_ver = word["values"].get(None)
     try:
         version = int(word_ver.split(".")[2])
     except (IndexError, ValueError, AttributeError):
         version = None
-    return version
+    return click_and_run_ident, version
 
 
 def _get_installed_office_version():
     # type: () -> Optional[str, bool]
     """
     Try do determine which is the highest current version of Office installed
+
+    Only Word and ClickToRunStore key existence is checked, every version in the same registry pass
     """
-    for possible_version, _ in KNOWN_VERSIONS.items():
-        try:
-            office_keys = registry.get_keys(
+    versions = list(KNOWN_VERSIONS)
+    results = registry.query_many(
+        [
+            (
                 registry.HKEY_LOCAL_MACHINE,
-                r"SOFTWARE\Microsoft\Office\{}".format(possible_version),
-                recursion_level=2,
-                arch=registry.KEY_WOW64_64KEY | registry.KEY_WOW64_32KEY,
-                combine=True,
+                "{}\\{}\\{}".format(OFFICE_KEY, version, subkey),
+                [],
+                BOTH_VIEWS,
             )
-
-            try:
-                is_click_and_run = (
-                    True if office_keys["ClickToRunStore"] is not None else False
-                )
-            except (TypeError, KeyError):
-                is_click_and_run = False
-
-            try:
-                # Let's say word is the reference (since we could also have powerpoint viewer or so)
-                is_valid = True if office_keys["Word"] is not None else False
-                if is_valid:
-                    return possible_version, is_click_and_run
-            except KeyError:
-                pass
-        except FileNotFoundError:
-            pass
+            for version in versions
+            for subkey in ("Word", "ClickToRunStore")
+        ]
+    )
+    for index, possible_version in enumerate(versions):
+        word, click_and_run_store = results[index * 2 : index * 2 + 2]
+        # Let's say word is the reference (since we could also have powerpoint viewer or so)
+        if word["error"] is None:
+            return possible_version, click_and_run_store["error"] is None
     return None, None
 
 
@@ -116,7 +106,9 @@ def get_office_version():
     Let's use some tricks, ie detect current Word used
     """
 
-    word_version = _get_used_word_version()
+    click_and_run_ident, word_version = (
+        _get_office_click_and_run_ident_and_word_version()
+    )
     office_version, is_click_and_run = _get_installed_office_version()
 
     # Prefer to get used word version instead of installed one
@@ -127,7 +119,6 @@ def get_office_version():
         version = float(office_version)
     else:
         version = None
-    click_and_run_ident = _get_office_click_and_run_ident()
 
     def _get_office_version():
         # type: () -> Optional[str]
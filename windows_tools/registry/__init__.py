@@ -15,30 +15,1203 @@ Versioning semantics:
 
 __intname__ = "windows_tools.registry"
 __author__ = "Orsiris de Jong"
-__copyright__ = "Copyright (C) 2019-2024 Orsiris de Jong"
+__copyright__ = "Copyright (C) 2019-2026 Orsiris de Jong"
 __description__ = "Windows registry 32 and 64 bits simple API"
 __licence__ = "BSD 3 Clause"
-__version__ = "1.1.0"
-__build__ = "2023050601"
-
-from typing import List, NoReturn, Optional, Union
-
-# that import is needed so we get CONSTANTS from winreg (eg HKEY_LOCAL_MACHINE etc) for direct use in module
-from winreg import *  # noqa ignore=F405
-
-# The following lines make lint tools happy
-from winreg import (
-    ConnectRegistry,
-    OpenKey,
-    EnumKey,
-    EnumValue,
-    QueryInfoKey,
-    QueryValueEx,
-    DeleteKey,
-)
-from winreg import KEY_WOW64_32KEY, KEY_WOW64_64KEY, KEY_READ, KEY_ALL_ACCESS, HKEYType
+__version__ = "1.16.0"
+__build__ = "2026101715"
+
+import ctypes
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, NoReturn, Optional, Tuple, Union
+
+try:
+    # that import is needed so we get CONSTANTS from winreg (eg HKEY_LOCAL_MACHINE etc) for direct use in module
+    from winreg import *  # noqa ignore=F405
+
+    # The following lines make lint tools happy
+    from winreg import (
+        ConnectRegistry,
+        OpenKey,
+        EnumKey,
+        EnumValue,
+        QueryInfoKey,
+        QueryValueEx,
+        DeleteKey,
+        CreateKeyEx,
+        SetValueEx,
+        DeleteValue,
+    )
+    from winreg import (
+        KEY_WOW64_32KEY,
+        KEY_WOW64_64KEY,
+        KEY_READ,
+        KEY_ALL_ACCESS,
+        HKEYType,
+    )
+
+    _HAS_WINREG = True
+except ImportError:
+    # Non Windows platforms, we still provide the constants so in-memory and offline backends can be used
+    _HAS_WINREG = False
+    HKEYType = object
+    HKEY_CLASSES_ROOT = 0x80000000
+    HKEY_CURRENT_USER = 0x80000001
+    HKEY_LOCAL_MACHINE = 0x80000002
+    HKEY_USERS = 0x80000003
+    HKEY_PERFORMANCE_DATA = 0x80000004
+    HKEY_CURRENT_CONFIG = 0x80000005
+    HKEY_DYN_DATA = 0x80000006
+    KEY_QUERY_VALUE = 0x0001
+    KEY_SET_VALUE = 0x0002
+    KEY_CREATE_SUB_KEY = 0x0004
+    KEY_ENUMERATE_SUB_KEYS = 0x0008
+    KEY_NOTIFY = 0x0010
+    KEY_CREATE_LINK = 0x0020
+    KEY_WOW64_64KEY = 0x0100
+    KEY_WOW64_32KEY = 0x0200
+    KEY_READ = 0x20019
+    KEY_WRITE = 0x20006
+    KEY_EXECUTE = 0x20019
+    KEY_ALL_ACCESS = 0xF003F
+    REG_NONE = 0
+    REG_SZ = 1
+    REG_EXPAND_SZ = 2
+    REG_BINARY = 3
+    REG_DWORD = 4
+    REG_DWORD_LITTLE_ENDIAN = 4
+    REG_DWORD_BIG_ENDIAN = 5
+    REG_LINK = 6
+    REG_MULTI_SZ = 7
+    REG_RESOURCE_LIST = 8
+    REG_FULL_RESOURCE_DESCRIPTOR = 9
+    REG_RESOURCE_REQUIREMENTS_LIST = 10
+    REG_QWORD = 11
+    REG_QWORD_LITTLE_ENDIAN = 11
+
 from windows_tools.misc import windows_ticks_to_date
 
+# 768 = 0 | KEY_WOW64_64KEY | KEY_WOW64_32KEY (where 0 = default)
+WOW64_VIEWS = KEY_WOW64_64KEY | KEY_WOW64_32KEY
+
+HIVE_NAMES = {
+    HKEY_CLASSES_ROOT: "HKEY_CLASSES_ROOT",
+    HKEY_CURRENT_USER: "HKEY_CURRENT_USER",
+    HKEY_LOCAL_MACHINE: "HKEY_LOCAL_MACHINE",
+    HKEY_USERS: "HKEY_USERS",
+    HKEY_CURRENT_CONFIG: "HKEY_CURRENT_CONFIG",
+}
+
+HIVE_ALIASES = {
+    "HKCR": HKEY_CLASSES_ROOT,
+    "HKCU": HKEY_CURRENT_USER,
+    "HKLM": HKEY_LOCAL_MACHINE,
+    "HKU": HKEY_USERS,
+    "HKCC": HKEY_CURRENT_CONFIG,
+}
+HIVE_ALIASES.update({name: hive for hive, name in HIVE_NAMES.items()})
+
+# Difference between windows epoch (1601-01-01) and unix epoch (1970-01-01) in 100ns ticks
+EPOCH_AS_WINDOWS_TICKS = 116444736000000000
+
+
+def unix_seconds_to_windows_ticks(seconds: float) -> int:
+    """
+    Unix epoch to windows ticks converter, reverse of windows_tools.misc.windows_ticks_to_unix_seconds
+    """
+    return int(seconds * 10000000) + EPOCH_AS_WINDOWS_TICKS
+
+
+def guess_value_type(value) -> int:
+    """
+    Guess registry value type from python type, the same way winreg returns them
+    """
+    if isinstance(value, bool) or value is None:
+        return REG_DWORD if isinstance(value, bool) else REG_NONE
+    if isinstance(value, int):
+        return REG_DWORD if 0 <= value <= 0xFFFFFFFF else REG_QWORD
+    if isinstance(value, (bytes, bytearray)):
+        return REG_BINARY
+    if isinstance(value, (list, tuple)):
+        return REG_MULTI_SZ
+    return REG_SZ
+
+
+_UINT32 = struct.Struct("<I")
+_UINT32_BIG_ENDIAN = struct.Struct(">I")
+_UINT64 = struct.Struct("<Q")
+
+
+def decode_value_data(raw: bytes, value_type: int):
+    """
+    Decode raw value data the way winreg.QueryValueEx does
+    Fixed size types are unpacked in place, without copying the data first
+    """
+    if value_type in (REG_SZ, REG_EXPAND_SZ, REG_LINK):
+        if len(raw) % 2:
+            raw = raw[:-1]
+        return bytes(raw).decode("utf-16-le", "replace").split("\x00", 1)[0]
+    if value_type == REG_MULTI_SZ:
+        if len(raw) % 2:
+            raw = raw[:-1]
+        # Multi strings end with two null chars, remove trailing empty strings
+        strings = bytes(raw).decode("utf-16-le", "replace").rstrip("\x00")
+        return strings.split("\x00") if strings else []
+    if value_type == REG_DWORD:
+        if len(raw) >= 4:
+            return _UINT32.unpack_from(raw)[0]
+        return int.from_bytes(raw, "little")
+    if value_type == REG_QWORD:
+        if len(raw) >= 8:
+            return _UINT64.unpack_from(raw)[0]
+        return int.from_bytes(raw, "little")
+    if value_type == REG_DWORD_BIG_ENDIAN:
+        if len(raw) >= 4:
+            return _UINT32_BIG_ENDIAN.unpack_from(raw)[0]
+        return int.from_bytes(raw, "big")
+    if not raw and value_type in (REG_NONE, REG_BINARY):
+        return None
+    return bytes(raw)
+
+
+def encode_value_data(value, value_type: int) -> bytes:
+    """
+    Encode a value the way it is stored in the registry, reverse of decode_value_data()
+    """
+    if value_type in (REG_SZ, REG_EXPAND_SZ, REG_LINK):
+        return (str(value) + "\x00").encode("utf-16-le")
+    if value_type == REG_MULTI_SZ:
+        return ("".join(string + "\x00" for string in value) + "\x00").encode(
+            "utf-16-le"
+        )
+    if value_type == REG_DWORD:
+        return _UINT32.pack(value)
+    if value_type == REG_QWORD:
+        return _UINT64.pack(value)
+    if value_type == REG_DWORD_BIG_ENDIAN:
+        return _UINT32_BIG_ENDIAN.pack(value)
+    if value is None:
+        return b""
+    return bytes(value)
+
+
+def _split_path(key: str) -> List[str]:
+    return [part for part in key.split("\\") if part]
+
+
+class RegistryBackend:
+    """
+    Registry backend protocol
+
+    Every registry access in this module goes through a backend, which mimics winreg primitives
+    Handles are opaque objects that only make sense to the backend that created them
+    Backends must raise FileNotFoundError for missing keys / values and OSError when enumeration
+    indexes are exhausted, as winreg does
+    """
+
+    read_only = False
+
+    def connect(self, computer: Optional[str], hive: int):
+        """
+        Return a handle to the root of a hive
+        """
+        raise NotImplementedError
+
+    def open_key(self, handle, sub_key: str, access: int = KEY_READ):
+        """
+        Open sub_key relative to handle, returns a new handle
+        """
+        raise NotImplementedError
+
+    def close_key(self, handle) -> None:
+        """
+        Release a handle obtained from connect or open_key
+        """
+        pass
+
+    def enum_key(self, handle, index: int) -> str:
+        """
+        Return the name of the subkey at index
+        """
+        raise NotImplementedError
+
+    def enum_value(self, handle, index: int) -> Tuple[str, object, int]:
+        """
+        Return (name, value, type) of the value at index
+        """
+        raise NotImplementedError
+
+    def query_value(self, handle, name: Optional[str]) -> Tuple[object, int]:
+        """
+        Return (value, type) of a named value, None or empty name being the default value
+        """
+        raise NotImplementedError
+
+    def query_info(self, handle) -> Tuple[int, int, int]:
+        """
+        Return (subkey count, value count, last write time as windows ticks)
+        """
+        raise NotImplementedError
+
+    def delete_key(self, handle, sub_key: str) -> None:
+        """
+        Delete an empty sub_key relative to handle
+        """
+        raise PermissionError("Registry backend %s is read only" % type(self).__name__)
+
+    def delete_tree(self, handle, sub_key: str) -> None:
+        """
+        Delete sub_key relative to handle with all its subkeys and values, in one native call
+        An empty sub_key deletes the subkeys and values of handle, but not the key itself
+        Backends without such a call raise NotImplementedError
+        """
+        raise NotImplementedError
+
+    def create_key(self, handle, sub_key: str, access: int = KEY_ALL_ACCESS):
+        """
+        Open sub_key relative to handle, creating it and its missing parents, returns a new handle
+        """
+        raise PermissionError("Registry backend %s is read only" % type(self).__name__)
+
+    def set_value(self, handle, name: Optional[str], value, value_type: int) -> None:
+        """
+        Create or replace a value, None or empty name being the default value
+        """
+        raise PermissionError("Registry backend %s is read only" % type(self).__name__)
+
+    def delete_value(self, handle, name: Optional[str]) -> None:
+        """
+        Delete a value
+        """
+        raise PermissionError("Registry backend %s is read only" % type(self).__name__)
+
+
+class WinregBackend(RegistryBackend):
+    """
+    Live registry backend, using winreg
+    """
+
+    def __init__(self):
+        if not _HAS_WINREG:
+            raise OSError("winreg is not available on this platform")
+
+    def connect(self, computer: Optional[str], hive: int):
+        return ConnectRegistry(computer, hive)
+
+    def open_key(self, handle, sub_key: str, access: int = KEY_READ):
+        return OpenKey(handle, sub_key, 0, access)
+
+    def close_key(self, handle) -> None:
+        try:
+            handle.Close()
+        except AttributeError:
+            pass
+
+    def enum_key(self, handle, index: int) -> str:
+        return EnumKey(handle, index)
+
+    def enum_value(self, handle, index: int) -> Tuple[str, object, int]:
+        return EnumValue(handle, index)
+
+    def query_value(self, handle, name: Optional[str]) -> Tuple[object, int]:
+        return QueryValueEx(handle, name)
+
+    def query_info(self, handle) -> Tuple[int, int, int]:
+        return QueryInfoKey(handle)
+
+    def delete_key(self, handle, sub_key: str) -> None:
+        DeleteKey(handle, sub_key)
+
+    def delete_tree(self, handle, sub_key: str) -> None:
+        try:
+            reg_delete_tree = ctypes.windll.advapi32.RegDeleteTreeW
+        except AttributeError:
+            # RegDeleteTree exists since Windows Vista
+            raise NotImplementedError
+        result = reg_delete_tree(ctypes.c_void_p(int(handle)), sub_key or None)
+        if result != 0:
+            raise ctypes.WinError(result)
+
+    def create_key(self, handle, sub_key: str, access: int = KEY_ALL_ACCESS):
+        return CreateKeyEx(handle, sub_key, 0, access)
+
+    def set_value(self, handle, name: Optional[str], value, value_type: int) -> None:
+        SetValueEx(handle, name, 0, value_type, value)
+
+    def delete_value(self, handle, name: Optional[str]) -> None:
+        DeleteValue(handle, name)
+
+
+class MemoryKey:
+    """
+    A registry key living in memory
+    Subkeys and values are indexed by lowercase name since the registry is case insensitive
+    """
+
+    __slots__ = (
+        "name",
+        "parent",
+        "subkeys",
+        "values",
+        "last_write",
+        "_subkey_list",
+        "_value_list",
+    )
+
+    def __init__(self, name: str, last_write: int = 0, parent: "MemoryKey" = None):
+        self.name = name
+        self.parent = parent
+        self.subkeys = {}  # type: Dict[str, MemoryKey]
+        self.values = {}  # type: Dict[str, Tuple[str, object, int]]
+        self.last_write = last_write
+        # Index based enumeration caches, invalidated on change
+        self._subkey_list = None
+        self._value_list = None
+
+    def subkey_at(self, index: int) -> "MemoryKey":
+        if self._subkey_list is None:
+            self._subkey_list = list(self.subkeys.values())
+        return self._subkey_list[index]
+
+    def value_at(self, index: int) -> Tuple[str, object, int]:
+        if self._value_list is None:
+            self._value_list = list(self.values.values())
+        return self._value_list[index]
+
+    def get_subkey(self, name: str) -> "MemoryKey":
+        try:
+            return self.subkeys[name.lower()]
+        except KeyError:
+            raise FileNotFoundError("Registry key [%s] not found" % name)
+
+    def add_subkey(self, name: str, last_write: int = 0) -> "MemoryKey":
+        try:
+            return self.subkeys[name.lower()]
+        except KeyError:
+            subkey = MemoryKey(name, last_write, self)
+            self.subkeys[name.lower()] = subkey
+            self._subkey_list = None
+            return subkey
+
+    def remove_subkey(self, name: str) -> None:
+        del self.subkeys[name.lower()]
+        self._subkey_list = None
+
+    def remove_value(self, name: Optional[str]) -> None:
+        try:
+            del self.values[(name or "").lower()]
+        except KeyError:
+            raise FileNotFoundError("Registry value [%s] not found" % name)
+        self._value_list = None
+
+    def touch(self, last_write: int) -> None:
+        """
+        Update last write time, which always moves forward so changes are seen even within a clock tick
+        """
+        self.last_write = max(last_write, self.last_write + 1)
+
+    def clear(self) -> None:
+        """
+        Remove all subkeys and values
+        """
+        self.subkeys = {}
+        self.values = {}
+        self._subkey_list = None
+        self._value_list = None
+
+    def set_value(self, name: Optional[str], value, value_type: int = None) -> None:
+        name = name or ""
+        if value_type is None:
+            value_type = guess_value_type(value)
+        self.values[name.lower()] = (name, value, value_type)
+        self._value_list = None
+
+
+class MemoryBackend(RegistryBackend):
+    """
+    Registry backend backed by python dicts, useful for tests, benchmarks and offline analysis
+
+    Trees are given per hive in get_keys() format, ie
+    {HKEY_LOCAL_MACHINE: {"SOFTWARE": {"": [{"name": "x", "value": 1, "type": REG_DWORD}], "Subkey": {}}}}
+    where "type" is optional and guessed from python type when omitted
+
+    WOW64 redirection is emulated: asking for KEY_WOW64_32KEY under HKLM\\SOFTWARE will read from
+    HKLM\\SOFTWARE\\WOW6432Node when that key exists
+    """
+
+    def __init__(self, trees: dict = None, last_write: int = None):
+        if last_write is None:
+            last_write = unix_seconds_to_windows_ticks(datetime.now().timestamp())
+        self.last_write = last_write
+        self.hives = {}  # type: Dict[int, MemoryKey]
+        # Functions called as listener(key, deleted) after every change, see add_listener()
+        self.listeners = []  # type: List[Callable[[MemoryKey, bool], None]]
+        if trees:
+            for hive, tree in trees.items():
+                self.load_tree(hive, tree)
+
+    def get_hive(self, hive: int) -> MemoryKey:
+        try:
+            return self.hives[hive]
+        except KeyError:
+            root = MemoryKey(HIVE_NAMES.get(hive, str(hive)), self.last_write)
+            self.hives[hive] = root
+            return root
+
+    def load_tree(self, hive: int, tree: dict, key: str = "") -> None:
+        """
+        Load a get_keys() like tree under hive\\key
+        """
+        node = self.get_hive(hive)
+        for part in _split_path(key):
+            node = node.add_subkey(part, self.last_write)
+        self._load_node(node, tree)
+
+    def _load_node(self, node: MemoryKey, tree: dict) -> None:
+        for name, content in tree.items():
+            if name == "":
+                for value in content:
+                    node.set_value(value["name"], value["value"], value.get("type"))
+            else:
+                self._load_node(node.add_subkey(name, self.last_write), content)
+
+    def connect(self, computer: Optional[str], hive: int):
+        if computer not in (None, "", "localhost", "."):
+            raise OSError(
+                "%s cannot connect to remote computer %s"
+                % (type(self).__name__, computer)
+            )
+        return self.get_hive(hive)
+
+    def _resolve(self, handle) -> MemoryKey:
+        # Predefined hive constants can be used directly as handles, as winreg allows
+        if isinstance(handle, int):
+            return self.get_hive(handle)
+        return handle
+
+    def _get_subkey(self, node, name: str):
+        return node.get_subkey(name)
+
+    def _redirect(self, node, parts: List[str], access: int):
+        """
+        Emulate WOW64 redirection, returns the node from which remaining parts are resolved
+        """
+        if (
+            access & KEY_WOW64_32KEY
+            and node is self.hives.get(HKEY_LOCAL_MACHINE)
+            and parts
+            and parts[0].lower() == "software"
+            and (len(parts) < 2 or parts[1].lower() != "wow6432node")
+        ):
+            node = self._get_subkey(node, parts.pop(0))
+            try:
+                node = self._get_subkey(node, "WOW6432Node")
+            except FileNotFoundError:
+                pass
+        return node
+
+    def open_key(self, handle, sub_key: str, access: int = KEY_READ):
+        parts = _split_path(sub_key)
+        node = self._redirect(self._resolve(handle), parts, access)
+        for part in parts:
+            node = self._get_subkey(node, part)
+        return node
+
+    @staticmethod
+    def _now() -> int:
+        return unix_seconds_to_windows_ticks(datetime.now().timestamp())
+
+    def add_listener(self, listener: Callable[[MemoryKey, bool], None]) -> None:
+        """
+        Call listener(key, deleted) whenever a key gets changed, which simulates registry change notifications
+        key is the key whose values or direct subkeys changed, or the deleted key when deleted is True
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[MemoryKey, bool], None]) -> None:
+        self.listeners.remove(listener)
+
+    def _changed(self, node: MemoryKey, *deleted: MemoryKey) -> None:
+        node.touch(self._now())
+        for listener in list(self.listeners):
+            for deleted_node in deleted:
+                listener(deleted_node, True)
+            listener(node, False)
+
+    def create_key(self, handle, sub_key: str, access: int = KEY_ALL_ACCESS):
+        if self.read_only:
+            super().create_key(handle, sub_key, access)
+        parts = _split_path(sub_key)
+        node = self._redirect(self._resolve(handle), parts, access)
+        for part in parts:
+            try:
+                node = self._get_subkey(node, part)
+            except FileNotFoundError:
+                parent = node
+                node = node.add_subkey(part, self._now())
+                self._changed(parent)
+        return node
+
+    def set_value(self, handle, name: Optional[str], value, value_type: int) -> None:
+        if self.read_only:
+            super().set_value(handle, name, value, value_type)
+        node = self._resolve(handle)
+        node.set_value(name, value, value_type)
+        self._changed(node)
+
+    def delete_value(self, handle, name: Optional[str]) -> None:
+        if self.read_only:
+            super().delete_value(handle, name)
+        node = self._resolve(handle)
+        node.remove_value(name)
+        self._changed(node)
+
+    def enum_key(self, handle, index: int) -> str:
+        try:
+            return self._resolve(handle).subkey_at(index).name
+        except IndexError:
+            raise OSError("No more data is available")
+
+    def enum_value(self, handle, index: int) -> Tuple[str, object, int]:
+        try:
+            return self._resolve(handle).value_at(index)
+        except IndexError:
+            raise OSError("No more data is available")
+
+    def query_value(self, handle, name: Optional[str]) -> Tuple[object, int]:
+        try:
+            _, value, value_type = self._resolve(handle).values[(name or "").lower()]
+        except KeyError:
+            raise FileNotFoundError("Registry value [%s] not found" % name)
+        return value, value_type
+
+    def query_info(self, handle) -> Tuple[int, int, int]:
+        node = self._resolve(handle)
+        return len(node.subkeys), len(node.values), node.last_write
+
+    def delete_key(self, handle, sub_key: str) -> None:
+        if self.read_only:
+            super().delete_key(handle, sub_key)
+        target = self._resolve(handle)
+        for part in _split_path(sub_key):
+            target = target.get_subkey(part)
+        if target.parent is None:
+            raise PermissionError("Cannot delete registry hive root")
+        if target.subkeys:
+            raise PermissionError("Registry key [%s] has subkeys" % target.name)
+        target.parent.remove_subkey(target.name)
+        self._changed(target.parent, target)
+
+    def delete_tree(self, handle, sub_key: str) -> None:
+        if self.read_only:
+            super().delete_key(handle, sub_key)
+        target = self._resolve(handle)
+        for part in _split_path(sub_key):
+            target = target.get_subkey(part)
+        if not _split_path(sub_key):
+            subkeys = list(target.subkeys.values())
+            target.clear()
+            self._changed(target, *subkeys)
+        elif target.parent is None:
+            raise PermissionError("Cannot delete registry hive root")
+        else:
+            target.parent.remove_subkey(target.name)
+            self._changed(target.parent, target)
+
+
+def _parse_reg_value(data: str) -> Tuple[object, int]:
+    """
+    Decode a value from a .reg export file
+    """
+    if data.startswith('"'):
+        return data[1:-1].replace('\\"', '"').replace("\\\\", "\\"), REG_SZ
+    if data.startswith("dword:"):
+        return int(data[6:], 16), REG_DWORD
+    if data.startswith("hex"):
+        header, _, payload = data.partition(":")
+        value_type = int(header[4:-1], 16) if header.startswith("hex(") else REG_BINARY
+        raw = bytes.fromhex("".join(payload.split()).replace(",", ""))
+        if value_type in (REG_SZ, REG_EXPAND_SZ):
+            return raw.decode("utf-16-le").rstrip("\x00"), value_type
+        if value_type in (REG_MULTI_SZ, REG_DWORD, REG_QWORD):
+            return decode_value_data(raw, value_type), value_type
+        return raw, value_type
+    raise ValueError("Cannot decode registry value [%s]" % data)
+
+
+def _read_reg_file_lines(path: str):
+    with open(path, "rb") as file_handle:
+        raw = file_handle.read()
+    if raw.startswith(b"\xff\xfe"):
+        content = raw[2:].decode("utf-16-le")
+    elif raw.startswith(b"\xef\xbb\xbf"):
+        content = raw[3:].decode("utf-8")
+    else:
+        content = raw.decode("mbcs" if os.name == "nt" else "latin-1")
+
+    # Join continued hex lines
+    line_buffer = ""
+    for line in content.splitlines():
+        if line.endswith("\\"):
+            line_buffer += line[:-1].strip()
+            continue
+        yield (line_buffer + line.strip()) if line_buffer else line.strip()
+        line_buffer = ""
+    if line_buffer:
+        yield line_buffer
+
+
+def _split_reg_value_line(line: str) -> Tuple[Optional[str], str]:
+    if line.startswith("@="):
+        return None, line[2:]
+    # Find closing quote of value name, taking escaped quotes into account
+    index = 1
+    while index < len(line):
+        if line[index] == "\\":
+            index += 2
+            continue
+        if line[index] == '"':
+            break
+        index += 1
+    name = line[1:index].replace('\\"', '"').replace("\\\\", "\\")
+    return name, line[index + 2 :]
+
+
+class RegFileBackend(MemoryBackend):
+    """
+    Read-only backend over a .reg export file (reg export / regedit export, REGEDIT4 or version 5.00)
+
+    .reg files don't carry key timestamps, so every key gets the file modification time
+    """
+
+    read_only = True
+
+    def __init__(self, path: str):
+        super().__init__(
+            last_write=unix_seconds_to_windows_ticks(os.path.getmtime(path))
+        )
+        self.path = path
+        node = None
+        for line in _read_reg_file_lines(path):
+            if not line or line.startswith(";"):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                key_path = line[1:-1]
+                if key_path.startswith("-"):
+                    node = None
+                    continue
+                hive_name, _, sub_key = key_path.partition("\\")
+                try:
+                    node = self.get_hive(HIVE_ALIASES[hive_name.upper()])
+                except KeyError:
+                    raise ValueError("Unknown hive [%s] in %s" % (hive_name, path))
+                for part in _split_path(sub_key):
+                    node = node.add_subkey(part, self.last_write)
+            elif node is not None and (line.startswith('"') or line.startswith("@=")):
+                name, data = _split_reg_value_line(line)
+                if data == "-":
+                    continue
+                value, value_type = _parse_reg_value(data)
+                node.set_value(name, value, value_type)
+
+
+_BACKEND = None  # type: Optional[RegistryBackend]
+
+
+def _close_handles(backend: RegistryBackend, *handles) -> None:
+    """
+    Close handles that were successfully opened, ignoring None ones
+    """
+    for handle in handles:
+        if handle is not None:
+            backend.close_key(handle)
+
+
+def set_backend(backend: Optional[RegistryBackend]) -> None:
+    """
+    Set the registry backend used by all functions of this module
+    None restores the default winreg backend
+    """
+    global _BACKEND
+    _BACKEND = backend
+
+
+def get_backend(backend: RegistryBackend = None) -> RegistryBackend:
+    """
+    Return given backend, or the current module wide backend
+    """
+    global _BACKEND
+    if backend is not None:
+        return backend
+    if _BACKEND is None:
+        _BACKEND = WinregBackend()
+    return _BACKEND
+
+
+@contextmanager
+def use_backend(backend: RegistryBackend):
+    """
+    Temporarily set the module wide registry backend, eg to run existing collectors against an offline hive
+
+    with registry.use_backend(HiveFileBackend(...)):
+        installed_software.get_installed_software()
+    """
+    global _BACKEND
+    previous_backend = _BACKEND
+    _BACKEND = backend
+    try:
+        yield backend
+    finally:
+        _BACKEND = previous_backend
+
+
+class _SessionHandle:
+    """
+    A key handle cached by a RegistrySession, given out as the handle itself so entries stay distinct
+    even when the wrapped backend returns the same object for different access masks
+    Hive connections are wrapped too, with an empty path, so backends returning the same connection
+    for different computer names still give distinct (computer, hive) roots
+    handle becomes None once the backend handle is closed
+    """
+
+    __slots__ = ("handle", "root", "path", "access", "pins")
+
+    def __init__(self, handle, root: tuple, path: str, access: int):
+        self.handle = handle
+        self.root = root
+        self.path = path
+        self.access = access
+        self.pins = 0
+
+
+class RegistrySession(RegistryBackend):
+    """
+    Registry backend wrapper that pools hive connections per (computer, hive) and keeps
+    opened key handles in a LRU cache, so repeated queries don't reconnect nor reopen keys,
+    and keys are opened relative to their nearest already opened parent
+
+    Handles given out are pinned until close_key() is called on them, only unpinned handles
+    are evicted (and really closed) when the cache is full
+    Everything is closed when the session is closed
+
+    with RegistrySession() as session:
+        get_values(HKEY_LOCAL_MACHINE, key, names, backend=session)
+    """
+
+    def __init__(
+        self,
+        backend: RegistryBackend = None,
+        computer: Optional[str] = None,
+        max_handles: int = 256,
+    ):
+        self.backend = get_backend(backend)
+        self.read_only = self.backend.read_only
+        self.computer = computer
+        self.max_handles = max_handles
+        self.stats = {"connects": 0, "opens": 0, "hits": 0, "evictions": 0}
+        self._lock = threading.RLock()
+        self._connections = {}  # type: Dict[tuple, _SessionHandle]
+        self._cache = OrderedDict()  # type: OrderedDict
+
+    def __enter__(self) -> "RegistrySession":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close every cached key handle and hive connection
+        """
+        with self._lock:
+            for entry in self._cache.values():
+                self._close_entry(entry)
+            for connection in self._connections.values():
+                self._close_entry(connection)
+            self._cache.clear()
+            self._connections.clear()
+
+    def connect(self, computer: Optional[str], hive: int):
+        computer = computer or self.computer
+        root = (computer, hive)
+        with self._lock:
+            try:
+                return self._connections[root]
+            except KeyError:
+                connection = _SessionHandle(
+                    self.backend.connect(computer, hive), root, "", 0
+                )
+                self.stats["connects"] += 1
+                self._connections[root] = connection
+                return connection
+
+    def _locate(self, handle) -> Tuple[tuple, str, int]:
+        """
+        Return (root, path, registry view flags) of a handle given by this session
+        """
+        if isinstance(handle, _SessionHandle):
+            return handle.root, handle.path, handle.access & WOW64_VIEWS
+        if isinstance(handle, int):
+            # Predefined hive constant used as handle
+            self.connect(None, handle)
+            return (self.computer, handle), "", 0
+        raise OSError("Handle %s does not belong to this registry session" % handle)
+
+    def open_key(self, handle, sub_key: str, access: int = KEY_READ):
+        with self._lock:
+            root, parent_path, view = self._locate(handle)
+            # Keys opened relative to a redirected key stay in the same registry view
+            access |= view
+            parts = _split_path(parent_path) + _split_path(sub_key)
+            path = "\\".join(parts)
+            cache_key = (root, path.lower(), access)
+            try:
+                entry = self._cache[cache_key]
+                self._cache.move_to_end(cache_key)
+                self.stats["hits"] += 1
+            except KeyError:
+                # Find nearest opened parent, or fall back to the hive connection
+                parent = self._connections[root].handle
+                remaining = parts
+                for index in range(len(parts) - 1, 0, -1):
+                    try:
+                        parent_entry = self._cache[
+                            (root, "\\".join(parts[:index]).lower(), access)
+                        ]
+                    except KeyError:
+                        continue
+                    self._cache.move_to_end(
+                        (root, "\\".join(parts[:index]).lower(), access)
+                    )
+                    parent = parent_entry.handle
+                    remaining = parts[index:]
+                    break
+                opened = self.backend.open_key(parent, "\\".join(remaining), access)
+                self.stats["opens"] += 1
+                entry = _SessionHandle(opened, root, path, access)
+                # Pinned before evicting, so the new handle cannot be evicted right away
+                entry.pins += 1
+                self._cache[cache_key] = entry
+                self._evict()
+                return entry
+            entry.pins += 1
+            return entry
+
+    def backend_handle(self, handle):
+        """
+        Return the wrapped backend handle of a handle given by this session
+        """
+        if isinstance(handle, _SessionHandle):
+            return handle.handle
+        return handle
+
+    def _close_entry(self, entry: _SessionHandle) -> None:
+        if entry.handle is not None:
+            self.backend.close_key(entry.handle)
+            entry.handle = None
+
+    def _evict(self) -> None:
+        excess = len(self._cache) - self.max_handles
+        if excess <= 0:
+            return
+        # Least recently used entries come first, stop as soon as enough are found
+        victims = []
+        for cache_key, entry in self._cache.items():
+            if entry.pins > 0:
+                continue
+            victims.append(cache_key)
+            if len(victims) >= excess:
+                break
+        for cache_key in victims:
+            self._close_entry(self._cache.pop(cache_key))
+            self.stats["evictions"] += 1
+
+    def close_key(self, handle) -> None:
+        with self._lock:
+            if (
+                not isinstance(handle, _SessionHandle)
+                or self._connections.get(handle.root) is handle
+            ):
+                # Hive connections stay open until the session is closed
+                return
+            if handle.pins > 0:
+                handle.pins -= 1
+            if (
+                handle.pins == 0
+                and self._cache.get((handle.root, handle.path.lower(), handle.access))
+                is not handle
+            ):
+                # Handle of a deleted key, no longer cached
+                self._close_entry(handle)
+            self._evict()
+
+    def enum_key(self, handle, index: int) -> str:
+        return self.backend.enum_key(self.backend_handle(handle), index)
+
+    def enum_value(self, handle, index: int) -> Tuple[str, object, int]:
+        return self.backend.enum_value(self.backend_handle(handle), index)
+
+    def query_value(self, handle, name: Optional[str]) -> Tuple[object, int]:
+        return self.backend.query_value(self.backend_handle(handle), name)
+
+    def query_info(self, handle) -> Tuple[int, int, int]:
+        return self.backend.query_info(self.backend_handle(handle))
+
+    def create_key(self, handle, sub_key: str, access: int = KEY_ALL_ACCESS):
+        with self._lock:
+            try:
+                return self.open_key(handle, sub_key, access)
+            except FileNotFoundError:
+                pass
+            _, _, view = self._locate(handle)
+            self.backend.close_key(
+                self.backend.create_key(
+                    self.backend_handle(handle), sub_key, access | view
+                )
+            )
+            return self.open_key(handle, sub_key, access)
+
+    def set_value(self, handle, name: Optional[str], value, value_type: int) -> None:
+        self.backend.set_value(self.backend_handle(handle), name, value, value_type)
+
+    def delete_value(self, handle, name: Optional[str]) -> None:
+        self.backend.delete_value(self.backend_handle(handle), name)
+
+    def _forget(self, root: tuple, path: str, include_key: bool = True) -> None:
+        """
+        Forget about handles of a deleted key and its subkeys
+        """
+        for cache_key in list(self._cache):
+            cached_root, cached_path, _ = cache_key
+            if cached_root == root and (
+                (include_key and cached_path == path)
+                or cached_path.startswith(path + "\\" if path else "")
+            ):
+                entry = self._cache.pop(cache_key)
+                # Pinned handles will be closed by their owner's close_key() call
+                if entry.pins == 0:
+                    self._close_entry(entry)
+
+    def delete_key(self, handle, sub_key: str) -> None:
+        with self._lock:
+            root, parent_path, _ = self._locate(handle)
+            path = "\\".join(_split_path(parent_path) + _split_path(sub_key)).lower()
+            self.backend.delete_key(self.backend_handle(handle), sub_key)
+            self._forget(root, path)
+
+    def delete_tree(self, handle, sub_key: str) -> None:
+        with self._lock:
+            root, parent_path, _ = self._locate(handle)
+            path = "\\".join(_split_path(parent_path) + _split_path(sub_key)).lower()
+            self.backend.delete_tree(self.backend_handle(handle), sub_key)
+            self._forget(root, path, include_key=bool(_split_path(sub_key)))
+
+
+_ticks_to_date = lru_cache(maxsize=1024)(windows_ticks_to_date)
+_MISSING = object()
+
+
+class RegistryValue:
+    """
+    Compact registry value record, used instead of {"name", "value", "type"} dicts in compact mode
+    Supports value["name"] like access so it can replace those dicts in existing code
+    last_modified is the date of the key holding the value, computed once per key
+    view is the registry view the value was read from (0, KEY_WOW64_64KEY or KEY_WOW64_32KEY)
+    """
+
+    __slots__ = ("name", "value", "type", "last_write", "view")
+
+    def __init__(
+        self,
+        name: str,
+        value,
+        value_type: int,
+        last_write: int = None,
+        view: int = 0,
+    ):
+        self.name = name
+        self.value = value
+        self.type = value_type
+        self.last_write = last_write
+        self.view = view
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        if self.last_write is None:
+            return None
+        return _ticks_to_date(self.last_write)
+
+    def __getitem__(self, item: str):
+        if item in ("name", "value", "type", "last_modified"):
+            return getattr(self, item)
+        raise KeyError(item)
+
+    def get(self, item: str, default=None):
+        try:
+            return self[item]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "value": self.value, "type": self.type}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RegistryValue):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return "RegistryValue(%r, %r, %r)" % (self.name, self.value, self.type)
+
+
+class RegistryRecord:
+    """
+    Compact get_values() result for one subkey, behaves like a read-only {name: value} dict
+    Value names are shared by all records of a query, values are stored in a tuple
+    view is the registry view the subkey was read from (0, KEY_WOW64_64KEY or KEY_WOW64_32KEY)
+    """
+
+    __slots__ = ("key", "last_write", "view", "_fields", "_data")
+
+    def __init__(
+        self,
+        key: str,
+        fields: Dict[str, int],
+        data: tuple,
+        last_write: int = None,
+        view: int = 0,
+    ):
+        self.key = key
+        self.last_write = last_write
+        self.view = view
+        self._fields = fields
+        self._data = data
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        if self.last_write is None:
+            return None
+        return _ticks_to_date(self.last_write)
+
+    def __getitem__(self, name: str):
+        value = self._data[self._fields[name]]
+        if value is _MISSING:
+            raise KeyError(name)
+        return value
+
+    def get(self, name: str, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name, _MISSING) is not _MISSING
+
+    def items(self) -> List[tuple]:
+        return [
+            (name, self._data[index])
+            for name, index in self._fields.items()
+            if self._data[index] is not _MISSING
+        ]
+
+    def keys(self) -> List[str]:
+        return [name for name, _ in self.items()]
+
+    def values(self) -> list:
+        return [value for _, value in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.items())
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RegistryRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return "RegistryRecord(%r, %r)" % (self.key, self.to_dict())
+
+
+# Shared pool reading the 32 bit registry view while the calling thread reads the 64 bit one
+VIEW_WORKERS = 8
+_VIEW_EXECUTOR = None  # type: Optional[ThreadPoolExecutor]
+_VIEW_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_view_executor() -> ThreadPoolExecutor:
+    global _VIEW_EXECUTOR
+    with _VIEW_EXECUTOR_LOCK:
+        if _VIEW_EXECUTOR is None:
+            _VIEW_EXECUTOR = ThreadPoolExecutor(max_workers=VIEW_WORKERS)
+        return _VIEW_EXECUTOR
+
+
+def read_views(
+    reader: Callable[[int], object], arch: int = 768, first_match: bool = False
+) -> List[Tuple[int, object]]:
+    """
+    Run reader(view) for every registry view in arch and return [(view, result)] for views where
+    reader didn't raise FileNotFoundError, in 64 bit then 32 bit order
+
+    Views are read concurrently, the first one in the calling thread and the others on a shared
+    thread pool. A view that didn't start yet when the calling thread is done is read inline,
+    so a busy pool never makes this slower than sequential reads
+
+    :param reader: function reading one view, given 0, KEY_WOW64_64KEY or KEY_WOW64_32KEY
+    :param arch: registry views to read, 768 = KEY_WOW64_64KEY | KEY_WOW64_32KEY
+    :param first_match: read views one after another and stop at the first view found
+    :return: list of (view, result) tuples, raises FileNotFoundError when no view was found
+    """
+    if arch == 768:
+        views = [KEY_WOW64_64KEY, KEY_WOW64_32KEY]
+    else:
+        views = [arch]
+
+    def _read(view: int) -> Tuple[int, object]:
+        try:
+            return view, reader(view)
+        except FileNotFoundError as exc:
+            return view, exc
+
+    if first_match or len(views) == 1:
+        outcomes = []
+        for view in views:
+            outcomes.append(_read(view))
+            if not isinstance(outcomes[-1][1], FileNotFoundError):
+                break
+    else:
+        futures = [_get_view_executor().submit(_read, view) for view in views[1:]]
+        outcomes = [_read(views[0])]
+        for view, future in zip(views[1:], futures):
+            outcomes.append(_read(view) if future.cancel() else future.result())
+
+    results = [
+        (view, result)
+        for view, result in outcomes
+        if not isinstance(result, FileNotFoundError)
+    ]
+    if not results:
+        raise outcomes[-1][1]
+    return results
+
 
 def get_value(
     hive: int,
@@ -46,6 +1219,8 @@ def get_value(
     value: Optional[str],
     arch: int = 0,
     last_modified: bool = False,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
 ) -> Union[str, dict]:
     """
     Returns a value from a given registry path
@@ -55,37 +1230,38 @@ def get_value(
     :param value: which value we query, may be None if unnamed value is searched
     :param arch: which registry architecture we seek (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
                  Giving multiple arches here will return first result
+    :param backend: optional registry backend, defaults to module wide backend
+    :param computer: remote computer name (remote registry service), None for local registry
     :return: value
     """
+    backend = get_backend(backend)
 
     def _get_value(hive: int, key: str, value: Optional[str], arch: int) -> str:
+        open_reg = None
+        open_key = None
         try:
-            open_reg = ConnectRegistry(None, hive)
-            open_key = OpenKey(open_reg, key, 0, KEY_READ | arch)
+            open_reg = backend.connect(computer, hive)
+            open_key = backend.open_key(open_reg, key, KEY_READ | arch)
             if last_modified:
                 output = {}
-                output["value"], key_type = QueryValueEx(open_key, value)
-                timestamp = windows_ticks_to_date(QueryInfoKey(open_key)[2])
+                output["value"], key_type = backend.query_value(open_key, value)
+                timestamp = windows_ticks_to_date(backend.query_info(open_key)[2])
                 output["last_modified"] = timestamp
             else:
-                output, key_type = QueryValueEx(open_key, value)
+                output, key_type = backend.query_value(open_key, value)
             # Return the first match
             return output
         except (FileNotFoundError, TypeError, OSError) as exc:
             raise FileNotFoundError(
                 "Registry key [%s] with value [%s] not found. %s" % (key, value, exc)
             )
+        finally:
+            _close_handles(backend, open_key, open_reg)
 
     # 768 = 0 | KEY_WOW64_64KEY | KEY_WOW64_32KEY (where 0 = default)
-    if arch == 768:
-        for _arch in [KEY_WOW64_64KEY, KEY_WOW64_32KEY]:
-            try:
-                return _get_value(hive, key, value, _arch)
-            except FileNotFoundError:
-                pass
-        raise FileNotFoundError
-    else:
-        return _get_value(hive, key, value, arch)
+    return read_views(
+        lambda view: _get_value(hive, key, value, view), arch, first_match=True
+    )[0][1]
 
 
 def get_values(
@@ -95,6 +1271,9 @@ def get_values(
     arch: int = 0,
     combine: bool = False,
     last_modified: bool = False,
+    backend: RegistryBackend = None,
+    compact: bool = False,
+    computer: Optional[str] = None,
 ) -> list:
     """
     Returns a dictionnary of values in names from registry key
@@ -104,57 +1283,271 @@ def get_values(
     :param names: which value names we query for
     :param arch: which registry architecture we seek (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
     :param combine: shall we combine multiple arch results or return first match
+                    Both views are then read concurrently, and subkeys found identical in both views
+                    (keys that aren't redirected) are only returned once
+    :param backend: optional registry backend, defaults to module wide backend
+    :param computer: remote computer name (remote registry service), None for local registry
+    :param compact: return RegistryRecord objects instead of dicts, with subkey last modification date
+                    in record.last_modified when last_modified is set and the view it was read from in record.view
     :return: list of strings
     """
+    backend = get_backend(backend)
+    # Value name to index in compact records, shared by all records
+    fields = {}  # type: Dict[str, int]
+    for name in names:
+        fields.setdefault(name, len(fields))
 
     def _get_values(hive: int, key: str, names: List[str], arch: int) -> list:
+        open_reg = None
+        open_key = None
         try:
-            open_reg = ConnectRegistry(None, hive)
-            open_key = OpenKey(open_reg, key, 0, KEY_READ | arch)
-            subkey_count, value_count, _ = QueryInfoKey(open_key)
+            open_reg = backend.connect(computer, hive)
+            open_key = backend.open_key(open_reg, key, KEY_READ | arch)
+            subkey_count, value_count, _ = backend.query_info(open_key)
 
             output = []
             for index in range(subkey_count):
+                subkey_name = backend.enum_key(open_key, index)
+                subkey_handle = backend.open_key(open_key, subkey_name, KEY_READ | arch)
+                try:
+                    data = [_MISSING] * len(fields)
+                    found = False
+                    for name, field_index in fields.items():
+                        try:
+                            data[field_index] = backend.query_value(
+                                subkey_handle, name
+                            )[0]
+                            found = True
+                        except (FileNotFoundError, TypeError):
+                            pass
+                    if not found:
+                        continue
+                    # Last modification date is read once per subkey
+                    last_write = (
+                        backend.query_info(subkey_handle)[2] if last_modified else None
+                    )
+                finally:
+                    backend.close_key(subkey_handle)
+                if compact:
+                    output.append(
+                        (
+                            subkey_name,
+                            RegistryRecord(
+                                subkey_name, fields, tuple(data), last_write, arch
+                            ),
+                        )
+                    )
+                    continue
                 values = {}
-                subkey_name = EnumKey(open_key, index)
-                subkey_handle = OpenKey(open_key, subkey_name)
-                for name in names:
-                    try:
-                        if last_modified:
-                            values[name] = {}
-                            values[name]["value"] = QueryValueEx(subkey_handle, name)[0]
-                            timestamp = windows_ticks_to_date(
-                                QueryInfoKey(subkey_handle)[2]
-                            )
-                            values[name]["last_modified"] = timestamp
-                        else:
-                            values[name] = QueryValueEx(subkey_handle, name)[0]
-                    except (FileNotFoundError, TypeError):
-                        pass
-                if values != {}:
-                    output.append(values)
+                timestamp = _ticks_to_date(last_write) if last_modified else None
+                for name, field_index in fields.items():
+                    if data[field_index] is _MISSING:
+                        continue
+                    if last_modified:
+                        values[name] = {
+                            "value": data[field_index],
+                            "last_modified": timestamp,
+                        }
+                    else:
+                        values[name] = data[field_index]
+                output.append((subkey_name, values))
             return output
 
         except (FileNotFoundError, TypeError, OSError) as exc:
             raise FileNotFoundError("Cannot query registry key [%s]. %s" % (key, exc))
+        finally:
+            _close_handles(backend, open_key, open_reg)
 
     # 768 = 0 | KEY_WOW64_64KEY | KEY_WOW64_32KEY (where 0 = default)
-    if arch == 768:
-        result = []
-        for _arch in [KEY_WOW64_64KEY, KEY_WOW64_32KEY]:
+    try:
+        results = read_views(
+            lambda view: _get_values(hive, key, names, view),
+            arch,
+            first_match=not combine,
+        )
+    except FileNotFoundError:
+        if arch == 768:
+            return []
+        raise
+
+    output = []
+    # Entries of previous views by lowercase subkey name
+    seen = {}  # type: Dict[str, list]
+    for _, entries in results:
+        view_entries = {}  # type: Dict[str, list]
+        for subkey_name, entry in entries:
+            lowered_name = subkey_name.lower()
+            if entry in seen.get(lowered_name, []):
+                # Same key seen through both views, ie not redirected
+                continue
+            view_entries.setdefault(lowered_name, []).append(entry)
+            output.append(entry)
+        for lowered_name, view_entry_list in view_entries.items():
+            seen.setdefault(lowered_name, []).extend(view_entry_list)
+    return output
+
+
+def _walk_keys(
+    backend: RegistryBackend,
+    open_reg,
+    key: str,
+    arch: int,
+    max_depth: Optional[int],
+    filter_on_names: Optional[List[str]],
+    compact: bool = False,
+):
+    """
+    Depth first registry traversal with an explicit stack
+    Subkeys are opened relative to their already opened parent, and only the handles of
+    the current branch are kept open, so memory and handle usage only depend on tree depth
+
+    Yields (list of path parts relative to key, list of values, last write windows ticks)
+    Values are {"name", "value", "type"} dicts, or a tuple of RegistryValue records in compact mode
+    """
+
+    def _read_key(handle) -> Tuple[int, list, int]:
+        subkey_count, value_count, last_write = backend.query_info(handle)
+        values = []
+        for index in range(value_count):
+            name, value, value_type = backend.enum_value(handle, index)
+            if isinstance(filter_on_names, list) and name not in filter_on_names:
+                continue
+            if compact:
+                values.append(RegistryValue(name, value, value_type, last_write, arch))
+            else:
+                values.append({"name": name, "value": value, "type": value_type})
+        return subkey_count, tuple(values) if compact else values, last_write
+
+    try:
+        handle = backend.open_key(open_reg, key, KEY_READ | arch)
+    except (FileNotFoundError, TypeError, OSError) as exc:
+        raise FileNotFoundError("Cannot query registry key [%s]. %s" % (key, exc))
+
+    # Stack of [handle, path parts, subkey count, next subkey index]
+    stack = []
+    try:
+        try:
+            subkey_count, values, last_write = _read_key(handle)
+        except (TypeError, OSError) as exc:
+            backend.close_key(handle)
+            raise FileNotFoundError("Cannot query registry key [%s]. %s" % (key, exc))
+        stack.append([handle, [], subkey_count, 0])
+        yield [], values, last_write
+
+        while stack:
+            frame = stack[-1]
+            handle, parts, subkey_count, index = frame
+            if index >= subkey_count or (
+                max_depth is not None and len(parts) >= max_depth
+            ):
+                stack.pop()
+                backend.close_key(handle)
+                continue
+            frame[3] += 1
             try:
-                if combine:
-                    result = result + (_get_values(hive, key, names, _arch))
-                else:
-                    return _get_values(hive, key, names, _arch)
+                subkey_name = backend.enum_key(handle, index)
+            except OSError:
+                # Subkeys were removed while we were walking
+                frame[2] = index
+                continue
+            try:
+                subkey_handle = backend.open_key(handle, subkey_name, KEY_READ | arch)
+            except (FileNotFoundError, TypeError, OSError):
+                continue
+            try:
+                subkey_count, values, last_write = _read_key(subkey_handle)
+            except (TypeError, OSError):
+                backend.close_key(subkey_handle)
+                continue
+            subkey_parts = parts + [subkey_name]
+            stack.append([subkey_handle, subkey_parts, subkey_count, 0])
+            yield subkey_parts, values, last_write
+    finally:
+        # Early termination, make sure we don't leave handles open
+        for frame in stack:
+            backend.close_key(frame[0])
+
+
+def walk_keys(
+    hive: int,
+    key: str,
+    max_depth: Optional[int] = None,
+    filter_on_names: List[str] = None,
+    arch: int = 0,
+    backend: RegistryBackend = None,
+    compact: bool = False,
+    computer: Optional[str] = None,
+):
+    """
+    Generator that walks a registry tree depth first and yields keys as they are read,
+    so whole subtrees can be processed in bounded memory, and walking can be stopped anytime
+
+    :param hive: registry hive (windows.registry.HKEY_LOCAL_MACHINE...)
+    :param key: which registry key we start from
+    :param max_depth: how many subkey levels we walk, None for unlimited, 0 for key itself only
+    :param filter_on_names: list of value names we want, if none given, all values are returned
+    :param arch: which registry architecture we seek (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+                 Giving both arches walks the 64 bit view then the 32 bit view
+    :param backend: optional registry backend, defaults to module wide backend
+    :param compact: yield tuples of RegistryValue records instead of lists of dicts
+    :param computer: remote computer name (remote registry service), None for local registry
+    :return: yields (key path, list of {"name", "value", "type"} dicts, last write time in windows ticks)
+    """
+    backend = get_backend(backend)
+
+    try:
+        open_reg = backend.connect(computer, hive)
+    except OSError as exc:
+        raise FileNotFoundError(
+            "Cannot connect to registry hive [%s]. %s" % (hive, exc)
+        )
+
+    try:
+        if arch == 768:
+            arches = [KEY_WOW64_64KEY, KEY_WOW64_32KEY]
+        else:
+            arches = [arch]
+        found = False
+        for _arch in arches:
+            walker = _walk_keys(
+                backend, open_reg, key, _arch, max_depth, filter_on_names, compact
+            )
+            try:
+                for parts, values, last_write in walker:
+                    found = True
+                    yield "\\".join([key] + parts if key else parts), values, last_write
             except FileNotFoundError:
-                pass
-        return result
-    else:
-        return _get_values(hive, key, names, arch)
+                if len(arches) == 1:
+                    raise
+            finally:
+                walker.close()
+        if not found:
+            raise FileNotFoundError("Cannot query registry key [%s]" % key)
+    finally:
+        _close_handles(backend, open_reg)
 
 
-OPEN_REGISTRY_HANDLE = None
+def _merge_trees(target: dict, source: dict) -> None:
+    """
+    Merge a get_keys() tree read from another registry view into target, without overwriting
+    anything already in target
+    """
+    for name, content in source.items():
+        if name == "":
+            if "" not in target:
+                target[""] = content
+                continue
+            values = target[""]
+            known_names = set(value["name"].lower() for value in values)
+            added = [
+                value for value in content if value["name"].lower() not in known_names
+            ]
+            if added:
+                target[""] = values + type(values)(added)
+        elif name in target:
+            _merge_trees(target[name], content)
+        else:
+            target[name] = content
 
 
 def get_keys(
@@ -165,6 +1558,9 @@ def get_keys(
     filter_on_names: List[str] = None,
     combine: bool = False,
     last_modified: bool = False,
+    backend: RegistryBackend = None,
+    compact: bool = False,
+    computer: Optional[str] = None,
 ) -> dict:
     """
     :param hive: registry hive (windows.registry.HKEY_LOCAL_MACHINE...)
@@ -173,118 +1569,716 @@ def get_keys(
     :param recursion_level: recursivity level
     :param filter_on_names: list of strings we search, if none given, all value names are returned
     :param combine: shall we combine multiple arch results or return first match
+                    Both views are then read concurrently and merged, keys present in both views get
+                    the subkeys of both, and the 32 bit values whose names aren't in the 64 bit view
+    :param backend: optional registry backend, defaults to module wide backend
+    :param compact: store values as tuples of RegistryValue records instead of lists of dicts,
+                    records always carry their key last modification date in value.last_modified
+                    and the view they were read from in value.view
+    :param computer: remote computer name (remote registry service), None for local registry
     :return: list of strings
     """
+    backend = get_backend(backend)
+
+    def _get_keys(open_reg, key: str, arch: int) -> dict:
+        output = {}
+        # Current branch of nested dicts, branch[n] being the dict of the key at depth n
+        branch = [output]
+        for parts, values, last_write in _walk_keys(
+            backend, open_reg, key, arch, recursion_level, filter_on_names, compact
+        ):
+            if parts:
+                del branch[len(parts) :]
+                node = {}
+                branch[-1][parts[-1]] = node
+                branch.append(node)
+            else:
+                node = output
+            if values:
+                if last_modified and not compact:
+                    last_modified_date = _ticks_to_date(last_write)
+                    for value in values:
+                        value["last_modified"] = last_modified_date
+                node[""] = values
+        return output
+
+    try:
+        open_reg = backend.connect(computer, hive)
+    except OSError as exc:
+        raise FileNotFoundError(
+            "Cannot connect to registry hive [%s]. %s" % (hive, exc)
+        )
+
+    try:
+        # 768 = 0 | KEY_WOW64_64KEY | KEY_WOW64_32KEY (where 0 = default)
+        try:
+            results = read_views(
+                lambda view: _get_keys(open_reg, key, view),
+                arch,
+                first_match=not combine,
+            )
+        except FileNotFoundError:
+            if arch == 768:
+                return {}
+            raise
+        output = results[0][1]
+        for _, tree in results[1:]:
+            _merge_trees(output, tree)
+        return output
+    finally:
+        _close_handles(backend, open_reg)
+
+
+def _prefixes_to_open(paths: List[List[str]]) -> List[List[str]]:
+    """
+    Return the parent keys shared by at least two of the given paths, shortest first,
+    skipping intermediate keys that don't branch
+    """
+    counts = {}  # type: Dict[tuple, int]
+    originals = {}  # type: Dict[tuple, List[str]]
+    for parts in paths:
+        lowered_parts = tuple(part.lower() for part in parts)
+        for index in range(1, len(parts)):
+            counts[lowered_parts[:index]] = counts.get(lowered_parts[:index], 0) + 1
+            originals.setdefault(lowered_parts[:index], parts[:index])
+    shared = [prefix for prefix, count in counts.items() if count > 1]
+    # A parent key used by exactly the same queries as one of its subkeys doesn't branch
+    dominated = set(
+        prefix[:-1] for prefix in shared if counts.get(prefix[:-1]) == counts[prefix]
+    )
+    branching = [originals[prefix] for prefix in shared if prefix not in dominated]
+    return sorted(branching, key=len)
+
+
+def query_many(
+    queries: List[tuple],
+    last_modified: bool = False,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
+) -> List[dict]:
+    """
+    Run many registry value queries in one pass
+
+    Queries are grouped per hive and registry view, parent keys shared by multiple queries
+    are opened once and every key is opened relative to its nearest opened parent
+
+    :param queries: list of (hive, key, value names, arch) tuples, arch being optional (defaults to 0)
+                    value names may be a list of names, a single name, or None for all values of the key
+                    arch may be KEY_WOW64_64KEY | KEY_WOW64_32KEY, in which case first view where key exists is used
+    :param last_modified: add key last modification date to results
+    :param backend: optional registry backend, defaults to module wide backend
+                    if backend is a RegistrySession, its cached handles are reused and kept
+    :param computer: remote computer name (remote registry service), None for local registry
+    :return: list of results in the same order as queries, ie
+             {"hive": hive, "key": key, "arch": arch, "values": {name: value}, "missing": [names], "error": None}
+             where error is a string when the key could not be opened
+    """
+    backend = get_backend(backend)
+    if isinstance(backend, RegistrySession):
+        session = backend
+        own_session = False
+    else:
+        session = RegistrySession(backend)
+        own_session = True
+
+    results = []
+    pending = []
+    for index, query in enumerate(queries):
+        hive, key, names = query[:3]
+        arch = query[3] if len(query) > 3 else 0
+        if isinstance(names, str):
+            names = [names]
+        results.append(
+            {
+                "hive": hive,
+                "key": key,
+                "arch": arch,
+                "values": {},
+                "missing": [],
+                "error": None,
+            }
+        )
+        views = [KEY_WOW64_64KEY, KEY_WOW64_32KEY] if arch == 768 else [arch]
+        pending.append((index, _split_path(key), names, views))
+
+    try:
+        # Each round tries the next registry view for queries whose key was not found
+        while pending:
+            groups = {}  # type: Dict[tuple, list]
+            for item in pending:
+                groups.setdefault((results[item[0]]["hive"], item[3][0]), []).append(
+                    item
+                )
+            pending = []
+
+            for (hive, view), items in groups.items():
+                root = session.connect(computer, hive)
+                parents = []
+                try:
+                    for prefix in _prefixes_to_open([item[1] for item in items]):
+                        try:
+                            parents.append(
+                                session.open_key(
+                                    root, "\\".join(prefix), KEY_READ | view
+                                )
+                            )
+                        except OSError:
+                            pass
+                    for index, parts, names, views in sorted(
+                        items, key=lambda item: [part.lower() for part in item[1]]
+                    ):
+                        result = results[index]
+                        try:
+                            handle = session.open_key(
+                                root, "\\".join(parts), KEY_READ | view
+                            )
+                        except OSError as exc:
+                            if len(views) > 1:
+                                pending.append((index, parts, names, views[1:]))
+                            else:
+                                result["error"] = (
+                                    "Cannot query registry key [%s]. %s"
+                                    % (
+                                        result["key"],
+                                        exc,
+                                    )
+                                )
+                            continue
+                        try:
+                            if names is None:
+                                for value_index in range(session.query_info(handle)[1]):
+                                    name, value, _ = session.enum_value(
+                                        handle, value_index
+                                    )
+                                    result["values"][name] = value
+                            else:
+                                for name in names:
+                                    try:
+                                        result["values"][name] = session.query_value(
+                                            handle, name
+                                        )[0]
+                                    except (FileNotFoundError, TypeError):
+                                        result["missing"].append(name)
+                            if last_modified:
+                                result["last_modified"] = windows_ticks_to_date(
+                                    session.query_info(handle)[2]
+                                )
+                        except OSError as exc:
+                            result["error"] = "Cannot query registry key [%s]. %s" % (
+                                result["key"],
+                                exc,
+                            )
+                        finally:
+                            session.close_key(handle)
+                finally:
+                    for parent in parents:
+                        session.close_key(parent)
+    finally:
+        if own_session:
+            session.close()
+    return results
+
+
+class RegistryBatch:
+    """
+    Registry writes collected and applied together
 
-    global OPEN_REGISTRY_HANDLE
+    Writes are grouped per key, so every key is opened, or created with its missing parents, only once
+    Keys are processed in the order of their first write, and writes of a key in the order they were added
+    When a write fails, changes already applied are undone in reverse order, keys that were created
+    are deleted again, and the error is raised
 
-    def _get_keys(
-        hive: int, key: str, arch: int, recursion_level: int, filter_on_names: List[str]
+    with RegistryBatch() as batch:
+        batch.set_value(HKEY_LOCAL_MACHINE, r"SOFTWARE\\Vendor\\App", "Version", "1.0")
+        batch.delete_value(HKEY_LOCAL_MACHINE, r"SOFTWARE\\Vendor\\App", "Obsolete")
+    """
+
+    def __init__(
+        self,
+        backend: RegistryBackend = None,
+        computer: Optional[str] = None,
+        rollback: bool = True,
     ):
-        global OPEN_REGISTRY_HANDLE
+        """
+        :param backend: optional registry backend, defaults to module wide backend
+        :param computer: remote computer name (remote registry service), None for local registry
+        :param rollback: keep an undo log, so applied changes are undone when a write fails or by rollback()
+        """
+        self.backend = get_backend(backend)
+        self.computer = computer
+        self.rollback_on_error = rollback
+        # (hive, lowercase key, view): (key, [operations])
+        self._groups = OrderedDict()  # type: OrderedDict
+        # Changes applied by last apply(), in order
+        self._undo = []  # type: List[tuple]
+        self.stats = {"keys": 0, "created_keys": 0, "writes": 0, "rolled_back": 0}
+        # Changes that could not be undone, as {"key", "name", "error"} dicts
+        self.rollback_errors = []  # type: List[dict]
+
+    def __enter__(self) -> "RegistryBatch":
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type is None:
+            self.apply()
+
+    def __len__(self) -> int:
+        return sum(len(operations) for _, operations in self._groups.values())
+
+    def _add(self, hive: int, key: str, arch: int, operation: Optional[tuple]) -> None:
+        # 768 = 0 | KEY_WOW64_64KEY | KEY_WOW64_32KEY (where 0 = default)
+        views = [KEY_WOW64_64KEY, KEY_WOW64_32KEY] if arch == 768 else [arch]
+        for view in views:
+            group_key = (hive, "\\".join(_split_path(key)).lower(), view)
+            try:
+                _, operations = self._groups[group_key]
+            except KeyError:
+                operations = []
+                self._groups[group_key] = (key, operations)
+            if operation is not None:
+                operations.append(operation)
 
+    def create_key(self, hive: int, key: str, arch: int = 0) -> None:
+        """
+        Create key and its missing parents
+        """
+        self._add(hive, key, arch, None)
+
+    def set_value(
+        self,
+        hive: int,
+        key: str,
+        name: Optional[str],
+        value,
+        value_type: int = None,
+        arch: int = 0,
+    ) -> None:
+        """
+        Create or replace a value, creating its key when needed
+        value_type is guessed from python type when omitted
+        """
+        if value_type is None:
+            value_type = guess_value_type(value)
+        self._add(hive, key, arch, ("set", name, value, value_type))
+
+    def set_values(
+        self, hive: int, key: str, values: Union[dict, List[dict]], arch: int = 0
+    ) -> None:
+        """
+        Create or replace values of a key, given as {name: value} or as get_values() like
+        [{"name": x, "value": y, "type": z}] lists where type is optional
+        """
+        if isinstance(values, dict):
+            values = [{"name": name, "value": value} for name, value in values.items()]
+        for value in values:
+            self.set_value(
+                hive, key, value["name"], value["value"], value.get("type"), arch
+            )
+
+    def delete_value(
+        self, hive: int, key: str, name: Optional[str], arch: int = 0
+    ) -> None:
+        """
+        Delete a value, missing values are ignored
+        """
+        self._add(hive, key, arch, ("delete", name))
+
+    def _session(self) -> RegistrySession:
+        if isinstance(self.backend, RegistrySession):
+            return self.backend
+        return RegistrySession(self.backend, self.computer)
+
+    def _open(self, session: RegistrySession, hive: int, key: str, view: int):
+        open_reg = session.connect(self.computer, hive)
+        access = KEY_ALL_ACCESS | view
         try:
-            if not OPEN_REGISTRY_HANDLE:
-                OPEN_REGISTRY_HANDLE = ConnectRegistry(None, hive)
-            open_key = OpenKey(OPEN_REGISTRY_HANDLE, key, 0, KEY_READ | arch)
-            subkey_count, value_count, _ = QueryInfoKey(open_key)
-
-            output = {}
-            values = []
-            for index in range(value_count):
-                name, value, type = EnumValue(open_key, index)
-                if isinstance(filter_on_names, list) and name not in filter_on_names:
-                    pass
-                else:
-                    if last_modified:
-                        last_modified_date = windows_ticks_to_date(
-                            QueryInfoKey(open_key)[2]
-                        )
-                        data = {
-                            "name": name,
-                            "value": value,
-                            "type": type,
-                            "last_modified": last_modified_date,
-                        }
-                    else:
-                        data = {"name": name, "value": value, "type": type}
-                    values.append(data)
-            if not values == []:
-                output[""] = values
+            return session.open_key(open_reg, key, access)
+        except FileNotFoundError:
+            pass
+        # Create missing keys one level at a time, so we know which ones to delete on rollback
+        handle = None
+        parts = []
+        try:
+            for part in _split_path(key):
+                parts.append(part)
+                path = "\\".join(parts)
+                try:
+                    subkey = session.open_key(open_reg, path, access)
+                except FileNotFoundError:
+                    subkey = session.create_key(open_reg, path, access)
+                    if self.rollback_on_error:
+                        self._undo.append(("key", hive, path, view))
+                    self.stats["created_keys"] += 1
+                _close_handles(session, handle)
+                handle = subkey
+        except Exception:
+            # Caller supplied sessions would keep the parent level pinned otherwise
+            _close_handles(session, handle)
+            raise
+        return handle
 
-            if recursion_level > 0:
-                for subkey_index in range(subkey_count):
-                    try:
-                        subkey_name = EnumKey(open_key, subkey_index)
-                        sub_values = get_keys(
-                            hive=0,
-                            key=key + "\\" + subkey_name,
-                            arch=arch,
-                            recursion_level=recursion_level - 1,
-                            filter_on_names=filter_on_names,
-                            last_modified=last_modified,
-                        )
-                        output[subkey_name] = sub_values
-                    except FileNotFoundError:
-                        pass
+    def _write(
+        self,
+        session: RegistrySession,
+        handle,
+        hive: int,
+        key: str,
+        view: int,
+        operation: tuple,
+    ) -> None:
+        name = operation[1]
+        previous = None
+        if self.rollback_on_error or operation[0] == "delete":
+            try:
+                previous = session.query_value(handle, name)
+            except FileNotFoundError:
+                if operation[0] == "delete":
+                    return
+        if operation[0] == "set":
+            session.set_value(handle, name, operation[2], operation[3])
+        else:
+            session.delete_value(handle, name)
+        # Without rollback, previous values of set operations aren't read, so no undo log is kept
+        if self.rollback_on_error:
+            self._undo.append(("value", hive, key, view, name, previous))
+        self.stats["writes"] += 1
 
-            return output
+    def apply(self) -> dict:
+        """
+        Apply pending writes
 
-        except (FileNotFoundError, TypeError, OSError) as exc:
-            raise FileNotFoundError("Cannot query registry key [%s]. %s" % (key, exc))
+        :return: {"keys": keys written, "created_keys": keys created, "writes": values set or deleted, "rolled_back": 0}
+        """
+        if self.backend.read_only:
+            raise PermissionError(
+                "Registry backend %s is read only" % type(self.backend).__name__
+            )
+        groups = self._groups
+        self._groups = OrderedDict()
+        self._undo = []
+        self.stats = {"keys": 0, "created_keys": 0, "writes": 0, "rolled_back": 0}
+        self.rollback_errors = []
+        session = self._session()
+        try:
+            for (hive, _, view), (key, operations) in groups.items():
+                handle = self._open(session, hive, key, view)
+                self.stats["keys"] += 1
+                try:
+                    for operation in operations:
+                        self._write(session, handle, hive, key, view, operation)
+                finally:
+                    session.close_key(handle)
+        except Exception:
+            # Invalid data (ie str as REG_DWORD) raises TypeError or ValueError, not only OSError
+            if self.rollback_on_error:
+                self._rollback(session)
+            raise
+        finally:
+            if session is not self.backend:
+                session.close()
+        return self.stats
 
-    # 768 = 0 | KEY_WOW64_64KEY | KEY_WOW64_32KEY (where 0 = default)
-    if arch == 768:
-        result = {}
-        for _arch in [KEY_WOW64_64KEY, KEY_WOW64_32KEY]:
+    def rollback(self) -> int:
+        """
+        Undo changes of last apply() call
+
+        :return: number of changes undone, changes that failed are listed in rollback_errors
+        """
+        if not self.rollback_on_error:
+            raise RuntimeError(
+                "RegistryBatch was created with rollback=False, no undo log was kept"
+            )
+        session = self._session()
+        try:
+            return self._rollback(session)
+        finally:
+            if session is not self.backend:
+                session.close()
+
+    def _rollback(self, session: RegistrySession) -> int:
+        while self._undo:
+            change = self._undo.pop()
+            hive, key, view = change[1:4]
+            open_reg = session.connect(self.computer, hive)
+            access = KEY_ALL_ACCESS | view
+            handle = None
             try:
-                if combine:
-                    result.update(
-                        _get_keys(hive, key, _arch, recursion_level, filter_on_names)
-                    )
+                if change[0] == "key":
+                    parts = _split_path(key)
+                    handle = session.open_key(open_reg, "\\".join(parts[:-1]), access)
+                    session.delete_key(handle, parts[-1])
                 else:
-                    return _get_keys(hive, key, _arch, recursion_level, filter_on_names)
-            except FileNotFoundError:
-                pass
-        return result
-    else:
-        return _get_keys(hive, key, arch, recursion_level, filter_on_names)
+                    name, previous = change[4:]
+                    handle = session.open_key(open_reg, key, access)
+                    if previous is None:
+                        session.delete_value(handle, name)
+                    else:
+                        session.set_value(handle, name, *previous)
+                self.stats["rolled_back"] += 1
+            except OSError as exc:
+                self.rollback_errors.append(
+                    {
+                        "key": key,
+                        "name": change[4] if change[0] == "value" else None,
+                        "error": str(exc),
+                    }
+                )
+            finally:
+                _close_handles(session, handle)
+        return self.stats["rolled_back"]
 
 
-def delete_sub_key(root_key: int, current_key: str, arch: int = 0) -> None:
+def set_value(
+    hive: int,
+    key: str,
+    name: Optional[str],
+    value,
+    value_type: int = None,
+    arch: int = 0,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
+) -> None:
     """
+    Create or replace a registry value, creating its key when needed
 
-    :param root_key: winreg registry root key constant
-    :param current_key:
-    :param arch:
+    :param hive: registry hive (windows.registry.HKEY_LOCAL_MACHINE...)
+    :param key: which registry key the value belongs to
+    :param name: value name, None or empty string being the default value
+    :param value: value data
+    :param value_type: registry value type (REG_SZ, REG_DWORD...), guessed from python type when omitted
+    :param arch: which registry architecture we seek (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+                 768 writes the value in both views
+    :param backend: optional registry backend, defaults to module wide backend
+    :param computer: remote computer name (remote registry service), None for local registry
     :return:
     """
+    batch = RegistryBatch(backend, computer)
+    batch.set_value(hive, key, name, value, value_type, arch)
+    batch.apply()
+
 
-    def _delete_sub_key(root_key: int, current_key: str, arch: int) -> NoReturn:
-        open_key = OpenKey(root_key, current_key, 0, KEY_ALL_ACCESS | arch)
-        info_key = QueryInfoKey(open_key)
-        for _ in range(0, info_key[0]):
-            # NOTE:: This code is to delete the key and all sub_keys.
-            # If you just want to walk through them, then
-            # you should pass x to EnumKey. sub_key = EnumKey(open_key, x)
-            # Deleting the sub_key will change the sub_key count used by EnumKey.
-            # We must always pass 0 to EnumKey so we
-            # always get back the new first sub_key.
-            sub_key = EnumKey(open_key, 0)
+def set_values(
+    hive: int,
+    key: str,
+    values: Union[dict, List[dict]],
+    arch: int = 0,
+    rollback: bool = True,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
+) -> dict:
+    """
+    Create or replace many values of a key, opening the key once
+
+    :param hive: registry hive (windows.registry.HKEY_LOCAL_MACHINE...)
+    :param key: which registry key the values belong to
+    :param values: {name: value} dict, or [{"name": x, "value": y, "type": z}] list where type is optional
+    :param arch: which registry architecture we seek (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+                 768 writes the values in both views
+    :param rollback: restore previous values when a write fails
+    :param backend: optional registry backend, defaults to module wide backend
+    :param computer: remote computer name (remote registry service), None for local registry
+    :return: stats, see RegistryBatch.apply()
+    """
+    batch = RegistryBatch(backend, computer, rollback)
+    batch.set_values(hive, key, values, arch)
+    return batch.apply()
+
+
+def create_keys(
+    hive: int,
+    keys: Union[str, List[str]],
+    arch: int = 0,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
+) -> dict:
+    """
+    Create registry keys and their missing parents, existing keys are left untouched
+
+    :param hive: registry hive (windows.registry.HKEY_LOCAL_MACHINE...)
+    :param keys: key or list of keys to create
+    :param arch: which registry architecture we seek (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+    :param backend: optional registry backend, defaults to module wide backend
+    :param computer: remote computer name (remote registry service), None for local registry
+    :return: stats, see RegistryBatch.apply()
+    """
+    if isinstance(keys, str):
+        keys = [keys]
+    batch = RegistryBatch(backend, computer)
+    for key in keys:
+        batch.create_key(hive, key, arch)
+    return batch.apply()
+
+
+def delete_tree(
+    hive: int,
+    key: str,
+    arch: int = 0,
+    dry_run: bool = False,
+    progress: Callable[[int, str], None] = None,
+    native: bool = False,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
+) -> dict:
+    """
+    Delete a registry key with all its subkeys and values
+
+    The subtree is enumerated once, then keys are deleted bottom-up through their already open parent handle
+    Errors don't stop the deletion, they are reported and keys holding undeletable subkeys are kept
+
+    :param hive: registry hive (windows.registry.HKEY_LOCAL_MACHINE...)
+    :param key: key to delete
+    :param arch: which registry architecture we seek (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+                 768 deletes the key in both views
+    :param dry_run: only list keys that would be deleted, in deletion order
+                    With arch 768, keys that aren't redirected are listed once per view
+    :param progress: optional callback, called as progress(number of keys deleted so far, deleted key path)
+    :param native: try the backend tree deletion call first (RegDeleteTree on Windows), falling back
+                   to bottom-up deletion when unavailable. Native deletions only count the top key
+    :param backend: optional registry backend, defaults to module wide backend
+    :param computer: remote computer name (remote registry service), None for local registry
+    :return: {"deleted": number of keys, "keys": [deleted key paths, bottom-up], "errors": [{"key", "error"}],
+              "native": whether the native tree deletion was used}
+    """
+    backend = get_backend(backend)
+    parts = _split_path(key)
+    if not parts:
+        raise PermissionError("Cannot delete registry hive root")
+    if backend.read_only and not dry_run:
+        raise PermissionError(
+            "Registry backend %s is read only" % type(backend).__name__
+        )
+    parent_key = "\\".join(parts[:-1])
+    name = parts[-1]
+    result = {"deleted": 0, "keys": [], "errors": [], "native": False}
+
+    def _deleted(path: str) -> None:
+        result["deleted"] += 1
+        result["keys"].append(path)
+        if progress is not None:
+            progress(result["deleted"], path)
+
+    def _subkey_names(handle) -> List[str]:
+        names = []
+        for index in range(backend.query_info(handle)[0]):
             try:
-                DeleteKey(open_key, sub_key)
+                names.append(backend.enum_key(handle, index))
             except OSError:
-                _delete_sub_key(root_key, "\\".join([current_key, sub_key]), arch)
-                # No extra delete here since each call
-                # to delete_sub_key will try to delete itself when its empty.
+                break
+        return names
 
-        DeleteKey(open_key, "")
-        open_key.Close()
-        return
+    def _delete_tree(open_reg, view: int) -> None:
+        access = KEY_ALL_ACCESS | view
+        parent = None
+        # Stack of [handle, path, subkey names not visited yet]
+        stack = []
+        try:
+            try:
+                # Deleting a key only needs rights on the key itself, not on its parent
+                parent = backend.open_key(open_reg, parent_key, KEY_READ | view)
+                root = backend.open_key(parent, name, access)
+            except OSError as exc:
+                raise FileNotFoundError(
+                    "Cannot open registry key [%s]. %s" % (key, exc)
+                )
+            stack.append([root, key, []])
+            if native and not dry_run:
+                try:
+                    # The tree is emptied through its own handle, which has the rights RegDeleteTree needs
+                    backend.delete_tree(root, "")
+                    backend.delete_key(parent, name)
+                    result["native"] = True
+                    _deleted(key)
+                    return
+                except NotImplementedError:
+                    pass
+                except OSError:
+                    # ie access denied on a subkey, find out which keys can be deleted
+                    pass
+            stack[-1][2] = _subkey_names(root)
+            while stack:
+                handle, path, names = stack[-1]
+                if names:
+                    # Subkeys are deleted in reverse enumeration order, so indexes of the remaining ones don't move
+                    subkey_name = names.pop()
+                    subkey_path = path + "\\" + subkey_name
+                    if not dry_run:
+                        # Leaf keys, usually most of a tree, are deleted without being opened
+                        try:
+                            backend.delete_key(handle, subkey_name)
+                            _deleted(subkey_path)
+                            continue
+                        except OSError:
+                            pass
+                    try:
+                        subkey = backend.open_key(handle, subkey_name, access)
+                    except OSError as exc:
+                        result["errors"].append({"key": subkey_path, "error": str(exc)})
+                        continue
+                    try:
+                        stack.append([subkey, subkey_path, _subkey_names(subkey)])
+                    except OSError as exc:
+                        backend.close_key(subkey)
+                        result["errors"].append({"key": subkey_path, "error": str(exc)})
+                    continue
+                stack.pop()
+                backend.close_key(handle)
+                if dry_run:
+                    _deleted(path)
+                    continue
+                try:
+                    backend.delete_key(
+                        stack[-1][0] if stack else parent, path.rsplit("\\", 1)[-1]
+                    )
+                    _deleted(path)
+                except OSError as exc:
+                    result["errors"].append({"key": path, "error": str(exc)})
+        finally:
+            _close_handles(
+                backend, *[handle for handle, _, _ in reversed(stack)], parent
+            )
 
-    # 768 = 0 | KEY_WOW64_64KEY | KEY_WOW64_32KEY (where 0 = default)
-    if arch == 768:
-        for _arch in [KEY_WOW64_64KEY, KEY_WOW64_32KEY]:
-            _delete_sub_key(root_key, current_key, _arch)
-    else:
-        _delete_sub_key(root_key, current_key, arch)
+    try:
+        open_reg = backend.connect(computer, hive)
+    except OSError as exc:
+        raise FileNotFoundError(
+            "Cannot connect to registry hive [%s]. %s" % (hive, exc)
+        )
+    try:
+        # 768 = 0 | KEY_WOW64_64KEY | KEY_WOW64_32KEY (where 0 = default)
+        if arch == 768:
+            found = False
+            for view in [KEY_WOW64_64KEY, KEY_WOW64_32KEY]:
+                try:
+                    _delete_tree(open_reg, view)
+                    found = True
+                except FileNotFoundError:
+                    # Key isn't redirected, and was already deleted by the other view
+                    pass
+            if not found:
+                raise FileNotFoundError("Cannot open registry key [%s]" % key)
+        else:
+            _delete_tree(open_reg, arch)
+        return result
+    finally:
+        backend.close_key(open_reg)
+
+
+def delete_sub_key(
+    root_key: int, current_key: str, arch: int = 0, backend: RegistryBackend = None
+) -> None:
+    """
+    Delete a registry key with all its subkeys, raises on first error
+    See delete_tree() for progress and dry run options
+
+    :param root_key: winreg registry root key constant
+    :param current_key: key to delete
+    :param arch: which registry architecture we seek (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+    :param backend: optional registry backend, defaults to module wide backend
+    :return:
+    """
+    result = delete_tree(root_key, current_key, arch, backend=backend)
+    if result["errors"]:
+        error = result["errors"][0]
+        raise OSError(
+            "Cannot delete registry key [%s]. %s" % (error["key"], error["error"])
+        )
@@ -0,0 +1,343 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+Asyncio facade for the registry module
+
+Registry calls are blocking, so every function here runs its windows_tools.registry counterpart
+on a dedicated, bounded thread pool and awaits it, keeping the event loop responsive.
+Many queries can be gathered concurrently, at most AIO_WORKERS of them running at a time.
+
+Cancelling the awaiting task stops the registry call before it opens its next key, so a large
+scan doesn't keep a worker busy after nobody waits for it anymore.
+
+Usage:
+    import asyncio
+    from windows_tools import registry
+    from windows_tools.registry import aio
+
+    async def main():
+        product_name, uninstall = await asyncio.gather(
+            aio.get_value(registry.HKEY_LOCAL_MACHINE, r"SOFTWARE\\Microsoft\\Windows NT\\CurrentVersion", "ProductName"),
+            aio.get_values(registry.HKEY_LOCAL_MACHINE, r"SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Uninstall", names=["DisplayName"]),
+        )
+        async for path, values, last_write in aio.walk_keys(registry.HKEY_LOCAL_MACHINE, r"SOFTWARE\\Microsoft"):
+            print(path)
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, List, Optional, Tuple
+
+from windows_tools import registry
+from windows_tools.registry import (
+    RegistryBackend,
+    RegistrySession,
+    get_backend,
+    KEY_READ,
+)
+
+# Max registry calls running at the same time
+AIO_WORKERS = 4
+# Keys read per worker round trip by walk_keys()
+WALK_BATCH_SIZE = 64
+
+_EXECUTOR = None  # type: Optional[ThreadPoolExecutor]
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def set_executor(executor: Optional[ThreadPoolExecutor]) -> None:
+    """
+    Set the thread pool used by this module, None restores the default AIO_WORKERS pool
+    """
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        _EXECUTOR = executor
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=AIO_WORKERS)
+        return _EXECUTOR
+
+
+class CancellableBackend(RegistryBackend):
+    """
+    Registry backend wrapper raising asyncio.CancelledError on the next key opening once cancelled
+    Registry functions close their handles on the way out, like on any other error
+    """
+
+    def __init__(self, backend: RegistryBackend, cancelled: threading.Event = None):
+        self.backend = backend
+        self.read_only = backend.read_only
+        self.cancelled = cancelled or threading.Event()
+
+    def _check(self) -> None:
+        if self.cancelled.is_set():
+            raise asyncio.CancelledError()
+
+    def connect(self, computer: Optional[str], hive: int):
+        self._check()
+        return self.backend.connect(computer, hive)
+
+    def open_key(self, handle, sub_key: str, access: int = KEY_READ):
+        self._check()
+        return self.backend.open_key(handle, sub_key, access)
+
+    def close_key(self, handle) -> None:
+        self.backend.close_key(handle)
+
+    def enum_key(self, handle, index: int) -> str:
+        return self.backend.enum_key(handle, index)
+
+    def enum_value(self, handle, index: int) -> Tuple[str, object, int]:
+        return self.backend.enum_value(handle, index)
+
+    def query_value(self, handle, name: Optional[str]) -> Tuple[object, int]:
+        return self.backend.query_value(handle, name)
+
+    def query_info(self, handle) -> Tuple[int, int, int]:
+        return self.backend.query_info(handle)
+
+
+class CancellableSession(RegistrySession):
+    """
+    View of a RegistrySession sharing its connections and cached handles, so registry functions still
+    see a session and reuse it, only its wrapped backend being cancellable
+    The session stays open, it is closed by its owner
+    """
+
+    def __init__(self, session: RegistrySession, cancelled: threading.Event = None):
+        self.__dict__.update(session.__dict__)
+        self.backend = CancellableBackend(session.backend, cancelled)
+
+    @property
+    def cancelled(self) -> threading.Event:
+        return self.backend.cancelled
+
+
+def _cancellable(backend: RegistryBackend = None) -> RegistryBackend:
+    backend = get_backend(backend)
+    if isinstance(backend, RegistrySession):
+        return CancellableSession(backend)
+    return CancellableBackend(backend)
+
+
+async def _run(function: Callable, *args, backend: RegistryBackend = None, **kwargs):
+    """
+    Run a registry function on the executor, stopping it when the awaiting task gets cancelled
+    """
+    loop = asyncio.get_event_loop()
+    backend = _cancellable(backend)
+    future = loop.run_in_executor(
+        _get_executor(), partial(function, *args, backend=backend, **kwargs)
+    )
+    try:
+        return await future
+    except asyncio.CancelledError:
+        backend.cancelled.set()
+        raise
+
+
+async def get_value(
+    hive: int,
+    key: str,
+    value: Optional[str],
+    arch: int = 0,
+    last_modified: bool = False,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
+):
+    """
+    Awaitable windows_tools.registry.get_value()
+    """
+    return await _run(
+        registry.get_value,
+        hive,
+        key,
+        value,
+        arch,
+        last_modified,
+        backend=backend,
+        computer=computer,
+    )
+
+
+async def get_values(
+    hive: int,
+    key: str,
+    names: List[str],
+    arch: int = 0,
+    combine: bool = False,
+    last_modified: bool = False,
+    backend: RegistryBackend = None,
+    compact: bool = False,
+    computer: Optional[str] = None,
+) -> list:
+    """
+    Awaitable windows_tools.registry.get_values()
+    """
+    return await _run(
+        registry.get_values,
+        hive,
+        key,
+        names,
+        arch,
+        combine,
+        last_modified,
+        backend=backend,
+        compact=compact,
+        computer=computer,
+    )
+
+
+async def get_keys(
+    hive: int,
+    key: str,
+    arch: int = 0,
+    recursion_level: int = 1,
+    filter_on_names: List[str] = None,
+    combine: bool = False,
+    last_modified: bool = False,
+    backend: RegistryBackend = None,
+    compact: bool = False,
+    computer: Optional[str] = None,
+) -> dict:
+    """
+    Awaitable windows_tools.registry.get_keys()
+    """
+    return await _run(
+        registry.get_keys,
+        hive,
+        key,
+        arch,
+        recursion_level,
+        filter_on_names,
+        combine,
+        last_modified,
+        backend=backend,
+        compact=compact,
+        computer=computer,
+    )
+
+
+async def query_many(
+    queries: list,
+    last_modified: bool = False,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
+) -> List[dict]:
+    """
+    Awaitable windows_tools.registry.query_many()
+    """
+    return await _run(
+        registry.query_many,
+        queries,
+        last_modified,
+        backend=backend,
+        computer=computer,
+    )
+
+
+class _AsyncWalk:
+    """
+    Async iterator over windows_tools.registry.walk_keys() results
+    Keys are read by batches on the executor, the walk stops when the iterator is closed or garbage collected
+    """
+
+    def __init__(self, batch_size: int, backend: RegistryBackend, **kwargs):
+        self._backend = _cancellable(backend)
+        self._walker = registry.walk_keys(backend=self._backend, **kwargs)
+        self._batch_size = batch_size
+        self._batch = []  # type: list
+        self._done = False
+        # The walker runs on worker threads, one call at a time
+        self._lock = threading.Lock()
+
+    def __aiter__(self) -> "_AsyncWalk":
+        return self
+
+    def _read_batch(self) -> list:
+        batch = []
+        with self._lock:
+            for item in self._walker:
+                batch.append(item)
+                if len(batch) >= self._batch_size:
+                    break
+        return batch
+
+    def _close(self) -> None:
+        with self._lock:
+            self._walker.close()
+
+    async def __anext__(self) -> Tuple[str, list, int]:
+        if not self._batch and not self._done:
+            loop = asyncio.get_event_loop()
+            try:
+                self._batch = await loop.run_in_executor(
+                    _get_executor(), self._read_batch
+                )
+            except asyncio.CancelledError:
+                self._backend.cancelled.set()
+                raise
+            self._batch.reverse()
+            self._done = len(self._batch) < self._batch_size
+        if not self._batch:
+            raise StopAsyncIteration
+        return self._batch.pop()
+
+    async def aclose(self) -> None:
+        """
+        Stop walking and close registry handles
+        """
+        self._done = True
+        self._batch = []
+        self._backend.cancelled.set()
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(_get_executor(), self._close)
+
+    async def __aenter__(self) -> "_AsyncWalk":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+
+def walk_keys(
+    hive: int,
+    key: str,
+    max_depth: Optional[int] = None,
+    filter_on_names: List[str] = None,
+    arch: int = 0,
+    backend: RegistryBackend = None,
+    compact: bool = False,
+    computer: Optional[str] = None,
+    batch_size: int = WALK_BATCH_SIZE,
+) -> _AsyncWalk:
+    """
+    Async iterator version of windows_tools.registry.walk_keys()
+    Use it as an async context manager, or call aclose(), to release handles when stopping early
+
+        async with aio.walk_keys(hive, key) as walker:
+            async for path, values, last_write in walker:
+                ...
+
+    :param batch_size: keys read per worker round trip
+    """
+    return _AsyncWalk(
+        batch_size,
+        backend,
+        hive=hive,
+        key=key,
+        max_depth=max_depth,
+        filter_on_names=filter_on_names,
+        arch=arch,
+        compact=compact,
+        computer=computer,
+    )
@@ -0,0 +1,705 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+Registry subtree export and import
+
+Subtrees are exported while they are walked, key by key, either as standard .reg files
+(Windows Registry Editor Version 5.00, UTF-16 LE, as written by regedit / reg export)
+or as a compact length-prefixed binary format, much faster to load than .reg text.
+
+Exported files are read back as a stream of key records, which can be imported into a registry
+backend (the live registry by default) or loaded into a plain get_keys() like tree, which
+MemoryBackend accepts as is.
+
+Binary format, little endian, keys being stored by blocks of up to BINARY_BLOCK_KEYS keys
+so they can be written and read back while streaming:
+    header: b"WTRB", format version (uint8)
+    block: tag 1 (uint8), key count (uint32), value count (uint32), block size (uint32), then sections,
+           each being a byte length (uint32) followed by its data:
+           - string table: key names, value names and strings of the block, utf-8, null separated
+           - per key: hive, key name index, value count (uint32)
+           - per key: parent key index in file (int32, -1 when the key name is a full path)
+           - per key: last write time in windows ticks (uint64)
+           - per value: type, value name index (uint32)
+           - string indexes (uint32) for REG_SZ, REG_EXPAND_SZ, REG_LINK values and REG_MULTI_SZ items
+           - string counts (uint32) for REG_MULTI_SZ values
+           - integers (uint64) for REG_DWORD, REG_DWORD_BIG_ENDIAN and REG_QWORD values
+           - raw data lengths (uint32), then raw data for any other value type
+    end: tag 0 (uint8)
+Each column is decoded at once, and keys are attached to their parent by index, so loading
+never parses nor looks up key paths.
+
+Usage:
+    from windows_tools import registry
+    from windows_tools.registry.export import export_reg, export_binary, import_file, load_tree
+
+    export_binary(registry.HKEY_LOCAL_MACHINE, r"SOFTWARE\\Vendor", "vendor.wtrb")
+    export_reg(registry.HKEY_LOCAL_MACHINE, r"SOFTWARE\\Vendor", "vendor.reg")
+    ...
+    backend = registry.MemoryBackend(load_tree("vendor.wtrb"))
+    import_file("vendor.reg")
+"""
+
+import gc
+import io
+import struct
+import sys
+from array import array
+from collections import deque
+from itertools import accumulate, compress, repeat
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from windows_tools.registry import (
+    HIVE_ALIASES,
+    HIVE_NAMES,
+    RegistryBackend,
+    RegistryBatch,
+    delete_tree,
+    encode_value_data,
+    walk_keys,
+    _parse_reg_value,
+    _read_reg_file_lines,
+    _split_reg_value_line,
+    REG_BINARY,
+    REG_DWORD,
+    REG_DWORD_BIG_ENDIAN,
+    REG_EXPAND_SZ,
+    REG_LINK,
+    REG_MULTI_SZ,
+    REG_NONE,
+    REG_QWORD,
+    REG_SZ,
+)
+
+BINARY_MAGIC = b"WTRB"
+BINARY_FORMAT_VERSION = 1
+# Keys per binary block, a block being kept in memory while written or read
+BINARY_BLOCK_KEYS = 4096
+REG_HEADER = "Windows Registry Editor Version 5.00"
+# Keys written per RegistryBatch by import_file()
+IMPORT_BATCH_KEYS = 500
+# regedit wraps hex data lines at 80 chars
+REG_LINE_LENGTH = 80
+
+_TAG_END = 0
+_TAG_BLOCK = 1
+_HEADER = struct.Struct("<4sB")
+_BLOCK = struct.Struct("<BIII")
+_SECTION = struct.Struct("<I")
+_BIG_ENDIAN = sys.byteorder == "big"
+_STRING_TYPES = (REG_SZ, REG_EXPAND_SZ, REG_LINK)
+_INTEGER_TYPES = (REG_DWORD, REG_DWORD_BIG_ENDIAN, REG_QWORD)
+
+# Key record: (hive, key path, last write windows ticks or None, [(name, value, type)] or None)
+# values are None for deleted keys, value and type are None for deleted values
+KeyRecord = Tuple[int, str, Optional[int], Optional[List[tuple]]]
+
+
+def _open_output(file: Union[str, BinaryIO]) -> Tuple[BinaryIO, bool]:
+    if isinstance(file, str):
+        return open(file, "wb"), True
+    return file, False
+
+
+def _escape_reg_string(string: str) -> str:
+    return string.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _format_hex(prefix: str, raw: bytes) -> str:
+    """
+    Format raw data as regedit does, hex bytes separated by commas with lines continued by a backslash
+    """
+    if not raw:
+        return prefix
+    hex_data = raw.hex()
+    pairs = [hex_data[index : index + 2] for index in range(0, len(hex_data), 2)]
+    lines = []
+    line = prefix
+    for index, pair in enumerate(pairs):
+        item = pair + ("," if index < len(pairs) - 1 else "")
+        if len(line) + len(item) > REG_LINE_LENGTH - 1:
+            lines.append(line + "\\")
+            line = "  "
+        line += item
+    lines.append(line)
+    return "\r\n".join(lines)
+
+
+def format_reg_value(name: Optional[str], value, value_type: int) -> str:
+    """
+    Format a value as a .reg file line
+    """
+    line = '"%s"=' % _escape_reg_string(name) if name else "@="
+    if (
+        value_type == REG_SZ
+        and isinstance(value, str)
+        and not any(char in value for char in "\r\n\x00")
+    ):
+        return line + '"%s"' % _escape_reg_string(value)
+    if value_type == REG_DWORD and isinstance(value, int):
+        return line + "dword:%08x" % value
+    raw = encode_value_data(value, value_type)
+    prefix = "hex:" if value_type == REG_BINARY else "hex(%x):" % value_type
+    return _format_hex(line + prefix, raw)
+
+
+def _walk_records(
+    hive: int,
+    key: str,
+    arch: int,
+    backend: Optional[RegistryBackend],
+    computer: Optional[str],
+) -> Iterator[KeyRecord]:
+    for path, values, last_write in walk_keys(
+        hive, key, arch=arch, backend=backend, compact=True, computer=computer
+    ):
+        yield hive, path, last_write, [
+            (value.name, value.value, value.type) for value in values
+        ]
+
+
+def write_reg(records, file: Union[str, BinaryIO]) -> int:
+    """
+    Write key records as a .reg file, returns number of keys written
+    """
+    output, owned = _open_output(file)
+    writer = io.TextIOWrapper(output, encoding="utf-16-le", newline="")
+    count = 0
+    try:
+        writer.write("\ufeff" + REG_HEADER + "\r\n")
+        for hive, path, _, values in records:
+            key_path = "\\".join(part for part in (HIVE_NAMES[hive], path) if part)
+            if values is None:
+                writer.write("\r\n[-%s]\r\n" % key_path)
+                continue
+            lines = ["", "[%s]" % key_path]
+            for name, value, value_type in values:
+                if value_type is None:
+                    lines.append('"%s"=-' % _escape_reg_string(name))
+                else:
+                    lines.append(format_reg_value(name, value, value_type))
+            writer.write("\r\n".join(lines) + "\r\n")
+            count += 1
+        writer.write("\r\n")
+        writer.flush()
+    finally:
+        writer.detach()
+        if owned:
+            output.close()
+    return count
+
+
+def _pack_section(data) -> bytes:
+    if isinstance(data, array):
+        if _BIG_ENDIAN:
+            data = array(data.typecode, data)
+            data.byteswap()
+        data = data.tobytes()
+    return _SECTION.pack(len(data)) + data
+
+
+class _BinaryBlock:
+    """
+    Columns of a binary block being written
+    Key names, value names and strings are stored once in a string table, and referenced by index
+    """
+
+    def __init__(self):
+        self.keys = array("I")  # hive, key name index, value count by key
+        self.parents = array("i")
+        self.last_writes = array("Q")
+        self.value_info = array("I")  # type, name index by value
+        self.strings = array("I")
+        self.multi_counts = array("I")
+        self.integers = array("Q")
+        self.raw_lengths = array("I")
+        self.raw = []  # type: List[bytes]
+        self.table = {}  # type: Dict[str, int]
+        self.key_count = 0
+        self.value_count = 0
+
+    def _index(self, string: str) -> int:
+        try:
+            return self.table[string]
+        except KeyError:
+            # Registry names and strings never contain null chars, which separate table strings
+            index = self.table[string.partition("\x00")[0]] = len(self.table)
+            return index
+
+    def add_key(self, hive: int, parent: int, name: str, last_write: int) -> None:
+        self.keys.extend((hive, self._index(name), 0))
+        self.parents.append(parent)
+        self.last_writes.append(last_write)
+        self.key_count += 1
+
+    def add_value(self, name: str, value, value_type: int) -> None:
+        self.value_info.extend((value_type, self._index(name)))
+        if value_type in _STRING_TYPES:
+            self.strings.append(self._index("" if value is None else str(value)))
+        elif value_type == REG_MULTI_SZ:
+            items = value or []
+            self.multi_counts.append(len(items))
+            self.strings.extend(self._index(str(item)) for item in items)
+        elif value_type in _INTEGER_TYPES:
+            self.integers.append(value or 0)
+        else:
+            raw = encode_value_data(value, value_type)
+            self.raw_lengths.append(len(raw))
+            self.raw.append(raw)
+        self.keys[-1] += 1
+        self.value_count += 1
+
+    def pack(self) -> bytes:
+        table = sorted(self.table, key=self.table.__getitem__)
+        sections = b"".join(
+            _pack_section(section)
+            for section in (
+                "\x00".join(table).encode("utf-8", "surrogatepass"),
+                self.keys,
+                self.parents,
+                self.last_writes,
+                self.value_info,
+                self.strings,
+                self.multi_counts,
+                self.integers,
+                self.raw_lengths,
+                b"".join(self.raw),
+            )
+        )
+        return (
+            _BLOCK.pack(_TAG_BLOCK, self.key_count, self.value_count, len(sections))
+            + sections
+        )
+
+
+def write_binary(records, file: Union[str, BinaryIO]) -> int:
+    """
+    Write key records in binary format, returns number of keys written
+    Keys are stored by name under their parent key index when the parent was written before, as walk_keys()
+    yields them, any other key being stored by its full path
+    Deleted keys and values can't be represented and are skipped
+    """
+    output, owned = _open_output(file)
+    # Key index in file by (hive, lowercase key path), -1 for keys only created as parents of a full path
+    indexes = {}  # type: Dict[Tuple[int, str], int]
+    block = _BinaryBlock()
+    count = 0
+    try:
+        output.write(_HEADER.pack(BINARY_MAGIC, BINARY_FORMAT_VERSION))
+        for hive, path, last_write, values in records:
+            if values is None:
+                continue
+            lowered_path = path.lower()
+            parent_path, _, name = lowered_path.rpartition("\\")
+            if not path or (hive, lowered_path) in indexes:
+                # Keys written again are merged into the existing one by their full path
+                parent = -1
+            else:
+                parent = indexes.get((hive, parent_path), -1)
+            if parent < 0:
+                name = path
+                parts = lowered_path.split("\\")
+                for index in range(1, len(parts)):
+                    indexes.setdefault((hive, "\\".join(parts[:index])), -1)
+            else:
+                name = path[len(parent_path) + 1 :] if parent_path else path
+            indexes[(hive, lowered_path)] = count
+            block.add_key(hive, parent, name, last_write or 0)
+            for value_name, value, value_type in values:
+                if value_type is not None:
+                    block.add_value(value_name or "", value, value_type)
+            count += 1
+            if block.key_count >= BINARY_BLOCK_KEYS:
+                output.write(block.pack())
+                block = _BinaryBlock()
+        if block.key_count:
+            output.write(block.pack())
+        output.write(bytes([_TAG_END]))
+    finally:
+        if owned:
+            output.close()
+    return count
+
+
+def export_reg(
+    hive: int,
+    key: str,
+    file: Union[str, BinaryIO],
+    arch: int = 0,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
+) -> int:
+    """
+    Export a registry subtree as a .reg file while walking it
+
+    :param hive: registry hive (windows.registry.HKEY_LOCAL_MACHINE...)
+    :param key: root key of the export
+    :param file: file path, or binary file object
+    :param arch: registry view (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+    :param backend: optional registry backend, defaults to module wide backend
+    :param computer: remote computer name (remote registry service), None for local registry
+    :return: number of keys exported
+    """
+    return write_reg(_walk_records(hive, key, arch, backend, computer), file)
+
+
+def export_binary(
+    hive: int,
+    key: str,
+    file: Union[str, BinaryIO],
+    arch: int = 0,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
+) -> int:
+    """
+    Export a registry subtree in binary format while walking it, see export_reg() for arguments
+    Unlike .reg files, binary exports keep key last write times
+    """
+    return write_binary(_walk_records(hive, key, arch, backend, computer), file)
+
+
+def iter_reg(path: str) -> Iterator[KeyRecord]:
+    """
+    Read key records from a .reg file, last write times being None
+    """
+    hive = None
+    key_path = None
+    values = None
+    for line in _read_reg_file_lines(path):
+        if not line or line.startswith(";"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            if key_path is not None:
+                yield hive, key_path, None, values
+            key_path = line[1:-1]
+            deleted = key_path.startswith("-")
+            hive_name, _, key_path = key_path.lstrip("-").partition("\\")
+            try:
+                hive = HIVE_ALIASES[hive_name.upper()]
+            except KeyError:
+                raise ValueError("Unknown hive [%s] in %s" % (hive_name, path))
+            values = None if deleted else []
+            if deleted:
+                yield hive, key_path, None, None
+                key_path = None
+        elif values is not None and (line.startswith('"') or line.startswith("@=")):
+            name, data = _split_reg_value_line(line)
+            # Default values are named "", as winreg enumerates them
+            name = name or ""
+            if data == "-":
+                values.append((name, None, None))
+            else:
+                value, value_type = _parse_reg_value(data)
+                if value == b"" and value_type in (REG_NONE, REG_BINARY):
+                    # Empty binary data reads as None, as winreg does
+                    value = None
+                values.append((name, value, value_type))
+    if key_path is not None:
+        yield hive, key_path, None, values
+
+
+def _split(items: list, lengths) -> List[list]:
+    """
+    Slice a flat list by item lengths
+    """
+    return [
+        items[end - length : end] for length, end in zip(lengths, accumulate(lengths))
+    ]
+
+
+def _read_blocks(path: str) -> Iterator[tuple]:
+    """
+    Read binary export blocks, as (hives, parents, last writes, key names, value counts,
+    value names, values, value types) columns, values being sliced by key value counts
+    """
+    with open(path, "rb") as file_handle:
+        magic, version = _HEADER.unpack(file_handle.read(_HEADER.size))
+        if magic != BINARY_MAGIC:
+            raise ValueError("%s is not a binary registry export" % path)
+        if version != BINARY_FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported binary registry export format version %s" % version
+            )
+        while True:
+            header = file_handle.read(_BLOCK.size)
+            if not header or header[0] == _TAG_END:
+                return
+            if len(header) < _BLOCK.size:
+                raise ValueError("Truncated binary registry export %s" % path)
+            _, key_count, value_count, size = _BLOCK.unpack(header)
+            data = file_handle.read(size)
+            if len(data) < size:
+                raise ValueError("Truncated binary registry export %s" % path)
+            sections = []
+            offset = 0
+            while offset < size:
+                (length,) = _SECTION.unpack_from(data, offset)
+                offset += _SECTION.size
+                sections.append(data[offset : offset + length])
+                offset += length
+            (
+                table,
+                keys,
+                parents,
+                last_writes,
+                value_info,
+                strings,
+                multi_counts,
+                integers,
+                raw_lengths,
+                raw,
+            ) = sections
+            lookup = table.decode("utf-8", "surrogatepass").split("\x00").__getitem__
+            keys = _unpack_array("I", keys)
+            value_info = _unpack_array("I", value_info)
+            value_types = value_info[0::2]
+            # Values are read from their type column through a reader per type
+            read_string = map(lookup, _unpack_array("I", strings)).__next__
+            read_multi_count = iter(_unpack_array("I", multi_counts)).__next__
+            readers = dict.fromkeys(_STRING_TYPES, read_string)
+            readers.update(
+                dict.fromkeys(
+                    _INTEGER_TYPES, iter(_unpack_array("Q", integers)).__next__
+                )
+            )
+            readers[REG_MULTI_SZ] = lambda: [
+                read_string() for _ in range(read_multi_count())
+            ]
+            read_raw = map(
+                io.BytesIO(raw).read, _unpack_array("I", raw_lengths)
+            ).__next__
+            # Empty binary data reads as None, as winreg does
+            readers[REG_NONE] = readers[REG_BINARY] = lambda: read_raw() or None
+            yield (
+                keys[0::3],
+                _unpack_array("i", parents),
+                _unpack_array("Q", last_writes),
+                list(map(lookup, keys[1::3])),
+                keys[2::3],
+                list(map(lookup, value_info[1::2])),
+                [read() for read in map(readers.get, value_types, repeat(read_raw))],
+                value_types,
+            )
+
+
+def _unpack_array(typecode: str, data: bytes) -> array:
+    items = array(typecode)
+    items.frombytes(data)
+    if _BIG_ENDIAN:
+        items.byteswap()
+    return items
+
+
+def iter_binary(path: str) -> Iterator[KeyRecord]:
+    """
+    Read key records from a binary export
+    """
+    # Key paths by key index in file, keys referencing their parent key index
+    paths = []  # type: List[str]
+    for hives, parents, last_writes, names, value_counts, *values in _read_blocks(path):
+        values = list(zip(*values))
+        offset = 0
+        for hive, parent, last_write, name, value_count in zip(
+            hives, parents, last_writes, names, value_counts
+        ):
+            if parent >= 0 and paths[parent]:
+                name = paths[parent] + "\\" + name
+            paths.append(name)
+            yield hive, name, last_write, values[offset : offset + value_count]
+            offset += value_count
+
+
+def iter_file(path: str) -> Iterator[KeyRecord]:
+    """
+    Read key records from a .reg file or a binary export, format being detected from file content
+    """
+    with open(path, "rb") as file_handle:
+        magic = file_handle.read(len(BINARY_MAGIC))
+    if magic == BINARY_MAGIC:
+        return iter_binary(path)
+    return iter_reg(path)
+
+
+def _load_binary_tree(path: str) -> Dict[int, dict]:
+    """
+    Load a binary export, keys referencing their parent node by index, without any path lookup
+    """
+    trees = {}  # type: Dict[int, dict]
+    nodes = []  # type: List[dict]
+    for hives, parents, _, names, value_counts, *values in _read_blocks(path):
+        values = [
+            {"name": name, "value": value, "type": value_type}
+            for name, value, value_type in zip(*values)
+        ]
+        key_values = _split(values, value_counts)
+        if min(parents, default=0) >= 0:
+            # Keys stored by name are new keys, so nodes and values are set without any merging,
+            # dict.__setitem__ being mapped over the whole block
+            block_nodes = [{} for _ in names]
+            nodes.extend(block_nodes)
+            deque(
+                map(
+                    dict.__setitem__,
+                    map(nodes.__getitem__, parents),
+                    names,
+                    block_nodes,
+                ),
+                0,
+            )
+            deque(
+                map(
+                    dict.__setitem__,
+                    compress(block_nodes, value_counts),
+                    repeat(""),
+                    compress(key_values, value_counts),
+                ),
+                0,
+            )
+            continue
+        for hive, parent, name, key_values in zip(hives, parents, names, key_values):
+            if parent >= 0:
+                node = nodes[parent].setdefault(name, {})
+            else:
+                node = trees.setdefault(hive, {})
+                for part in name.split("\\"):
+                    if part:
+                        node = node.setdefault(part, {})
+            nodes.append(node)
+            if key_values:
+                existing = node.get("")
+                if existing is None:
+                    node[""] = key_values
+                else:
+                    # Same key written twice, last values win
+                    value_names = set(value["name"].lower() for value in key_values)
+                    node[""] = [
+                        value
+                        for value in existing
+                        if value["name"].lower() not in value_names
+                    ] + key_values
+    return trees
+
+
+def _load_records_tree(records: Iterator[KeyRecord]) -> Dict[int, dict]:
+    trees = {}  # type: Dict[int, dict]
+    # Nodes by (hive, lowercase key path), so keys are found without walking the tree again
+    nodes = {}  # type: Dict[Tuple[int, str], dict]
+    for hive, key_path, _, values in records:
+        lowered_path = key_path.lower()
+        if values is None:
+            parent_path, _, name = lowered_path.rpartition("\\")
+            parent = nodes.get((hive, parent_path))
+            if parent is not None:
+                for subkey in [subkey for subkey in parent if subkey.lower() == name]:
+                    del parent[subkey]
+            for node_key in [
+                node_key
+                for node_key in nodes
+                if node_key[0] == hive
+                and (
+                    node_key[1] == lowered_path
+                    or node_key[1].startswith(lowered_path + "\\")
+                )
+            ]:
+                del nodes[node_key]
+            continue
+        try:
+            node = nodes[(hive, lowered_path)]
+        except KeyError:
+            node = trees.setdefault(hive, {})
+            parts = []
+            for part in key_path.split("\\"):
+                if not part:
+                    continue
+                parts.append(part.lower())
+                node_key = (hive, "\\".join(parts))
+                try:
+                    node = nodes[node_key]
+                except KeyError:
+                    node = node.setdefault(part, {})
+                    nodes[node_key] = node
+        if not values:
+            continue
+        key_values = node.setdefault("", [])
+        for name, value, value_type in values:
+            lowered_name = (name or "").lower()
+            for existing in [
+                existing
+                for existing in key_values
+                if (existing["name"] or "").lower() == lowered_name
+            ]:
+                key_values.remove(existing)
+            if value_type is not None:
+                key_values.append({"name": name, "value": value, "type": value_type})
+    return trees
+
+
+def load_tree(path: str) -> Dict[int, dict]:
+    """
+    Load an export into {hive: get_keys() like tree} dicts, which MemoryBackend accepts
+    """
+    with open(path, "rb") as file_handle:
+        binary = file_handle.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    # Loading only allocates objects which are all kept, garbage collection passes would be wasted
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        if binary:
+            return _load_binary_tree(path)
+        return _load_records_tree(iter_reg(path))
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def import_file(
+    path: str,
+    arch: int = 0,
+    backend: RegistryBackend = None,
+    computer: Optional[str] = None,
+) -> dict:
+    """
+    Import a .reg file or a binary export into the registry, streaming it by batches of IMPORT_BATCH_KEYS keys
+    Every batch is rolled back when one of its writes fails, batches already applied are kept
+
+    :param path: export file
+    :param arch: registry view (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+    :param backend: optional registry backend, defaults to module wide backend
+    :param computer: remote computer name (remote registry service), None for local registry
+    :return: {"keys": keys written, "created_keys": keys created, "writes": values written or deleted, "deleted_keys": subtrees deleted}
+    """
+    stats = {"keys": 0, "created_keys": 0, "writes": 0, "deleted_keys": 0}
+    batch = RegistryBatch(backend, computer)
+    batch_keys = 0
+
+    def _apply() -> None:
+        for name, count in batch.apply().items():
+            if name in stats:
+                stats[name] += count
+
+    for hive, key_path, _, values in iter_file(path):
+        if values is None:
+            # Deletions must see the writes of previous records
+            _apply()
+            batch_keys = 0
+            try:
+                delete_tree(hive, key_path, arch, backend=backend, computer=computer)
+                stats["deleted_keys"] += 1
+            except FileNotFoundError:
+                pass
+            continue
+        batch.create_key(hive, key_path, arch)
+        for name, value, value_type in values:
+            if value_type is None:
+                batch.delete_value(hive, key_path, name, arch)
+            else:
+                batch.set_value(hive, key_path, name, value, value_type, arch)
+        batch_keys += 1
+        if batch_keys >= IMPORT_BATCH_KEYS:
+            _apply()
+            batch_keys = 0
+    _apply()
+    return stats
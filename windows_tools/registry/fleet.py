@@ -0,0 +1,322 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+Remote registry fleet collector
+
+Queries the registry of many computers concurrently through the remote registry service.
+Every computer gets its own RegistrySession, so its hive connections and key handles are reused
+by all queries of a collection and kept between collections, until the host fails.
+
+Collections run on a bounded thread pool with a per host timeout, counted from the moment the
+host is actually being queried. Errors never stop the collection, they are reported per host.
+A host that timed out keeps its worker busy until the underlying call returns, and is reported
+as busy by following collections meanwhile.
+
+Usage:
+    from windows_tools import registry
+    from windows_tools.registry.fleet import RegistryFleet
+
+    with RegistryFleet(["host1", "host2"], max_workers=16, timeout=10) as fleet:
+        for host in fleet.collect(lambda session: registry.get_values(
+            registry.HKEY_LOCAL_MACHINE, r"SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Uninstall",
+            names=["DisplayName"], backend=session
+        )):
+            print(host["computer"], host["error"] or host["result"])
+
+MultiHostBackend routes computer names to other backends, ie in-memory registries standing in for
+remote computers, so collections can be tested on any OS.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from time import monotonic
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from windows_tools.registry import (
+    RegistryBackend,
+    RegistrySession,
+    get_backend,
+    KEY_READ,
+    KEY_ALL_ACCESS,
+)
+
+# Max time between two checks of host deadlines
+DEADLINE_CHECK_INTERVAL = 0.1
+
+
+class _HostHandle:
+    """
+    Handle given by MultiHostBackend, remembers which host backend it belongs to
+    """
+
+    __slots__ = ("backend", "handle")
+
+    def __init__(self, backend: RegistryBackend, handle):
+        self.backend = backend
+        self.handle = handle
+
+
+class MultiHostBackend(RegistryBackend):
+    """
+    Registry backend that dispatches every computer to its own backend
+    The None computer is the local one
+    Unknown computers fail to connect like unreachable hosts do
+    """
+
+    def __init__(self, hosts: Dict[Optional[str], RegistryBackend] = None):
+        self.hosts = {}  # type: Dict[Optional[str], RegistryBackend]
+        for computer, backend in (hosts or {}).items():
+            self.add_host(computer, backend)
+
+    @staticmethod
+    def _host_name(computer: Optional[str]) -> Optional[str]:
+        if computer is None:
+            return None
+        return computer.lstrip("\\").lower()
+
+    def add_host(self, computer: Optional[str], backend: RegistryBackend) -> None:
+        self.hosts[self._host_name(computer)] = backend
+
+    def connect(self, computer: Optional[str], hive: int):
+        try:
+            backend = self.hosts[self._host_name(computer)]
+        except KeyError:
+            raise OSError("The network path was not found: %s" % computer)
+        # Host backends see themselves as the local computer
+        return _HostHandle(backend, backend.connect(None, hive))
+
+    def _resolve(self, handle) -> Tuple[RegistryBackend, object]:
+        if isinstance(handle, int):
+            # Predefined hive constant used as handle, on the local computer
+            return self.hosts[None], handle
+        return handle.backend, handle.handle
+
+    def open_key(self, handle, sub_key: str, access: int = KEY_READ):
+        backend, host_handle = self._resolve(handle)
+        return _HostHandle(backend, backend.open_key(host_handle, sub_key, access))
+
+    def close_key(self, handle) -> None:
+        if isinstance(handle, _HostHandle):
+            handle.backend.close_key(handle.handle)
+
+    def enum_key(self, handle, index: int) -> str:
+        backend, host_handle = self._resolve(handle)
+        return backend.enum_key(host_handle, index)
+
+    def enum_value(self, handle, index: int) -> Tuple[str, object, int]:
+        backend, host_handle = self._resolve(handle)
+        return backend.enum_value(host_handle, index)
+
+    def query_value(self, handle, name: Optional[str]) -> Tuple[object, int]:
+        backend, host_handle = self._resolve(handle)
+        return backend.query_value(host_handle, name)
+
+    def query_info(self, handle) -> Tuple[int, int, int]:
+        backend, host_handle = self._resolve(handle)
+        return backend.query_info(host_handle)
+
+    def delete_key(self, handle, sub_key: str) -> None:
+        backend, host_handle = self._resolve(handle)
+        backend.delete_key(host_handle, sub_key)
+
+    def delete_tree(self, handle, sub_key: str) -> None:
+        backend, host_handle = self._resolve(handle)
+        backend.delete_tree(host_handle, sub_key)
+
+    def create_key(self, handle, sub_key: str, access: int = KEY_ALL_ACCESS):
+        backend, host_handle = self._resolve(handle)
+        return _HostHandle(backend, backend.create_key(host_handle, sub_key, access))
+
+    def set_value(self, handle, name: Optional[str], value, value_type: int) -> None:
+        backend, host_handle = self._resolve(handle)
+        backend.set_value(host_handle, name, value, value_type)
+
+    def delete_value(self, handle, name: Optional[str]) -> None:
+        backend, host_handle = self._resolve(handle)
+        backend.delete_value(host_handle, name)
+
+
+def _host_result(computer: str) -> dict:
+    return {
+        "computer": computer,
+        "result": None,
+        "error": None,
+        "error_type": None,
+        "timed_out": False,
+        "elapsed": None,
+    }
+
+
+class RegistryFleet:
+    """
+    Concurrent registry collector over a list of computers
+    """
+
+    def __init__(
+        self,
+        computers: Iterable[str],
+        backend: RegistryBackend = None,
+        max_workers: int = 8,
+        timeout: float = 30,
+        max_handles: int = 64,
+    ):
+        """
+        :param computers: computer names to query
+        :param backend: optional registry backend, defaults to module wide backend
+        :param max_workers: how many computers are queried at the same time
+        :param timeout: max seconds a computer may take per collection
+        :param max_handles: key handles cached per computer
+        """
+        self.computers = list(computers)
+        self.backend = get_backend(backend)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_handles = max_handles
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._sessions = {}  # type: Dict[str, RegistrySession]
+        # Computers still being queried, and those whose query timed out
+        self._busy = set()
+        self._abandoned = set()
+
+    def __enter__(self) -> "RegistryFleet":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close every host session, hosts still being queried are closed when their query returns
+        """
+        with self._lock:
+            for computer in list(self._sessions):
+                if computer in self._busy:
+                    self._abandoned.add(computer)
+                else:
+                    self._sessions.pop(computer).close()
+        self._executor.shutdown(wait=False)
+
+    def _get_session(self, computer: str) -> RegistrySession:
+        with self._lock:
+            try:
+                return self._sessions[computer]
+            except KeyError:
+                session = RegistrySession(self.backend, computer, self.max_handles)
+                self._sessions[computer] = session
+                return session
+
+    def _drop_session(self, computer: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(computer, None)
+        if session is not None:
+            session.close()
+
+    def _query(
+        self, computer: str, collector: Callable, started: Dict[str, float]
+    ) -> object:
+        started[computer] = monotonic()
+        try:
+            return collector(self._get_session(computer))
+        except Exception:
+            # Reconnect on next collection
+            self._drop_session(computer)
+            raise
+        finally:
+            with self._lock:
+                self._busy.discard(computer)
+                abandoned = computer in self._abandoned
+                self._abandoned.discard(computer)
+            if abandoned:
+                self._drop_session(computer)
+
+    def collect(
+        self, collector: Callable[[RegistrySession], object], timeout: float = None
+    ) -> List[dict]:
+        """
+        Run collector(session) for every computer, session being a RegistrySession bound to that computer
+
+        :param collector: function querying one computer, ie lambda session: registry.get_value(..., backend=session)
+        :param timeout: max seconds per computer, defaults to fleet timeout
+        :return: list of {"computer", "result", "error", "error_type", "timed_out", "elapsed"} dicts,
+                 in computers order
+        """
+        if timeout is None:
+            timeout = self.timeout
+        results = dict(
+            (computer, _host_result(computer)) for computer in self.computers
+        )
+        started = {}  # type: Dict[str, float]
+        pending = {}
+        with self._lock:
+            for computer in results:
+                if computer in self._busy:
+                    results[computer]["error"] = (
+                        "Previous query of computer %s is still running" % computer
+                    )
+                    results[computer]["error_type"] = "BusyError"
+                    continue
+                self._busy.add(computer)
+                future = self._executor.submit(
+                    self._query, computer, collector, started
+                )
+                pending[future] = computer
+
+        while pending:
+            now = monotonic()
+            deadlines = [
+                started[computer] + timeout
+                for computer in pending.values()
+                if computer in started
+            ]
+            wait_time = DEADLINE_CHECK_INTERVAL
+            if deadlines:
+                wait_time = max(0, min(min(deadlines) - now, wait_time))
+            done, _ = wait(
+                list(pending), timeout=wait_time, return_when=FIRST_COMPLETED
+            )
+
+            now = monotonic()
+            for future in done:
+                computer = pending.pop(future)
+                result = results[computer]
+                result["elapsed"] = now - started.get(computer, now)
+                try:
+                    result["result"] = future.result()
+                except Exception as exc:
+                    result["error"] = "Cannot query computer %s: %s" % (computer, exc)
+                    result["error_type"] = type(exc).__name__
+
+            for future, computer in list(pending.items()):
+                if computer in started and now - started[computer] >= timeout:
+                    del pending[future]
+                    with self._lock:
+                        # Still running, session is dropped once the query returns
+                        if computer in self._busy:
+                            self._abandoned.add(computer)
+                    result = results[computer]
+                    result["elapsed"] = now - started[computer]
+                    result["timed_out"] = True
+                    result["error"] = "Query of computer %s timed out after %ss" % (
+                        computer,
+                        timeout,
+                    )
+                    result["error_type"] = "TimeoutError"
+        return list(results.values())
+
+
+def collect_fleet(
+    computers: Iterable[str],
+    collector: Callable[[RegistrySession], object],
+    backend: RegistryBackend = None,
+    max_workers: int = 8,
+    timeout: float = 30,
+) -> List[dict]:
+    """
+    One shot RegistryFleet collection, see RegistryFleet.collect()
+    """
+    with RegistryFleet(computers, backend, max_workers, timeout) as fleet:
+        return fleet.collect(collector)
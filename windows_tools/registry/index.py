@@ -0,0 +1,321 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+Registry value search index
+
+Indexes key names, value names and string data of a registry subtree, so keys can be found by
+exact, prefix or substring match without walking the registry again.
+
+Terms are lowercased, sorted and deduplicated. Exact and prefix lookups are binary searches,
+substring lookups scan a single string holding every term. Each term points to the keys holding
+it through a flat array of key ids.
+
+The index is built from a RegistrySnapshot and refreshed through refresh_snapshot(), so only keys
+whose last write time changed are read again. Changed keys are kept in a small side index until
+they represent COMPACT_RATIO of all keys, then the sorted arrays are rebuilt.
+
+Usage:
+    from windows_tools import registry
+    from windows_tools.registry.index import RegistryIndex
+
+    index = RegistryIndex.build(registry.HKEY_LOCAL_MACHINE, r"SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Uninstall")
+    index.save("uninstall.index.json.gz")
+    ...
+    index = RegistryIndex.load("uninstall.index.json.gz")
+    index.refresh()
+    index.find("{90160000-008C-0000-1000-0000000FF1CE}")
+    index.find("C:\\Program Files\\Vendor", mode="prefix")
+"""
+
+import base64
+import gzip
+import json
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Set
+
+from windows_tools.registry import RegistryBackend, _split_path
+from windows_tools.registry.snapshot import (
+    RegistrySnapshot,
+    SnapshotKey,
+    take_snapshot,
+    refresh_snapshot,
+)
+
+INDEX_FORMAT_VERSION = 1
+SEARCH_MODES = ("exact", "prefix", "substring")
+# Rebuild sorted arrays once this ratio of keys changed since last build
+COMPACT_RATIO = 0.1
+# Terms are separated by this char in the substring search string, it cannot be part of a term
+_TERM_SEPARATOR = "\x00"
+
+
+def _encode_array(values: array) -> str:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def _decode_array(data: str) -> array:
+    values = array("I")
+    values.frombytes(base64.b64decode(data))
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def key_terms(entry: SnapshotKey) -> Set[str]:
+    """
+    Searchable lowercase terms of a key: its name, value names and string data
+    """
+    parts = _split_path(entry.path)
+    terms = set()
+    if parts:
+        terms.add(parts[-1].lower())
+    for name, value, _ in entry.values:
+        if name:
+            terms.add(name.lower())
+        if isinstance(value, str):
+            terms.add(value.lower())
+        elif isinstance(value, list):
+            terms.update(item.lower() for item in value if isinstance(item, str))
+    terms.discard("")
+    # Null chars would break the substring search string
+    return set(term.replace(_TERM_SEPARATOR, "") for term in terms)
+
+
+class RegistryIndex:
+    """
+    Searchable index over a registry snapshot
+    """
+
+    def __init__(self, snapshot: RegistrySnapshot):
+        self.snapshot = snapshot
+        # Key id to key path relative to snapshot root, None for removed keys
+        self.paths = []  # type: List[Optional[str]]
+        self._ids = {}  # type: Dict[str, int]
+        self._terms = []  # type: List[str]
+        # Key ids of term n are _postings[_posting_offsets[n]:_posting_offsets[n + 1]]
+        self._postings = array("I")
+        self._posting_offsets = array("I", [0])
+        self._search_string = ""
+        self._term_offsets = array("I")
+        # Keys whose sorted array entries are outdated, and their current terms
+        self._stale = set()  # type: Set[int]
+        self._delta = {}  # type: Dict[int, Set[str]]
+        self._rebuild()
+
+    @classmethod
+    def build(
+        cls, hive: int, key: str, arch: int = 0, backend: RegistryBackend = None
+    ) -> "RegistryIndex":
+        """
+        Snapshot a registry subtree and index it
+
+        :param hive: registry hive (windows.registry.HKEY_LOCAL_MACHINE...)
+        :param key: root key of the index
+        :param arch: registry view (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+        :param backend: optional registry backend, defaults to module wide backend
+        """
+        return cls(take_snapshot(hive, key, arch, backend))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _rebuild(self) -> None:
+        self.paths = [entry.path for entry in self.snapshot.keys.values()]
+        self._ids = dict(
+            (path.lower(), key_id) for key_id, path in enumerate(self.paths)
+        )
+        pairs = []
+        for key_id, entry in enumerate(self.snapshot.keys.values()):
+            for term in key_terms(entry):
+                pairs.append((term, key_id))
+        pairs.sort()
+        self._load_pairs(pairs)
+        self._stale = set()
+        self._delta = {}
+
+    def _load_pairs(self, pairs: Iterable[tuple]) -> None:
+        terms = []
+        postings = array("I")
+        posting_offsets = array("I")
+        for term, key_id in pairs:
+            if not terms or terms[-1] != term:
+                terms.append(term)
+                posting_offsets.append(len(postings))
+            postings.append(key_id)
+        posting_offsets.append(len(postings))
+        self._set_terms(terms, postings, posting_offsets)
+
+    def _set_terms(
+        self, terms: List[str], postings: array, posting_offsets: array
+    ) -> None:
+        self._terms = terms
+        self._postings = postings
+        self._posting_offsets = posting_offsets
+        self._search_string = _TERM_SEPARATOR.join(terms)
+        term_offsets = array("I")
+        offset = 0
+        for term in terms:
+            term_offsets.append(offset)
+            offset += len(term) + 1
+        self._term_offsets = term_offsets
+
+    def _term_key_ids(self, term_index: int) -> Iterable[int]:
+        return self._postings[
+            self._posting_offsets[term_index] : self._posting_offsets[term_index + 1]
+        ]
+
+    def _matching_term_indexes(self, term: str, mode: str) -> Iterable[int]:
+        if mode == "exact":
+            index = bisect_left(self._terms, term)
+            if index < len(self._terms) and self._terms[index] == term:
+                return [index]
+            return []
+        if mode == "prefix":
+            start = bisect_left(self._terms, term)
+            # Terms never contain the highest code point, so it closes the prefix range
+            return range(start, bisect_right(self._terms, term + "\U0010ffff", start))
+        indexes = []
+        position = self._search_string.find(term)
+        while position != -1:
+            term_index = bisect_right(self._term_offsets, position) - 1
+            indexes.append(term_index)
+            if term_index + 1 >= len(self._term_offsets):
+                break
+            # Continue with next term, so a term matching twice is only listed once
+            position = self._search_string.find(
+                term, self._term_offsets[term_index + 1]
+            )
+        return indexes
+
+    @staticmethod
+    def _matches(candidate: str, term: str, mode: str) -> bool:
+        if mode == "exact":
+            return candidate == term
+        if mode == "prefix":
+            return candidate.startswith(term)
+        return term in candidate
+
+    def find(self, term: str, mode: str = "exact", limit: int = None) -> List[str]:
+        """
+        Find keys by key name, value name or string value data, case insensitive
+
+        :param term: what we're looking for
+        :param mode: exact, prefix or substring match
+        :param limit: max number of keys returned
+        :return: list of full key paths, in registry walk order
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(
+                "Search mode [%s] should be one of %s" % (mode, ", ".join(SEARCH_MODES))
+            )
+        term = term.lower()
+        if not term:
+            return []
+        key_ids = set()
+        for term_index in self._matching_term_indexes(term, mode):
+            key_ids.update(self._term_key_ids(term_index))
+        key_ids.difference_update(self._stale)
+        for key_id, terms in self._delta.items():
+            if any(self._matches(candidate, term, mode) for candidate in terms):
+                key_ids.add(key_id)
+        paths = [self.paths[key_id] for key_id in sorted(key_ids)]
+        if limit is not None:
+            paths = paths[:limit]
+        return [self._full_path(path) for path in paths]
+
+    def _full_path(self, path: str) -> str:
+        if not path:
+            return self.snapshot.key
+        if not self.snapshot.key:
+            return path
+        return self.snapshot.key + "\\" + path
+
+    def refresh(self, backend: RegistryBackend = None) -> dict:
+        """
+        Read changed keys again and update the index
+
+        :param backend: optional registry backend, defaults to module wide backend
+        :return: changes, see windows_tools.registry.snapshot.refresh_snapshot()
+        """
+        snapshot, changes = refresh_snapshot(self.snapshot, backend)
+        self.snapshot = snapshot
+        for path in changes["removed_keys"]:
+            key_id = self._ids.pop(path.lower())
+            self.paths[key_id] = None
+            self._stale.add(key_id)
+            self._delta.pop(key_id, None)
+        for path in changes["added_keys"]:
+            self._ids[path.lower()] = len(self.paths)
+            self.paths.append(path)
+        for path in list(changes["changed_keys"]) + changes["added_keys"]:
+            key_id = self._ids[path.lower()]
+            self._stale.add(key_id)
+            self._delta[key_id] = key_terms(snapshot.keys[path.lower()])
+        if len(self._stale) > COMPACT_RATIO * max(len(self._ids), 1):
+            self._rebuild()
+        return changes
+
+    def to_dict(self) -> dict:
+        return {
+            "version": INDEX_FORMAT_VERSION,
+            "snapshot": self.snapshot.to_dict(),
+            "paths": self.paths,
+            "terms": self._terms,
+            "postings": _encode_array(self._postings),
+            "posting_offsets": _encode_array(self._posting_offsets),
+            "stale": sorted(self._stale),
+            "delta": dict(
+                (str(key_id), sorted(terms)) for key_id, terms in self._delta.items()
+            ),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RegistryIndex":
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported registry index format version %s" % data.get("version")
+            )
+        index = cls.__new__(cls)
+        index.snapshot = RegistrySnapshot.from_dict(data["snapshot"])
+        index.paths = data["paths"]
+        index._ids = dict(
+            (path.lower(), key_id)
+            for key_id, path in enumerate(index.paths)
+            if path is not None
+        )
+        index._set_terms(
+            data["terms"],
+            _decode_array(data["postings"]),
+            _decode_array(data["posting_offsets"]),
+        )
+        index._stale = set(data["stale"])
+        index._delta = dict(
+            (int(key_id), set(terms)) for key_id, terms in data["delta"].items()
+        )
+        return index
+
+    def save(self, path: str) -> None:
+        """
+        Write index and its snapshot as JSON, gzip compressed when path ends with .gz
+        """
+        data = json.dumps(self.to_dict(), separators=(",", ":")).encode("utf-8")
+        if path.endswith(".gz"):
+            data = gzip.compress(data, compresslevel=1)
+        with open(path, "wb") as file_handle:
+            file_handle.write(data)
+
+    @classmethod
+    def load(cls, path: str) -> "RegistryIndex":
+        with open(path, "rb") as file_handle:
+            data = file_handle.read()
+        if path.endswith(".gz"):
+            data = gzip.decompress(data)
+        return cls.from_dict(json.loads(data.decode("utf-8")))
@@ -0,0 +1,599 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+Offline registry hive (regf) reader
+
+Hive files (SOFTWARE, SYSTEM, NTUSER.DAT, or any file produced by reg save) are memory mapped
+and cells are only decoded when a key or value is actually requested, so opening a hive is
+instant regardless of its size and the file is never copied to memory as a whole.
+
+Only the primary hive file is read, transaction logs (.LOG1 / .LOG2) are not replayed, so
+hives copied from a running system should be saved with reg save first.
+
+Usage:
+    from windows_tools import registry
+    from windows_tools.registry.regf import HiveFileBackend
+
+    with HiveFileBackend() as backend:
+        backend.mount(registry.HKEY_LOCAL_MACHINE, "SOFTWARE", "/hives/SOFTWARE")
+        with registry.use_backend(backend):
+            installed_software.get_installed_software()
+
+Hive format reference: https://github.com/msuhanov/regf/blob/master/Windows%20registry%20file%20format%20specification.md
+"""
+
+import mmap
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from windows_tools.registry import (
+    MemoryBackend,
+    decode_value_data,
+    encode_value_data,
+    MemoryKey,
+    guess_value_type,
+    _split_path,
+    KEY_READ,
+    REG_DWORD,
+    REG_DWORD_BIG_ENDIAN,
+    REG_QWORD,
+)
+
+BASE_BLOCK_SIZE = 4096
+HBIN_HEADER_SIZE = 32
+BIG_DATA_SEGMENT_SIZE = 16344
+
+KEY_HIVE_ENTRY = 0x0004
+KEY_COMP_NAME = 0x0020
+VALUE_COMP_NAME = 0x0001
+
+_BASE_BLOCK = struct.Struct("<4sIIQIIIIII")
+_CELL_SIZE = struct.Struct("<i")
+_NK = struct.Struct("<2sHQ15IHH")
+_VK = struct.Struct("<2sHIIIHH")
+_LIST_HEADER = struct.Struct("<2sH")
+_DB = struct.Struct("<2sHI")
+_UINT16 = struct.Struct("<H")
+_UINT32 = struct.Struct("<I")
+
+# Value types decoded straight from the hive buffer, without copying their data first
+_FIXED_SIZE_VALUES = {
+    REG_DWORD: _UINT32,
+    REG_DWORD_BIG_ENDIAN: struct.Struct(">I"),
+    REG_QWORD: struct.Struct("<Q"),
+}
+
+
+def subkey_name_hash(name: str) -> int:
+    """
+    Hash used in lh subkey lists
+    """
+    name_hash = 0
+    for char in name.upper():
+        name_hash = (name_hash * 37 + ord(char)) & 0xFFFFFFFF
+    return name_hash
+
+
+class HiveKey:
+    """
+    Handle to a key node (nk cell) of a hive file
+    Subkey and value lists are only resolved when first needed, then cached on the handle
+    """
+
+    __slots__ = (
+        "hive",
+        "offset",
+        "flags",
+        "last_write",
+        "subkey_count",
+        "subkey_list",
+        "value_count",
+        "value_list",
+        "_name",
+        "_subkeys",
+        "_subkey_index",
+        "_values",
+    )
+
+    def __init__(self, hive: "RegfHive", offset: int):
+        data_offset = hive.cell_data_offset(offset)
+        (
+            signature,
+            self.flags,
+            self.last_write,
+            _,
+            _,
+            self.subkey_count,
+            _,
+            self.subkey_list,
+            _,
+            self.value_count,
+            self.value_list,
+            _,
+            _,
+            _,
+            _,
+            _,
+            _,
+            _,
+            _,
+            _,
+        ) = _NK.unpack_from(hive.buffer, data_offset)
+        if signature != b"nk":
+            raise OSError(
+                "Corrupt hive %s: no key node at offset %s" % (hive.path, offset)
+            )
+        self.hive = hive
+        self.offset = offset
+        self._name = None
+        self._subkeys = None
+        self._subkey_index = None
+        self._values = None
+
+    @property
+    def name(self) -> str:
+        if self._name is None:
+            self._name = self.hive.read_key_name(self.offset, self.flags)
+        return self._name
+
+    @property
+    def subkeys(self) -> List[Tuple[int, Optional[int]]]:
+        """
+        List of (nk offset, name hash or None)
+        """
+        if self._subkeys is None:
+            if self.subkey_count:
+                self._subkeys = self.hive.read_subkey_list(self.subkey_list)
+            else:
+                self._subkeys = []
+        return self._subkeys
+
+    @property
+    def subkey_index(self) -> Dict[int, List[int]]:
+        """
+        Subkey offsets by name hash, so looking up a name isn't a linear scan of the subkey list
+        """
+        if self._subkey_index is None:
+            self._subkey_index = {}
+            for subkey_offset, name_hash in self.subkeys:
+                if name_hash is None:
+                    name_hash = subkey_name_hash(HiveKey(self.hive, subkey_offset).name)
+                self._subkey_index.setdefault(name_hash, []).append(subkey_offset)
+        return self._subkey_index
+
+    @property
+    def values(self) -> Tuple[int, ...]:
+        """
+        Tuple of vk offsets
+        """
+        if self._values is None:
+            if self.value_count:
+                self._values = struct.unpack_from(
+                    "<%dI" % self.value_count,
+                    self.hive.buffer,
+                    self.hive.cell_data_offset(self.value_list),
+                )
+            else:
+                self._values = ()
+        return self._values
+
+
+class RegfHive:
+    """
+    Memory mapped regf hive file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise OSError("Hive file %s is empty" % path)
+        (
+            signature,
+            self.primary_sequence,
+            self.secondary_sequence,
+            self.last_write,
+            self.major_version,
+            self.minor_version,
+            _,
+            _,
+            self.root_offset,
+            self.hive_bins_size,
+        ) = _BASE_BLOCK.unpack_from(self.buffer, 0)
+        if signature != b"regf":
+            self.close()
+            raise OSError("File %s is not a registry hive" % path)
+        self.root = HiveKey(self, self.root_offset)
+
+    def close(self) -> None:
+        try:
+            self.buffer.close()
+        except (AttributeError, BufferError):
+            pass
+        self._file.close()
+
+    def cell_data_offset(self, offset: int) -> int:
+        """
+        Translate a cell offset into an absolute file offset of the cell data (after the size field)
+        """
+        return BASE_BLOCK_SIZE + offset + 4
+
+    def read_key_name(self, offset: int, flags: int) -> str:
+        data_offset = self.cell_data_offset(offset)
+        name_length = _UINT16.unpack_from(self.buffer, data_offset + 72)[0]
+        raw = self.buffer[data_offset + 76 : data_offset + 76 + name_length]
+        if flags & KEY_COMP_NAME:
+            return raw.decode("latin-1")
+        return raw.decode("utf-16-le", "replace")
+
+    def read_subkey_list(self, offset: int) -> List[Tuple[int, Optional[int]]]:
+        data_offset = self.cell_data_offset(offset)
+        signature, count = _LIST_HEADER.unpack_from(self.buffer, data_offset)
+        if signature in (b"lf", b"lh"):
+            entries = struct.unpack_from(
+                "<%dI" % (count * 2), self.buffer, data_offset + 4
+            )
+            offsets = entries[::2]
+            if signature == b"lh":
+                return list(zip(offsets, entries[1::2]))
+            return [(subkey_offset, None) for subkey_offset in offsets]
+        if signature == b"li":
+            offsets = struct.unpack_from("<%dI" % count, self.buffer, data_offset + 4)
+            return [(subkey_offset, None) for subkey_offset in offsets]
+        if signature == b"ri":
+            subkeys = []
+            for list_offset in struct.unpack_from(
+                "<%dI" % count, self.buffer, data_offset + 4
+            ):
+                subkeys += self.read_subkey_list(list_offset)
+            return subkeys
+        raise OSError(
+            "Corrupt hive %s: bad subkey list at offset %s" % (self.path, offset)
+        )
+
+    def find_subkey(self, key: HiveKey, name: str) -> HiveKey:
+        lowered_name = name.lower()
+        for subkey_offset in key.subkey_index.get(subkey_name_hash(name), ()):
+            subkey = HiveKey(self, subkey_offset)
+            if subkey.name.lower() == lowered_name:
+                return subkey
+        if any(ord(char) > 127 for char in name):
+            # Our uppercase conversion may differ from Windows' one for non ascii names
+            for subkey_offset, _ in key.subkeys:
+                subkey = HiveKey(self, subkey_offset)
+                if subkey.name.lower() == lowered_name:
+                    return subkey
+        # CurrentControlSet is a volatile link which does not exist in SYSTEM hive files
+        if key.offset == self.root_offset and lowered_name == "currentcontrolset":
+            select = self.find_subkey(key, "Select")
+            current = self.query_value(select, "Current")[0]
+            return self.find_subkey(key, "ControlSet%03d" % current)
+        raise FileNotFoundError("Registry key [%s] not found in %s" % (name, self.path))
+
+    def read_value(
+        self, offset: int, with_data: bool = True
+    ) -> Tuple[str, object, int]:
+        """
+        Return (name, value, type) for a vk cell
+        """
+        data_offset = self.cell_data_offset(offset)
+        (
+            signature,
+            name_length,
+            data_size,
+            value_data_offset,
+            value_type,
+            flags,
+            _,
+        ) = _VK.unpack_from(self.buffer, data_offset)
+        if signature != b"vk":
+            raise OSError(
+                "Corrupt hive %s: no value at offset %s" % (self.path, offset)
+            )
+        raw_name = self.buffer[data_offset + 20 : data_offset + 20 + name_length]
+        if flags & VALUE_COMP_NAME:
+            name = raw_name.decode("latin-1")
+        else:
+            name = raw_name.decode("utf-16-le", "replace")
+        if not with_data:
+            return name, None, value_type
+        if value_type == REG_DWORD and data_size == 0x80000004:
+            # Resident dword, the data offset field is the value
+            return name, value_data_offset, value_type
+        fixed_size_value = _FIXED_SIZE_VALUES.get(value_type)
+        if fixed_size_value is not None and data_size == fixed_size_value.size:
+            return (
+                name,
+                fixed_size_value.unpack_from(
+                    self.buffer, self.cell_data_offset(value_data_offset)
+                )[0],
+                value_type,
+            )
+        return (
+            name,
+            decode_value_data(
+                self._read_data(data_size, value_data_offset), value_type
+            ),
+            value_type,
+        )
+
+    def _read_data(self, data_size: int, offset: int) -> bytes:
+        if data_size & 0x80000000:
+            # Resident data, stored in the offset field itself
+            return _UINT32.pack(offset)[: data_size & 0x7FFFFFFF]
+        if data_size == 0:
+            return b""
+        start = self.cell_data_offset(offset)
+        if (
+            data_size > BIG_DATA_SEGMENT_SIZE
+            and self.minor_version >= 4
+            and self.buffer[start : start + 2] == b"db"
+        ):
+            _, segment_count, segment_list = _DB.unpack_from(self.buffer, start)
+            segments = struct.unpack_from(
+                "<%dI" % segment_count, self.buffer, self.cell_data_offset(segment_list)
+            )
+            raw = bytearray()
+            for segment in segments:
+                remaining = data_size - len(raw)
+                segment_start = self.cell_data_offset(segment)
+                raw += self.buffer[
+                    segment_start : segment_start
+                    + min(remaining, BIG_DATA_SEGMENT_SIZE)
+                ]
+            return bytes(raw)
+        return self.buffer[start : start + data_size]
+
+    def query_value(self, key: HiveKey, name: Optional[str]) -> Tuple[object, int]:
+        lowered_name = (name or "").lower()
+        for value_offset in key.values:
+            value_name, _, _ = self.read_value(value_offset, with_data=False)
+            if value_name.lower() == lowered_name:
+                _, value, value_type = self.read_value(value_offset)
+                return value, value_type
+        raise FileNotFoundError(
+            "Registry value [%s] not found in %s" % (name, self.path)
+        )
+
+
+class HiveFileBackend(MemoryBackend):
+    """
+    Read-only registry backend over one or more offline hive files
+
+    Hive files are mounted at the place they live on a running system, ie
+    backend.mount(HKEY_LOCAL_MACHINE, "SOFTWARE", "SOFTWARE")
+    backend.mount(HKEY_LOCAL_MACHINE, "SYSTEM", "SYSTEM")
+    backend.mount(HKEY_CURRENT_USER, "", "NTUSER.DAT")
+    backend.mount(HKEY_CLASSES_ROOT, "", "SOFTWARE", hive_key="Classes")
+    """
+
+    read_only = True
+
+    def __init__(self, mounts: Dict[Tuple[int, str], str] = None):
+        super().__init__(last_write=0)
+        self._hives = {}  # type: Dict[str, RegfHive]
+        self._mounts = {}  # type: Dict[MemoryKey, HiveKey]
+        if mounts:
+            for (hive, key), path in mounts.items():
+                self.mount(hive, key, path)
+
+    def __enter__(self) -> "HiveFileBackend":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for hive in self._hives.values():
+            hive.close()
+        self._hives = {}
+        self._mounts = {}
+
+    def mount(self, hive: int, key: str, path: str, hive_key: str = "") -> None:
+        """
+        Mount hive file at path under hive\\key, optionally only mounting hive_key subkey of the hive file
+        """
+        try:
+            regf_hive = self._hives[path]
+        except KeyError:
+            regf_hive = RegfHive(path)
+            self._hives[path] = regf_hive
+        root = regf_hive.root
+        for part in _split_path(hive_key):
+            root = regf_hive.find_subkey(root, part)
+
+        node = self.get_hive(hive)
+        for part in _split_path(key):
+            node = node.add_subkey(part, root.last_write)
+        self._mounts[node] = root
+
+    def _resolve(self, handle):
+        if type(handle) is HiveKey:
+            return handle
+        handle = super()._resolve(handle)
+        return self._mounts.get(handle, handle)
+
+    def _get_subkey(self, node, name: str):
+        if isinstance(node, HiveKey):
+            return node.hive.find_subkey(node, name)
+        subkey = node.get_subkey(name)
+        return self._mounts.get(subkey, subkey)
+
+    def enum_key(self, handle, index: int) -> str:
+        node = self._resolve(handle)
+        if isinstance(node, HiveKey):
+            try:
+                return HiveKey(node.hive, node.subkeys[index][0]).name
+            except IndexError:
+                raise OSError("No more data is available")
+        return super().enum_key(node, index)
+
+    def enum_value(self, handle, index: int) -> Tuple[str, object, int]:
+        node = self._resolve(handle)
+        if isinstance(node, HiveKey):
+            try:
+                return node.hive.read_value(node.values[index])
+            except IndexError:
+                raise OSError("No more data is available")
+        return super().enum_value(node, index)
+
+    def query_value(self, handle, name: Optional[str]) -> Tuple[object, int]:
+        node = self._resolve(handle)
+        if isinstance(node, HiveKey):
+            return node.hive.query_value(node, name)
+        return super().query_value(node, name)
+
+    def query_info(self, handle) -> Tuple[int, int, int]:
+        node = self._resolve(handle)
+        if isinstance(node, HiveKey):
+            return node.subkey_count, node.value_count, node.last_write
+        return super().query_info(node)
+
+
+class _HiveWriter:
+    """
+    Minimal regf writer producing a single hive bin, used to build test and benchmark hives
+    """
+
+    MAX_LIST_SIZE = 512
+
+    def __init__(self):
+        self.bins = bytearray(HBIN_HEADER_SIZE)
+
+    def alloc(self, data: bytes) -> int:
+        offset = len(self.bins)
+        size = (len(data) + 4 + 7) & ~7
+        self.bins += _CELL_SIZE.pack(-size) + data + b"\x00" * (size - 4 - len(data))
+        return offset
+
+    def write_value(self, name: str, value, value_type: int) -> int:
+        raw = encode_value_data(value, value_type)
+        if len(raw) <= 4:
+            data_size = len(raw) | 0x80000000
+            data_offset = int.from_bytes(raw.ljust(4, b"\x00"), "little")
+        elif len(raw) > BIG_DATA_SEGMENT_SIZE:
+            segments = [
+                self.alloc(raw[index : index + BIG_DATA_SEGMENT_SIZE])
+                for index in range(0, len(raw), BIG_DATA_SEGMENT_SIZE)
+            ]
+            segment_list = self.alloc(struct.pack("<%dI" % len(segments), *segments))
+            data_size = len(raw)
+            data_offset = self.alloc(_DB.pack(b"db", len(segments), segment_list))
+        else:
+            data_size = len(raw)
+            data_offset = self.alloc(raw)
+        try:
+            raw_name = name.encode("latin-1")
+            flags = VALUE_COMP_NAME
+        except UnicodeEncodeError:
+            raw_name = name.encode("utf-16-le")
+            flags = 0
+        return self.alloc(
+            _VK.pack(b"vk", len(raw_name), data_size, data_offset, value_type, flags, 0)
+            + raw_name
+        )
+
+    def write_subkey_list(self, subkeys: List[Tuple[str, int]]) -> int:
+        subkeys = sorted(subkeys, key=lambda subkey: subkey[0].upper())
+        lists = []
+        for index in range(0, len(subkeys), self.MAX_LIST_SIZE):
+            chunk = subkeys[index : index + self.MAX_LIST_SIZE]
+            entries = []
+            for name, offset in chunk:
+                entries += [offset, subkey_name_hash(name)]
+            lists.append(
+                self.alloc(
+                    _LIST_HEADER.pack(b"lh", len(chunk))
+                    + struct.pack("<%dI" % len(entries), *entries)
+                )
+            )
+        if len(lists) == 1:
+            return lists[0]
+        return self.alloc(
+            _LIST_HEADER.pack(b"ri", len(lists))
+            + struct.pack("<%dI" % len(lists), *lists)
+        )
+
+    def write_key(
+        self, name: str, tree: dict, parent: int, last_write: int, flags: int = 0
+    ) -> int:
+        try:
+            raw_name = name.encode("latin-1")
+            flags |= KEY_COMP_NAME
+        except UnicodeEncodeError:
+            raw_name = name.encode("utf-16-le")
+        offset = self.alloc(b"\x00" * (_NK.size + len(raw_name)))
+
+        value_offsets = [
+            self.write_value(
+                value["name"],
+                value["value"],
+                value.get("type", guess_value_type(value["value"])),
+            )
+            for value in tree.get("", [])
+        ]
+        value_list = (
+            self.alloc(struct.pack("<%dI" % len(value_offsets), *value_offsets))
+            if value_offsets
+            else 0xFFFFFFFF
+        )
+        subkeys = [
+            (subkey_name, self.write_key(subkey_name, subtree, offset, last_write))
+            for subkey_name, subtree in tree.items()
+            if subkey_name != ""
+        ]
+        subkey_list = self.write_subkey_list(subkeys) if subkeys else 0xFFFFFFFF
+
+        nk = _NK.pack(
+            b"nk",
+            flags,
+            last_write,
+            0,
+            parent,
+            len(subkeys),
+            0,
+            subkey_list,
+            0xFFFFFFFF,
+            len(value_offsets),
+            value_list,
+            0xFFFFFFFF,
+            0xFFFFFFFF,
+            0,
+            0,
+            0,
+            0,
+            0,
+            len(raw_name),
+            0,
+        )
+        self.bins[offset + 4 : offset + 4 + _NK.size + len(raw_name)] = nk + raw_name
+        return offset
+
+
+def build_hive(tree: dict, last_write: int = 0) -> bytes:
+    """
+    Build a regf hive from a get_keys() like tree, mostly useful to create test and benchmark hives
+    """
+    writer = _HiveWriter()
+    root_offset = writer.write_key("ROOT", tree, 0xFFFFFFFF, last_write, KEY_HIVE_ENTRY)
+    bins = writer.bins
+    bins += b"\x00" * (-len(bins) % BASE_BLOCK_SIZE)
+    bins[0:HBIN_HEADER_SIZE] = (
+        b"hbin" + struct.pack("<II", 0, len(bins)) + b"\x00" * (HBIN_HEADER_SIZE - 12)
+    )
+    base_block = bytearray(
+        _BASE_BLOCK.pack(b"regf", 1, 1, last_write, 1, 5, 0, 1, root_offset, len(bins))
+    )
+    base_block += b"\x00" * (508 - len(base_block))
+    checksum = 0
+    for (dword,) in struct.iter_unpack("<I", bytes(base_block)):
+        checksum ^= dword
+    base_block += _UINT32.pack(checksum)
+    base_block += b"\x00" * (BASE_BLOCK_SIZE - len(base_block))
+    return bytes(base_block + bins)
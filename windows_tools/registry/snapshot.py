@@ -0,0 +1,316 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+Registry subtree snapshots and incremental refresh
+
+A snapshot holds every key of a subtree with its last write time, subkey names and values.
+Refreshing a snapshot only queries the last write time of keys whose timestamp didn't move,
+values and subkeys are only enumerated again for keys that changed.
+
+Windows only updates the last write time of the key whose values or direct subkeys changed,
+not the one of its parents, so every key of the subtree still gets opened on refresh,
+but enumeration and value reads are limited to changed keys.
+
+Usage:
+    from windows_tools import registry
+    from windows_tools.registry.snapshot import RegistrySnapshot, take_snapshot, refresh_snapshot
+
+    snapshot = take_snapshot(registry.HKEY_LOCAL_MACHINE, r"SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Uninstall")
+    snapshot.save("uninstall.json.gz")
+    ...
+    snapshot, changes = refresh_snapshot(RegistrySnapshot.load("uninstall.json.gz"))
+"""
+
+import gzip
+import json
+from typing import Dict, List, Optional, Tuple
+
+from windows_tools.registry import (
+    RegistryBackend,
+    get_backend,
+    _close_handles,
+    _split_path,
+    KEY_READ,
+)
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+class SnapshotKey:
+    """
+    State of a single registry key in a snapshot
+    values is a tuple of (name, value, type) tuples
+    """
+
+    __slots__ = ("path", "last_write", "subkeys", "values")
+
+    def __init__(
+        self,
+        path: str,
+        last_write: int,
+        subkeys: Tuple[str, ...],
+        values: Tuple[Tuple[str, object, int], ...],
+    ):
+        self.path = path
+        self.last_write = last_write
+        self.subkeys = subkeys
+        self.values = values
+
+
+def _encode_value(value):
+    if isinstance(value, bytes):
+        return {"hex": value.hex()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return bytes.fromhex(value["hex"])
+    return value
+
+
+class RegistrySnapshot:
+    """
+    Snapshot of a registry subtree
+    keys are indexed by lowercase path relative to the snapshot root, root key being ""
+    """
+
+    def __init__(self, hive: int, key: str, arch: int = 0):
+        self.hive = hive
+        self.key = key
+        self.arch = arch
+        self.keys = {}  # type: Dict[str, SnapshotKey]
+        # Number of keys read from registry versus reused from previous snapshot
+        self.stats = {"enumerated": 0, "unchanged": 0}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get_values(self, path: str = "") -> Dict[str, object]:
+        """
+        Return {name: value} dict of a key given by its path relative to snapshot root
+        """
+        try:
+            entry = self.keys["\\".join(_split_path(path)).lower()]
+        except KeyError:
+            raise FileNotFoundError("Registry key [%s] not in snapshot" % path)
+        return dict((name, value) for name, value, _ in entry.values)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "hive": self.hive,
+            "key": self.key,
+            "arch": self.arch,
+            "keys": [
+                [
+                    entry.path,
+                    entry.last_write,
+                    list(entry.subkeys),
+                    [
+                        [name, _encode_value(value), value_type]
+                        for name, value, value_type in entry.values
+                    ],
+                ]
+                for entry in self.keys.values()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RegistrySnapshot":
+        if data.get("version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported registry snapshot format version %s" % data.get("version")
+            )
+        snapshot = cls(data["hive"], data["key"], data["arch"])
+        for path, last_write, subkeys, values in data["keys"]:
+            snapshot.keys[path.lower()] = SnapshotKey(
+                path,
+                last_write,
+                tuple(subkeys),
+                tuple(
+                    (name, _decode_value(value), value_type)
+                    for name, value, value_type in values
+                ),
+            )
+        return snapshot
+
+    def save(self, path: str) -> None:
+        """
+        Write snapshot as JSON, gzip compressed when path ends with .gz
+        """
+        data = json.dumps(self.to_dict(), separators=(",", ":")).encode("utf-8")
+        if path.endswith(".gz"):
+            data = gzip.compress(data, compresslevel=1)
+        with open(path, "wb") as file_handle:
+            file_handle.write(data)
+
+    @classmethod
+    def load(cls, path: str) -> "RegistrySnapshot":
+        with open(path, "rb") as file_handle:
+            data = file_handle.read()
+        if path.endswith(".gz"):
+            data = gzip.decompress(data)
+        return cls.from_dict(json.loads(data.decode("utf-8")))
+
+
+def _read_key(
+    backend: RegistryBackend, handle, path: str, last_write: int
+) -> SnapshotKey:
+    subkey_count, value_count, _ = backend.query_info(handle)
+    subkeys = []
+    for index in range(subkey_count):
+        try:
+            subkeys.append(backend.enum_key(handle, index))
+        except OSError:
+            # Subkeys were deleted while enumerating
+            break
+    values = []
+    for index in range(value_count):
+        try:
+            values.append(tuple(backend.enum_value(handle, index)))
+        except OSError:
+            break
+    return SnapshotKey(path, last_write, tuple(subkeys), tuple(values))
+
+
+def _fill_snapshot(
+    snapshot: RegistrySnapshot,
+    previous: Optional[RegistrySnapshot],
+    backend: RegistryBackend,
+) -> List[str]:
+    """
+    Read snapshot subtree, reusing keys of previous snapshot whose last write time didn't change
+    Returns lowercase paths of keys that were enumerated again
+    """
+    enumerated = []
+    open_reg = None
+    stack = []  # type: List[Tuple[object, str, List[str]]]
+
+    def _visit(handle, path: str) -> None:
+        lowered_path = path.lower()
+        try:
+            last_write = backend.query_info(handle)[2]
+            entry = previous.keys.get(lowered_path) if previous else None
+            if entry is None or entry.last_write != last_write:
+                entry = _read_key(backend, handle, path, last_write)
+                enumerated.append(lowered_path)
+                snapshot.stats["enumerated"] += 1
+            else:
+                snapshot.stats["unchanged"] += 1
+        except OSError:
+            backend.close_key(handle)
+            raise
+        snapshot.keys[lowered_path] = entry
+        # Subkey names are popped from the end, so they are visited in enumeration order
+        stack.append((handle, path, list(reversed(entry.subkeys))))
+
+    try:
+        open_reg = backend.connect(None, snapshot.hive)
+        _visit(backend.open_key(open_reg, snapshot.key, KEY_READ | snapshot.arch), "")
+        while stack:
+            handle, path, subkeys = stack[-1]
+            if not subkeys:
+                stack.pop()
+                backend.close_key(handle)
+                continue
+            name = subkeys.pop()
+            try:
+                subkey = backend.open_key(handle, name, KEY_READ | snapshot.arch)
+            except OSError:
+                # Key was deleted since its parent was enumerated
+                continue
+            _visit(subkey, path + "\\" + name if path else name)
+    except OSError as exc:
+        raise FileNotFoundError(
+            "Cannot snapshot registry key [%s]. %s" % (snapshot.key, exc)
+        )
+    finally:
+        _close_handles(backend, *[handle for handle, _, _ in reversed(stack)], open_reg)
+    return enumerated
+
+
+def _value_changes(old: Optional[SnapshotKey], new: SnapshotKey) -> dict:
+    old_values = (
+        dict((name.lower(), (name, value)) for name, value, _ in old.values)
+        if old
+        else {}
+    )
+    new_values = dict((name.lower(), (name, value)) for name, value, _ in new.values)
+    changes = {"added": {}, "removed": {}, "changed": {}}
+    for lowered_name, (name, value) in new_values.items():
+        try:
+            _, old_value = old_values[lowered_name]
+        except KeyError:
+            changes["added"][name] = value
+            continue
+        if old_value != value:
+            changes["changed"][name] = {"old": old_value, "new": value}
+    for lowered_name, (name, value) in old_values.items():
+        if lowered_name not in new_values:
+            changes["removed"][name] = value
+    return changes
+
+
+def _diff(
+    old: RegistrySnapshot, new: RegistrySnapshot, candidates
+) -> Dict[str, object]:
+    old_paths = set(old.keys)
+    new_paths = set(new.keys)
+    changed_keys = {}
+    for lowered_path in candidates:
+        if lowered_path not in old_paths or lowered_path not in new_paths:
+            continue
+        changes = _value_changes(old.keys[lowered_path], new.keys[lowered_path])
+        if changes["added"] or changes["removed"] or changes["changed"]:
+            changed_keys[new.keys[lowered_path].path] = changes
+    return {
+        "added_keys": sorted(new.keys[path].path for path in new_paths - old_paths),
+        "removed_keys": sorted(old.keys[path].path for path in old_paths - new_paths),
+        "changed_keys": changed_keys,
+    }
+
+
+def take_snapshot(
+    hive: int, key: str, arch: int = 0, backend: RegistryBackend = None
+) -> RegistrySnapshot:
+    """
+    Read a whole registry subtree into a snapshot
+
+    :param hive: registry hive (windows.registry.HKEY_LOCAL_MACHINE...)
+    :param key: root key of the snapshot
+    :param arch: registry view (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+    :param backend: optional registry backend, defaults to module wide backend
+    :return: RegistrySnapshot
+    """
+    snapshot = RegistrySnapshot(hive, key, arch)
+    _fill_snapshot(snapshot, None, get_backend(backend))
+    return snapshot
+
+
+def refresh_snapshot(
+    snapshot: RegistrySnapshot, backend: RegistryBackend = None
+) -> Tuple[RegistrySnapshot, dict]:
+    """
+    Read a registry subtree again, only enumerating keys whose last write time changed
+
+    :param snapshot: previous snapshot, left untouched
+    :param backend: optional registry backend, defaults to module wide backend
+    :return: (new snapshot, changes) where changes is
+             {"added_keys": [paths], "removed_keys": [paths],
+              "changed_keys": {path: {"added": {name: value}, "removed": {name: value}, "changed": {name: {"old": value, "new": value}}}}}
+             paths being relative to the snapshot root
+    """
+    new_snapshot = RegistrySnapshot(snapshot.hive, snapshot.key, snapshot.arch)
+    enumerated = _fill_snapshot(new_snapshot, snapshot, get_backend(backend))
+    return new_snapshot, _diff(snapshot, new_snapshot, enumerated)
+
+
+def diff_snapshots(old: RegistrySnapshot, new: RegistrySnapshot) -> dict:
+    """
+    Compare two snapshots of the same subtree, see refresh_snapshot() for result format
+    """
+    return _diff(old, new, new.keys)
@@ -0,0 +1,604 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+Registry change notification watcher
+
+Watches many registry keys from a single background thread using key change notifications
+(RegNotifyChangeKeyValue) instead of polling. Bursts of changes are coalesced: changed keys are
+delivered once no change happened for debounce seconds, or at the latest max_delay seconds after
+the first change of a burst.
+
+Changes are delivered as lists of watched key full paths, ie ["HKEY_LOCAL_MACHINE\\SOFTWARE\\Vendor"],
+to callbacks running in the watcher thread, or through asyncio streams.
+
+Notifications only work on the local registry. MemoryBackend changes made through the backend API
+(set_value, RegistryBatch, delete_tree...) are notified too, so watchers can be tested on any OS.
+
+Usage:
+    from windows_tools import registry
+    from windows_tools.registry.watch import RegistryWatcher
+
+    with RegistryWatcher(debounce=1) as watcher:
+        watcher.watch(registry.HKEY_LOCAL_MACHINE, r"SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Uninstall")
+        watcher.watch(registry.HKEY_LOCAL_MACHINE, r"SYSTEM\\CurrentControlSet\\Services\\SharedAccess\\Parameters\\FirewallPolicy")
+        watcher.add_callback(lambda paths: print("Changed:", paths))
+        ...
+
+    async for paths in watcher.stream():
+        print("Changed:", paths)
+"""
+
+import asyncio
+import ctypes
+import threading
+from collections import OrderedDict
+from logging import getLogger
+from time import monotonic
+from typing import Callable, Dict, List, Optional
+
+from windows_tools.registry import (
+    HIVE_NAMES,
+    MemoryBackend,
+    MemoryKey,
+    RegistryBackend,
+    RegistrySession,
+    WinregBackend,
+    get_backend,
+    _close_handles,
+    _split_path,
+    KEY_NOTIFY,
+    KEY_READ,
+)
+
+logger = getLogger(__name__)
+
+# RegNotifyChangeKeyValue filters, subkey added / deleted and value changes
+REG_NOTIFY_CHANGE_NAME = 0x00000001
+REG_NOTIFY_CHANGE_LAST_SET = 0x00000004
+# WaitForMultipleObjects limit, one slot is kept for the wake up event
+MAXIMUM_WAIT_OBJECTS = 64
+# Max wait per group of events when more than MAXIMUM_WAIT_OBJECTS - 1 keys are watched
+GROUP_WAIT_INTERVAL = 0.05
+
+
+class MemoryNotifier:
+    """
+    Change notifier for MemoryBackend, fed by the backend change listeners
+    """
+
+    def __init__(self, backend: MemoryBackend):
+        self.backend = backend
+        self._condition = threading.Condition()
+        self._watches = {}  # type: Dict[int, tuple]
+        self._fired = OrderedDict()  # type: OrderedDict
+        self._woken = False
+        self._next_token = 0
+        backend.add_listener(self._on_change)
+
+    def _on_change(self, node: MemoryKey, deleted: bool) -> None:
+        ancestors = set()
+        parent = node
+        while parent is not None:
+            ancestors.add(id(parent))
+            parent = parent.parent
+        with self._condition:
+            for token, (watched, subtree) in self._watches.items():
+                if watched is node or (subtree and id(watched) in ancestors):
+                    self._fired[token] = None
+                elif deleted:
+                    # Watched key lives in the deleted subtree
+                    parent = watched.parent
+                    while parent is not None and parent is not node:
+                        parent = parent.parent
+                    if parent is node:
+                        self._fired[token] = None
+            if self._fired:
+                self._condition.notify_all()
+
+    def register(self, handle, subtree: bool) -> int:
+        with self._condition:
+            self._next_token += 1
+            self._watches[self._next_token] = (
+                self.backend._resolve(handle),
+                subtree,
+            )
+            return self._next_token
+
+    def unregister(self, token: int) -> None:
+        with self._condition:
+            self._watches.pop(token, None)
+            self._fired.pop(token, None)
+
+    def wait(self, timeout: Optional[float]) -> List[int]:
+        """
+        Wait until watched keys change, or until timeout seconds, None waiting until wake()
+        Returns tokens of changed watches
+        """
+        with self._condition:
+            if not self._fired and not self._woken:
+                self._condition.wait(timeout)
+            self._woken = False
+            fired = list(self._fired)
+            self._fired.clear()
+            return fired
+
+    def wake(self) -> None:
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        try:
+            self.backend.remove_listener(self._on_change)
+        except ValueError:
+            pass
+
+
+class Win32Notifier:
+    """
+    Change notifier for the live registry, one auto reset event per watched key
+    Notifications are one shot, so they are armed again every time they fire
+    """
+
+    def __init__(self):
+        from ctypes import wintypes
+
+        self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self._advapi32 = ctypes.WinDLL("advapi32")
+        self._kernel32.CreateEventW.restype = wintypes.HANDLE
+        self._kernel32.CreateEventW.argtypes = [
+            ctypes.c_void_p,
+            wintypes.BOOL,
+            wintypes.BOOL,
+            wintypes.LPCWSTR,
+        ]
+        self._kernel32.WaitForMultipleObjects.restype = wintypes.DWORD
+        self._kernel32.WaitForMultipleObjects.argtypes = [
+            wintypes.DWORD,
+            ctypes.POINTER(wintypes.HANDLE),
+            wintypes.BOOL,
+            wintypes.DWORD,
+        ]
+        self._kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
+        self._kernel32.SetEvent.argtypes = [wintypes.HANDLE]
+        self._kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        self._advapi32.RegNotifyChangeKeyValue.argtypes = [
+            wintypes.HANDLE,
+            wintypes.BOOL,
+            wintypes.DWORD,
+            wintypes.HANDLE,
+            wintypes.BOOL,
+        ]
+        self._handle_type = wintypes.HANDLE
+        self._wake_event = self._create_event()
+        self._watches = OrderedDict()  # type: OrderedDict
+
+    def _create_event(self):
+        event = self._kernel32.CreateEventW(None, False, False, None)
+        if not event:
+            raise ctypes.WinError(ctypes.get_last_error())
+        return event
+
+    def _arm(self, handle, subtree: bool, event) -> None:
+        result = self._advapi32.RegNotifyChangeKeyValue(
+            int(handle),
+            subtree,
+            REG_NOTIFY_CHANGE_NAME | REG_NOTIFY_CHANGE_LAST_SET,
+            event,
+            True,
+        )
+        if result != 0:
+            raise ctypes.WinError(result)
+
+    def register(self, handle, subtree: bool) -> int:
+        event = self._create_event()
+        try:
+            self._arm(handle, subtree, event)
+        except OSError:
+            self._kernel32.CloseHandle(event)
+            raise
+        self._watches[event] = (handle, subtree)
+        return event
+
+    def unregister(self, token: int) -> None:
+        if self._watches.pop(token, None) is not None:
+            # Closing the key handle, done by the watcher, cancels the notification
+            self._kernel32.CloseHandle(token)
+
+    def _wait_group(self, events: list, milliseconds: int) -> List[int]:
+        handles = (self._handle_type * (len(events) + 1))(self._wake_event, *events)
+        result = self._kernel32.WaitForMultipleObjects(
+            len(events) + 1, handles, False, milliseconds
+        )
+        if result == 0xFFFFFFFF:
+            raise ctypes.WinError(ctypes.get_last_error())
+        if result >= len(events) + 1:
+            # WAIT_TIMEOUT
+            return []
+        fired = []
+        if result > 0:
+            fired.append(events[result - 1])
+        # Only the first signaled event is reported, collect the others without waiting
+        for event in events[result:]:
+            if self._kernel32.WaitForSingleObject(event, 0) == 0:
+                fired.append(event)
+        return fired
+
+    def wait(self, timeout: Optional[float]) -> List[int]:
+        """
+        Wait until watched keys change, or until timeout seconds, None waiting until wake()
+        Returns tokens of changed watches
+        """
+        events = list(self._watches)
+        group_size = MAXIMUM_WAIT_OBJECTS - 1
+        groups = [
+            events[index : index + group_size]
+            for index in range(0, len(events), group_size)
+        ] or [[]]
+        if len(groups) == 1:
+            milliseconds = 0xFFFFFFFF if timeout is None else int(timeout * 1000)
+            fired = self._wait_group(groups[0], milliseconds)
+        else:
+            # Too many events for one wait, poll every group then wait a bit on each of them
+            deadline = None if timeout is None else monotonic() + timeout
+            fired = []
+            while not fired:
+                for group in groups:
+                    fired += self._wait_group(group, 0)
+                if fired or (deadline is not None and monotonic() >= deadline):
+                    break
+                for group in groups:
+                    fired += self._wait_group(
+                        group, int(GROUP_WAIT_INTERVAL * 1000 / len(groups))
+                    )
+                    if fired:
+                        break
+        for event in fired:
+            handle, subtree = self._watches[event]
+            try:
+                self._arm(handle, subtree, event)
+            except OSError as exc:
+                # ie key was deleted, watch stays silent until unregistered
+                logger.debug("Cannot watch registry key again: %s" % exc)
+        return fired
+
+    def wake(self) -> None:
+        self._kernel32.SetEvent(self._wake_event)
+
+    def close(self) -> None:
+        for event in list(self._watches):
+            self.unregister(event)
+        self._kernel32.CloseHandle(self._wake_event)
+
+
+def create_notifier(backend: RegistryBackend):
+    """
+    Return a change notifier for backend, raises NotImplementedError for backends without notifications
+    """
+    if isinstance(backend, RegistrySession):
+        backend = backend.backend
+    if isinstance(backend, MemoryBackend):
+        return MemoryNotifier(backend)
+    if isinstance(backend, WinregBackend):
+        return Win32Notifier()
+    raise NotImplementedError(
+        "Registry backend %s cannot notify changes" % type(backend).__name__
+    )
+
+
+class _Watch:
+    __slots__ = ("path", "hive", "key", "arch", "subtree", "handle", "token")
+
+    def __init__(self, hive: int, key: str, arch: int, subtree: bool, handle):
+        self.path = "\\".join([HIVE_NAMES.get(hive, str(hive))] + _split_path(key))
+        self.hive = hive
+        self.key = key
+        self.arch = arch
+        self.subtree = subtree
+        self.handle = handle
+        self.token = None
+
+
+class RegistryChangeStream:
+    """
+    Asyncio stream of changed key path lists, see RegistryWatcher.stream()
+    """
+
+    def __init__(self, watcher: "RegistryWatcher", loop=None):
+        self._watcher = watcher
+        self._loop = loop or asyncio.get_event_loop()
+        self._queue = asyncio.Queue()
+        self._closed = False
+
+    def __aiter__(self) -> "RegistryChangeStream":
+        return self
+
+    async def __anext__(self) -> List[str]:
+        if self._closed and self._queue.empty():
+            raise StopAsyncIteration
+        paths = await self._queue.get()
+        if paths is None:
+            raise StopAsyncIteration
+        return paths
+
+    def _put(self, paths: Optional[List[str]]) -> None:
+        # Called from the watcher thread
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, paths)
+        except RuntimeError:
+            # Event loop is closed
+            self._closed = True
+
+    def close(self) -> None:
+        """
+        Stop receiving changes, pending ones can still be read
+        """
+        if not self._closed:
+            self._closed = True
+            self._watcher._remove_stream(self)
+            self._put(None)
+
+
+class RegistryWatcher:
+    """
+    Watches registry keys for changes from a single background thread
+    """
+
+    def __init__(
+        self,
+        backend: RegistryBackend = None,
+        debounce: float = 0.5,
+        max_delay: float = 5,
+    ):
+        """
+        :param backend: optional registry backend, defaults to module wide backend
+        :param debounce: changes are delivered once no other change happened for debounce seconds
+        :param max_delay: max seconds between the first change of a burst and its delivery
+        """
+        self.backend = get_backend(backend)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.stats = {"notifications": 0, "deliveries": 0}
+        self._notifier = None
+        self._lock = threading.Lock()
+        # watch() and unwatch() wait for the watcher thread to apply their change
+        self._synced = threading.Condition(self._lock)
+        self._sync_requests = 0
+        self._sync_done = 0
+        self._watches = OrderedDict()  # type: OrderedDict
+        # Watches are registered and unregistered by the watcher thread, which owns notifications
+        self._added = []  # type: List[_Watch]
+        self._removed = []  # type: List[_Watch]
+        self._tokens = {}  # type: Dict[int, _Watch]
+        self._callbacks = []  # type: List[Callable[[List[str]], None]]
+        self._streams = []  # type: List[RegistryChangeStream]
+        self._thread = None  # type: Optional[threading.Thread]
+        self._stopping = threading.Event()
+        # Error that stopped the watcher thread, raised by watch() and unwatch() until stop()
+        self._error = None  # type: Optional[OSError]
+
+    def __enter__(self) -> "RegistryWatcher":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def watch(self, hive: int, key: str, subtree: bool = True, arch: int = 0) -> str:
+        """
+        Watch a registry key, raises FileNotFoundError when the key does not exist
+
+        :param hive: registry hive (windows.registry.HKEY_LOCAL_MACHINE...)
+        :param key: key to watch
+        :param subtree: also watch subkeys of key
+        :param arch: registry view (0 = default, windows.registry.KEY_WOW64_64KEY, windows.registry.KEY_WOW64_32KEY)
+        :return: full key path, as delivered on change
+        """
+        open_reg = self.backend.connect(None, hive)
+        try:
+            handle = self.backend.open_key(open_reg, key, KEY_READ | KEY_NOTIFY | arch)
+        except OSError as exc:
+            raise FileNotFoundError("Cannot watch registry key [%s]. %s" % (key, exc))
+        finally:
+            self.backend.close_key(open_reg)
+        watch = _Watch(hive, key, arch, subtree, handle)
+        with self._lock:
+            previous = self._watches.pop((watch.path.lower(), arch), None)
+            if previous is not None:
+                self._removed.append(previous)
+            self._watches[(watch.path.lower(), arch)] = watch
+            self._added.append(watch)
+        self._wait_sync()
+        return watch.path
+
+    def unwatch(self, hive: int, key: str, arch: int = 0) -> None:
+        path = "\\".join([HIVE_NAMES.get(hive, str(hive))] + _split_path(key))
+        with self._lock:
+            watch = self._watches.pop((path.lower(), arch), None)
+            if watch is not None:
+                self._removed.append(watch)
+        self._wait_sync()
+
+    def _wait_sync(self, timeout: float = 5) -> None:
+        """
+        Wake the watcher thread up and wait until it registered watch changes
+        Raises OSError when the watcher thread stopped on an error
+        """
+        with self._lock:
+            self._sync_requests += 1
+            request = self._sync_requests
+        if self._thread is None or self._thread is threading.current_thread():
+            return
+        self._notifier.wake()
+        with self._synced:
+            deadline = monotonic() + timeout
+            while (
+                self._sync_done < request
+                and self._thread is not None
+                and self._error is None
+            ):
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self._synced.wait(remaining)
+            if self._error is not None:
+                raise OSError("Registry watcher stopped: %s" % self._error)
+
+    @property
+    def watched(self) -> List[str]:
+        with self._lock:
+            return [watch.path for watch in self._watches.values()]
+
+    def add_callback(self, callback: Callable[[List[str]], None]) -> None:
+        """
+        Call callback(changed key paths) on every delivery, from the watcher thread
+        """
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[List[str]], None]) -> None:
+        self._callbacks.remove(callback)
+
+    def stream(self, loop=None) -> RegistryChangeStream:
+        """
+        Return an async iterator of changed key path lists, bound to the running (or given) event loop
+
+            async for paths in watcher.stream():
+                print(paths)
+        """
+        stream = RegistryChangeStream(self, loop)
+        with self._lock:
+            self._streams.append(stream)
+        return stream
+
+    def _remove_stream(self, stream: RegistryChangeStream) -> None:
+        with self._lock:
+            try:
+                self._streams.remove(stream)
+            except ValueError:
+                pass
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        if self._notifier is None:
+            self._notifier = create_notifier(self.backend)
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="RegistryWatcher", daemon=True
+        )
+        self._thread.start()
+        self._wait_sync()
+
+    def stop(self) -> None:
+        """
+        Stop watching and forget watched keys, pending changes are delivered first, streams end
+        """
+        if self._thread is not None:
+            self._stopping.set()
+            self._notifier.wake()
+            self._thread.join()
+            self._thread = None
+            self._error = None
+        with self._lock:
+            watches = list(self._watches.values()) + self._removed
+            self._watches.clear()
+            self._added = []
+            self._removed = []
+            streams = self._streams
+            self._streams = []
+        for watch in watches:
+            if watch.token is not None:
+                self._notifier.unregister(watch.token)
+            _close_handles(self.backend, watch.handle)
+        self._tokens = {}
+        if self._notifier is not None:
+            self._notifier.close()
+            self._notifier = None
+        for stream in streams:
+            stream._closed = True
+            stream._put(None)
+
+    def _sync(self) -> None:
+        with self._lock:
+            added, self._added = self._added, []
+            removed, self._removed = self._removed, []
+            request = self._sync_requests
+        for watch in removed:
+            if watch.token is not None:
+                self._notifier.unregister(watch.token)
+                self._tokens.pop(watch.token, None)
+            self.backend.close_key(watch.handle)
+        for watch in added:
+            if watch in removed:
+                continue
+            handle = watch.handle
+            if isinstance(self.backend, RegistrySession):
+                # Notifiers work on handles of the wrapped backend
+                handle = self.backend.backend_handle(handle)
+            try:
+                watch.token = self._notifier.register(handle, watch.subtree)
+                self._tokens[watch.token] = watch
+            except OSError as exc:
+                logger.error("Cannot watch registry key [%s]: %s" % (watch.path, exc))
+        with self._synced:
+            self._sync_done = request
+            self._synced.notify_all()
+
+    def _deliver(self, paths: List[str]) -> None:
+        self.stats["deliveries"] += 1
+        for callback in list(self._callbacks):
+            try:
+                callback(paths)
+            except Exception as exc:
+                logger.error("Registry watcher callback failed: %s" % exc)
+        with self._lock:
+            streams = list(self._streams)
+        for stream in streams:
+            stream._put(list(paths))
+
+    def _run(self) -> None:
+        pending = OrderedDict()  # type: OrderedDict
+        first_change = last_change = 0.0
+        while True:
+            self._sync()
+            if self._stopping.is_set():
+                break
+            timeout = None
+            if pending:
+                deadline = min(
+                    last_change + self.debounce, first_change + self.max_delay
+                )
+                timeout = max(0, deadline - monotonic())
+            try:
+                tokens = self._notifier.wait(timeout)
+            except OSError as exc:
+                logger.error("Registry watcher cannot wait for changes: %s" % exc)
+                with self._synced:
+                    self._error = exc
+                    self._synced.notify_all()
+                break
+            now = monotonic()
+            with self._lock:
+                # Keys unwatched since the last sync are ignored
+                watches = [
+                    self._tokens[token]
+                    for token in tokens
+                    if token in self._tokens
+                    and self._tokens[token] not in self._removed
+                ]
+            for watch in watches:
+                self.stats["notifications"] += 1
+                if not pending:
+                    first_change = now
+                last_change = now
+                pending[watch.path] = None
+            if pending and now >= min(
+                last_change + self.debounce, first_change + self.max_delay
+            ):
+                self._deliver(list(pending))
+                pending.clear()
+        if pending:
+            self._deliver(list(pending))
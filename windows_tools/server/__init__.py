@@ -18,18 +18,20 @@ __author__ = "Orsiris de Jong"
 __copyright__ = "Copyright (C) 2020-2024 Orsiris de Jong"
 __description__ = "Windows server identification functions"
 __licence__ = "BSD 3 Clause"
-__version__ = "0.1.1"
-__build__ = "2020040902"
+__version__ = "0.3.0"
+__build__ = "2026101720"
 
 
-import wmi
+from windows_tools.wmi_queries import query_wmi, query_wmi_many
 
 
 def is_windows_server():
-    wmi_standard = wmi.WMI(namespace="cimv2")
-
     try:
-        result = wmi_standard.Win32_OperatingSystem()[0].ProductType
+        result = query_wmi(
+            "SELECT ProductType FROM Win32_OperatingSystem",
+            name="windows_tools.server.is_windows_server",
+            cache=True,
+        )[0]["ProductType"]
         # ProductType 1 = Workstation, 2 = Domain Controller, 3 = Server
         # https://docs.microsoft.com/en-us/windows/win32/cimwin32prov/win32-operatingsystem
         if result in [2, 3]:
@@ -55,10 +57,29 @@ def is_rds_server():
 
     :return: boolean
     """
-    wmi_standard = wmi.WMI(namespace="cimv2")
+    # Fallbacks are queried concurrently, then checked in order
+    results, _ = query_wmi_many(
+        [
+            {
+                "name": "os_product_suite",
+                "query_str": "SELECT OSProductSuite FROM Win32_OperatingSystem",
+                "cache": True,
+            },
+            {
+                "name": "server_feature",
+                "query_str": "SELECT ID FROM Win32_ServerFeature WHERE ID = 18",
+                "can_be_skipped": True,
+            },
+            {
+                "name": "terminal_service",
+                "query_str": "SELECT Name FROM Win32_TerminalService WHERE State = 'Running'",
+                "can_be_skipped": True,
+            },
+        ]
+    )
 
     try:
-        result = wmi_standard.Win32_OperatingSystem()[0].OSProductSuite
+        result = results["os_product_suite"][0]["OSProductSuite"]
         # Let's assume it's a client computer (or a server without RDS capabilities)
         # Might also be a server with RDS installed in admin mode (OSProductSuite=276)
         if result & 256:
@@ -69,19 +90,8 @@ def is_rds_server():
     except Exception:
         pass
 
-    try:
-        result = wmi_standard.Win32_ServerFeature(ID=18)
-        if result == []:
-            return False
-        return True
-    # Let's keep a very broad exception here because it would be a shame if install stops because of missing features
-    except Exception:
-        pass
-
-    try:
-        result = wmi_standard.Win32_TerminalService(State="Running")
-        if result == []:
-            return False
-        return True
-    except Exception:
-        return None
+    # Failed queries give None, eg Win32_ServerFeature doesn't exist on clients
+    for name in ("server_feature", "terminal_service"):
+        if results[name] is not None:
+            return results[name] != []
+    return None
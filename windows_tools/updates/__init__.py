@@ -19,16 +19,22 @@ __author__ = "Orsiris de Jong"
 __copyright__ = "Copyright (C) 2021-2024 Orsiris de Jong"
 __description__ = "Retrieve complete Windows Update installed updates list"
 __licence__ = "BSD 3 Clause"
-__version__ = "2.2.0"
-__build__ = "2024121001"
+__version__ = "2.4.0"
+__build__ = "2026101725"
 
 import re
 import logging
-from win32com import client
 import dateutil.parser
 from windows_tools import wmi_queries
+from windows_tools.wmi_queries.wql import select
 from windows_tools import registry
 
+try:
+    from win32com import client
+except ImportError:
+    # Only needed by get_windows_updates_com(), WMI and registry paths also run against fixtures on other platforms
+    client = None
+
 logger = logging.getLogger(__intname__)
 
 # As of 2021, KB numbers go up to 7 digits
@@ -42,7 +48,12 @@ def get_windows_updates_wmi():
 
     updates = []
 
-    result = wmi_queries.query_wmi("SELECT * FROM Win32_QuickFixEngineering")
+    result = wmi_queries.query_wmi(
+        select(
+            "Win32_QuickFixEngineering",
+            ["HotFixID", "InstalledOn", "Description", "Caption"],
+        )
+    )
     for entry in result:
         # Since freaking windows WMI returns localized dates (thanks), we have to parse them to make sure
         # we have standard YYYY-MM-DD date formats
@@ -98,6 +109,8 @@ def get_windows_updates_com(
     valid_operation_codes = [1, 3]
     valid_status_codes = [1, 2, 3]
 
+    if client is None:
+        raise OSError("Windows Update COM API is not available on this platform")
     session = client.Dispatch(update_path)
     searcher = session.CreateUpdateSearcher()
     result = searcher.GetTotalHistoryCount()
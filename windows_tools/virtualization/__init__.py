@@ -18,8 +18,8 @@ __author__ = "Orsiris de Jong"
 __copyright__ = "Copyright (C) 2020-2024 Orsiris de Jong"
 __description__ = "Simple virtualization platform identification for Windows guest"
 __licence__ = "BSD 3 Clause"
-__version__ = "0.3.2"
-__build__ = "2021070201"
+__version__ = "0.5.0"
+__build__ = "2026101720"
 
 
 from typing import Tuple
@@ -30,48 +30,35 @@ import windows_tools.wmi_queries
 logger = getLogger(__intname__)
 
 
+# (product_id key, query), hardware data is cached by wmi_queries, see WMI_CACHE_TTLS
+PLATFORM_QUERIES = [
+    ("computersystem", "SELECT Manufacturer, Model FROM Win32_ComputerSystem"),
+    ("baseboard", "SELECT Manufacturer, Product FROM Win32_Baseboard"),
+    ("bios", "SELECT Manufacturer, SerialNumber, Version FROM Win32_Bios"),
+    ("diskdrive", "SELECT Caption, Model, SerialNumber FROM Win32_DiskDrive"),
+]
+
+
 def get_relevant_platform_info() -> dict:
+    """
+    Hardware identification data, queries being run concurrently
+    """
     product_id = {}
 
     # noinspection PyBroadException
     try:
         # Create a list of various computer data which will allow to check if we're running on a virtual system
-
-        result = windows_tools.wmi_queries.query_wmi(
-            "SELECT Manufacturer, Model FROM Win32_ComputerSystem",
-            name="windows_tools.virtualization.get_relavant_platform_info_1",
-        )
-        try:
-            product_id["computersystem"] = result[0]
-        except IndexError:
-            pass
-
-        result = windows_tools.wmi_queries.query_wmi(
-            "SELECT Manufacturer, Product FROM Win32_Baseboard",
-            name="windows_tools.virtualization.get_relavant_platform_info_2",
-        )
-        try:
-            product_id["baseboard"] = result[0]
-        except IndexError:
-            pass
-
-        result = windows_tools.wmi_queries.query_wmi(
-            "SELECT Manufacturer, SerialNumber, Version FROM Win32_Bios",
-            name="windows_tools.virtualization.get_relavant_platform_info_3",
-        )
-        try:
-            product_id["bios"] = result[0]
-        except IndexError:
-            pass
-
-        result = windows_tools.wmi_queries.query_wmi(
-            "SELECT Caption, Model, SerialNumber FROM Win32_DiskDrive",
-            name="windows_tools.virtualization.get_relavant_platform_info_4",
+        results, _ = windows_tools.wmi_queries.query_wmi_many(
+            [
+                {"name": key, "query_str": query_str, "cache": True}
+                for key, query_str in PLATFORM_QUERIES
+            ]
         )
-        try:
-            product_id["diskdrive"] = result[0]
-        except IndexError:
-            pass
+        for key, _ in PLATFORM_QUERIES:
+            try:
+                product_id[key] = results[key][0]
+            except (IndexError, TypeError):
+                pass
     except Exception:
         logger.error("Cannot perform virtualization check.")
 
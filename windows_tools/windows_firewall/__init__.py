@@ -15,14 +15,19 @@ Versioning semantics:
 
 __intname__ = "windows_tools.windows_firewall"
 __author__ = "Orsiris de Jong"
-__copyright__ = "Copyright (C) 2020 Orsiris de Jong"
+__copyright__ = "Copyright (C) 2020-2026 Orsiris de Jong"
 __description__ = "Windows firewall state retrieval"
 __licence__ = "BSD 3 Clause"
-__version__ = "0.1.1"
-__build__ = "2020110201"
+__version__ = "0.2.0"
+__build__ = "2026101705"
 
 import windows_tools.registry
 
+FIREWALL_POLICY_KEY = (
+    r"SYSTEM\CurrentControlSet\Services\SharedAccess\Parameters\FirewallPolicy"
+)
+FIREWALL_PROFILES = ["StandardProfile", "DomainProfile", "PublicProfile"]
+
 
 def is_firewall_active() -> bool:
     """
@@ -30,31 +35,17 @@ def is_firewall_active() -> bool:
 
     :return: (bool)
     """
-    try:
-        fw_std = windows_tools.registry.get_value(
-            windows_tools.registry.HKEY_LOCAL_MACHINE,
-            r"SYSTEM\CurrentControlSet\Services\SharedAccess\Parameters\FirewallPolicy\StandardProfile",
-            "EnableFirewall",
-        )
-    except FileNotFoundError:
-        fw_std = 0
-    try:
-        fw_dom = windows_tools.registry.get_value(
-            windows_tools.registry.HKEY_LOCAL_MACHINE,
-            r"SYSTEM\CurrentControlSet\Services\SharedAccess\Parameters\FirewallPolicy\StandardProfile",
-            "EnableFirewall",
-        )
-    except FileNotFoundError:
-        fw_dom = 0
-    try:
-        fw_pub = windows_tools.registry.get_value(
-            windows_tools.registry.HKEY_LOCAL_MACHINE,
-            r"SYSTEM\CurrentControlSet\Services\SharedAccess\Parameters\FirewallPolicy\StandardProfile",
-            "EnableFirewall",
-        )
-    except FileNotFoundError:
-        fw_pub = 0
-
-    if fw_std == 1 or fw_dom == 1 or fw_pub == 1:
-        return True
+    results = windows_tools.registry.query_many(
+        [
+            (
+                windows_tools.registry.HKEY_LOCAL_MACHINE,
+                FIREWALL_POLICY_KEY + "\\" + profile,
+                ["EnableFirewall"],
+            )
+            for profile in FIREWALL_PROFILES
+        ]
+    )
+    for result in results:
+        if result["values"].get("EnableFirewall") == 1:
+            return True
     return False
@@ -20,11 +20,19 @@ __author__ = "Orsiris de Jong"
 __copyright__ = "Copyright (C) 2020-2024 Orsiris de Jong"
 __description__ = "Windows WMI query wrapper, wmi timezone converters"
 __licence__ = "BSD 3 Clause"
-__version__ = "1.0.1"
-__build__ = "2024110701"
+__version__ = "1.9.0"
+__build__ = "2026101725"
 
 import logging
 import re
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
 from datetime import datetime, timedelta, timezone
 import time
 from logging.handlers import QueueHandler
@@ -36,14 +44,464 @@ try:
 except ImportError:
     from queue import Queue
     from queue import Queue as SimpleQueue
-from typing import Union
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-# imports to debug WMI requests with better error messages
-import pywintypes
-import wmi
+try:
+    # imports to debug WMI requests with better error messages
+    import pythoncom
+    import pywintypes
+    import wmi
+
+    _HAS_WMI = True
+    _COM_ERROR = pywintypes.com_error
+    _X_ACCESS_DENIED = wmi.x_access_denied
+    _X_WMI = wmi.x_wmi
+except ImportError:
+    # Non Windows platforms, connection pools still work with injected connection factories
+    _HAS_WMI = False
+    pythoncom = None
+    pywintypes = None
+    wmi = None
+
+    class _WmiUnavailable(Exception):
+        """
+        Never raised, stands for pywin32 and wmi exceptions
+        """
+
+    _COM_ERROR = _X_ACCESS_DENIED = _X_WMI = _WmiUnavailable
 
 logger = logging.getLogger(__intname__)
 
+# Pooled connections unused for longer are closed instead of being reused
+WMI_POOL_IDLE_TIMEOUT = 300
+# Pooled connections unused for longer are health checked before being reused
+WMI_POOL_HEALTH_CHECK_INTERVAL = 30
+
+# Objects converted at once by iter_wmi()
+WMI_BATCH_SIZE = 256
+# IWbemServices::ExecQuery flags
+WBEM_FLAG_RETURN_IMMEDIATELY = 0x10
+WBEM_FLAG_FORWARD_ONLY = 0x20
+
+WMI_MONIKER = r"winmgmts:{impersonationLevel=impersonate,authenticationLevel=pktPrivacy,(LockMemory, !IncreaseQuota)}!\\%s\root\%s"
+
+# Pool key: (computer, namespace, moniker or None)
+ConnectionKey = Tuple[str, str, Optional[str]]
+
+
+def get_moniker(computer: str, namespace: str) -> Optional[str]:
+    """
+    Return the moniker used to connect to a namespace, None for namespaces reached by name
+    """
+    if namespace.startswith("cimv2"):
+        return WMI_MONIKER % (computer, namespace)
+    return None
+
+
+def wmi_connection_factory(computer: str, namespace: str, moniker: Optional[str]):
+    """
+    Default connection factory, opens a wmi.WMI() connection
+    """
+    if not _HAS_WMI:
+        raise OSError("WMI is not available on this platform")
+    if moniker:
+        return wmi.WMI(moniker=moniker)
+    return wmi.WMI(namespace=namespace)
+
+
+def wmi_health_check(connection) -> bool:
+    """
+    Default health check, fetches the __SystemClass definition, which is always present and cheap
+    """
+    # noinspection PyBroadException
+    try:
+        connection._namespace.Get("__SystemClass")
+        return True
+    except Exception:
+        return False
+
+
+class WmiConnectionPool:
+    """
+    Per thread WMI connection pool, keyed on (computer, namespace, moniker)
+
+    COM objects belong to the thread (apartment) that created them, so every thread gets its own connections.
+    Connections unused for longer than idle_timeout seconds are closed instead of being reused, and connections
+    unused for longer than health_check_interval seconds are health checked before being reused.
+
+    factory(computer, namespace, moniker) opens connections and health_check(connection) returns False for broken ones,
+    both can be replaced, eg by fakes in tests
+    """
+
+    def __init__(
+        self,
+        factory: Callable = None,
+        idle_timeout: float = WMI_POOL_IDLE_TIMEOUT,
+        health_check: Callable = None,
+        health_check_interval: float = WMI_POOL_HEALTH_CHECK_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.factory = factory or wmi_connection_factory
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check or wmi_health_check
+        self.health_check_interval = health_check_interval
+        self.clock = clock
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "expired": 0,
+            "unhealthy": 0,
+            "discarded": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Pool wide counters, for all threads
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _connections(self) -> Dict[ConnectionKey, list]:
+        """
+        Current thread connections, as {key: [connection, last use time]}
+        """
+        try:
+            return self._local.connections
+        except AttributeError:
+            self._local.connections = {}
+            return self._local.connections
+
+    def _expire(self, connections: Dict[ConnectionKey, list], now: float) -> None:
+        for key in [
+            key
+            for key, (_, last_used) in connections.items()
+            if now - last_used > self.idle_timeout
+        ]:
+            del connections[key]
+            self._count("expired")
+
+    def get(
+        self,
+        computer: str = "localhost",
+        namespace: str = "cimv2",
+        moniker: Optional[str] = None,
+    ):
+        """
+        Return a connection of the current thread, opening it when needed
+        Connections opening failures are raised as is
+        """
+        connections = self._connections()
+        now = self.clock()
+        self._expire(connections, now)
+        key = (computer, namespace, moniker)
+        try:
+            entry = connections[key]
+        except KeyError:
+            pass
+        else:
+            if now - entry[1] <= self.health_check_interval or self.health_check(
+                entry[0]
+            ):
+                entry[1] = now
+                self._count("reused")
+                return entry[0]
+            del connections[key]
+            self._count("unhealthy")
+        connection = self.factory(computer, namespace, moniker)
+        connections[key] = [connection, now]
+        self._count("created")
+        return connection
+
+    def discard(
+        self,
+        computer: str = "localhost",
+        namespace: str = "cimv2",
+        moniker: Optional[str] = None,
+    ) -> None:
+        """
+        Drop a connection of the current thread, eg after a query failed with it
+        """
+        if self._connections().pop((computer, namespace, moniker), None) is not None:
+            self._count("discarded")
+
+    def clear(self) -> None:
+        """
+        Drop all connections of the current thread
+        """
+        self._connections().clear()
+
+    def __len__(self) -> int:
+        """
+        Number of connections of the current thread
+        """
+        return len(self._connections())
+
+
+_POOL = None  # type: Optional[WmiConnectionPool]
+
+
+def set_connection_pool(pool: Optional[WmiConnectionPool]) -> None:
+    """
+    Set the connection pool used by query_wmi()
+    None restores the default pool
+    """
+    global _POOL
+    _POOL = pool
+
+
+def get_connection_pool(pool: WmiConnectionPool = None) -> WmiConnectionPool:
+    """
+    Return given pool, or the current module wide pool
+    """
+    global _POOL
+    if pool is not None:
+        return pool
+    if _POOL is None:
+        _POOL = WmiConnectionPool()
+    return _POOL
+
+
+@contextmanager
+def use_connection_pool(pool: WmiConnectionPool):
+    """
+    Temporarily set the module wide connection pool, eg with a fake connection factory
+    """
+    global _POOL
+    previous_pool = _POOL
+    _POOL = pool
+    try:
+        yield pool
+    finally:
+        _POOL = previous_pool
+
+
+# Query results cache key: (computer, namespace, normalized query, depth, rows, parse_datetimes)
+CacheKey = Tuple[str, str, str, int, bool, bool]
+
+_QUOTED_LITERALS = re.compile(r"('[^']*'|\"[^\"]*\")")
+_FROM_CLASS = re.compile(r"\sFROM\s+(\w+)", re.IGNORECASE)
+
+
+def normalize_query(query_str: str) -> str:
+    """
+    Normalize a WQL query so that equivalent spellings share the same cache entry
+    Whitespace is collapsed and keywords / identifiers are lowercased, quoted literals are kept as is
+    """
+    # Splitting on a capturing group alternates text and quoted literals
+    parts = _QUOTED_LITERALS.split(query_str)
+    for index in range(0, len(parts), 2):
+        parts[index] = " ".join(parts[index].split()).lower()
+    return "".join(parts)
+
+
+def get_query_class(query_str: str) -> Optional[str]:
+    """
+    Return the lowercased WMI class name a query reads from, eg win32_bios
+    """
+    match = _FROM_CLASS.search(query_str)
+    if match:
+        return match.group(1).lower()
+    return None
+
+
+# Seconds cached results stay valid, per lowercased WMI class
+# Hardware and setup classes practically never change while running
+WMI_CACHE_TTLS = {
+    "win32_baseboard": 86400,
+    "win32_bios": 86400,
+    "win32_computersystem": 3600,
+    "win32_diskdrive": 600,
+    "win32_operatingsystem": 600,
+    "win32_timezone": 3600,
+}
+WMI_CACHE_DEFAULT_TTL = 60
+WMI_CACHE_SIZE = 256
+
+
+class WmiCache:
+    """
+    Opt-in LRU cache of query_wmi() results, keyed on (computer, namespace, normalized query, depth, rows)
+    Every entry expires after the TTL of the queried class, see WMI_CACHE_TTLS, or default_ttl
+
+    Entries can be dropped explicitly with invalidate(), eg after changing the time zone
+    stats gives the number of hits, misses, evictions, expirations and invalidations
+    """
+
+    def __init__(
+        self,
+        max_entries: int = WMI_CACHE_SIZE,
+        ttls: Dict[str, float] = None,
+        default_ttl: float = WMI_CACHE_DEFAULT_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttls = dict(WMI_CACHE_TTLS)
+        if ttls:
+            self.ttls.update(
+                (class_name.lower(), ttl) for class_name, ttl in ttls.items()
+            )
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        # {CacheKey: (expires, class name, result)}, least recently used first
+        self._entries = OrderedDict()  # type: OrderedDict
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def make_key(
+        computer: str,
+        namespace: str,
+        query_str: str,
+        depth: int,
+        rows: bool,
+        parse_datetimes: bool = False,
+    ) -> CacheKey:
+        return (
+            computer.lower(),
+            namespace.lower(),
+            normalize_query(query_str),
+            depth,
+            rows,
+            parse_datetimes,
+        )
+
+    def get_ttl(self, query_str: str) -> float:
+        return self.ttls.get(get_query_class(query_str), self.default_ttl)
+
+    @staticmethod
+    def _copy(result):
+        # Callers often alter returned dicts or rows lists, which must not alter cached ones
+        if isinstance(result, list):
+            return [dict(row) if isinstance(row, dict) else row for row in result]
+        if isinstance(result, WmiRows):
+            # Rows are tuples, copying the list is enough
+            return WmiRows(result.columns, list(result.rows))
+        return result
+
+    def get(self, key: CacheKey):
+        """
+        Return a copy of the cached result, or None when missing or expired
+        """
+        with self._lock:
+            try:
+                expires, _, result = self._entries[key]
+            except KeyError:
+                self._stats["misses"] += 1
+                return None
+            if self.clock() >= expires:
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        return self._copy(result)
+
+    def set(self, key: CacheKey, result, ttl: float = None) -> None:
+        """
+        Cache a result, None results (failed queries) are never cached
+        """
+        if result is None:
+            return
+        if ttl is None:
+            ttl = self.get_ttl(key[2])
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (
+                self.clock() + ttl,
+                get_query_class(key[2]),
+                self._copy(result),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, class_name: str = None, computer: str = None) -> int:
+        """
+        Drop cached results, all of them, or only those of a WMI class and / or computer
+        Returns the number of dropped entries
+        """
+        if class_name:
+            class_name = class_name.lower()
+        if computer:
+            computer = computer.lower()
+        with self._lock:
+            keys = [
+                key
+                for key, (_, key_class, _) in self._entries.items()
+                if (not class_name or key_class == class_name)
+                and (not computer or key[0] == computer)
+            ]
+            for key in keys:
+                del self._entries[key]
+            self._stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+# Module wide cache, only used by query_wmi(cache=True)
+_CACHE = WmiCache()
+
+
+def set_cache(cache: WmiCache) -> None:
+    """
+    Replace the module wide query cache
+    """
+    global _CACHE
+    _CACHE = cache
+
+
+def get_cache(cache: Union[WmiCache, bool] = None) -> Optional[WmiCache]:
+    """
+    Resolve a query_wmi() cache argument, True meaning the module wide cache, None or False no cache
+    """
+    if cache is True:
+        return _CACHE
+    if not cache:
+        return None
+    return cache
+
+
+@contextmanager
+def use_cache(cache: WmiCache):
+    """
+    Temporarily set the module wide query cache
+    """
+    global _CACHE
+    previous_cache = _CACHE
+    _CACHE = cache
+    try:
+        yield cache
+    finally:
+        _CACHE = previous_cache
+
 
 def wmi_object_2_list_of_dict(
     wmi_objects, depth: int = 1, root: bool = True
@@ -98,6 +556,254 @@ def wmi_object_2_list_of_dict(
     return result
 
 
+_SELECT_REGEX = re.compile(r"^\s*SELECT\s+(.+?)\s+FROM\s", re.IGNORECASE | re.DOTALL)
+
+
+def get_select_columns(query_str: str) -> Optional[Tuple[str, ...]]:
+    """
+    Return the column names of a WQL SELECT query, None for SELECT * or anything else than a SELECT query
+    """
+    match = _SELECT_REGEX.match(query_str)
+    if not match:
+        return None
+    columns = tuple(column.strip() for column in match.group(1).split(","))
+    if "*" in columns:
+        return None
+    return columns
+
+
+class WmiRows:
+    """
+    WMI query result as tuple rows sharing a single column header
+
+    rows[n][index] is the value of column columns[index] for the nth object, as_dicts() gives the usual
+    list of dicts view, which query_wmi() returns by default
+    """
+
+    __slots__ = ("columns", "rows", "_indexes")
+
+    def __init__(self, columns: Tuple[str, ...], rows: List[tuple]):
+        self.columns = columns
+        self.rows = rows
+        self._indexes = None  # type: Optional[Dict[str, int]]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self.rows)
+
+    def __getitem__(self, index: int) -> tuple:
+        return self.rows[index]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, WmiRows):
+            return NotImplemented
+        return self.columns == other.columns and self.rows == other.rows
+
+    def __repr__(self) -> str:
+        return "WmiRows(columns=%r, rows=%d)" % (self.columns, len(self.rows))
+
+    def index(self, column: str) -> int:
+        """
+        Return the index of a column in rows, column names being case insensitive like WMI ones
+        """
+        if self._indexes is None:
+            self._indexes = {
+                name.lower(): index for index, name in enumerate(self.columns)
+            }
+        try:
+            return self._indexes[column.lower()]
+        except KeyError:
+            raise KeyError("No WMI column [%s]" % column)
+
+    def column(self, column: str) -> list:
+        """
+        Return all values of a column
+        """
+        index = self.index(column)
+        return [row[index] for row in self.rows]
+
+    def as_dicts(self) -> List[dict]:
+        """
+        Return rows as dicts, like wmi_object_2_list_of_dict() does
+        """
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+
+def _property_value(properties, column: str):
+    try:
+        return properties.Item(column).Value
+    # Properties missing from some objects of the result set, eg subclasses
+    except Exception:
+        return None
+
+
+def _datetime_indexes(properties, header: Tuple[str, ...]) -> List[int]:
+    """
+    Indexes of the datetime columns, read from the CIM types of an object properties
+    """
+    indexes = []
+    for index, column in enumerate(header):
+        # noinspection PyBroadException
+        try:
+            if properties.Item(column).CIMType == CIM_TYPE_DATETIME:
+                indexes.append(index)
+        except Exception:
+            pass
+    return indexes
+
+
+def _convert_datetime(value):
+    if value is None:
+        return None
+    if isinstance(value, (tuple, list)):
+        # datetime arrays
+        return tuple(cim_timestamp_to_datetime(item) for item in value)
+    return cim_timestamp_to_datetime(value)
+
+
+def wmi_objects_to_rows(
+    wmi_objects,
+    columns: Optional[Tuple[str, ...]] = None,
+    parse_datetimes: bool = False,
+) -> WmiRows:
+    """
+    Flatten WMI objects into WmiRows
+
+    The property list is resolved once, from the given columns or the first object, instead of once per object,
+    and every object costs one Properties_ round trip plus one property lookup per column.
+    Accepts wmi module objects as well as raw SWbemObjects
+
+    With parse_datetimes=True, values of datetime properties, found from the CIM types of the first object,
+    are converted from CIM timestamps to timezone aware datetime objects
+    """
+    header = tuple(columns) if columns else None
+    datetime_indexes = None
+    rows = []
+    for wmi_object in wmi_objects:
+        ole_object = getattr(wmi_object, "ole_object", wmi_object)
+        properties = ole_object.Properties_
+        if header is None:
+            header = tuple(str(prop.Name) for prop in properties)
+        if datetime_indexes is None:
+            datetime_indexes = (
+                _datetime_indexes(properties, header) if parse_datetimes else []
+            )
+        if datetime_indexes:
+            row = [_property_value(properties, column) for column in header]
+            for index in datetime_indexes:
+                row[index] = _convert_datetime(row[index])
+            rows.append(tuple(row))
+        else:
+            rows.append(tuple(_property_value(properties, column) for column in header))
+    return WmiRows(header or (), rows)
+
+
+def _exec_query(wmi_handle, query_str: str, flags: int = WBEM_FLAG_RETURN_IMMEDIATELY):
+    """
+    Run a query returning raw SWbemObjects when possible, since wmi module objects read every property
+    name of every object when they are created
+    """
+    namespace = getattr(wmi_handle, "_namespace", None)
+    if namespace is None:
+        return wmi_handle.query(query_str)
+    return namespace.ExecQuery(query_str, "WQL", flags)
+
+
+def _connect(
+    pool: WmiConnectionPool, computer: str, namespace: str
+) -> Tuple[ConnectionKey, object]:
+    """
+    Get a pooled connection to a namespace, raises ValueError for unknown namespaces
+    """
+    if namespace.startswith("cimv2") or namespace == "wmi":
+        key = (computer, namespace, get_moniker(computer, namespace))
+        return key, pool.get(*key)
+    if namespace == "SecurityCenter2":
+        key = (computer, "SecurityCenter2", None)
+        return key, pool.get(*key)
+    if namespace == "SecurityCenter":
+        # Try to fallback to securityCenter v1 for XP
+        # noinspection PyBroadException
+        try:
+            key = (computer, "SecurityCenter2", None)
+            return key, pool.get(*key)
+        except Exception:
+            key = (computer, "SecurityCenter", None)
+            return key, pool.get(*key)
+    raise ValueError("Bogus query path %s" % namespace)
+
+
+def iter_wmi(
+    query_str: str,
+    namespace: str = "cimv2",
+    batch_size: int = WMI_BATCH_SIZE,
+    computer: str = "localhost",
+    pool: WmiConnectionPool = None,
+    rows: bool = False,
+    parse_datetimes: bool = False,
+) -> Iterator[Union[dict, WmiRows]]:
+    """
+    Stream a WMI query result, for large classes like Win32_NTLogEvent or CIM_DataFile
+
+    The query is run semisynchronously with a forward-only enumerator, so WMI doesn't keep objects already
+    enumerated, and objects are converted batch_size at a time. Memory use doesn't depend on result size and
+    stopping the iteration early stops the enumeration.
+    Yields dicts, or WmiRows batches sharing the same columns with rows=True.
+    parse_datetimes=True converts datetime properties, see wmi_objects_to_rows()
+    Unlike query_wmi(), errors are raised
+
+        for event in iter_wmi("SELECT EventCode, Message FROM Win32_NTLogEvent WHERE Logfile='System'"):
+            ...
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    pool = get_connection_pool(pool)
+    key, wmi_handle = _connect(pool, computer, namespace)
+    columns = get_select_columns(query_str)
+    try:
+        enumerator = iter(
+            _exec_query(
+                wmi_handle,
+                query_str,
+                WBEM_FLAG_RETURN_IMMEDIATELY | WBEM_FLAG_FORWARD_ONLY,
+            )
+        )
+        while True:
+            batch = wmi_objects_to_rows(
+                islice(enumerator, batch_size), columns, parse_datetimes
+            )
+            if not batch.rows:
+                return
+            # Later batches reuse the columns resolved by the first one
+            columns = batch.columns
+            if rows:
+                yield batch
+            else:
+                for row in batch.rows:
+                    yield dict(zip(columns, row))
+            if len(batch.rows) < batch_size:
+                return
+    except Exception:
+        # The connection may be broken, so it isn't reused
+        pool.discard(*key)
+        raise
+
+
+def _run_query(
+    wmi_handle, query_str: str, depth: int, rows: bool, parse_datetimes: bool = False
+):
+    if rows:
+        return wmi_objects_to_rows(
+            _exec_query(wmi_handle, query_str),
+            get_select_columns(query_str),
+            parse_datetimes,
+        )
+    return wmi_object_2_list_of_dict(wmi_handle.query(query_str), depth)
+
+
 def query_wmi(
     query_str: str,
     namespace: str = "cimv2",
@@ -107,11 +813,47 @@ def query_wmi(
     mp_queue: Union[Queue, SimpleQueue] = None,
     debug: bool = False,
     computer: str = "localhost",
-) -> Union[list, None]:
+    pool: WmiConnectionPool = None,
+    rows: bool = False,
+    cache: Union[WmiCache, bool] = None,
+    parse_datetimes: bool = False,
+) -> Union[list, WmiRows, None]:
     """
     Execute WMI queries that return pre-formatted python dictionaries
-    Also allows to pass a queue for logging returns when using multiprocessing
+    Also allows to pass a queue for logging returns when using multiprocessing, which replaces the root logger handlers
+    of the current process, windows_tools.wmi_queries.workers.WmiWorkerPool runs queries in warm processes and forwards logs instead
+    Connections are reused from the given pool, or the module wide one, see WmiConnectionPool
+
+    With rows=True, results are returned as WmiRows, only reading the columns named in the SELECT clause, depth being ignored
+    parse_datetimes=True also converts datetime properties to datetime objects, with rows=True only
+
+    With cache=True, results are served from the module wide WmiCache, or from the given one, until they expire
+    Only use it for static data, eg hardware, setup or time zone classes
     """
+    cache = get_cache(cache)
+    if cache is not None:
+        cache_key = cache.make_key(
+            computer, namespace, query_str, depth, rows, parse_datetimes
+        )
+        result = cache.get(cache_key)
+        if result is not None:
+            return result
+        result = query_wmi(
+            query_str,
+            namespace=namespace,
+            name=name,
+            depth=depth,
+            can_be_skipped=can_be_skipped,
+            mp_queue=mp_queue,
+            debug=debug,
+            computer=computer,
+            pool=pool,
+            rows=rows,
+            parse_datetimes=parse_datetimes,
+        )
+        cache.set(cache_key, result)
+        return result
+
     if mp_queue:
         logging_handler = QueueHandler(mp_queue)
         local_logger = logging.getLogger()
@@ -134,32 +876,25 @@ def query_wmi(
 
     # Full moniker example
     # wmi_handle = wmi.WMI(moniker=r'winmgmts:{impersonationLevel=impersonate,authenticationLevel=pktPrivacy,(LockMemory, !IncreaseQuota)}!\\localhost\root\cimv2/Security/MicrosoftVolumeEncryption')
+    pool = get_connection_pool(pool)
     try:
-        if namespace.startswith("cimv2"):
-            wmi_handle = wmi.WMI(
-                moniker=r"winmgmts:{impersonationLevel=impersonate,authenticationLevel=pktPrivacy,(LockMemory, !IncreaseQuota)}!\\%s\root\%s"
-                % (computer, namespace)
-            )
-            return wmi_object_2_list_of_dict(wmi_handle.query(query_str), depth)
-        elif namespace == "wmi":
-            wmi_handle = wmi.WMI(namespace="wmi")
-            return wmi_object_2_list_of_dict(wmi_handle.query(query_str), depth)
-        elif namespace == "SecurityCenter":
-            # Try to fallback to securityCenter v1 for XP
-            # noinspection PyBroadException
-            try:
-                wmi_handle = wmi.WMI(namespace="SecurityCenter2")
-            except Exception:
-                # noinspection PyBroadException
-                try:
-                    wmi_handle = wmi.WMI(namespace="SecurityCenter")
-                except Exception:
-                    logger.info("cannot get securityCenter handle.")
-                    return None
-            return wmi_object_2_list_of_dict(wmi_handle.query(query_str), depth)
-        else:
+        try:
+            key, wmi_handle = _connect(pool, computer, namespace)
+        except ValueError:
             local_logger.critical("Bogus query path {}.".format(namespace))
-    except pywintypes.com_error:
+            return None
+        except Exception:
+            if namespace not in ("SecurityCenter", "SecurityCenter2"):
+                raise
+            logger.info("cannot get securityCenter handle.")
+            return None
+        try:
+            return _run_query(wmi_handle, query_str, depth, rows, parse_datetimes)
+        except Exception:
+            # The connection may be broken, so it isn't reused
+            pool.discard(*key)
+            raise
+    except _COM_ERROR:
         if can_be_skipped is not True:
             local_logger.warning(
                 "Cannot get WMI query (pywin) {}.".format(name), exc_info=True
@@ -167,7 +902,7 @@ def query_wmi(
             local_logger.debug("Trace:", exc_info=True)
         else:
             local_logger.info("Cannot get WMI query (pywin) {}.".format(name))
-    except wmi.x_access_denied:
+    except _X_ACCESS_DENIED:
         if can_be_skipped is not True:
             local_logger.warning(
                 "Cannot get WMI request (access) {}.".format(name), exc_info=True
@@ -175,7 +910,7 @@ def query_wmi(
             local_logger.debug("Trace:", exc_info=True)
         else:
             local_logger.info("Cannot get WMI request (access) {}.".format(name))
-    except wmi.x_wmi:
+    except _X_WMI:
         if can_be_skipped is not True:
             local_logger.warning(
                 "Cannot get WMI query (x_wmi) {}.".format(name), exc_info=True
@@ -204,6 +939,192 @@ def query_wmi(
     # pythoncom.CoUninitialize()
 
 
+# Max queries running at the same time in query_wmi_many()
+WMI_WORKERS = 4
+# Default per query timeout in seconds for query_wmi_many()
+WMI_QUERY_TIMEOUT = 60
+
+_EXECUTOR = None  # type: Optional[ThreadPoolExecutor]
+_EXECUTOR_LOCK = threading.Lock()
+_COM_STATE = threading.local()
+
+
+def set_executor(executor: Optional[ThreadPoolExecutor]) -> None:
+    """
+    Set the thread pool used by query_wmi_many(), None restores the default WMI_WORKERS pool
+    """
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        _EXECUTOR = executor
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=WMI_WORKERS)
+        return _EXECUTOR
+
+
+def _com_initialize() -> None:
+    """
+    Initialize COM once per worker thread
+    Worker threads outlive single queries and keep their pooled connections, so COM stays initialized
+    """
+    if pythoncom is not None and not getattr(_COM_STATE, "initialized", False):
+        pythoncom.CoInitialize()
+        _COM_STATE.initialized = True
+
+
+class WmiQueryError(Exception):
+    """
+    Structured query_wmi_many() error, reason being "timeout" or "error", "crash" for WmiWorkerPool workers
+    that died and "missing" for queries missing from a replayed fixture
+    The original exception, if any, is kept as exception
+    """
+
+    def __init__(
+        self,
+        name: str,
+        query_str: str,
+        namespace: str,
+        reason: str,
+        exception: Exception = None,
+    ):
+        self.name = name
+        self.query_str = query_str
+        self.namespace = namespace
+        self.reason = reason
+        self.exception = exception
+        super().__init__(
+            "WMI query %s [%s] in namespace %s failed: %s%s"
+            % (
+                name,
+                query_str,
+                namespace,
+                reason,
+                " (%s)" % exception if exception is not None else "",
+            )
+        )
+
+    def __reduce__(self):
+        return (
+            self.__class__,
+            (self.name, self.query_str, self.namespace, self.reason, self.exception),
+        )
+
+
+def _query_worker(
+    pool: WmiConnectionPool,
+    query_str: str,
+    namespace: str,
+    depth: int,
+    computer: str,
+    rows: bool,
+    parse_datetimes: bool,
+):
+    _com_initialize()
+    key, wmi_handle = _connect(pool, computer, namespace)
+    try:
+        return _run_query(wmi_handle, query_str, depth, rows, parse_datetimes)
+    except Exception:
+        pool.discard(*key)
+        raise
+
+
+def query_wmi_many(
+    queries: Union[Dict[str, str], List[dict]],
+    timeout: float = WMI_QUERY_TIMEOUT,
+    pool: WmiConnectionPool = None,
+    executor: ThreadPoolExecutor = None,
+) -> Tuple[Dict[str, Union[list, WmiRows, None]], Dict[str, WmiQueryError]]:
+    """
+    Run independent WMI queries concurrently on a thread pool, at most WMI_WORKERS at a time by default
+
+    queries is either {name: query_str}, or a list of dicts of query_wmi() arguments, including name,
+    query_str, namespace, computer, depth, rows, parse_datetimes, cache and can_be_skipped,
+    and optionally a per query timeout, eg:
+
+        results, errors = query_wmi_many([
+            {"name": "bios", "query_str": "SELECT Version FROM Win32_Bios", "cache": True},
+            {"name": "bitlocker", "query_str": "SELECT * FROM Win32_EncryptableVolume",
+             "namespace": "cimv2/Security/MicrosoftVolumeEncryption", "timeout": 5},
+        ])
+
+    Returns (results, errors), results having every query name, with None for failed queries,
+    and errors having a WmiQueryError for every failed query
+    Timeouts are counted from the call, a timed out query keeps its worker thread busy until WMI returns,
+    since COM calls cannot be interrupted
+    """
+    if isinstance(queries, dict):
+        queries = [
+            {"name": name, "query_str": query_str}
+            for name, query_str in queries.items()
+        ]
+    pool = get_connection_pool(pool)
+    executor = executor or _get_executor()
+    start = time.monotonic()
+    results = {}
+    errors = {}
+    pending = []
+    for query in queries:
+        name = query["name"]
+        query_str = query["query_str"]
+        namespace = query.get("namespace", "cimv2")
+        computer = query.get("computer", "localhost")
+        depth = query.get("depth", 1)
+        rows = query.get("rows", False)
+        parse_datetimes = query.get("parse_datetimes", False)
+        cache = get_cache(query.get("cache"))
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(
+                computer, namespace, query_str, depth, rows, parse_datetimes
+            )
+            results[name] = cache.get(cache_key)
+            if results[name] is not None:
+                continue
+        results[name] = None
+        future = executor.submit(
+            _query_worker,
+            pool,
+            query_str,
+            namespace,
+            depth,
+            computer,
+            rows,
+            parse_datetimes,
+        )
+        pending.append(
+            (query, namespace, cache, cache_key, future, query.get("timeout", timeout))
+        )
+
+    for query, namespace, cache, cache_key, future, query_timeout in pending:
+        name = query["name"]
+        query_str = query["query_str"]
+        try:
+            result = future.result(
+                timeout=max(0, start + query_timeout - time.monotonic())
+            )
+        except FutureTimeoutError:
+            future.cancel()
+            errors[name] = WmiQueryError(name, query_str, namespace, "timeout")
+        except Exception as exc:
+            errors[name] = WmiQueryError(name, query_str, namespace, "error", exc)
+        else:
+            results[name] = result
+            if cache is not None:
+                cache.set(cache_key, result)
+            continue
+        if query.get("can_be_skipped"):
+            logger.info(str(errors[name]))
+        else:
+            logger.warning(str(errors[name]))
+            if errors[name].exception is not None:
+                logger.debug("Trace:", exc_info=errors[name].exception)
+    return results, errors
+
+
 def get_timezone_offset() -> int:
     is_dst = time.daylight and time.localtime().tm_isdst > 0
     utc_offset = -(time.altzone if is_dst else time.timezone)
@@ -214,6 +1135,7 @@ def get_wmi_timezone_bias() -> str:
     """
     Get current timezone bias in WMI compatible format, eg:
     "UTC+2" = "+120"
+    The bias is cached, see WMI_CACHE_TTLS, use get_cache().invalidate("Win32_TimeZone") after changing time zones
 
     :return: str
     """
@@ -223,6 +1145,7 @@ def get_wmi_timezone_bias() -> str:
         name="windows_tools.wmi_queries.timezonebias",
         depth=1,
         can_be_skipped=False,
+        cache=True,
     )
     try:
         return str(result[0]["Bias"])
@@ -247,17 +1170,68 @@ def utc_datetime_to_cim_timestamp(dt: datetime, localize: bool = True) -> str:
         tz_bias = timezonebias
     else:
         tz_bias = "+" + timezonebias
-    cim_timestamp = dt.strftime("%Y%m%d%H%M%S.%f") + tz_bias
+    cim_timestamp = "%04d%02d%02d%02d%02d%02d.%06d%s" % (
+        dt.year,
+        dt.month,
+        dt.day,
+        dt.hour,
+        dt.minute,
+        dt.second,
+        dt.microsecond,
+        tz_bias,
+    )
     return cim_timestamp
 
 
-def cim_timestamp_to_datetime(cim_timestamp: str, utc: bool = True) -> datetime:
+# SWbemProperty.CIMType of datetime properties (wbemCimtypeDatetime)
+CIM_TYPE_DATETIME = 101
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@lru_cache(maxsize=None)
+def _cim_timezone(offset: int) -> timezone:
     """
-    Convert WMI timestamp to python datetime object
+    Shared fixed offset timezone per UTC offset in minutes
+    """
+    if offset == 0:
+        return timezone.utc
+    return timezone(timedelta(minutes=offset))
 
-    wmi timestamps ALWAYS include timezones, hence are always UTC
 
-    if utc is False, we'll return a datetime object without current timezone
+class _CimSliceCache(dict):
+    """
+    Values computed once per CIM timestamp slice, eg per "yyyymmdd" day
+    Keys are bounded by the calendar, hence no eviction
+    """
+
+    def __init__(self, compute: Callable[[str], object]):
+        super().__init__()
+        self.compute = compute
+
+    def __missing__(self, key: str):
+        value = self.compute(key)
+        self[key] = value
+        return value
+
+
+# (year, month, day) and epoch seconds per "yyyymmdd" day, seconds per "HHMM" time of day,
+# timezone and UTC offset seconds per "sUUU" offset
+_CIM_DATES = _CimSliceCache(lambda day: (int(day[:4]), int(day[4:6]), int(day[6:8])))
+_CIM_DAY_SECONDS = _CimSliceCache(
+    lambda day: (datetime(int(day[:4]), int(day[4:6]), int(day[6:8])) - _EPOCH).days
+    * 86400
+)
+_CIM_MINUTE_SECONDS = _CimSliceCache(
+    lambda hour_minute: int(hour_minute[:2]) * 3600 + int(hour_minute[2:4]) * 60
+)
+_CIM_OFFSET_SECONDS = _CimSliceCache(lambda offset: int(offset) * 60)
+_CIM_TIMEZONES = _CimSliceCache(lambda offset: _cim_timezone(int(offset)))
+
+
+def _parse_cim_timestamp_slow(cim_timestamp: str) -> Tuple[datetime, int]:
+    """
+    Parse CIM timestamps with unusual lengths, eg fractions with less than 6 digits
     """
     cim_time, cim_offset = re.split("[+-]", cim_timestamp)
     timestamp = datetime.strptime(cim_time, "%Y%m%d%H%M%S.%f")
@@ -268,12 +1242,119 @@ def cim_timestamp_to_datetime(cim_timestamp: str, utc: bool = True) -> datetime:
         offset = -int(cim_offset)
     else:
         offset = 0
+    return timestamp, offset
+
+
+def cim_timestamp_to_datetime(cim_timestamp: str, utc: bool = True) -> datetime:
+    """
+    Convert WMI timestamp to python datetime object
 
+    wmi timestamps ALWAYS include timezones, hence are always UTC
+
+    if utc is False, we'll return a datetime object without current timezone
+
+    yyyymmddHHMMSS.mmmmmmsUUU timestamps are parsed by slicing, others fall back to strptime
+    """
+    if cim_timestamp[21:22] in ("+", "-") and cim_timestamp[14:15] == ".":
+        year, month, day = _CIM_DATES[cim_timestamp[:8]]
+        if utc:
+            return datetime(
+                year,
+                month,
+                day,
+                int(cim_timestamp[8:10]),
+                int(cim_timestamp[10:12]),
+                int(cim_timestamp[12:14]),
+                int(cim_timestamp[15:21]),
+                _CIM_TIMEZONES[cim_timestamp[21:]],
+            )
+        return datetime(
+            year,
+            month,
+            day,
+            int(cim_timestamp[8:10]),
+            int(cim_timestamp[10:12]),
+            int(cim_timestamp[12:14]),
+            int(cim_timestamp[15:21]),
+        ) + timedelta(seconds=_CIM_OFFSET_SECONDS[cim_timestamp[21:]])
+
+    timestamp, offset = _parse_cim_timestamp_slow(cim_timestamp)
     if utc:
-        timestamp = timestamp.replace(tzinfo=timezone(timedelta(minutes=offset)))
-    else:
-        timestamp += timedelta(minutes=offset)
-    return timestamp
+        return timestamp.replace(tzinfo=_cim_timezone(offset))
+    return timestamp + timedelta(minutes=offset)
+
+
+def cim_timestamps_to_datetimes(
+    cim_timestamps: Iterable[Optional[str]], utc: bool = True
+) -> List[Optional[datetime]]:
+    """
+    Convert a column of WMI timestamps at once, None values (unset properties) staying None
+    The usual yyyymmddHHMMSS.mmmmmmsUUU timestamps are parsed inline, without a function call per value
+    """
+    result = []
+    append = result.append
+    dates = _CIM_DATES
+    timezones = _CIM_TIMEZONES
+    for cim_timestamp in cim_timestamps:
+        if cim_timestamp is None:
+            append(None)
+        elif utc and cim_timestamp[21:22] in ("+", "-") and cim_timestamp[14:15] == ".":
+            year, month, day = dates[cim_timestamp[:8]]
+            append(
+                datetime(
+                    year,
+                    month,
+                    day,
+                    int(cim_timestamp[8:10]),
+                    int(cim_timestamp[10:12]),
+                    int(cim_timestamp[12:14]),
+                    int(cim_timestamp[15:21]),
+                    timezones[cim_timestamp[21:]],
+                )
+            )
+        else:
+            append(cim_timestamp_to_datetime(cim_timestamp, utc))
+    return result
+
+
+def cim_timestamps_to_epochs(
+    cim_timestamps: Iterable[Optional[str]],
+    microseconds: bool = False,
+    missing: int = 0,
+) -> array:
+    """
+    Convert a column of WMI timestamps to UTC epoch seconds, or microseconds, in a compact array("q")
+    None values (unset properties) are stored as missing
+    Seconds are cached per day, time of day and offset, so no datetime object is created for usual timestamps
+    """
+    result = array("q")
+    append = result.append
+    days = _CIM_DAY_SECONDS
+    minutes = _CIM_MINUTE_SECONDS
+    offsets = _CIM_OFFSET_SECONDS
+    for cim_timestamp in cim_timestamps:
+        if cim_timestamp is None:
+            append(missing)
+            continue
+        if cim_timestamp[21:22] in ("+", "-") and cim_timestamp[14:15] == ".":
+            seconds = (
+                days[cim_timestamp[:8]]
+                + minutes[cim_timestamp[8:12]]
+                + int(cim_timestamp[12:14])
+                - offsets[cim_timestamp[21:]]
+            )
+            if microseconds:
+                append(seconds * 1000000 + int(cim_timestamp[15:21]))
+            else:
+                append(seconds)
+            continue
+        timestamp, offset = _parse_cim_timestamp_slow(cim_timestamp)
+        delta = timestamp - _EPOCH - timedelta(minutes=offset)
+        if microseconds:
+            append(delta // timedelta(microseconds=1))
+        else:
+            append(delta // timedelta(seconds=1))
+    return result
 
 
 def create_cim_timestamp_from_now(**kwargs) -> str:
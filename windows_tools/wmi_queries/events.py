@@ -0,0 +1,568 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+WMI event subscriptions
+
+Subscribes to intrinsic events (__InstanceCreationEvent, __InstanceModificationEvent... polled by WMI
+every WITHIN seconds) and extrinsic events (Win32_ProcessStartTrace, Win32_VolumeChangeEvent...).
+Every subscription is read by its own background thread, COM objects belonging to the thread that
+created them, and events are delivered by batches from a single dispatcher thread: a batch is delivered
+once it has batch_size events, or at the latest max_delay seconds after its first event.
+
+Batches are lists of WmiEvent, delivered to callbacks running in the dispatcher thread, or through
+asyncio streams. Slow consumers apply backpressure: streams hold at most max_batches batches, the
+dispatcher waits for them, and at most max_pending events wait for the dispatcher. With overflow="block"
+readers then stop reading events, which WMI keeps queued, with "drop_oldest" or "drop_newest" events
+are dropped and counted in stats.
+
+Event sources are opened by a replaceable factory, FakeEventProvider allowing tests on any OS.
+
+Usage:
+    from windows_tools.wmi_queries.events import WmiEventWatcher, instance_event_query
+
+    with WmiEventWatcher(batch_size=50, max_delay=1) as watcher:
+        watcher.subscribe("SELECT * FROM Win32_ProcessStartTrace", name="processes")
+        watcher.subscribe(instance_event_query("modification", "Win32_Service", within=2), name="services")
+        watcher.subscribe("SELECT * FROM Win32_VolumeChangeEvent", name="volumes")
+        watcher.add_callback(lambda events: print([(event.subscription, event.data) for event in events]))
+        ...
+
+    async for events in watcher.stream():
+        print(events)
+"""
+
+import asyncio
+import itertools
+import queue
+import threading
+import time
+from logging import getLogger
+from time import monotonic
+from typing import Callable, Dict, List, Optional
+
+from windows_tools.wmi_queries import (
+    WBEM_FLAG_FORWARD_ONLY,
+    WBEM_FLAG_RETURN_IMMEDIATELY,
+    _COM_ERROR,
+    _com_initialize,
+    get_moniker,
+    normalize_query,
+    pythoncom,
+    wmi_connection_factory,
+)
+from windows_tools.wmi_queries.wql import WqlQuery, select
+
+logger = getLogger(__name__)
+
+# Seconds readers and the dispatcher wait before checking whether they should stop
+EVENT_POLL_INTERVAL = 0.2
+# SWbemEventSource.NextEvent() timeout error (wbemErrTimedOut)
+WBEM_E_TIMED_OUT = -2147209215
+
+INSTANCE_EVENTS = {
+    "creation": "__InstanceCreationEvent",
+    "modification": "__InstanceModificationEvent",
+    "deletion": "__InstanceDeletionEvent",
+    "operation": "__InstanceOperationEvent",
+}
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+def instance_event_query(
+    kind: str, class_name: str, within: float = 2, where: str = None
+) -> str:
+    """
+    Build an intrinsic event query, eg instance_event_query("creation", "Win32_Process", 1) gives
+    SELECT * FROM __InstanceCreationEvent WITHIN 1 WHERE TargetInstance ISA 'Win32_Process'
+
+    :param kind: creation, modification, deletion or operation (any of them)
+    :param where: optional extra condition, eg "TargetInstance.State = 'Stopped'"
+    """
+    condition = "TargetInstance ISA '%s'" % class_name
+    if where:
+        condition = "%s AND (%s)" % (condition, where)
+    return select(INSTANCE_EVENTS[kind], where=condition, within=within)
+
+
+def _event_to_dict(ole_object, depth: int = 2) -> dict:
+    """
+    Flatten an event object, embedded objects like TargetInstance becoming dicts up to depth levels
+    """
+    result = {}
+    for prop in ole_object.Properties_:
+        value = prop.Value
+        if depth > 1 and hasattr(value, "Properties_"):
+            value = _event_to_dict(value, depth - 1)
+        result[str(prop.Name)] = value
+    return result
+
+
+class WmiEventSource:
+    """
+    Default event source, a semisynchronous WMI notification query, to be used from the thread that opened it
+    """
+
+    def __init__(self, query_str: str, namespace: str, computer: str):
+        connection = wmi_connection_factory(
+            computer, namespace, get_moniker(computer, namespace)
+        )
+        self._source = connection._namespace.ExecNotificationQuery(
+            query_str, "WQL", WBEM_FLAG_RETURN_IMMEDIATELY | WBEM_FLAG_FORWARD_ONLY
+        )
+
+    def next_event(self, timeout: float) -> Optional[dict]:
+        """
+        Wait up to timeout seconds for the next event, None when none came
+        """
+        try:
+            return _event_to_dict(self._source.NextEvent(int(timeout * 1000)))
+        except _COM_ERROR as exc:
+            excepinfo = exc.args[2] if len(exc.args) > 2 else None
+            if exc.args[0] == WBEM_E_TIMED_OUT or (
+                excepinfo and excepinfo[5] == WBEM_E_TIMED_OUT
+            ):
+                return None
+            raise
+
+    def close(self) -> None:
+        self._source = None
+
+
+class _FakeEventSource:
+    def __init__(self, events: queue.Queue):
+        self._events = events
+
+    def next_event(self, timeout: float) -> Optional[dict]:
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        pass
+
+
+class FakeEventProvider:
+    """
+    Fake event source factory, events emitted for a query are read by the subscriptions to that query
+    Events not read yet stay queued, like WMI does
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = {}  # type: Dict[str, queue.Queue]
+        self.opened = []  # type: List[tuple]
+
+    def _queue(self, query_str: str) -> queue.Queue:
+        with self._lock:
+            return self._queues.setdefault(normalize_query(query_str), queue.Queue())
+
+    def emit(self, query_str: str, event: dict) -> None:
+        self._queue(query_str).put(event)
+
+    def pending(self, query_str: str) -> int:
+        """
+        Number of emitted events not read yet
+        """
+        return self._queue(query_str).qsize()
+
+    def __call__(
+        self, query_str: str, namespace: str, computer: str
+    ) -> _FakeEventSource:
+        self.opened.append((query_str, namespace, computer))
+        return _FakeEventSource(self._queue(query_str))
+
+
+class WmiEvent:
+    """
+    Event received by a subscription, data being the flattened event object
+    """
+
+    __slots__ = ("subscription", "data", "received")
+
+    def __init__(self, subscription: str, data: dict, received: float = None):
+        self.subscription = subscription
+        self.data = data
+        self.received = received or time.time()
+
+    def __repr__(self) -> str:
+        return "WmiEvent(%r, %r)" % (self.subscription, self.data)
+
+
+class _Subscription:
+    __slots__ = ("name", "query_str", "namespace", "computer", "thread", "stopping")
+
+    def __init__(self, name: str, query_str: str, namespace: str, computer: str):
+        self.name = name
+        self.query_str = query_str
+        self.namespace = namespace
+        self.computer = computer
+        self.thread = None  # type: Optional[threading.Thread]
+        self.stopping = threading.Event()
+
+
+def _running_loop():
+    """
+    Event loop running in the current thread, if any
+    """
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    except AttributeError:
+        # Python < 3.7
+        loop = asyncio.get_event_loop()
+        return loop if loop.is_running() else None
+
+
+class WmiEventStream:
+    """
+    Asyncio stream of event batches, see WmiEventWatcher.stream()
+    """
+
+    def __init__(self, watcher: "WmiEventWatcher", loop=None, max_batches: int = 16):
+        self._watcher = watcher
+        self._loop = loop or asyncio.get_event_loop()
+        self._queue = asyncio.Queue(maxsize=max_batches)
+        self._closed = False
+        self._ended = False
+        # (batch, delivered event) waiting for room in a full queue
+        self._waiting = None  # type: Optional[tuple]
+
+    def __aiter__(self) -> "WmiEventStream":
+        return self
+
+    async def __anext__(self) -> List[WmiEvent]:
+        if self._ended and self._queue.empty():
+            raise StopAsyncIteration
+        events = await self._queue.get()
+        if self._waiting is not None:
+            # Room was made for the batch the dispatcher waits with
+            waiting_events, delivered = self._waiting
+            self._waiting = None
+            self._queue.put_nowait(waiting_events)
+            delivered.set()
+        if events is None:
+            raise StopAsyncIteration
+        return events
+
+    def _offer(self, events: List[WmiEvent], delivered: threading.Event) -> None:
+        # Called from the event loop
+        if self._queue.full():
+            self._waiting = (events, delivered)
+        else:
+            self._queue.put_nowait(events)
+            delivered.set()
+
+    def _put(self, events: List[WmiEvent]) -> None:
+        """
+        Called from the dispatcher thread, waits while the stream is full, unless it gets closed
+        """
+        delivered = threading.Event()
+        try:
+            self._loop.call_soon_threadsafe(self._offer, events, delivered)
+        except RuntimeError:
+            # Event loop is closed
+            self._closed = True
+            return
+        while not delivered.wait(EVENT_POLL_INTERVAL):
+            if self._closed:
+                return
+
+    def _end(self) -> None:
+        # Called from the event loop
+        self._ended = True
+        if not self._queue.full():
+            self._queue.put_nowait(None)
+
+    def _finish(self) -> None:
+        self._closed = True
+        try:
+            self._loop.call_soon_threadsafe(self._end)
+        except RuntimeError:
+            pass
+
+    def close(self) -> None:
+        """
+        Stop receiving events, pending batches can still be read
+        """
+        if not self._closed:
+            self._watcher._remove_stream(self)
+            self._finish()
+
+
+class WmiEventWatcher:
+    """
+    Runs WMI event subscriptions on background threads and delivers their events by batches
+    """
+
+    def __init__(
+        self,
+        source_factory: Callable = None,
+        batch_size: int = 100,
+        max_delay: float = 0.5,
+        max_pending: int = 10000,
+        overflow: str = "block",
+    ):
+        """
+        :param source_factory: source_factory(query_str, namespace, computer) opens an event source, whose
+                               next_event(timeout) returns an event dict or None, defaults to WmiEventSource
+        :param batch_size: max events per batch
+        :param max_delay: max seconds between the first event of a batch and its delivery
+        :param max_pending: max events waiting for the dispatcher
+        :param overflow: what readers do when max_pending events are waiting, block, drop_oldest or drop_newest
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                "overflow must be one of %s" % ", ".join(OVERFLOW_POLICIES)
+            )
+        if batch_size < 1 or max_pending < 1:
+            raise ValueError("batch_size and max_pending must be at least 1")
+        self.source_factory = source_factory or WmiEventSource
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.overflow = overflow
+        self.stats = {"received": 0, "dropped": 0, "batches": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._events = queue.Queue(maxsize=max_pending)
+        self._subscriptions = {}  # type: Dict[str, _Subscription]
+        self._names = itertools.count(1)
+        self._callbacks = []  # type: List[Callable[[List[WmiEvent]], None]]
+        self._streams = []  # type: List[WmiEventStream]
+        self._dispatcher = None  # type: Optional[threading.Thread]
+        self._stopping = threading.Event()
+
+    def __enter__(self) -> "WmiEventWatcher":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def subscribe(
+        self,
+        query_str: str,
+        namespace: str = "cimv2",
+        computer: str = "localhost",
+        name: str = None,
+    ) -> str:
+        """
+        Subscribe to an event query, validated by WqlQuery, raises WqlError for invalid ones
+        Intrinsic event queries need a WITHIN clause, unless their provider raises events itself
+
+        :return: subscription name, as given in WmiEvent.subscription
+        """
+        WqlQuery.parse(query_str)
+        with self._lock:
+            if name is None:
+                name = "subscription_%d" % next(self._names)
+            if name in self._subscriptions:
+                raise ValueError("Subscription %s already exists" % name)
+            subscription = _Subscription(name, query_str, namespace, computer)
+            self._subscriptions[name] = subscription
+        if self._dispatcher is not None:
+            self._start_reader(subscription)
+        return name
+
+    def unsubscribe(self, name: str) -> None:
+        """
+        Stop a subscription, events it already received are still delivered
+        """
+        with self._lock:
+            subscription = self._subscriptions.pop(name)
+        subscription.stopping.set()
+        if subscription.thread is not None:
+            subscription.thread.join()
+
+    @property
+    def subscriptions(self) -> List[str]:
+        with self._lock:
+            return list(self._subscriptions)
+
+    def add_callback(self, callback: Callable[[List[WmiEvent]], None]) -> None:
+        """
+        Call callback(events) on every batch, from the dispatcher thread
+        Slow callbacks delay following batches, hence apply backpressure
+        """
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[List[WmiEvent]], None]) -> None:
+        self._callbacks.remove(callback)
+
+    def stream(self, loop=None, max_batches: int = 16) -> WmiEventStream:
+        """
+        Return an async iterator of event batches, bound to the running (or given) event loop
+        The dispatcher waits when max_batches batches weren't read yet
+
+            async for events in watcher.stream():
+                print(events)
+        """
+        stream = WmiEventStream(self, loop, max_batches)
+        with self._lock:
+            self._streams.append(stream)
+        return stream
+
+    def _remove_stream(self, stream: WmiEventStream) -> None:
+        with self._lock:
+            try:
+                self._streams.remove(stream)
+            except ValueError:
+                pass
+
+    def start(self) -> None:
+        if self._dispatcher is not None:
+            return
+        self._stopping.clear()
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="WmiEventWatcher", daemon=True
+        )
+        self._dispatcher.start()
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+        for subscription in subscriptions:
+            self._start_reader(subscription)
+
+    def stop(self) -> None:
+        """
+        Stop all subscriptions, events already received are delivered first, streams end
+        When called from an event loop, eg leaving a with block in a coroutine, streams of that loop
+        don't get batches they have no room for anymore
+        """
+        if self._dispatcher is None:
+            return
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+        for subscription in subscriptions:
+            subscription.stopping.set()
+        for subscription in subscriptions:
+            if subscription.thread is not None:
+                subscription.thread.join()
+                subscription.thread = None
+            subscription.stopping.clear()
+        self._stopping.set()
+        # Streams read by the event loop running this thread cannot take batches until stop() returns
+        current_loop = _running_loop()
+        with self._lock:
+            for stream in self._streams:
+                if stream._loop is current_loop:
+                    stream._closed = True
+        self._events.put(None)
+        self._dispatcher.join()
+        self._dispatcher = None
+        with self._lock:
+            streams = self._streams
+            self._streams = []
+        for stream in streams:
+            stream._finish()
+
+    def _start_reader(self, subscription: _Subscription) -> None:
+        subscription.thread = threading.Thread(
+            target=self._read,
+            args=(subscription,),
+            name="WmiEventReader-%s" % subscription.name,
+            daemon=True,
+        )
+        subscription.thread.start()
+
+    def _enqueue(self, event: WmiEvent, subscription: _Subscription) -> None:
+        if self.overflow == "block":
+            while not subscription.stopping.is_set():
+                try:
+                    self._events.put(event, timeout=EVENT_POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    pass
+            # Stopped while blocked, the event is lost
+            self._count("dropped")
+            return
+        while True:
+            try:
+                self._events.put_nowait(event)
+                return
+            except queue.Full:
+                self._count("dropped")
+                if self.overflow == "drop_newest":
+                    return
+                try:
+                    self._events.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _read(self, subscription: _Subscription) -> None:
+        _com_initialize()
+        try:
+            source = self.source_factory(
+                subscription.query_str, subscription.namespace, subscription.computer
+            )
+        except Exception as exc:
+            self._count("errors")
+            logger.error(
+                "Cannot subscribe to WMI events [%s]: %s"
+                % (subscription.query_str, exc)
+            )
+            logger.debug("Trace:", exc_info=True)
+            return
+        try:
+            while not subscription.stopping.is_set():
+                try:
+                    data = source.next_event(EVENT_POLL_INTERVAL)
+                except Exception as exc:
+                    self._count("errors")
+                    logger.error(
+                        "WMI event subscription %s failed: %s"
+                        % (subscription.name, exc)
+                    )
+                    logger.debug("Trace:", exc_info=True)
+                    return
+                if data is None:
+                    continue
+                self._count("received")
+                self._enqueue(WmiEvent(subscription.name, data), subscription)
+        finally:
+            source.close()
+            if pythoncom is not None:
+                pythoncom.CoUninitialize()
+
+    def _deliver(self, events: List[WmiEvent]) -> None:
+        self._count("batches")
+        for callback in list(self._callbacks):
+            try:
+                callback(events)
+            except Exception as exc:
+                logger.error("WMI event callback failed: %s" % exc)
+        with self._lock:
+            streams = list(self._streams)
+        for stream in streams:
+            stream._put(list(events))
+
+    def _dispatch(self) -> None:
+        stopping = False
+        while not stopping:
+            event = self._events.get()
+            if event is None:
+                return
+            events = [event]
+            deadline = monotonic() + self.max_delay
+            while len(events) < self.batch_size:
+                remaining = deadline - monotonic()
+                try:
+                    if remaining > 0:
+                        event = self._events.get(timeout=remaining)
+                    else:
+                        # Past max_delay, only take events already waiting
+                        event = self._events.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    stopping = True
+                    break
+                events.append(event)
+            self._deliver(events)
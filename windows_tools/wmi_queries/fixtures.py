@@ -0,0 +1,457 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+Recorded WMI fixtures
+
+Records query results on a Windows host into a compact fixture (JSON, gzip compressed JSON or msgpack)
+and replays them on any OS, with configurable latency, so collectors and benchmarks run without WMI.
+
+Recording and replaying both happen at the connection level: WmiRecorder and WmiReplay are connection
+factories for WmiConnectionPool, hence query_wmi(), query_wmi_many() and iter_wmi() still flatten
+objects themselves on replay, and every module using query_wmi() can be replayed unmodified.
+Fixtures hold one result per (namespace, normalized query), as columns, CIM types and value rows.
+Embedded objects aren't recorded, so depth > 1 queries replay their reference paths.
+
+Usage:
+    from windows_tools.wmi_queries.fixtures import WmiFixture, recording, replaying
+    from windows_tools import server
+
+    # On Windows
+    with recording() as fixture:
+        server.is_rds_server()
+    fixture.save("host.json.gz")
+
+    # Anywhere
+    with replaying("host.json.gz", latency=0.01) as replay:
+        server.is_rds_server()
+        print(replay.stats)
+"""
+
+import gzip
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from windows_tools.wmi_queries import (
+    WmiCache,
+    WmiConnectionPool,
+    WmiQueryError,
+    _property_value,
+    normalize_query,
+    use_cache,
+    use_connection_pool,
+    wmi_connection_factory,
+)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FIXTURE_FORMAT_VERSION = 1
+
+# Fixture entries key: (lowercase namespace, normalized query)
+FixtureKey = Tuple[str, str]
+
+
+def _encode_value(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (tuple, list)):
+        return [_encode_value(item) for item in value]
+    if isinstance(value, bytes):
+        return {"hex": value.hex()}
+    # Embedded objects, COM dates...
+    return str(value)
+
+
+def _decode_value(value):
+    if isinstance(value, list):
+        # COM returns arrays as tuples
+        return tuple(_decode_value(item) for item in value)
+    if isinstance(value, dict):
+        return bytes.fromhex(value["hex"])
+    return value
+
+
+class FixtureEntry:
+    """
+    Recorded result of a query, or the error it raised
+    """
+
+    __slots__ = (
+        "namespace",
+        "query_str",
+        "columns",
+        "cim_types",
+        "rows",
+        "error",
+        "properties",
+        "indexes",
+    )
+
+    def __init__(
+        self,
+        namespace: str,
+        query_str: str,
+        columns: Tuple[str, ...] = (),
+        cim_types: Tuple[int, ...] = (),
+        rows: List[tuple] = None,
+        error: str = None,
+    ):
+        self.namespace = namespace
+        self.query_str = query_str
+        self.columns = tuple(columns)
+        self.cim_types = tuple(cim_types)
+        self.rows = rows or []
+        self.error = error
+        # Shared by replayed objects, like wmi module objects properties
+        self.properties = dict.fromkeys(self.columns)
+        self.indexes = {column.lower(): index for index, column in enumerate(columns)}
+
+
+class WmiFixture:
+    """
+    Recorded WMI query results, indexed by (namespace, normalized query)
+    """
+
+    def __init__(self, metadata: dict = None):
+        self.metadata = metadata or {}
+        self.entries = {}  # type: Dict[FixtureKey, FixtureEntry]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(namespace: str, query_str: str) -> FixtureKey:
+        return namespace.lower(), normalize_query(query_str)
+
+    def add(self, entry: FixtureEntry) -> None:
+        """
+        Add an entry, replacing any former result of the same query
+        """
+        with self._lock:
+            self.entries[self.make_key(entry.namespace, entry.query_str)] = entry
+
+    def get(self, namespace: str, query_str: str) -> Optional[FixtureEntry]:
+        return self.entries.get(self.make_key(namespace, query_str))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: FixtureKey) -> bool:
+        return self.make_key(*key) in self.entries
+
+    def to_dict(self) -> dict:
+        queries = []
+        for entry in self.entries.values():
+            query = {"namespace": entry.namespace, "query": entry.query_str}
+            if entry.error is not None:
+                query["error"] = entry.error
+            else:
+                query["columns"] = list(entry.columns)
+                query["cim_types"] = list(entry.cim_types)
+                query["rows"] = [
+                    [_encode_value(value) for value in row] for row in entry.rows
+                ]
+            queries.append(query)
+        return {
+            "version": FIXTURE_FORMAT_VERSION,
+            "metadata": self.metadata,
+            "queries": queries,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WmiFixture":
+        if data.get("version") != FIXTURE_FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported WMI fixture format version %s" % data.get("version")
+            )
+        fixture = cls(data.get("metadata"))
+        for query in data["queries"]:
+            fixture.add(
+                FixtureEntry(
+                    query["namespace"],
+                    query["query"],
+                    query.get("columns", ()),
+                    query.get("cim_types", ()),
+                    [
+                        tuple(_decode_value(value) for value in row)
+                        for row in query.get("rows", ())
+                    ],
+                    query.get("error"),
+                )
+            )
+        return fixture
+
+    def save(self, path: str) -> None:
+        """
+        Write fixture as msgpack when path ends with .msgpack, else as JSON, gzip compressed when path ends with .gz
+        """
+        if path.endswith(".msgpack"):
+            if msgpack is None:
+                raise ImportError("msgpack is needed to write %s" % path)
+            data = msgpack.packb(self.to_dict(), use_bin_type=True)
+        else:
+            data = json.dumps(self.to_dict(), separators=(",", ":")).encode("utf-8")
+            if path.endswith(".gz"):
+                data = gzip.compress(data, compresslevel=1)
+        with open(path, "wb") as file_handle:
+            file_handle.write(data)
+
+    @classmethod
+    def load(cls, path: str) -> "WmiFixture":
+        with open(path, "rb") as file_handle:
+            data = file_handle.read()
+        if path.endswith(".msgpack"):
+            if msgpack is None:
+                raise ImportError("msgpack is needed to read %s" % path)
+            return cls.from_dict(msgpack.unpackb(data, raw=False))
+        if path.endswith(".gz"):
+            data = gzip.decompress(data)
+        return cls.from_dict(json.loads(data.decode("utf-8")))
+
+
+def _record_objects(wmi_objects) -> FixtureEntry:
+    columns = None
+    cim_types = ()
+    rows = []
+    for wmi_object in wmi_objects:
+        properties = getattr(wmi_object, "ole_object", wmi_object).Properties_
+        if columns is None:
+            columns = tuple(str(prop.Name) for prop in properties)
+            cim_types = tuple(int(prop.CIMType) for prop in properties)
+        rows.append(
+            tuple(
+                _encode_value(_property_value(properties, column)) for column in columns
+            )
+        )
+    return FixtureEntry("", "", columns or (), cim_types, rows)
+
+
+class _RecordingConnection:
+    """
+    Wraps a WMI connection, recording results of query() and _namespace.ExecQuery()
+    Results are read entirely while recording, even for forward-only enumerations
+    """
+
+    def __init__(self, recorder: "WmiRecorder", connection, namespace: str):
+        self._recorder = recorder
+        self._connection = connection
+        self._namespace_name = namespace
+        self._wrapped_namespace = getattr(connection, "_namespace", None)
+
+    @property
+    def _namespace(self):
+        if self._wrapped_namespace is None:
+            return None
+        return self
+
+    def _record(self, run: Callable, query_str: str) -> list:
+        try:
+            wmi_objects = list(run())
+        except Exception as exc:
+            self._recorder.fixture.add(
+                FixtureEntry(self._namespace_name, query_str, error=repr(exc))
+            )
+            raise
+        entry = _record_objects(wmi_objects)
+        entry.namespace = self._namespace_name
+        entry.query_str = query_str
+        self._recorder.fixture.add(entry)
+        return wmi_objects
+
+    def query(self, query_str: str) -> list:
+        return self._record(lambda: self._connection.query(query_str), query_str)
+
+    def ExecQuery(self, query_str: str, language: str = "WQL", flags: int = 0) -> list:
+        return self._record(
+            lambda: self._wrapped_namespace.ExecQuery(query_str, language, flags),
+            query_str,
+        )
+
+    def Get(self, *args):
+        return self._wrapped_namespace.Get(*args)
+
+    def __getattr__(self, name: str):
+        return getattr(self._connection, name)
+
+
+class WmiRecorder:
+    """
+    Connection factory recording every query run through its connections into fixture
+    """
+
+    def __init__(self, fixture: WmiFixture = None, factory: Callable = None):
+        self.fixture = fixture if fixture is not None else WmiFixture()
+        self.factory = factory or wmi_connection_factory
+
+    def __call__(
+        self, computer: str, namespace: str, moniker: Optional[str]
+    ) -> _RecordingConnection:
+        return _RecordingConnection(
+            self, self.factory(computer, namespace, moniker), namespace
+        )
+
+
+class _ReplayProperty:
+    __slots__ = ("Name", "Value", "CIMType")
+
+    def __init__(self, name: str, value, cim_type: int):
+        self.Name = name
+        self.Value = value
+        self.CIMType = cim_type
+
+
+class _ReplayProperties:
+    """
+    Stands for SWbemPropertySet
+    """
+
+    __slots__ = ("_entry", "_row")
+
+    def __init__(self, entry: FixtureEntry, row: tuple):
+        self._entry = entry
+        self._row = row
+
+    def Item(self, name: str) -> _ReplayProperty:
+        index = self._entry.indexes[name.lower()]
+        return _ReplayProperty(
+            self._entry.columns[index], self._row[index], self._entry.cim_types[index]
+        )
+
+    __call__ = Item
+
+    def __iter__(self):
+        return (self.Item(column) for column in self._entry.columns)
+
+
+class _ReplayObject:
+    """
+    Stands for a wmi module object as well as a raw SWbemObject
+    """
+
+    __slots__ = ("properties", "Properties_")
+
+    def __init__(self, entry: FixtureEntry, row: tuple):
+        self.properties = entry.properties
+        self.Properties_ = _ReplayProperties(entry, row)
+
+    def __getattr__(self, name: str):
+        try:
+            return self.Properties_.Item(name).Value
+        except KeyError:
+            raise AttributeError(name)
+
+
+class _ReplayConnection:
+    """
+    Stands for a wmi.WMI() connection, _namespace being itself
+    """
+
+    def __init__(self, replay: "WmiReplay", namespace: str):
+        self._replay = replay
+        self._namespace_name = namespace
+        self._namespace = self
+
+    def query(self, query_str: str) -> List[_ReplayObject]:
+        return self._replay.execute(self._namespace_name, query_str)
+
+    def ExecQuery(
+        self, query_str: str, language: str = "WQL", flags: int = 0
+    ) -> List[_ReplayObject]:
+        return self._replay.execute(self._namespace_name, query_str)
+
+    def Get(self, *args) -> bool:
+        return True
+
+
+class WmiReplay:
+    """
+    Connection factory replaying a fixture
+
+    Opening a connection takes connect_latency seconds, every query latency seconds plus per_object_latency
+    seconds per returned object, like a real WMI provider marshalling objects. Queries missing from the
+    fixture fail with WmiQueryError of reason "missing" and are counted in stats, recorded errors fail
+    with reason "error", both being handled by query_wmi() like any WMI failure
+    """
+
+    def __init__(
+        self,
+        fixture: WmiFixture,
+        latency: float = 0,
+        per_object_latency: float = 0,
+        connect_latency: float = 0,
+    ):
+        self.fixture = fixture
+        self.latency = latency
+        self.per_object_latency = per_object_latency
+        self.connect_latency = connect_latency
+        self._stats_lock = threading.Lock()
+        self.stats = {"connections": 0, "queries": 0, "objects": 0, "missing": 0}
+        # Queries missing from the fixture, as (namespace, query)
+        self.missing = []  # type: List[Tuple[str, str]]
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def __call__(
+        self, computer: str, namespace: str, moniker: Optional[str]
+    ) -> _ReplayConnection:
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        self._count("connections")
+        return _ReplayConnection(self, namespace)
+
+    def execute(self, namespace: str, query_str: str) -> List[_ReplayObject]:
+        self._count("queries")
+        entry = self.fixture.get(namespace, query_str)
+        if entry is None:
+            self._count("missing")
+            with self._stats_lock:
+                self.missing.append((namespace, query_str))
+            raise WmiQueryError("replay", query_str, namespace, "missing")
+        delay = self.latency + self.per_object_latency * len(entry.rows)
+        if delay:
+            time.sleep(delay)
+        if entry.error is not None:
+            raise WmiQueryError(
+                "replay", query_str, namespace, "error", RuntimeError(entry.error)
+            )
+        self._count("objects", len(entry.rows))
+        return [_ReplayObject(entry, row) for row in entry.rows]
+
+
+@contextmanager
+def recording(fixture: WmiFixture = None, factory: Callable = None):
+    """
+    Record queries run by query_wmi() and friends into fixture (a new one by default), which is yielded
+    A fresh module wide cache is used meanwhile, so cached queries are recorded too
+    """
+    recorder = WmiRecorder(fixture, factory)
+    with use_connection_pool(WmiConnectionPool(factory=recorder)), use_cache(
+        WmiCache()
+    ):
+        yield recorder.fixture
+
+
+@contextmanager
+def replaying(
+    fixture: Union[WmiFixture, str],
+    latency: float = 0,
+    per_object_latency: float = 0,
+    connect_latency: float = 0,
+):
+    """
+    Replay a fixture, or a fixture file, for queries run by query_wmi() and friends, yielding the WmiReplay
+    A fresh module wide cache is used meanwhile, so results cached before aren't served
+    """
+    if isinstance(fixture, str):
+        fixture = WmiFixture.load(fixture)
+    replay = WmiReplay(fixture, latency, per_object_latency, connect_latency)
+    with use_connection_pool(WmiConnectionPool(factory=replay)), use_cache(WmiCache()):
+        yield replay
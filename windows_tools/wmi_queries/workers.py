@@ -0,0 +1,377 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+Managed WMI worker pool
+
+Warm worker processes (or COM initialized threads) own their WMI connections and run queries sent
+over a task queue, so agents don't pay process startup, COM initialization and WMI connection costs
+on every query. Results come back as picklable WmiRows (or lists of dicts), failures as WmiQueryError.
+
+Worker processes forward their log records to the parent process, where they are handled by the
+loggers of the same name, honoring the parent logging configuration. Unlike query_wmi(mp_queue=...),
+no root logger handler is ever replaced in the parent process.
+
+Connections are opened by a factory, which must be picklable (a module level function) with processes,
+so the pool can be tested with a fake WMI provider on any OS.
+
+Usage:
+    from windows_tools.wmi_queries.workers import WmiWorkerPool
+
+    with WmiWorkerPool(workers=2) as pool:
+        future = pool.submit("SELECT Name, State FROM Win32_Service")
+        services = pool.query("SELECT Caption FROM Win32_OperatingSystem", timeout=30)
+        print(future.result().as_dicts(), services.rows)
+"""
+
+import itertools
+import logging
+import multiprocessing
+import pickle
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import wait as wait_futures
+from logging.handlers import QueueHandler
+from typing import Callable, Dict, Iterable, List
+
+from windows_tools.wmi_queries import (
+    WmiConnectionPool,
+    WmiQueryError,
+    _com_initialize,
+    _connect,
+    _query_worker,
+    pythoncom,
+    wmi_connection_factory,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between worker liveness checks
+WORKER_POLL_INTERVAL = 0.5
+
+
+class _LogForwarder(QueueHandler):
+    """
+    Sends worker log records to the parent process over the result queue
+    """
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.queue.put(("log", None, None, record))
+
+
+def _worker_main(
+    worker_index: int,
+    factory: Callable,
+    warm_namespaces: Iterable[str],
+    task_queue,
+    result_queue,
+    forward_logs: bool,
+    log_level: int,
+) -> None:
+    """
+    Worker loop, runs queries until it gets a None task
+    """
+    if forward_logs:
+        # The worker process is ours, so its root logger only forwards records to the parent
+        root_logger = logging.getLogger()
+        root_logger.handlers = [_LogForwarder(result_queue)]
+        root_logger.setLevel(log_level)
+    _com_initialize()
+    pool = WmiConnectionPool(factory=factory)
+    for namespace in warm_namespaces:
+        # noinspection PyBroadException
+        try:
+            _connect(pool, "localhost", namespace)
+        except Exception:
+            logger.warning(
+                "Worker %d cannot open namespace %s.", worker_index, namespace
+            )
+            logger.debug("Trace:", exc_info=True)
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                return
+            (
+                task_id,
+                name,
+                query_str,
+                namespace,
+                depth,
+                computer,
+                rows,
+                parse_datetimes,
+            ) = task
+            logger.debug("Worker %d running WMI query [%s].", worker_index, name)
+            try:
+                result = _query_worker(
+                    pool, query_str, namespace, depth, computer, rows, parse_datetimes
+                )
+                if not isinstance(result_queue, queue.Queue):
+                    # The queue feeder thread drops unpicklable results, which would never resolve the query
+                    pickle.dumps(result)
+            except Exception as exc:
+                try:
+                    pickle.dumps(exc)
+                except Exception:
+                    # Some COM exceptions cannot be sent to the parent process
+                    exc = RuntimeError(repr(exc))
+                result_queue.put(
+                    (
+                        "error",
+                        worker_index,
+                        task_id,
+                        WmiQueryError(name, query_str, namespace, "error", exc),
+                    )
+                )
+            else:
+                result_queue.put(("done", worker_index, task_id, result))
+    finally:
+        pool.clear()
+        if pythoncom is not None:
+            pythoncom.CoUninitialize()
+
+
+class WmiWorkerPool:
+    """
+    Pool of warm WMI workers, processes by default, COM initialized threads with processes=False
+
+    submit() queues a query and returns a concurrent.futures.Future, resolved with WmiRows (rows=True, default)
+    or a list of dicts, or failed with WmiQueryError, whose reason is "error", or "crash" when the worker
+    process died while running the query. Queries are dispatched by the parent process to idle workers only,
+    so it always knows which query a dead worker was running. Dead workers are replaced.
+
+    factory(computer, namespace, moniker) opens WMI connections in workers, see WmiConnectionPool,
+    and warm_namespaces are opened by every worker when it starts
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        processes: bool = True,
+        factory: Callable = None,
+        warm_namespaces: Iterable[str] = ("cimv2",),
+        mp_context=None,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.processes = processes
+        self.factory = factory or wmi_connection_factory
+        self.warm_namespaces = tuple(warm_namespaces)
+        if processes:
+            self._context = mp_context or multiprocessing.get_context()
+            self._result_queue = self._context.Queue()
+        else:
+            self._context = None
+            self._result_queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        # {task id: Future}, queued tasks, idle worker indexes, and {worker index: task} for running tasks
+        self._futures = {}  # type: Dict[int, Future]
+        self._pending = deque()  # type: deque
+        self._idle = []  # type: List[int]
+        self._running = {}  # type: Dict[int, tuple]
+        # No new queries once closed, workers are told to exit once stopping
+        self._closed = False
+        self._stopping = False
+        self._workers = []  # type: list
+        self._task_queues = []  # type: list
+        for worker_index in range(workers):
+            self._workers.append(None)
+            self._task_queues.append(None)
+            self._start_worker(worker_index)
+        self._collector = threading.Thread(
+            target=self._collect, name="WmiWorkerPool collector", daemon=True
+        )
+        self._collector.start()
+
+    def _start_worker(self, worker_index: int) -> None:
+        task_queue = self._context.Queue() if self.processes else queue.Queue()
+        args = (
+            worker_index,
+            self.factory,
+            self.warm_namespaces,
+            task_queue,
+            self._result_queue,
+            self.processes,
+            logging.getLogger("windows_tools").getEffectiveLevel(),
+        )
+        if self.processes:
+            worker = self._context.Process(
+                target=_worker_main,
+                args=args,
+                name="WmiWorker-%d" % worker_index,
+                daemon=True,
+            )
+        else:
+            worker = threading.Thread(
+                target=_worker_main,
+                args=args,
+                name="WmiWorker-%d" % worker_index,
+                daemon=True,
+            )
+        worker.start()
+        self._workers[worker_index] = worker
+        self._task_queues[worker_index] = task_queue
+        with self._lock:
+            self._idle.append(worker_index)
+
+    def _dispatch(self) -> None:
+        """
+        Send queued tasks to idle workers
+        """
+        with self._lock:
+            while self._pending and self._idle:
+                worker_index = self._idle.pop()
+                task = self._pending.popleft()
+                self._running[worker_index] = task
+                self._task_queues[worker_index].put(task)
+
+    def submit(
+        self,
+        query_str: str,
+        namespace: str = "cimv2",
+        name: str = "noname",
+        depth: int = 1,
+        computer: str = "localhost",
+        rows: bool = True,
+        parse_datetimes: bool = False,
+    ) -> Future:
+        """
+        Queue a WMI query, the returned future gives its result
+        parse_datetimes=True converts datetime properties, with rows=True only, see query_wmi()
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("WmiWorkerPool is closed")
+            task_id = next(self._task_ids)
+            self._futures[task_id] = future
+            self._pending.append(
+                (
+                    task_id,
+                    name,
+                    query_str,
+                    namespace,
+                    depth,
+                    computer,
+                    rows,
+                    parse_datetimes,
+                )
+            )
+        self._dispatch()
+        return future
+
+    def query(self, query_str: str, timeout: float = None, **kwargs):
+        """
+        Run a WMI query on a worker and wait for its result, raising WmiQueryError on failure
+        and concurrent.futures.TimeoutError after timeout seconds
+        """
+        return self.submit(query_str, **kwargs).result(timeout=timeout)
+
+    def _resolve(self, task_id: int, result=None, error: Exception = None) -> None:
+        with self._lock:
+            future = self._futures.pop(task_id, None)
+        if future is None or not future.set_running_or_notify_cancel():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _collect(self) -> None:
+        """
+        Resolve futures from worker messages, handle forwarded logs and replace dead workers
+        """
+        last_check = time.monotonic()
+        while True:
+            if time.monotonic() - last_check > WORKER_POLL_INTERVAL:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                kind, worker_index, task_id, payload = self._result_queue.get(
+                    timeout=WORKER_POLL_INTERVAL
+                )
+            except queue.Empty:
+                continue
+            if kind == "log":
+                record_logger = logging.getLogger(payload.name)
+                if record_logger.isEnabledFor(payload.levelno):
+                    record_logger.handle(payload)
+                continue
+            if kind == "stop":
+                return
+            with self._lock:
+                self._running.pop(worker_index, None)
+                self._idle.append(worker_index)
+            if kind == "done":
+                self._resolve(task_id, result=payload)
+            else:
+                self._resolve(task_id, error=payload)
+            self._dispatch()
+
+    def _check_workers(self) -> None:
+        if self._stopping:
+            return
+        for worker_index, worker in enumerate(self._workers):
+            if worker is None or worker.is_alive():
+                continue
+            with self._lock:
+                task = self._running.pop(worker_index, None)
+                if worker_index in self._idle:
+                    self._idle.remove(worker_index)
+            logger.error(
+                "WMI worker %d died, exit code %s.",
+                worker_index,
+                getattr(worker, "exitcode", None),
+            )
+            if task is not None:
+                task_id, name, query_str, namespace = task[:4]
+                self._resolve(
+                    task_id, error=WmiQueryError(name, query_str, namespace, "crash")
+                )
+            # While closing, dead workers are only replaced when queued queries still need them
+            if self._closed and not self._pending:
+                self._workers[worker_index] = None
+            else:
+                self._start_worker(worker_index)
+        self._dispatch()
+
+    def close(self, timeout: float = None) -> None:
+        """
+        Stop workers once queued queries are done, or after timeout seconds
+        Queries still pending afterwards fail with RuntimeError
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            futures = list(self._futures.values())
+        wait_futures(futures, timeout)
+        self._stopping = True
+        workers = [worker for worker in self._workers if worker is not None]
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        for worker in workers:
+            worker.join(timeout)
+        self._result_queue.put(("stop", None, None, None))
+        self._collector.join(timeout)
+        with self._lock:
+            task_ids = list(self._futures)
+        for task_id in task_ids:
+            self._resolve(task_id, error=RuntimeError("WmiWorkerPool is closed"))
+        if self.processes:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+    def __enter__(self) -> "WmiWorkerPool":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
@@ -0,0 +1,291 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+
+# This file is part of windows_tools module
+
+"""
+WQL query builder and parser
+
+WMI marshals every property of every returned object, so SELECT * queries cost much more than
+queries naming the few properties callers actually read. Queries can be built from a class name,
+the consumed fields and a WHERE clause, or parsed from existing query strings, then narrowed to the
+consumed fields. WHERE clauses are validated before queries are sent, so typos fail early with
+a WqlError telling where, instead of a generic WBEM_E_INVALID_QUERY COM error.
+
+Supported grammar, keywords being case insensitive:
+    SELECT * | property [, property...] FROM class [WITHIN seconds] [WHERE condition]
+    condition: [NOT] comparison | (condition), joined by AND / OR
+    comparison: operand {= | <> | != | < | > | <= | >=} operand
+                property [NOT] LIKE 'pattern', property IS [NOT] NULL, property ISA 'class'
+    operand: property, 'string' or "string", number, TRUE, FALSE, NULL
+
+Usage:
+    from windows_tools.wmi_queries import query_wmi
+    from windows_tools.wmi_queries.wql import WqlQuery, select
+
+    query_wmi(select("Win32_Service", ["Name", "State"], where="StartMode = 'Auto'"))
+    query_wmi(str(WqlQuery.parse("SELECT * FROM Win32_QuickFixEngineering").project(["HotFixID"])))
+"""
+
+import re
+from typing import Iterable, List, Optional, Tuple
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_QUERY = re.compile(
+    r"^\s*SELECT\s+(?P<columns>.+?)\s+FROM\s+(?P<class_name>\S+)"
+    r"(?:\s+WITHIN\s+(?P<within>\S+))?"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_TOKEN = re.compile(
+    r"\s*(?:(?P<string>'[^']*'|\"[^\"]*\")"
+    r"|(?P<number>-?\d+(?:\.\d+)?)"
+    r"|(?P<operator><>|!=|<=|>=|=|<|>)"
+    r"|(?P<paren>[()])"
+    r"|(?P<word>[A-Za-z_][A-Za-z0-9_.]*))"
+)
+_LITERAL_WORDS = ("TRUE", "FALSE", "NULL")
+_KEYWORDS = ("AND", "OR", "NOT", "LIKE", "IS", "ISA") + _LITERAL_WORDS
+
+
+class WqlError(ValueError):
+    """
+    Invalid or unsupported WQL query
+    """
+
+
+def _check_identifier(name: str, what: str) -> str:
+    if not _IDENTIFIER.match(name) or name.upper() in _KEYWORDS:
+        raise WqlError("Invalid %s name [%s]" % (what, name))
+    return name
+
+
+def _tokenize(where: str) -> List[Tuple[str, str, int]]:
+    """
+    Split a WHERE clause into (kind, text, position) tokens
+    """
+    tokens = []
+    position = 0
+    where = where.rstrip()
+    while position < len(where):
+        match = _TOKEN.match(where, position)
+        if not match or match.end() == position:
+            raise WqlError(
+                "Invalid WHERE clause at position %d: [%s]"
+                % (position, where[position:])
+            )
+        kind = match.lastgroup
+        text = match.group(kind)
+        start = match.start(kind)
+        if kind == "word" and text.upper() in _KEYWORDS:
+            kind = "literal" if text.upper() in _LITERAL_WORDS else "keyword"
+            text = text.upper()
+        elif kind in ("string", "number"):
+            kind = "literal"
+        tokens.append((kind, text, start))
+        position = match.end()
+    return tokens
+
+
+class _WhereParser:
+    """
+    Recursive descent WHERE clause validator
+    """
+
+    def __init__(self, where: str):
+        self.where = where
+        self.tokens = _tokenize(where)
+        self.index = 0
+
+    def _peek(self) -> Tuple[Optional[str], Optional[str]]:
+        if self.index < len(self.tokens):
+            return self.tokens[self.index][:2]
+        return None, None
+
+    def _error(self, expected: str) -> WqlError:
+        if self.index < len(self.tokens):
+            _, text, position = self.tokens[self.index]
+            found = "[%s] at position %d" % (text, position)
+        else:
+            found = "end of clause"
+        return WqlError(
+            "Invalid WHERE clause [%s]: expected %s, found %s"
+            % (self.where, expected, found)
+        )
+
+    def _take(self, kind: str, text: str = None) -> str:
+        token_kind, token_text = self._peek()
+        if token_kind != kind or (text is not None and token_text != text):
+            raise self._error(text or kind)
+        self.index += 1
+        return token_text
+
+    def _accept(self, kind: str, text: str) -> bool:
+        if self._peek() == (kind, text):
+            self.index += 1
+            return True
+        return False
+
+    def parse(self) -> None:
+        if not self.tokens:
+            raise WqlError("Empty WHERE clause")
+        self._condition()
+        if self.index < len(self.tokens):
+            raise self._error("AND, OR or end of clause")
+
+    def _condition(self) -> None:
+        self._term()
+        while self._accept("keyword", "OR"):
+            self._term()
+
+    def _term(self) -> None:
+        self._factor()
+        while self._accept("keyword", "AND"):
+            self._factor()
+
+    def _factor(self) -> None:
+        if self._accept("keyword", "NOT"):
+            self._factor()
+        elif self._accept("paren", "("):
+            self._condition()
+            self._take("paren", ")")
+        else:
+            self._comparison()
+
+    def _operand(self) -> str:
+        kind, _ = self._peek()
+        if kind not in ("word", "literal"):
+            raise self._error("property or literal")
+        self.index += 1
+        return kind
+
+    def _comparison(self) -> None:
+        left = self._operand()
+        kind, text = self._peek()
+        if kind == "operator":
+            self.index += 1
+            self._operand()
+            return
+        if left != "word":
+            raise self._error("comparison operator")
+        if self._accept("keyword", "IS"):
+            self._accept("keyword", "NOT")
+            self._take("literal", "NULL")
+        elif self._accept("keyword", "ISA"):
+            self._take_string()
+        else:
+            self._accept("keyword", "NOT")
+            if not self._accept("keyword", "LIKE"):
+                raise self._error("comparison operator, LIKE, IS or ISA")
+            self._take_string()
+
+    def _take_string(self) -> None:
+        kind, text = self._peek()
+        if kind != "literal" or text[0] not in "'\"":
+            raise self._error("quoted string")
+        self.index += 1
+
+
+def validate_where(where: str) -> str:
+    """
+    Raise WqlError if a WHERE clause (without the WHERE keyword) isn't valid, returns it otherwise
+    """
+    _WhereParser(where).parse()
+    return where
+
+
+class WqlQuery:
+    """
+    Parsed WQL SELECT query, columns being None for SELECT *
+    """
+
+    __slots__ = ("class_name", "columns", "where", "within")
+
+    def __init__(
+        self,
+        class_name: str,
+        columns: Optional[Iterable[str]] = None,
+        where: Optional[str] = None,
+        within: Optional[float] = None,
+    ):
+        self.class_name = _check_identifier(class_name, "class")
+        if columns is not None:
+            columns = tuple(_check_identifier(column, "property") for column in columns)
+            if not columns:
+                raise WqlError("No columns selected from %s" % class_name)
+        self.columns = columns  # type: Optional[Tuple[str, ...]]
+        self.where = validate_where(where.strip()) if where else None
+        self.within = within
+
+    @classmethod
+    def parse(cls, query_str: str) -> "WqlQuery":
+        """
+        Parse and validate a WQL SELECT query string
+        """
+        match = _QUERY.match(query_str)
+        if not match:
+            raise WqlError("Unsupported WQL query [%s]" % query_str)
+        columns = [column.strip() for column in match.group("columns").split(",")]
+        if columns == ["*"]:
+            columns = None
+        within = match.group("within")
+        if within is not None:
+            try:
+                within = float(within)
+            except ValueError:
+                raise WqlError("Invalid WITHIN interval [%s]" % within)
+        return cls(match.group("class_name"), columns, match.group("where"), within)
+
+    def project(self, fields: Iterable[str]) -> "WqlQuery":
+        """
+        Return the same query only selecting the given fields, eg the ones a caller actually reads
+        SELECT * becomes an explicit projection, explicit projections must already contain the fields
+        """
+        fields = tuple(fields)
+        if self.columns is not None:
+            selected = dict((column.lower(), column) for column in self.columns)
+            missing = [field for field in fields if field.lower() not in selected]
+            if missing:
+                raise WqlError(
+                    "Fields %s aren't selected by [%s]" % (", ".join(missing), self)
+                )
+            fields = tuple(selected[field.lower()] for field in fields)
+        return WqlQuery(self.class_name, fields, self.where, self.within)
+
+    def __str__(self) -> str:
+        query_str = "SELECT %s FROM %s" % (
+            ", ".join(self.columns) if self.columns else "*",
+            self.class_name,
+        )
+        if self.within is not None:
+            query_str += " WITHIN %g" % self.within
+        if self.where:
+            query_str += " WHERE %s" % self.where
+        return query_str
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, WqlQuery):
+            return NotImplemented
+        return str(self) == str(other)
+
+    def __repr__(self) -> str:
+        return "WqlQuery(%r)" % str(self)
+
+
+def select(
+    class_name: str,
+    columns: Optional[Iterable[str]] = None,
+    where: Optional[str] = None,
+    within: Optional[float] = None,
+) -> str:
+    """
+    Build and validate a WQL query string, selecting every property when columns is None
+    """
+    return str(WqlQuery(class_name, columns, where, within))
+
+
+def prune_query(query_str: str, fields: Iterable[str]) -> str:
+    """
+    Rewrite a query string so that it only selects the given fields
+    """
+    return str(WqlQuery.parse(query_str).project(fields))